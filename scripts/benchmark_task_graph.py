@@ -0,0 +1,95 @@
+"""
+Benchmark local des opérations sur ExecutionTaskGraph, sans réseau.
+Mesure le débit des mises à jour, la taille du document de graphe par noeud
+et la mémoire occupée par les noeuds chargés.
+
+Usage : python -m scripts.benchmark_task_graph --backend memory --nodes 200
+        python -m scripts.benchmark_task_graph --backend sqlite --sqlite-path /tmp/bench.sqlite3
+"""
+import argparse
+import json
+import logging
+import os
+import tempfile
+import time
+import tracemalloc
+
+from src.shared.execution_task_graph_management import (
+    ExecutionTaskGraph,
+    ExecutionTaskNode,
+    ExecutionTaskState,
+    ExecutionTaskType,
+)
+from src.shared.graph_storage import create_graph_storage
+
+logging.basicConfig(level=logging.WARNING)
+
+
+def run_benchmark(backend: str, node_count: int, sqlite_path: str | None = None) -> dict:
+    if backend == "sqlite":
+        os.environ["GRAPH_STORAGE_SQLITE_PATH"] = sqlite_path or os.path.join(
+            tempfile.mkdtemp(), "bench_graphs.sqlite3"
+        )
+    storage = create_graph_storage(backend)
+    graph = ExecutionTaskGraph(f"bench_{backend}_{int(time.time())}", storage=storage)
+
+    operations = 0
+    start = time.perf_counter()
+    previous_id = None
+    for i in range(node_count):
+        node = ExecutionTaskNode(
+            task_id=f"task_{i}",
+            objective=f"Objectif de la tâche {i}",
+            task_type=ExecutionTaskType.EXECUTABLE,
+            dependencies=[previous_id] if previous_id else [],
+            assigned_agent_type="coding_python",
+        )
+        graph.add_task(node, is_root=previous_id is None)
+        operations += 1
+        previous_id = node.id
+
+    for i in range(node_count):
+        task_id = f"task_{i}"
+        graph.update_task_state(task_id, ExecutionTaskState.WORKING, "bench")
+        graph.update_task_output(task_id, artifact_ref=f"artifact_{i}", summary="ok")
+        graph.update_task_state(task_id, ExecutionTaskState.COMPLETED, "bench")
+        operations += 3
+    elapsed = time.perf_counter() - start
+
+    graph_data = graph.as_dict()
+    payload_bytes = len(json.dumps(graph_data, ensure_ascii=False).encode("utf-8"))
+    node_dicts = list(graph_data.get("nodes", {}).values())
+
+    tracemalloc.start()
+    snapshot_before = tracemalloc.take_snapshot()
+    loaded_nodes = [ExecutionTaskNode.from_dict(node_data) for node_data in node_dicts]
+    snapshot_after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    node_memory_bytes = sum(
+        stat.size_diff for stat in snapshot_after.compare_to(snapshot_before, "filename")
+    )
+
+    return {
+        "backend": storage.name,
+        "nodes": node_count,
+        "operations": operations,
+        "seconds": round(elapsed, 4),
+        "ops_per_second": round(operations / elapsed, 1) if elapsed else float("inf"),
+        "graph_payload_bytes": payload_bytes,
+        "payload_bytes_per_node": round(payload_bytes / node_count, 1) if node_count else 0,
+        "memory_bytes_per_node": round(node_memory_bytes / len(loaded_nodes), 1) if loaded_nodes else 0,
+        "history_events": len(graph.get_task_history()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--backend", choices=["memory", "sqlite"], default="memory")
+    parser.add_argument("--nodes", type=int, default=100)
+    parser.add_argument("--sqlite-path", default=None)
+    args = parser.parse_args()
+    print(run_benchmark(args.backend, args.nodes, args.sqlite_path))
+
+
+if __name__ == "__main__":
+    main()
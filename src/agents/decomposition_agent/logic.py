@@ -4,6 +4,7 @@ from typing import Dict, Any, List
 
 from src.shared.base_agent_logic import BaseAgentLogic
 from src.shared.llm_client import call_llm
+from src.shared.structured_output import StructuredOutputError, generate_json
 import uuid
 
 logger = logging.getLogger(__name__)
@@ -12,6 +13,31 @@ if not logger.hasHandlers():
 
 AGENT_SKILL_DECOMPOSE_EXECUTION_PLAN = "execution_plan_decomposition"
 
+# Validation locale seulement : 'sous_taches' (récursif) et 'input_data_refs'
+# (libre) ne s'expriment pas dans le schéma de réponse de Vertex AI.
+DECOMPOSITION_TASK_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "id": {"type": "string"},
+        "nom": {"type": "string"},
+        "description": {"type": "string"},
+        "type": {"type": "string"},
+        "dependances": {"type": "array", "items": {"type": "string"}},
+        "assigned_agent_type": {"type": "string"},
+        "sous_taches": {"type": "array"},
+    },
+    "required": ["id", "nom", "description", "type", "assigned_agent_type"],
+}
+DECOMPOSITION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "global_context": {"type": "string"},
+        "instructions": {"type": "array", "items": {"type": "string"}},
+        "tasks": {"type": "array", "items": DECOMPOSITION_TASK_SCHEMA},
+    },
+    "required": ["global_context", "instructions", "tasks"],
+}
+
 class DecompositionAgentLogic(BaseAgentLogic):
     def __init__(self):
         super().__init__()
@@ -82,33 +108,21 @@ class DecompositionAgentLogic(BaseAgentLogic):
         try:
             self.logger.debug(f"DecompositionAgentLogic - Prompt Système LLM:\n{system_prompt}")
             self.logger.debug(f"DecompositionAgentLogic - Prompt Utilisateur LLM:\n{prompt}")
-            llm_response_str = await call_llm(prompt, system_prompt, json_mode=True)
-            self.logger.debug(f"DecompositionAgentLogic - Réponse brute du LLM: {llm_response_str}")
-            
-            decomposed_plan_json = json.loads(llm_response_str)
-            
-            if not isinstance(decomposed_plan_json, dict) or \
-               not all(k in decomposed_plan_json for k in ["global_context", "instructions", "tasks"]) or \
-               not isinstance(decomposed_plan_json.get("tasks"), list):
-                self.logger.error(f"La réponse du LLM n'a pas la structure principale attendue. Réponse: {decomposed_plan_json}")
-                return {
-                    "global_context": "Erreur de décomposition.", 
-                    "instructions": ["Le LLM n'a pas retourné la structure JSON attendue."],
-                    "tasks": [{"id": "error_task", "nom": "Erreur LLM", "description": f"Réponse LLM incorrecte: {llm_response_str}", "type": "exploratory", "dependances": [], "instructions_locales": [], "acceptance_criteria": [], "assigned_agent_type": "general_analysis", "sous_taches": [], "input_data_refs": {}}],
-                    "error": "LLM response structure incorrect."
-                }
+            decomposed_plan_json = await generate_json(
+                prompt, system_prompt, DECOMPOSITION_SCHEMA, llm_call=call_llm
+            )
 
             self.logger.info(f"DecompositionAgent - Plan décomposé reçu du LLM. Nombre de tâches principales: {len(decomposed_plan_json.get('tasks', []))}")
             return decomposed_plan_json
 
-        except json.JSONDecodeError as e:
-            self.logger.error(f"Impossible de parser la réponse JSON du LLM pour la décomposition: {e}. Réponse brute: '{llm_response_str}'")
+        except StructuredOutputError as e:
+            self.logger.error(f"Impossible d'exploiter la réponse JSON du LLM pour la décomposition: {e}. Réponse brute: '{e.raw_response}'")
             return {
                 "global_context": "Erreur de décomposition.", 
-                "instructions": ["La réponse du LLM n'était pas un JSON valide."],
-                "tasks": [{"id": "error_task_json", "nom": "Erreur JSON LLM", "description": f"JSON Invalide: {llm_response_str}", "type": "exploratory", "dependances": [], "instructions_locales": [], "acceptance_criteria": [], "assigned_agent_type": "general_analysis", "sous_taches": [], "input_data_refs": {}}],
+                "instructions": ["La réponse du LLM n'était pas un JSON valide conforme à la structure attendue."],
+                "tasks": [{"id": "error_task_json", "nom": "Erreur JSON LLM", "description": f"JSON Invalide ({e}): {e.raw_response}", "type": "exploratory", "dependances": [], "instructions_locales": [], "acceptance_criteria": [], "assigned_agent_type": "general_analysis", "sous_taches": [], "input_data_refs": {}}],
                 "error": "Invalid JSON response from LLM", 
-                "raw_response": llm_response_str
+                "raw_response": e.raw_response
             }
         except Exception as e:
             self.logger.error(f"Échec de la décomposition par le LLM: {e}", exc_info=True)
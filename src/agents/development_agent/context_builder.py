@@ -0,0 +1,278 @@
+"""
+Contexte de la boucle Pensée-Action du DevelopmentAgent, borné en jetons.
+
+À chaque itération, le LLM reçoit :
+    - l'objectif ;
+    - l'historique compacté des actions : une ligne par étape ancienne
+      (action, cible, résultat), les plus anciennes regroupées en un résumé
+      quand le budget l'exige ;
+    - le détail des dernières étapes, sorties d'outils comprises.
+
+Les sorties longues (fichier lu, stdout/stderr, listing) sont tronquées en
+gardant le début et la fin, avec les lignes omises et le moyen de les relire :
+`sed -n` sur le fichier lu, ou sur la copie complète d'une sortie de commande
+écrite dans l'environnement (DEV_AGENT_OUTPUT_DIR). Un fichier ou un répertoire
+déjà montré au LLM et inchangé n'est pas renvoyé : un renvoi à l'étape qui
+l'a montré le remplace.
+
+Quand le contexte dépasse le budget, le builder réduit dans l'ordre le nombre
+d'étapes détaillées, la taille des sorties, puis regroupe l'historique.
+
+Variables d'environnement :
+    DEV_AGENT_CONTEXT_TOKEN_BUDGET   jetons alloués au contexte (défaut : 6000)
+    DEV_AGENT_OUTPUT_MAX_TOKENS      jetons max d'une sortie d'outil (défaut : 1500)
+    DEV_AGENT_RECENT_STEPS           étapes montrées en détail (défaut : 3)
+    DEV_AGENT_OUTPUT_DIR             copies complètes des sorties de commande (défaut : /tmp/dev_agent_outputs)
+"""
+import hashlib
+import json
+import logging
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.shared.llm_rate_limiter import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+DEV_AGENT_CONTEXT_TOKEN_BUDGET = int(os.environ.get("DEV_AGENT_CONTEXT_TOKEN_BUDGET", "6000"))
+DEV_AGENT_OUTPUT_MAX_TOKENS = int(os.environ.get("DEV_AGENT_OUTPUT_MAX_TOKENS", "1500"))
+DEV_AGENT_RECENT_STEPS = int(os.environ.get("DEV_AGENT_RECENT_STEPS", "3"))
+DEV_AGENT_OUTPUT_DIR = os.environ.get("DEV_AGENT_OUTPUT_DIR", "/tmp/dev_agent_outputs")
+
+# Taille plancher d'une sortie quand le budget est serré ; au-delà, une sortie
+# de commande est copiée dans l'environnement pour rester consultable.
+MIN_OUTPUT_TOKENS = 200
+# ≈ 4 caractères par jeton, comme `estimate_tokens`.
+_CHARS_PER_TOKEN = 4
+_DIGEST_SUMMARY_CHARS = 160
+
+# Sorties d'outils susceptibles d'être volumineuses, par clé de `details`.
+_OUTPUT_KEYS = ("content", "stdout", "stderr", "files")
+# Cible de chaque action, lue dans l'action décidée par le LLM.
+_TARGET_KEYS = {
+    "generate_code_and_write_file": "file_path",
+    "execute_command": "command",
+    "read_file": "file_path",
+    "list_directory": "path",
+}
+
+
+def _fingerprint(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _as_text(value: Any) -> str:
+    if isinstance(value, str):
+        return value
+    if isinstance(value, list):
+        return "\n".join(item if isinstance(item, str) else json.dumps(item, ensure_ascii=False) for item in value)
+    return json.dumps(value, ensure_ascii=False)
+
+
+def truncate_output(text: str, max_tokens: int, source_path: Optional[str] = None) -> str:
+    """
+    Garde le début et la fin de `text` (≈ `max_tokens` jetons au total) et
+    remplace le milieu par les lignes omises et, si `source_path` est connu,
+    la commande qui permet de les relire.
+    """
+    max_chars = max_tokens * _CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    lines = text.splitlines()
+    head: List[str] = []
+    tail: List[str] = []
+    head_chars = tail_chars = 0
+    # 2/3 du budget pour le début (imports, en-têtes), 1/3 pour la fin (erreurs, résultat).
+    while len(head) + len(tail) < len(lines):
+        line = lines[len(head)]
+        if head_chars + len(line) + 1 > max_chars * 2 // 3:
+            break
+        head.append(line)
+        head_chars += len(line) + 1
+    while len(head) + len(tail) < len(lines):
+        line = lines[len(lines) - 1 - len(tail)]
+        if tail_chars + len(line) + 1 > max_chars // 3:
+            break
+        tail.insert(0, line)
+        tail_chars += len(line) + 1
+
+    if not (head or tail) or len(head) + len(tail) >= len(lines):
+        # Lignes très longues : coupe au caractère près.
+        return f"{text[:max_chars * 2 // 3]}\n[... {len(text) - max_chars} caractères omis ...]\n{text[-(max_chars // 3):]}"
+    first, last = len(head) + 1, len(lines) - len(tail)
+    marker = f"[... lignes {first}-{last} omises ({last - first + 1} lignes)"
+    if source_path:
+        marker += f" ; pour les lire : sed -n '{first},{last}p' {source_path}"
+    return "\n".join(head + [marker + " ...]"] + tail)
+
+
+class ContextStep:
+    """Une action exécutée par la boucle, avec ses sorties complètes."""
+
+    def __init__(self, index: int, action: str, target: Optional[str], summary: str, details: Dict[str, Any]):
+        self.index = index
+        self.action = action
+        self.target = target
+        self.summary = summary
+        self.failed = "error" in details
+        self.outputs: Dict[str, str] = {}
+        self.details: Dict[str, Any] = {}
+        for key, value in details.items():
+            if key in _OUTPUT_KEYS and value is not None:
+                self.outputs[key] = _as_text(value)
+            else:
+                self.details[key] = value
+        # Étape ayant déjà montré ce contenu inchangé (fichier lu, répertoire listé).
+        self.duplicate_of: Optional[int] = None
+        # Fichier permettant de relire chaque sortie complète.
+        self.sources: Dict[str, Optional[str]] = {}
+
+    def digest(self) -> str:
+        summary = self.summary.replace("\n", " ")
+        if len(summary) > _DIGEST_SUMMARY_CHARS:
+            summary = summary[:_DIGEST_SUMMARY_CHARS] + "..."
+        line = f"#{self.index} {self.action}"
+        if self.target:
+            line += f" {self.target}"
+        line += f" -> {summary}"
+        if self.duplicate_of is not None:
+            line += f" (contenu identique à l'étape #{self.duplicate_of})"
+        return line + (" [ÉCHEC]" if self.failed else "")
+
+    def render(self, output_tokens: int, visible: Tuple[int, ...] = ()) -> Dict[str, Any]:
+        """Étape détaillée ; un contenu dupliqué n'est omis que si l'étape d'origine est aussi détaillée (`visible`)."""
+        details = dict(self.details)
+        for key, text in self.outputs.items():
+            if self.duplicate_of in visible and key in ("content", "files"):
+                details[key] = f"[inchangé, identique au contenu montré à l'étape #{self.duplicate_of}]"
+            else:
+                details[key] = truncate_output(text, output_tokens, self.sources.get(key))
+        return {"step": self.index, "action_taken": self.action, "summary": self.summary, "details": details}
+
+
+class DevelopmentContextBuilder:
+    def __init__(
+        self,
+        token_budget: int = DEV_AGENT_CONTEXT_TOKEN_BUDGET,
+        output_max_tokens: int = DEV_AGENT_OUTPUT_MAX_TOKENS,
+        recent_steps: int = DEV_AGENT_RECENT_STEPS,
+        output_dir: str = DEV_AGENT_OUTPUT_DIR,
+    ):
+        self.token_budget = token_budget
+        self.output_max_tokens = max(MIN_OUTPUT_TOKENS, output_max_tokens)
+        self.recent_steps = max(1, recent_steps)
+        self.output_dir = output_dir.rstrip("/")
+        self.steps: List[ContextStep] = []
+        # Contenus montrés au LLM : "file:<chemin>" ou "dir:<chemin>" -> (empreinte, étape).
+        self._shown: Dict[str, Tuple[str, int]] = {}
+        self._pending_copies: List[Tuple[str, str]] = []
+        self.last_context_tokens = 0
+
+    def record(
+        self, action: str, action_payload: Dict[str, Any], summary: str, details: Optional[Dict[str, Any]]
+    ) -> ContextStep:
+        """Ajoute une action exécutée à l'historique."""
+        target_key = _TARGET_KEYS.get(action)
+        target = action_payload.get(target_key) if target_key else None
+        step = ContextStep(len(self.steps) + 1, action, target, summary, details or {})
+
+        if not step.failed:
+            if action == "read_file" and "content" in step.outputs:
+                self._deduplicate(step, f"file:{target}", step.outputs["content"])
+                step.sources["content"] = target
+            elif action == "list_directory" and "files" in step.outputs:
+                self._deduplicate(step, f"dir:{target}", step.outputs["files"])
+            elif action == "generate_code_and_write_file":
+                # Le LLM de la boucle n'a pas vu le code généré : une relecture le montrera.
+                self._shown.pop(f"file:{target}", None)
+        for key in ("stdout", "stderr", "files"):
+            text = step.outputs.get(key)
+            if key == "files" and step.duplicate_of is not None:
+                step.sources[key] = self.steps[step.duplicate_of - 1].sources.get(key)
+            elif text and estimate_tokens(text) > MIN_OUTPUT_TOKENS:
+                path = f"{self.output_dir}/step-{step.index}-{key}.txt"
+                step.sources[key] = path
+                self._pending_copies.append((path, text))
+        self.steps.append(step)
+        return step
+
+    def _deduplicate(self, step: ContextStep, key: str, text: str) -> None:
+        fingerprint = _fingerprint(text)
+        shown = self._shown.get(key)
+        if shown and shown[0] == fingerprint:
+            step.duplicate_of = shown[1]
+            logger.info(f"Contenu de '{step.target}' inchangé depuis l'étape #{shown[1]} : non renvoyé au LLM.")
+        else:
+            self._shown[key] = (fingerprint, step.index)
+
+    def pop_output_copies(self) -> List[Tuple[str, str]]:
+        """Sorties complètes (chemin, texte) à écrire dans l'environnement."""
+        copies, self._pending_copies = self._pending_copies, []
+        return copies
+
+    def output_copy_failed(self, path: str) -> None:
+        """La copie n'a pas pu être écrite : les sorties concernées perdent leur renvoi."""
+        for step in self.steps:
+            for key, source in step.sources.items():
+                if source == path:
+                    step.sources[key] = None
+
+    def last_result(self) -> Optional[Dict[str, Any]]:
+        """Dernière étape, sorties tronquées (statut intermédiaire publié au superviseur)."""
+        return self.steps[-1].render(self.output_max_tokens) if self.steps else None
+
+    def build(self, objective: Optional[str]) -> Dict[str, Any]:
+        """Entrée de la logique pour l'itération suivante, dans la limite du budget de jetons."""
+        detailed = min(self.recent_steps, len(self.steps))
+        output_tokens = self.output_max_tokens
+        folded = 0
+        while True:
+            payload = self._render(objective, detailed, output_tokens, folded)
+            tokens = estimate_tokens(json.dumps(payload, ensure_ascii=False))
+            if tokens <= self.token_budget:
+                break
+            older = len(self.steps) - detailed
+            if detailed > 1:
+                detailed -= 1
+            elif output_tokens > MIN_OUTPUT_TOKENS:
+                output_tokens = max(MIN_OUTPUT_TOKENS, output_tokens // 2)
+            elif older - folded > 1:
+                folded += max(1, (older - folded) // 2)
+            else:
+                logger.warning(f"Contexte de développement au-dessus du budget ({tokens} > {self.token_budget} jetons).")
+                break
+        self.last_context_tokens = tokens
+        logger.info(
+            f"Contexte de développement : {tokens} jetons, {len(self.steps)} étape(s) dont {detailed} détaillée(s)."
+        )
+        return payload
+
+    def _render(self, objective: Optional[str], detailed: int, output_tokens: int, folded: int) -> Dict[str, Any]:
+        older = self.steps[:len(self.steps) - detailed]
+        recent = self.steps[len(self.steps) - detailed:] if detailed else []
+        history = [step.digest() for step in older[folded:]]
+        if folded:
+            history.insert(0, _fold(older[:folded]))
+        visible = tuple(step.index for step in recent)
+        rendered = [step.render(output_tokens, visible) for step in recent]
+        return {
+            "objective": objective,
+            "action_history": history,
+            "recent_actions": rendered[:-1],
+            "last_action_result": rendered[-1] if rendered else None,
+        }
+
+
+def _fold(steps: List[ContextStep]) -> str:
+    counts: Dict[str, int] = {}
+    for step in steps:
+        counts[step.action] = counts.get(step.action, 0) + 1
+    actions = ", ".join(f"{action} x{count}" for action, count in counts.items())
+    failures = sum(1 for step in steps if step.failed)
+    targets = sorted({step.target for step in steps if step.target and step.action != "execute_command"})
+    line = f"#{steps[0].index}-#{steps[-1].index} : {actions}"
+    if failures:
+        line += f", dont {failures} en échec"
+    if targets:
+        line += f" ; fichiers/répertoires : {', '.join(targets)}"
+    return line
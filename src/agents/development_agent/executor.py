@@ -1,8 +1,10 @@
 import logging
 import json
 
-from src.shared.base_agent_executor import BaseAgentExecutor
+from src.shared.base_agent_executor import BaseAgentExecutor, LLMStreamRelay
+from src.shared.llm_client import bind_llm_stream
 from .logic import DevelopmentAgentLogic
+from .context_builder import DevelopmentContextBuilder
 
 from a2a.types import (
     Artifact,
@@ -57,7 +59,7 @@ class DevelopmentAgentExecutor(BaseAgentExecutor):
 
     
     @override
-    async def execute(
+    async def _execute_task(
         self, context: RequestContext, event_queue: EventQueue
     ) -> None:  #
 
@@ -85,6 +87,10 @@ class DevelopmentAgentExecutor(BaseAgentExecutor):
         current_context_id = task.contextId  #
 
         user_input_json_str = self._extract_input_from_message(message)  #
+        # Relais du flux LLM et issue de la tâche quand aucun artefact final n'a été publié.
+        stream_relay: LLMStreamRelay | None = None
+        final_artifact_published = False
+        outcome_summary = "Développement interrompu."
 
         if user_input_json_str is None:  #
             # Gestion d'erreur si l'input est invalide
@@ -141,7 +147,8 @@ class DevelopmentAgentExecutor(BaseAgentExecutor):
             #await self._notify_gra_of_status_change()
 
             # --- Début de la boucle Pensée-Action ---
-            last_action_result: dict | None = None  #
+            # Historique compacté des actions, borné en jetons, renvoyé au LLM à chaque itération.
+            context_builder = DevelopmentContextBuilder()
             continue_loop = True  #
 
             await event_queue.enqueue_event(
@@ -158,24 +165,32 @@ class DevelopmentAgentExecutor(BaseAgentExecutor):
                 )
             )
 
+            # Les réponses LLM de la boucle sont relayées au fil de l'eau au superviseur.
+            stream_relay = LLMStreamRelay(
+                event_queue, current_task_id, current_context_id, self.default_artifact_name
+            )
+
             while continue_loop:  #
                 tool_result = (
                     None  # Réinitialiser le résultat de l'outil à chaque itération
                 )
                 # 1. Préparer l'input pour la logique (LLM)
-                payload_for_logic = {  #
-                    "objective": input_payload_from_supervisor.get("objective"),
-                    "last_action_result": last_action_result,  #
-                }
+                payload_for_logic = context_builder.build(
+                    input_payload_from_supervisor.get("objective")
+                )
 
                 self.logger.info(
                     f"Début itération: Appel de la logique pour décider de la prochaine action."
                 )
 
                 # 2. Appeler le LLM pour qu'il décide de la prochaine action
-                llm_action_json_str = await self.agent_logic.process(
-                    json.dumps(payload_for_logic), current_context_id
-                )  #
+                try:
+                    with bind_llm_stream(stream_relay.on_chunk):
+                        llm_action_json_str = await self.agent_logic.process(
+                            json.dumps(payload_for_logic), current_context_id
+                        )  #
+                finally:
+                    await stream_relay.close()
                 llm_action_payload = json.loads(llm_action_json_str)  #
                 action_type = llm_action_payload.get("action")  #
 
@@ -189,9 +204,13 @@ class DevelopmentAgentExecutor(BaseAgentExecutor):
                 # 3. Exécuter l'action demandée par le LLM
                 if action_type == "generate_code_and_write_file":
                     file_path = llm_action_payload.get("file_path", "/app/main.py")
-                    code_to_write = await self._generate_code_from_specs(
-                        llm_action_payload
-                    )
+                    try:
+                        with bind_llm_stream(stream_relay.on_chunk):
+                            code_to_write = await self._generate_code_from_specs(
+                                llm_action_payload
+                            )
+                    finally:
+                        await stream_relay.close()
                     self.status_detail = f"Génération du fichier {file_path}"
                     #await self._notify_gra_of_status_change()
 
@@ -367,8 +386,10 @@ class DevelopmentAgentExecutor(BaseAgentExecutor):
 
                     continue_loop = False  # Stopper la boucle
 
-                    final_artifact = self._create_artifact_from_result(
-                        json.dumps(final_artifact_content), task
+                    final_artifact = stream_relay.adopt(
+                        self._create_artifact_from_result(
+                            json.dumps(final_artifact_content), task
+                        )
                     )
                     await event_queue.enqueue_event(
                         TaskArtifactUpdateEvent(
@@ -379,6 +400,7 @@ class DevelopmentAgentExecutor(BaseAgentExecutor):
                             artifact=final_artifact,
                         )
                     )
+                    final_artifact_published = True
                     await event_queue.enqueue_event(
                         TaskStatusUpdateEvent(
                             status=TaskStatus(
@@ -403,11 +425,11 @@ class DevelopmentAgentExecutor(BaseAgentExecutor):
 
                 # Préparer un retour intermédiaire si la boucle continue
                 if continue_loop:
-                    last_action_result = {
-                        "action_taken": action_type,
-                        "summary": action_summary,
-                        "details": action_result_details,
-                    }
+                    context_builder.record(
+                        action_type, llm_action_payload, action_summary, action_result_details
+                    )
+                    await self._store_full_outputs(context_builder)
+                    last_action_result = context_builder.last_result()
                     self.status_detail = action_summary
                     #await self._notify_gra_of_status_change()
                     await event_queue.enqueue_event(
@@ -422,6 +444,10 @@ class DevelopmentAgentExecutor(BaseAgentExecutor):
                         )
                     )
 
+            if continue_loop:
+                # Sortie de boucle sans complete_task : abandon après échecs répétés.
+                outcome_summary = action_summary
+
         except Exception as e:  #
             self.logger.error(
                 f"Erreur majeure dans l'exécuteur de développement pour la tâche {current_task_id}: {e}",
@@ -445,7 +471,15 @@ class DevelopmentAgentExecutor(BaseAgentExecutor):
             self.status_detail = f"Erreur: {e}"
             #await self._notify_gra_of_status_change()
             self._update_stats(success=False)  #
+            outcome_summary = f"Erreur interne de l'agent: {str(e)}"
         finally:  #
+            # L'aperçu du flux LLM ne doit pas rester le dernier artefact de la tâche.
+            if stream_relay is not None and not final_artifact_published:
+                await stream_relay.replace_preview(
+                    self._create_artifact_from_result(
+                        json.dumps({"final_summary": outcome_summary, "status": "failed"}), task
+                    )
+                )
             self.state = AgentOperationalState.IDLE
             self.current_task_id = (
                 context.current_task.id if context.current_task else None
@@ -454,6 +488,18 @@ class DevelopmentAgentExecutor(BaseAgentExecutor):
             self.status_detail = None
             #await self._notify_gra_of_status_change()  # Notifier la fin
 
+    async def _store_full_outputs(self, context_builder: DevelopmentContextBuilder) -> None:
+        """Écrit dans l'environnement les sorties complètes que le contexte du LLM tronque."""
+        for path, content in context_builder.pop_output_copies():
+            stored = await self.environment_manager.safe_tool_call(
+                self.environment_manager.write_file_to_environment(
+                    self.current_environment_id, path, content
+                ),
+                f"Copie de la sortie complète {path}",
+            )
+            if isinstance(stored, dict) and "error" in stored:
+                context_builder.output_copy_failed(path)
+
     async def _generate_code_from_specs(self, specs: dict) -> str:
         """Méthode privée pour appeler le LLM spécifiquement pour la génération de code."""
         from src.shared.llm_client import call_llm  #
@@ -6,11 +6,30 @@ from typing import Dict, Any
 
 from src.shared.base_agent_logic import BaseAgentLogic
 from src.shared.llm_client import call_llm #
+from src.shared.structured_output import generate_json
 
 logger = logging.getLogger(__name__)
 
 AGENT_SKILL_CODING_PYTHON = "coding_python"
 
+# Validation locale seulement : les champs dépendent de l'action et 'details' est libre.
+DEVELOPMENT_ACTION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "action": {
+            "type": "string",
+            "enum": [
+                "generate_code_and_write_file",
+                "execute_command",
+                "read_file",
+                "list_directory",
+                "complete_task",
+            ],
+        },
+    },
+    "required": ["action"],
+}
+
 class DevelopmentAgentLogic(BaseAgentLogic):
     def __init__(self):
         super().__init__()
@@ -52,6 +71,9 @@ class DevelopmentAgentLogic(BaseAgentLogic):
             input_payload = json.loads(input_data_str)
             objective = input_payload.get("objective", "Objectif non spécifié.")
             last_action_result = input_payload.get("last_action_result", {})
+            # Contexte compacté par l'exécuteur (voir `context_builder.py`).
+            action_history = input_payload.get("action_history") or []
+            recent_actions = input_payload.get("recent_actions") or []
         except json.JSONDecodeError:
             self.logger.error(f"DevelopmentAgentLogic: Input JSON invalide: {input_data_str}")
             return json.dumps({"action": "complete_task", "summary": "Erreur: L'input de la tâche était mal formaté."})
@@ -62,19 +84,34 @@ class DevelopmentAgentLogic(BaseAgentLogic):
 
         system_prompt = self._get_system_prompt()
         
+        history_section = ""
+        if action_history:
+            history_section += "Historique des actions précédentes (résumé) :\n" + "\n".join(action_history) + "\n\n"
+        if recent_actions:
+            history_section += (
+                "Actions récentes (détail) :\n"
+                f"{json.dumps(recent_actions, indent=2, ensure_ascii=False)}\n\n"
+            )
+        if history_section:
+            history_section += (
+                "Les sorties longues sont tronquées : relis seulement les lignes utiles avec la commande indiquée. "
+                "Ne relis pas un fichier ou un répertoire déjà montré s'il n'a pas changé depuis.\n\n"
+            )
+
         prompt = (
             f"Objectif de développement global : {objective}\n\n"
-            f"Résultat de la dernière action exécutée : {json.dumps(last_action_result, indent=2)}\n\n"
-            "En te basant sur l'objectif et le résultat de la dernière action, "
+            f"{history_section}"
+            f"Résultat de la dernière action exécutée : {json.dumps(last_action_result, indent=2, ensure_ascii=False)}\n\n"
+            "En te basant sur l'objectif, l'historique et le résultat de la dernière action, "
             "quelle est la **PROCHAINE action unique et atomique que tu dois planifier** ? "
             "Quand tu choisis `complete_task`, fournis un résumé structuré (avec fichiers générés, commandes exécutées, résultats des tests)."
             " Réponds UNIQUEMENT avec l'objet JSON correspondant à l'action choisie."
         )
         try:
-            llm_response_str = await call_llm(prompt, system_prompt, json_mode=True) #
+            # Réponse réparée et validée ici : l'exécuteur reçoit toujours une action JSON valide.
+            llm_action = await generate_json(prompt, system_prompt, DEVELOPMENT_ACTION_SCHEMA, llm_call=call_llm)
+            llm_response_str = json.dumps(llm_action, ensure_ascii=False)
             self.logger.info(f"DevelopmentAgentLogic - Réponse LLM (prochaine action): {llm_response_str}")
-            # Valider que la réponse est un JSON est une bonne pratique, mais on la retourne directement
-            # à l'exécuteur qui gérera le parsing et la validation.
             logger.debug(f"Action LLM décidée: - Payload: {llm_response_str}")
             return llm_response_str
         except Exception as e:
@@ -16,7 +16,8 @@ from starlette.responses import JSONResponse
 # --- 1. Import du nouveau handler ---
 from src.shared.log_handler import InMemoryLogHandler
 
-from src.shared.service_discovery import get_gra_base_url, register_self_with_gra
+from src.shared.service_discovery import get_gra_base_url, register_self_with_gra, stop_gra_heartbeat
+from src.shared.llm_client import get_llm_client, set_llm_agent_name
 from .executor import DevelopmentAgentExecutor
 from .logic import AGENT_SKILL_CODING_PYTHON
 
@@ -77,6 +78,9 @@ async def restart_endpoint(request):
 @contextlib.asynccontextmanager
 async def lifespan(app_param: Starlette):
     logger.info(f"[{AGENT_NAME}] Démarrage du cycle de vie (lifespan)...")
+    set_llm_agent_name(AGENT_NAME)
+    # Canal Vertex AI ouvert avant la première tâche.
+    await get_llm_client().warm_up()
     
     agent_public_url = os.environ.get("PUBLIC_URL")
     agent_internal_url = os.environ.get("INTERNAL_URL")
@@ -96,6 +100,7 @@ async def lifespan(app_param: Starlette):
     yield
     
     logger.info(f"[{AGENT_NAME}] Serveur en cours d'arrêt.")
+    await stop_gra_heartbeat(AGENT_NAME)
 
 def create_app_instance() -> Starlette:
     agent_card = get_development_agent_card()
@@ -3,9 +3,22 @@ import json
 from typing import Dict, Any
 from src.shared.base_agent_logic import BaseAgentLogic
 from src.shared.llm_client import call_llm
+from src.shared.structured_output import StructuredOutputError, generate_json
 
 logger = logging.getLogger(__name__)
 
+EVALUATION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "evaluation_notes": {"type": "string"},
+        "strengths": {"type": "array", "items": {"type": "string"}},
+        "weaknesses": {"type": "array", "items": {"type": "string"}},
+        "feasibility_score": {"type": "number"},
+        "evaluated_plan": {"type": "string"},
+    },
+    "required": ["evaluation_notes", "strengths", "weaknesses", "feasibility_score", "evaluated_plan"],
+}
+
 class EvaluatorAgentLogic(BaseAgentLogic):
     def __init__(self):
         super().__init__()
@@ -34,15 +47,15 @@ class EvaluatorAgentLogic(BaseAgentLogic):
         )
 
         try:
-            json_response_str = await call_llm(prompt, system_prompt, json_mode=True)
-            
-            evaluation_result = json.loads(json_response_str)
+            evaluation_result = await generate_json(
+                prompt, system_prompt, EVALUATION_SCHEMA, llm_call=call_llm, constrain_decoding=True
+            )
             logger.info(f"EvaluatorAgentLogic - Évaluation JSON reçue du LLM: {evaluation_result}")
             return evaluation_result
 
-        except json.JSONDecodeError as e:
-            logger.error(f"Impossible de parser la réponse JSON du LLM: {e}. Réponse brute: '{json_response_str}'")
-            return {"error": "Invalid JSON response from LLM", "raw_response": json_response_str}
+        except StructuredOutputError as e:
+            logger.error(f"Impossible de parser la réponse JSON du LLM: {e}. Réponse brute: '{e.raw_response}'")
+            return {"error": "Invalid JSON response from LLM", "raw_response": e.raw_response}
         except Exception as e:
             logger.error(f"Échec de l'évaluation par le LLM: {e}")
             return {"error": f"LLM processing failed: {e}", "evaluated_plan": plan_to_evaluate}
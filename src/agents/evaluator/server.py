@@ -21,7 +21,8 @@ from starlette.responses import JSONResponse
 # --- 1. Import du nouveau handler ---
 from src.shared.log_handler import InMemoryLogHandler
 
-from src.shared.service_discovery import get_gra_base_url, register_self_with_gra
+from src.shared.service_discovery import get_gra_base_url, register_self_with_gra, stop_gra_heartbeat
+from src.shared.llm_client import get_llm_client, set_llm_agent_name
 from .executor import EvaluatorAgentExecutor
 
 logger = logging.getLogger(__name__)
@@ -123,6 +124,9 @@ def create_app_instance() -> Starlette:
 @contextlib.asynccontextmanager
 async def lifespan(app_param: Starlette):
     logger.info(f"[{AGENT_NAME}] Démarrage du cycle de vie (lifespan)...")
+    set_llm_agent_name(AGENT_NAME)
+    # Canal Vertex AI ouvert avant la première tâche.
+    await get_llm_client().warm_up()
     
     agent_public_url = os.environ.get("PUBLIC_URL")
     agent_internal_url = os.environ.get("INTERNAL_URL")
@@ -142,6 +146,7 @@ async def lifespan(app_param: Starlette):
     yield
     
     logger.info(f"[{AGENT_NAME}] Serveur en cours d'arrêt.")
+    await stop_gra_heartbeat(AGENT_NAME)
 
 app = create_app_instance()
 
@@ -5,6 +5,7 @@ import uuid
 
 from src.shared.base_agent_logic import BaseAgentLogic
 from src.shared.llm_client import call_llm
+from src.shared.structured_output import StructuredOutputError, generate_json
 
 logger = logging.getLogger(__name__)
 if not logger.hasHandlers():
@@ -14,6 +15,27 @@ AGENT_SKILL_GENERAL_ANALYSIS = "general_analysis"
 AGENT_SKILL_WEB_RESEARCH = "web_research"
 AGENT_SKILL_DOCUMENT_SYNTHESIS = "document_synthesis"
 
+RESEARCH_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "summary": {"type": "string"},
+        "new_sub_tasks": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "id": {"type": "string"},
+                    "nom": {"type": "string"},
+                    "description": {"type": "string"},
+                    "assigned_agent_type": {"type": "string"},
+                },
+                "required": ["id", "nom", "description", "assigned_agent_type"],
+            },
+        },
+    },
+    "required": ["summary", "new_sub_tasks"],
+}
+
 class ResearchAgentLogic(BaseAgentLogic):
     def __init__(self):
         super().__init__()
@@ -82,31 +104,18 @@ class ResearchAgentLogic(BaseAgentLogic):
         try:
             self.logger.debug(f"ResearchAgentLogic - Prompt Système LLM:\n{system_prompt}")
             self.logger.debug(f"ResearchAgentLogic - Prompt Utilisateur LLM:\n{prompt}")
-            llm_response_str = await call_llm(prompt, system_prompt, json_mode=True)
-            self.logger.debug(f"ResearchAgentLogic - Réponse brute du LLM: {llm_response_str}")
-
             try:
-                llm_json_output = json.loads(llm_response_str)
-                if not isinstance(llm_json_output, dict) or \
-                   "summary" not in llm_json_output or \
-                   "new_sub_tasks" not in llm_json_output or \
-                   not isinstance(llm_json_output["new_sub_tasks"], list):
-                    self.logger.error(f"Réponse LLM pour ResearchAgent n'a pas la structure attendue (summary, new_sub_tasks): {llm_json_output}")
-                    return json.dumps({
-                        "summary": "Erreur: La réponse du LLM n'a pas la structure JSON attendue.",
-                        "new_sub_tasks": [],
-                        "error": "LLM response structure incorrect."
-                    })
+                llm_json_output = await generate_json(prompt, system_prompt, RESEARCH_SCHEMA, llm_call=call_llm)
                 self.logger.info(f"ResearchAgent - Résultat traité. Summary: '{llm_json_output.get('summary')[:100]}...'. Nombre de nouvelles sous-tâches: {len(llm_json_output.get('new_sub_tasks',[]))}")
                 return json.dumps(llm_json_output, ensure_ascii=False)
 
-            except json.JSONDecodeError as e:
-                self.logger.error(f"Impossible de parser JSON du LLM pour ResearchAgent: {e}. Réponse: '{llm_response_str}'")
+            except StructuredOutputError as e:
+                self.logger.error(f"Impossible d'exploiter le JSON du LLM pour ResearchAgent: {e}. Réponse: '{e.raw_response}'")
                 return json.dumps({
-                    "summary": "Erreur: La réponse du LLM n'était pas un JSON valide.",
+                    "summary": "Erreur: La réponse du LLM n'était pas un JSON valide conforme à la structure attendue.",
                     "new_sub_tasks": [],
                     "error": "Invalid JSON response from LLM", 
-                    "raw_response": llm_response_str
+                    "raw_response": e.raw_response
                 })
 
         except Exception as e:
@@ -44,7 +44,7 @@ class TestingAgentExecutor(BaseAgentExecutor):
         )
 
     @override
-    async def execute(self, context: RequestContext, event_queue: EventQueue) -> None:
+    async def _execute_task(self, context: RequestContext, event_queue: EventQueue) -> None:
         self.state = AgentOperationalState.WORKING
         self.current_task_id = context.current_task.id if context.current_task else None
         self.last_activity_time = time.time()
@@ -4,6 +4,7 @@ from typing import Dict, Any, Tuple
 
 from src.shared.base_agent_logic import BaseAgentLogic
 from src.shared.llm_client import call_llm
+from src.shared.structured_output import generate_json
 
 logger = logging.getLogger(__name__)
 if not logger.hasHandlers():
@@ -12,6 +13,40 @@ if not logger.hasHandlers():
 AGENT_SKILL_SOFTWARE_TESTING = "software_testing"
 AGENT_SKILL_TEST_CASE_GENERATION = "test_case_generation"
 
+TEST_CASES_SCHEMA = {
+    "type": "object",
+    "properties": {"generated_test_cases": {"type": "array", "items": {"type": "string"}}},
+    "required": ["generated_test_cases"],
+}
+TEST_REPORT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "test_status": {"type": "string", "enum": ["passed", "failed", "partial_success"]},
+        "summary": {"type": "string"},
+        "acceptance_criteria_status": {
+            "type": "object",
+            "properties": {
+                "passed": {"type": "array", "items": {"type": "string"}},
+                "failed": {"type": "array", "items": {"type": "string"}},
+            },
+        },
+        "specific_test_cases_results": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "test_case": {"type": "string"},
+                    "status": {"type": "string", "enum": ["passed", "failed"]},
+                    "details": {"type": "string"},
+                },
+                "required": ["test_case", "status"],
+            },
+        },
+        "identified_issues_or_bugs": {"type": "array", "items": {"type": "string"}},
+    },
+    "required": ["test_status", "summary"],
+}
+
 
 class TestingAgentLogic(BaseAgentLogic):
     def __init__(self):
@@ -79,11 +114,10 @@ class TestingAgentLogic(BaseAgentLogic):
                 "'generated_test_cases' (une liste de strings)."
             )
             try:
-                llm_response_tcg_str = await call_llm(prompt_tcg, system_prompt_tcg, json_mode=True)
-                parsed_llm_response = json.loads(llm_response_tcg_str)
-                if "generated_test_cases" not in parsed_llm_response or not isinstance(parsed_llm_response["generated_test_cases"], list):
-                    self.logger.error(f"TestingAgent (test_case_generation): Réponse LLM malformée - {llm_response_tcg_str}")
-                    raise ValueError("Réponse LLM pour la génération de cas de test malformée.")
+                parsed_llm_response = await generate_json(
+                    prompt_tcg, system_prompt_tcg, TEST_CASES_SCHEMA, llm_call=call_llm, constrain_decoding=True
+                )
+                llm_response_tcg_str = json.dumps(parsed_llm_response, ensure_ascii=False)
                 self.logger.info(f"TestingAgent (test_case_generation) - Cas de test générés (JSON): {llm_response_tcg_str}")
                 return llm_response_tcg_str 
             except Exception as e:
@@ -168,11 +202,9 @@ class TestingAgentLogic(BaseAgentLogic):
             )
 
             try:
-                llm_response_str = await call_llm(prompt_st, system_prompt_st, json_mode=True) 
-                test_report = json.loads(llm_response_str)
-                if not all(k in test_report for k in ["test_status", "summary"]):
-                    self.logger.error(f"Rapport de test LLM malformé: {test_report}")
-                    raise ValueError("Le rapport de test du LLM n'a pas la structure attendue.")
+                test_report = await generate_json(
+                    prompt_st, system_prompt_st, TEST_REPORT_SCHEMA, llm_call=call_llm, constrain_decoding=True
+                )
                 self.logger.info(f"TestingAgent (software_testing) - Rapport de test généré: {test_report.get('test_status')}, Summary: {test_report.get('summary')}")
                 return json.dumps(test_report, ensure_ascii=False)
 
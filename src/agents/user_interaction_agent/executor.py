@@ -49,7 +49,7 @@ class UserInteractionAgentExecutor(BaseAgentExecutor):
         logger.warning("Aucune entrée textuelle (JSON attendu) trouvée pour UserInteractionAgent.")
         return None
 
-    async def execute(self, context: RequestContext, event_queue: EventQueue) -> None:
+    async def _execute_task(self, context: RequestContext, event_queue: EventQueue) -> None:
         task_context_id_for_log = context.context_id if context.context_id else (context.message.contextId if context.message and context.message.contextId else "N/A")
         logger.info(f"{self.__class__.__name__}.execute appelé pour le contexte: {task_context_id_for_log}")
 
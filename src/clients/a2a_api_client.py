@@ -3,6 +3,8 @@
 import asyncio
 import httpx
 import logging
+import os
+import time
 from uuid import uuid4
 from typing import Any, Dict, Optional
 
@@ -20,16 +22,35 @@ from a2a.types import (
     TextPart,
     GetTaskRequest,
     TaskQueryParams,
+    CancelTaskRequest,
+    TaskIdParams,
     Task,
     TaskState,
+    TaskStatus,
     Artifact,
 )
 from a2a.client import A2AClientHTTPError, A2AClientJSONError
+from src.shared.circuit_breaker import (
+    CircuitBreaker,
+    CircuitState,
+    get_circuit_breaker,
+    get_circuit_breaker_registry,
+)
 
 logger = logging.getLogger(__name__)
 if not logger.hasHandlers():
     logging.basicConfig(level=logging.INFO)
 
+# Clé des métadonnées du message A2A portant l'échéance absolue de la tâche (epoch, secondes).
+A2A_DEADLINE_METADATA_KEY = "deadline_ts"
+# Clé des métadonnées du message de statut 'failed' portant le code d'échec structuré de l'agent.
+A2A_FAILURE_CODE_METADATA_KEY = "failure_code"
+CANCEL_REQUEST_TIMEOUT_SECONDS = 10.0
+CIRCUIT_REPORT_TIMEOUT_SECONDS = 5.0
+
+# Références des notifications au GRA en cours (évite leur ramasse-miettes).
+_background_tasks: set = set()
+
 
 # --- CLASSE D'AUTHENTIFICATION ---
 class GoogleIDTokenAuth(httpx.Auth):
@@ -62,9 +83,11 @@ def _create_agent_input_message(
     input_text: str,
     context_id: Optional[str] = None,
     task_id: Optional[str] = None,
+    deadline_ts: Optional[float] = None,
 ) -> Message:
     """
-    Crée un objet Message A2A à partir d'une chaîne de caractères. (Inchangé)
+    Crée un objet Message A2A à partir d'une chaîne de caractères.
+    L'échéance éventuelle est transmise à l'agent dans les métadonnées.
     """
     return Message(
         messageId=str(uuid4()),
@@ -74,20 +97,109 @@ def _create_agent_input_message(
         ],
         contextId=context_id,
         taskId=task_id,
+        metadata={A2A_DEADLINE_METADATA_KEY: deadline_ts} if deadline_ts is not None else None,
+    )
+
+
+def _remaining_seconds(deadline_ts: Optional[float]) -> Optional[float]:
+    if deadline_ts is None:
+        return None
+    return deadline_ts - time.time()
+
+
+async def _cancel_remote_task(a2a_client: A2AClient, task_id: str, agent_url: str) -> Optional[Task]:
+    """Demande l'annulation d'une tâche à l'agent (A2A tasks/cancel). Ne lève pas d'exception."""
+    try:
+        cancel_request = CancelTaskRequest(id=str(uuid4()), params=TaskIdParams(id=task_id))
+        cancel_response = await a2a_client.cancel_task(
+            request=cancel_request,
+            http_kwargs={"timeout": CANCEL_REQUEST_TIMEOUT_SECONDS},
+        )
+        if hasattr(cancel_response, 'root') and isinstance(getattr(cancel_response.root, 'result', None), Task):
+            logger.info(f"Tâche {task_id} annulée sur l'agent {agent_url}.")
+            return cancel_response.root.result
+        logger.warning(f"Annulation de la tâche {task_id} refusée par l'agent {agent_url}: {cancel_response}")
+    except Exception as e:
+        logger.warning(f"Impossible d'annuler la tâche {task_id} sur l'agent {agent_url}: {e}")
+    return None
+
+
+def _report_circuit_transition(breaker: CircuitBreaker, old_state: CircuitState, new_state: CircuitState) -> None:
+    """Remonte au GRA, sans bloquer l'appelant, le changement d'état d'un disjoncteur."""
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    payload = {
+        "agent_url": breaker.key,
+        "state": new_state.value,
+        "previous_state": old_state.value,
+        "last_error": breaker.last_error,
+        "reporter": os.environ.get("AGENT_NAME") or os.environ.get("HOSTNAME") or "unknown",
+    }
+    task = loop.create_task(_post_circuit_transition(payload))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+async def _post_circuit_transition(payload: Dict[str, Any]) -> None:
+    from src.shared.service_discovery import get_gra_base_url
+
+    try:
+        gra_url = await get_gra_base_url()
+        if not gra_url:
+            return
+        async with httpx.AsyncClient() as client:
+            await client.post(f"{gra_url}/v1/circuit_breakers", json=payload, timeout=CIRCUIT_REPORT_TIMEOUT_SECONDS)
+    except Exception as e:
+        logger.warning(f"Impossible de signaler au GRA le disjoncteur de {payload['agent_url']}: {e}")
+
+
+get_circuit_breaker_registry().add_transition_listener(_report_circuit_transition)
+
+
+def _canceled_task(task_id: str, context_id: Optional[str]) -> Task:
+    return Task(
+        id=task_id,
+        contextId=context_id or "",
+        status=TaskStatus(state=TaskState.canceled),
     )
-    
+
+
 
 async def call_a2a_agent(
     agent_url: str,
     input_text: str,
     initial_context_id: Optional[str] = None,
     max_retries: int = 30,
-    retry_delay: int = 5
+    retry_delay: int = 5,
+    deadline_ts: Optional[float] = None,
+    task_id: Optional[str] = None,
 ) -> Optional[Task]:
     """
     Appelle un agent A2A, lui envoie un message texte, et attend sa complétion.
     Gère maintenant l'authentification de service-à-service.
+
+    `deadline_ts` (epoch, secondes) borne l'appel des deux côtés : l'agent la reçoit
+    dans les métadonnées du message, et le client demande l'annulation de la tâche
+    (tasks/cancel) une fois l'échéance passée. La tâche retournée est alors dans
+    l'état `canceled`. L'annulation de la coroutine appelante est propagée de même.
+    Avec une échéance, la tâche est sondée jusqu'à elle ; sans échéance, pendant
+    `max_retries` tentatives espacées de `retry_delay`.
+    `task_id` permet à l'appelant de fixer l'identifiant de la tâche A2A pour la
+    retrouver plus tard (voir `await_a2a_task`).
+
+    Un disjoncteur par URL d'agent coupe les appels après plusieurs échecs
+    consécutifs : tant qu'il est ouvert, l'appel retourne None immédiatement
+    pour que l'appelant se tourne vers un autre agent.
     """
+    breaker = get_circuit_breaker(agent_url)
+    if not breaker.allow_request():
+        logger.warning(
+            f"Disjoncteur ouvert pour l'agent {agent_url} : appel refusé sans attente "
+            f"(nouvel essai possible dans {breaker.retry_after_seconds():.0f}s)."
+        )
+        return None
     logger.info(f"Appel à l'agent A2A à l'URL: {agent_url} avec l'entrée: '{input_text}'")
 
     async with httpx.AsyncClient(
@@ -103,102 +215,248 @@ async def call_a2a_agent(
             logger.info(f"Connecté à l'agent: {a2a_client.card.name if hasattr(a2a_client, 'card') and a2a_client.card else agent_url}")
         except Exception as e:
             logger.error(f"Impossible de se connecter à l'agent {agent_url} ou d'obtenir sa carte: {e}", exc_info=True)
+            breaker.record_failure(str(e))
             return None
 
-        message_payload = _create_agent_input_message(input_text, context_id=initial_context_id)
+        # L'identifiant de tâche est fixé côté client : il permet d'annuler la tâche
+        # même si la réponse de send_message n'arrive jamais.
+        task_id = task_id or str(uuid4())
+        message_payload = _create_agent_input_message(
+            input_text, context_id=initial_context_id, task_id=task_id, deadline_ts=deadline_ts
+        )
         send_params = MessageSendParams(message=message_payload)
         send_request = SendMessageRequest(id=str(uuid4()), params=send_params)
 
-        task_id: Optional[str] = None
-        context_id_for_task: Optional[str] = None
         try:
-            for attempt in range(max_retries):
-                try:
-                    send_response = await a2a_client.send_message(request=send_request)
-
-                    if hasattr(send_response, 'root') and hasattr(send_response.root, 'result') and isinstance(send_response.root.result, Task):
-                        created_task = send_response.root.result
-                        task_id = created_task.id
-                        context_id_for_task = created_task.contextId
-                        logger.info(
-                            f"Message envoyé. Tâche ID={task_id}, ContextID={context_id_for_task}, Statut initial={created_task.status.state}"
-                        )
-                        break
-                    else:
-                        error_content = send_response.model_dump_json(indent=2) if hasattr(send_response, 'model_dump_json') else str(send_response)
-                        logger.error(f"Réponse inattendue de send_message à {agent_url}: {error_content}")
-                        return None
-
-                except (A2AClientHTTPError, A2AClientJSONError, httpx.RequestError) as e:
-                    logger.error(
-                        f"Erreur réseau ou JSON lors de l'envoi du message à {agent_url}: {e}", exc_info=True
-                    )
+            return await _send_and_wait(
+                a2a_client, agent_url, send_request, task_id, initial_context_id,
+                max_retries, retry_delay, deadline_ts, breaker,
+            )
+        except asyncio.CancelledError:
+            logger.warning(f"Appel à l'agent {agent_url} interrompu : annulation de la tâche {task_id}.")
+            await asyncio.shield(_cancel_remote_task(a2a_client, task_id, agent_url))
+            raise
 
-                except Exception as e:
-                    logger.error(f"Erreur inattendue lors de l'envoi du message à {agent_url}: {e}", exc_info=True)
 
-                # Si on arrive ici : on va retry si pas au dernier tour
-                if attempt < max_retries - 1:
-                    delay = 2 ** attempt
-                    logger.warning(
-                        f"A2A call failed on attempt {attempt + 1}, retrying in {delay} seconds..."
+async def _send_and_wait(
+    a2a_client: A2AClient,
+    agent_url: str,
+    send_request: SendMessageRequest,
+    task_id: str,
+    initial_context_id: Optional[str],
+    max_retries: int,
+    retry_delay: int,
+    deadline_ts: Optional[float],
+    breaker: CircuitBreaker,
+) -> Optional[Task]:
+    context_id_for_task: Optional[str] = None
+    send_error: Optional[str] = None
+    try:
+        for attempt in range(max_retries):
+            remaining = _remaining_seconds(deadline_ts)
+            if remaining is not None and remaining <= 0:
+                logger.error(f"Échéance dépassée avant la réponse de l'agent {agent_url} pour la tâche {task_id}.")
+                cancelled = await _cancel_remote_task(a2a_client, task_id, agent_url)
+                return cancelled or _canceled_task(task_id, initial_context_id)
+            try:
+                # send_message est bloquant jusqu'à l'état final : son délai suit l'échéance.
+                http_kwargs = {"timeout": remaining} if remaining is not None else None
+                send_response = await a2a_client.send_message(request=send_request, http_kwargs=http_kwargs)
+
+                if hasattr(send_response, 'root') and hasattr(send_response.root, 'result') and isinstance(send_response.root.result, Task):
+                    created_task = send_response.root.result
+                    context_id_for_task = created_task.contextId
+                    breaker.record_success()
+                    logger.info(
+                        f"Message envoyé. Tâche ID={task_id}, ContextID={context_id_for_task}, Statut initial={created_task.status.state}"
                     )
-                    await asyncio.sleep(delay)
+                    break
                 else:
-                    logger.error(f"A2A call failed after {max_retries} attempts.")
+                    error_content = send_response.model_dump_json(indent=2) if hasattr(send_response, 'model_dump_json') else str(send_response)
+                    logger.error(f"Réponse inattendue de send_message à {agent_url}: {error_content}")
                     return None
-        except Exception as fatal_e:
-            logger.error(f"Erreur fatale dans le retry loop: {fatal_e}", exc_info=True)
-            return None
 
+            except (A2AClientHTTPError, A2AClientJSONError, httpx.RequestError) as e:
+                logger.error(
+                    f"Erreur réseau ou JSON lors de l'envoi du message à {agent_url}: {e}", exc_info=True
+                )
+                send_error = str(e) or type(e).__name__
 
-        if not task_id or not context_id_for_task:
-            logger.error(f"Aucun task_id ou context_id valide retourné par send_message pour l'agent {agent_url}.")
-            return None
+            except Exception as e:
+                logger.error(f"Erreur inattendue lors de l'envoi du message à {agent_url}: {e}", exc_info=True)
+                send_error = str(e) or type(e).__name__
 
-        logger.info(f"Sondage de la tâche {task_id} (contexte {context_id_for_task}) pour l'agent {agent_url}...")
-        final_task_result: Optional[Task] = None
-        for attempt in range(max_retries):
-            try:
-                await asyncio.sleep(retry_delay)
-                # Les TaskQueryParams de la librairie A2A ne gèrent pas
-                # directement le context_id. Certains serveurs A2A n'en ont
-                # pas besoin car l'identifiant de tâche est global. On retire
-                # donc ce paramètre pour éviter qu'il soit ignoré et on
-                # l'utilise uniquement pour le logging.
-                get_task_params = TaskQueryParams(id=task_id)
-                get_task_request = GetTaskRequest(id=str(uuid4()), params=get_task_params)
-
-                get_task_response = await a2a_client.get_task(request=get_task_request)
-
-                if hasattr(get_task_response, 'root') and hasattr(get_task_response.root, 'result') and isinstance(get_task_response.root.result, Task):
-                    current_task = get_task_response.root.result
-                    logger.info(f"Agent {agent_url} - Tâche {task_id} - Essai {attempt + 1} - Statut: {current_task.status.state}")
-                    
-                    # --- CORRECTION DE LA CONDITION DE SORTIE DE BOUCLE ---
-                    # On ne vérifie que les états réellement « en cours ».
-                    # Certains serveurs A2A renvoient l'état ``pending`` avant
-                    # ``submitted``. On l'ajoute donc à la liste des états à
-                    # surveiller pour éviter de sortir trop tôt de la boucle
-                    # d'attente.
-                    active_states = [
-                        TaskState.submitted,
-                        TaskState.working,
-                        getattr(TaskState, "pending", None),
-                    ]
-                    if current_task.status.state not in [s for s in active_states if s]:
-                        final_task_result = current_task
-                        break
-                else:
-                    error_content_get = get_task_response.model_dump_json(indent=2) if hasattr(get_task_response, 'model_dump_json') else str(get_task_response)
-                    logger.warning(f"Réponse inattendue de get_task pour l'agent {agent_url} (essai {attempt + 1}): {error_content_get}")
+            # La tâche a peut-être été créée malgré l'erreur (délai HTTP) : on la suit
+            # plutôt que de renvoyer le message et de dupliquer le travail.
+            existing_task = await _get_remote_task(a2a_client, task_id)
+            if existing_task is not None:
+                # L'agent répond : un délai HTTP sur une tâche longue n'est pas une panne.
+                breaker.record_success()
+                context_id_for_task = existing_task.contextId
+                logger.info(f"Tâche {task_id} déjà créée sur l'agent {agent_url} : passage au sondage.")
+                break
 
-            except Exception as e:
-                logger.error(f"Erreur lors de la récupération de la tâche {task_id} de l'agent {agent_url} (essai {attempt + 1}): {e}", exc_info=True)
-        
-        if final_task_result:
-            logger.info(f"Résultat final obtenu pour la tâche {task_id} de l'agent {agent_url}: Statut={final_task_result.status.state}")
-        else:
-            logger.error(f"La tâche {task_id} de l'agent {agent_url} n'a pas atteint un état final après {max_retries} tentatives.")
-
-        return final_task_result
+            breaker.record_failure(send_error)
+            if not breaker.allow_request():
+                logger.error(f"Disjoncteur ouvert pour l'agent {agent_url} : abandon de l'envoi de la tâche {task_id}.")
+                return None
+
+            # Si on arrive ici : on va retry si pas au dernier tour
+            if attempt < max_retries - 1:
+                delay = 2 ** attempt
+                remaining = _remaining_seconds(deadline_ts)
+                if remaining is not None:
+                    delay = max(0.0, min(delay, remaining))
+                logger.warning(
+                    f"A2A call failed on attempt {attempt + 1}, retrying in {delay} seconds..."
+                )
+                await asyncio.sleep(delay)
+            else:
+                logger.error(f"A2A call failed after {max_retries} attempts.")
+                return None
+    except asyncio.CancelledError:
+        raise
+    except Exception as fatal_e:
+        logger.error(f"Erreur fatale dans le retry loop: {fatal_e}", exc_info=True)
+        return None
+
+
+    if not context_id_for_task:
+        logger.error(f"Aucun task_id ou context_id valide retourné par send_message pour l'agent {agent_url}.")
+        return None
+
+    return await _poll_task(
+        a2a_client, agent_url, task_id, context_id_for_task, max_retries, retry_delay, deadline_ts, breaker
+    )
+
+
+async def _poll_task(
+    a2a_client: A2AClient,
+    agent_url: str,
+    task_id: str,
+    context_id_for_task: Optional[str],
+    max_retries: int,
+    retry_delay: int,
+    deadline_ts: Optional[float],
+    breaker: CircuitBreaker,
+) -> Optional[Task]:
+    """
+    Sonde la tâche jusqu'à un état final : jusqu'à l'échéance si `deadline_ts` est
+    donnée, sinon pendant `max_retries` tentatives. Si le sondage s'arrête sans état
+    final, la tâche est annulée sur l'agent pour ne pas y tourner sans suivi.
+    """
+    logger.info(f"Sondage de la tâche {task_id} (contexte {context_id_for_task}) pour l'agent {agent_url}...")
+    final_task_result: Optional[Task] = None
+    attempt = -1
+    while deadline_ts is not None or attempt < max_retries - 1:
+        attempt += 1
+        try:
+            remaining = _remaining_seconds(deadline_ts)
+            if remaining is not None and remaining <= 0:
+                logger.error(f"Échéance dépassée pour la tâche {task_id} de l'agent {agent_url} : annulation.")
+                cancelled = await _cancel_remote_task(a2a_client, task_id, agent_url)
+                final_task_result = cancelled or _canceled_task(task_id, context_id_for_task)
+                break
+            await asyncio.sleep(retry_delay if remaining is None else min(retry_delay, remaining))
+            # Les TaskQueryParams de la librairie A2A ne gèrent pas
+            # directement le context_id. Certains serveurs A2A n'en ont
+            # pas besoin car l'identifiant de tâche est global. On retire
+            # donc ce paramètre pour éviter qu'il soit ignoré et on
+            # l'utilise uniquement pour le logging.
+            get_task_params = TaskQueryParams(id=task_id)
+            get_task_request = GetTaskRequest(id=str(uuid4()), params=get_task_params)
+
+            get_task_response = await a2a_client.get_task(request=get_task_request)
+
+            if hasattr(get_task_response, 'root') and hasattr(get_task_response.root, 'result') and isinstance(get_task_response.root.result, Task):
+                current_task = get_task_response.root.result
+                breaker.record_success()
+                logger.info(f"Agent {agent_url} - Tâche {task_id} - Essai {attempt + 1} - Statut: {current_task.status.state}")
+                
+                # --- CORRECTION DE LA CONDITION DE SORTIE DE BOUCLE ---
+                # On ne vérifie que les états réellement « en cours ».
+                # Certains serveurs A2A renvoient l'état ``pending`` avant
+                # ``submitted``. On l'ajoute donc à la liste des états à
+                # surveiller pour éviter de sortir trop tôt de la boucle
+                # d'attente.
+                active_states = [
+                    TaskState.submitted,
+                    TaskState.working,
+                    getattr(TaskState, "pending", None),
+                ]
+                if current_task.status.state not in [s for s in active_states if s]:
+                    final_task_result = current_task
+                    break
+            else:
+                error_content_get = get_task_response.model_dump_json(indent=2) if hasattr(get_task_response, 'model_dump_json') else str(get_task_response)
+                logger.warning(f"Réponse inattendue de get_task pour l'agent {agent_url} (essai {attempt + 1}): {error_content_get}")
+
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Erreur lors de la récupération de la tâche {task_id} de l'agent {agent_url} (essai {attempt + 1}): {e}", exc_info=True)
+            breaker.record_failure(str(e) or type(e).__name__)
+            if breaker.state == CircuitState.OPEN:
+                logger.error(f"Disjoncteur ouvert pour l'agent {agent_url} : abandon du sondage de la tâche {task_id}.")
+                break
+    
+    if final_task_result:
+        logger.info(f"Résultat final obtenu pour la tâche {task_id} de l'agent {agent_url}: Statut={final_task_result.status.state}")
+    else:
+        logger.error(
+            f"La tâche {task_id} de l'agent {agent_url} n'a pas atteint un état final après {attempt + 1} tentative(s) : annulation."
+        )
+        await _cancel_remote_task(a2a_client, task_id, agent_url)
+
+    return final_task_result
+
+
+async def _get_remote_task(a2a_client: A2AClient, task_id: str) -> Optional[Task]:
+    try:
+        response = await a2a_client.get_task(
+            request=GetTaskRequest(id=str(uuid4()), params=TaskQueryParams(id=task_id)),
+            http_kwargs={"timeout": CANCEL_REQUEST_TIMEOUT_SECONDS},
+        )
+    except Exception:
+        return None
+    result = getattr(getattr(response, 'root', None), 'result', None)
+    return result if isinstance(result, Task) else None
+
+
+async def await_a2a_task(
+    agent_url: str,
+    task_id: str,
+    context_id: Optional[str] = None,
+    max_retries: int = 30,
+    retry_delay: int = 5,
+    deadline_ts: Optional[float] = None,
+) -> Optional[Task]:
+    """
+    Reprend le suivi d'une tâche A2A déjà envoyée (par exemple après un redémarrage
+    du superviseur) sans renvoyer le message : sondage jusqu'à l'état final, avec
+    la même gestion d'échéance que `call_a2a_agent`.
+    """
+    breaker = get_circuit_breaker(agent_url)
+    if not breaker.allow_request():
+        logger.warning(f"Disjoncteur ouvert pour l'agent {agent_url} : reprise de la tâche {task_id} refusée.")
+        return None
+    async with httpx.AsyncClient(auth=GoogleIDTokenAuth(), timeout=30.0, http2=False) as http_client:
+        try:
+            a2a_client = await A2AClient.get_client_from_agent_card_url(
+                httpx_client=http_client,
+                base_url=agent_url
+            )
+        except Exception as e:
+            logger.error(f"Impossible de se connecter à l'agent {agent_url} pour reprendre la tâche {task_id}: {e}")
+            breaker.record_failure(str(e))
+            return None
+        if await _get_remote_task(a2a_client, task_id) is None:
+            logger.warning(f"Tâche {task_id} inconnue de l'agent {agent_url} : reprise impossible.")
+            return None
+        try:
+            return await _poll_task(
+                a2a_client, agent_url, task_id, context_id, max_retries, retry_delay, deadline_ts, breaker
+            )
+        except asyncio.CancelledError:
+            await asyncio.shield(_cancel_remote_task(a2a_client, task_id, agent_url))
+            raise
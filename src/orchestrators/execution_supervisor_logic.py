@@ -6,6 +6,7 @@ import time
 import os
 import httpx
 import json
+from contextlib import contextmanager
 
 from src.shared.execution_task_graph_management import (
     ExecutionTaskGraph,
@@ -13,8 +14,23 @@ from src.shared.execution_task_graph_management import (
     ExecutionTaskState,
     ExecutionTaskType,
 )
+from src.shared.execution_scheduler import CriticalPathScheduler
+from src.shared.graph_analysis import DagValidationError, validate_dependencies
+from src.shared.retry_policy import (
+    SUPERVISOR_ERROR,
+    FailureClass,
+    RetryPolicy,
+    classify_failure,
+    is_failure_code,
+)
+from src.shared.decomposition_cache import DecompositionCache
 from src.shared.service_discovery import get_gra_base_url
-from src.clients.a2a_api_client import call_a2a_agent
+from src.clients.a2a_api_client import (
+    A2A_FAILURE_CODE_METADATA_KEY,
+    await_a2a_task,
+    call_a2a_agent,
+)
+from src.shared.circuit_breaker import get_circuit_breaker_registry
 from a2a.types import Artifact as A2ATypeArtifact
 
 from src.agents.testing_agent.logic import AGENT_SKILL_SOFTWARE_TESTING
@@ -26,6 +42,15 @@ from src.shared.agent_state import AgentOperationalState
 from src.shared.stats_utils import update_agent_stats
 
 GLOBAL_PLAN_COLLECTION = "global_plans"
+CAPACITY_WAIT_SECONDS = float(os.environ.get("CAPACITY_WAIT_SECONDS", "25"))
+EXECUTION_TASK_DEADLINE_SECONDS = float(
+    os.environ.get("EXECUTION_TASK_DEADLINE_SECONDS", "900")
+)
+SKILL_CATALOG_TTL_SECONDS = float(os.environ.get("SKILL_CATALOG_TTL_SECONDS", "60"))
+# Budget de cycles d'un plan, compté à travers les reprises (numéro de cycle checkpointé).
+EXECUTION_MAX_CYCLES = int(os.environ.get("EXECUTION_MAX_CYCLES", "10"))
+# Copie du catalogue de compétences du GRA partagée par les superviseurs du processus.
+_skill_catalog_cache: Dict[str, Any] = {}
 logger = logging.getLogger(__name__)
 
 
@@ -36,6 +61,7 @@ class ExecutionSupervisorLogic:
         team1_plan_final_text: str,
         execution_plan_id: Optional[str] = None,
         plan_environment_id: Optional[str] = None,
+        user_id: Optional[str] = None,
     ):
         """Initialise le superviseur d'exécution.
 
@@ -47,8 +73,11 @@ class ExecutionSupervisorLogic:
             Texte final du plan validé par TEAM 1.
         execution_plan_id : Optional[str]
             ID à réutiliser pour reprendre un plan existant.
+        user_id : Optional[str]
+            Utilisateur propriétaire du plan (partage équitable de la capacité).
         """
         self.global_plan_id = global_plan_id
+        self.user_id = user_id
         self.team1_plan_final_text = team1_plan_final_text
         self._local_to_global_id_map_for_plan: Dict[str, str] = {}
 
@@ -73,6 +102,22 @@ class ExecutionSupervisorLogic:
         self.environment_manager = EnvironmentManager()
         self.plan_environment_id = plan_environment_id
 
+        self.scheduler = CriticalPathScheduler()
+        self.retry_policy = RetryPolicy()
+        self.decomposition_cache = DecompositionCache()
+        self._decomposition_cache_key: Optional[str] = None
+        self.max_parallel_tasks = max(
+            1, int(os.environ.get("EXECUTION_MAX_PARALLEL_TASKS", "4"))
+        )
+        # Appels d'agents en cours (par tâche), interrompus par cancel().
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self._cancel_requested = False
+        # Appels A2A envoyés et non terminés, rangés dans le checkpoint pour reprise.
+        self._pending_dispatches: Dict[str, Dict[str, Any]] = {}
+        self._cycle_count = 0
+        # Dernier contenu écrit du checkpoint (hors numéro de cycle), pour n'écrire qu'en cas de changement.
+        self._checkpoint_state: Optional[Dict[str, Any]] = None
+
         # --- Operational status tracking ---
         self.operational_state: AgentOperationalState = AgentOperationalState.IDLE
         self.status_detail: str | None = None
@@ -154,6 +199,143 @@ class ExecutionSupervisorLogic:
             AgentOperationalState.IDLE, "Décomposition initiale prête"
         )
 
+    def _checkpoint_content(self) -> Dict[str, Any]:
+        return {
+            "cycle": self._cycle_count,
+            "local_to_global_id_map": dict(self._local_to_global_id_map_for_plan),
+            "pending_dispatches": {
+                task_id: dict(dispatch)
+                for task_id, dispatch in self._pending_dispatches.items()
+            },
+        }
+
+    def _save_checkpoint(self):
+        """
+        Range dans l'en-tête du graphe ce qu'il faut à un nouveau superviseur pour reprendre
+        le plan. N'écrit que si le cycle, la table des ID ou les dispatchs en cours ont changé.
+        """
+        state = self._checkpoint_content()
+        if state == self._checkpoint_state:
+            return
+        self.task_graph.save_supervisor_checkpoint(state)
+        self._checkpoint_state = state
+
+    @contextmanager
+    def _supervisor_state_rollback(self):
+        """
+        Remet la table des ID locaux et l'état du dernier checkpoint écrit à leur valeur
+        d'entrée si le bloc échoue : un lot de tâches rejeté, ou une unité de travail du
+        graphe abandonnée avec ses écritures, ne doit pas y laisser de trace.
+        """
+        id_map = dict(self._local_to_global_id_map_for_plan)
+        checkpoint_state = self._checkpoint_state
+        try:
+            yield
+        except BaseException:
+            self._local_to_global_id_map_for_plan.clear()
+            self._local_to_global_id_map_for_plan.update(id_map)
+            self._checkpoint_state = checkpoint_state
+            raise
+
+    def _forget_dispatch(self, task_id: str):
+        """Retire du checkpoint l'appel d'agent d'une tâche (terminé ou en erreur)."""
+        if self._pending_dispatches.pop(task_id, None) is not None:
+            self._save_checkpoint()
+
+    def _restore_checkpoint(self) -> Dict[str, Any]:
+        checkpoint = self.task_graph.load_supervisor_checkpoint()
+        id_map = checkpoint.get("local_to_global_id_map")
+        if not id_map:
+            # Plans antérieurs aux checkpoints : table reconstruite depuis les métadonnées des noeuds.
+            id_map = {
+                node_data["meta"]["local_id_from_agent"]: node_id
+                for node_id, node_data in self.task_graph.as_dict().get("nodes", {}).items()
+                if (node_data.get("meta") or {}).get("local_id_from_agent")
+            }
+        self._local_to_global_id_map_for_plan.clear()
+        self._local_to_global_id_map_for_plan.update(id_map)
+        self._cycle_count = int(checkpoint.get("cycle", 0))
+        self._pending_dispatches = dict(checkpoint.get("pending_dispatches") or {})
+        self._checkpoint_state = self._checkpoint_content()
+        self.logger.info(
+            f"[{self.execution_plan_id}] Checkpoint restauré: {len(id_map)} ID(s) locaux, cycle {self._cycle_count}, "
+            f"{len(self._pending_dispatches)} dispatch(s) en cours."
+        )
+        return checkpoint
+
+    async def _resume_pending_dispatches(self):
+        """
+        Reprend les appels d'agents en cours au moment du checkpoint : les tâches A2A
+        sont suivies jusqu'à leur fin sans être renvoyées. Les tâches assignées sans
+        appel enregistré sont remises à READY.
+        """
+        nodes = self.task_graph.as_dict().get("nodes", {})
+        in_progress_states = {
+            ExecutionTaskState.ASSIGNED.value,
+            ExecutionTaskState.WORKING.value,
+        }
+        for task_id, node_data in nodes.items():
+            if node_data.get("state") not in in_progress_states:
+                self._pending_dispatches.pop(task_id, None)
+            elif task_id not in self._pending_dispatches:
+                self.task_graph.update_task_state(
+                    task_id,
+                    ExecutionTaskState.READY,
+                    "Reprise: dispatch interrompu avant l'appel de l'agent.",
+                )
+        self._save_checkpoint()
+        if not self._pending_dispatches:
+            return
+
+        for task_id, dispatch in list(self._pending_dispatches.items()):
+            self._in_flight[task_id] = asyncio.create_task(
+                self._resume_dispatch(task_id, dispatch)
+            )
+        results = await asyncio.gather(*self._in_flight.values(), return_exceptions=True)
+        for task_id, result in zip(list(self._in_flight), results):
+            if isinstance(result, Exception):
+                self.logger.error(
+                    f"[{self.execution_plan_id}] Reprise de {task_id} en erreur: {result}"
+                )
+                self.task_graph.update_task_state(
+                    task_id,
+                    ExecutionTaskState.FAILED,
+                    f"Erreur interne du superviseur: {result}",
+                    error_code=SUPERVISOR_ERROR,
+                )
+            if not self._cancel_requested:
+                self._apply_retry_policy(task_id)
+        self._in_flight.clear()
+
+    async def _resume_dispatch(self, task_id: str, dispatch: Dict[str, Any]):
+        task_node = self.task_graph.get_task(task_id)
+        if not task_node:
+            self._forget_dispatch(task_id)
+            return
+        self.logger.info(
+            f"[{self.execution_plan_id}] Reprise du suivi de {task_id} (tâche A2A {dispatch['a2a_task_id']} sur {dispatch['agent_url']})."
+        )
+        try:
+            # La tâche reprise occupe toujours un créneau de l'agent : elle repasse par l'ordonnanceur de capacité.
+            lease_id = await self._acquire_capacity_slot(
+                dispatch.get("skill") or task_node.assigned_agent_type, task_id
+            )
+            try:
+                a2a_task_result = await await_a2a_task(
+                    dispatch["agent_url"],
+                    dispatch["a2a_task_id"],
+                    context_id=self.execution_plan_id,
+                    deadline_ts=dispatch.get("deadline_ts"),
+                )
+            finally:
+                if lease_id:
+                    await self._release_capacity_slot(lease_id)
+            await self._handle_a2a_result(
+                task_node, a2a_task_result, dispatch.get("agent_name", dispatch.get("skill", ""))
+            )
+        finally:
+            self._forget_dispatch(task_id)
+
     async def _ensure_gra_url(self):
         if not self._gra_base_url:
             self._gra_base_url = await get_gra_base_url()
@@ -165,6 +347,11 @@ class ExecutionSupervisorLogic:
                 raise ConnectionError(msg)
         return self._gra_base_url
 
+    @staticmethod
+    def _is_agent_circuit_open(agent_data: Dict[str, Any]) -> bool:
+        agent_url = agent_data.get("internal_url")
+        return bool(agent_url) and get_circuit_breaker_registry().is_open(agent_url)
+
     async def _get_agent_details_from_gra(self, skill: str) -> Optional[Dict[str, str]]:
         gra_url = await self._ensure_gra_url()
         agent_details = None
@@ -179,9 +366,16 @@ class ExecutionSupervisorLogic:
                 response.raise_for_status()
                 data = response.json()
 
-                agent_data = (
-                    data[0] if isinstance(data, list) and len(data) > 0 else None
+                candidates = data if isinstance(data, list) else []
+                # Les agents dont le disjoncteur est ouvert sont écartés tant qu'un autre est disponible.
+                agent_data = next(
+                    (a for a in candidates if not self._is_agent_circuit_open(a)), None
                 )
+                if agent_data is None and candidates:
+                    self.logger.warning(
+                        f"[{self.execution_plan_id}] Tous les agents pour '{skill}' ont un disjoncteur ouvert."
+                    )
+                    return None
 
                 if not agent_data:
                     self.logger.warning(
@@ -218,6 +412,54 @@ class ExecutionSupervisorLogic:
 
         return agent_details
 
+    async def _acquire_capacity_slot(self, skill: str, task_id: str) -> Optional[str]:
+        """
+        Demande un créneau d'agent à l'ordonnanceur de capacité du GRA (file équitable
+        entre plans). Retourne l'identifiant du lease, ou None si l'ordonnanceur est
+        injoignable : l'agent est alors appelé directement.
+        """
+        gra_url = await self._ensure_gra_url()
+        payload = {
+            "skill": skill,
+            "plan_id": self.global_plan_id,
+            "user_id": self.user_id,
+            "task_id": task_id,
+            "wait_seconds": CAPACITY_WAIT_SECONDS,
+        }
+        async with httpx.AsyncClient() as client:
+            while True:
+                try:
+                    response = await client.post(
+                        f"{gra_url}/v1/capacity/acquire",
+                        json=payload,
+                        timeout=CAPACITY_WAIT_SECONDS + 10.0,
+                    )
+                    response.raise_for_status()
+                    data = response.json()
+                except (httpx.HTTPError, ValueError) as e:
+                    self.logger.warning(
+                        f"[{self.execution_plan_id}] Ordonnanceur de capacité indisponible ({e}). Appel direct de l'agent pour {task_id}."
+                    )
+                    return None
+                if data.get("granted"):
+                    return data["lease"]["lease_id"]
+                self.logger.info(
+                    f"[{self.execution_plan_id}] Tâche {task_id} en attente d'un créneau '{skill}' (file: {data.get('queue_depth')})."
+                )
+
+    async def _release_capacity_slot(self, lease_id: str):
+        gra_url = await self._ensure_gra_url()
+        try:
+            async with httpx.AsyncClient() as client:
+                response = await client.post(
+                    f"{gra_url}/v1/capacity/leases/{lease_id}/release", timeout=10.0
+                )
+                response.raise_for_status()
+        except httpx.HTTPError as e:
+            self.logger.warning(
+                f"[{self.execution_plan_id}] Libération du lease {lease_id} impossible: {e}"
+            )
+
     async def _store_a2a_artifact_in_gra(
         self,
         a2a_artifact_to_store: A2ATypeArtifact,
@@ -444,7 +686,14 @@ class ExecutionSupervisorLogic:
         self.logger.info(
             f"[{self.execution_plan_id}] Début du cycle de traitement d'exécution."
         )
+        if self._cancel_requested:
+            self.logger.info(
+                f"[{self.execution_plan_id}] Plan annulé, aucun nouveau dispatch."
+            )
+            return
         await self._update_status(AgentOperationalState.WORKING, "Cycle d'exécution")
+        self._cycle_count += 1
+        self._save_checkpoint()
         current_graph_snapshot_before_ready = self.task_graph.as_dict()
         ready_tasks_nodes = self.task_graph.get_ready_tasks()
 
@@ -460,6 +709,7 @@ class ExecutionSupervisorLogic:
                 or overall_status.startswith("FAILED")
                 or overall_status.startswith("TIMEOUT")
                 or overall_status == "PLAN_DECOMPOSED_EMPTY"
+                or overall_status == "CANCELLED"
             ):
                 self.logger.info(
                     f"[{self.execution_plan_id}] Plan d'exécution déjà dans un état terminal ou sans tâches enfants: {overall_status}"
@@ -483,6 +733,7 @@ class ExecutionSupervisorLogic:
                     if state not in [
                         ExecutionTaskState.COMPLETED,
                         ExecutionTaskState.FAILED,
+                        ExecutionTaskState.BLOCKED,
                         ExecutionTaskState.CANCELLED,
                     ]:
                         non_terminal_tasks_count += 1
@@ -501,139 +752,335 @@ class ExecutionSupervisorLogic:
                     self.task_graph.set_overall_status(final_status)
             return
 
-        for task_node_from_ready in ready_tasks_nodes:
-            task_node = self.task_graph.get_task(task_node_from_ready.id)
-            if not task_node:
-                self.logger.warning(
-                    f"[{self.execution_plan_id}] Tâche {task_node_from_ready.id} retournée par get_ready_tasks mais non trouvée ensuite. Skipping."
-                )
-                continue
+        await self._dispatch_ready_tasks(ready_tasks_nodes)
 
-            self.logger.debug(
-                f"[{self.execution_plan_id}] Tâche {task_node.id} rechargée, état actuel en DB: {task_node.state.value}"
-            )
-            if task_node.state != ExecutionTaskState.READY:
-                self.logger.info(
-                    f"[{self.execution_plan_id}] Tâche {task_node.id} récupérée avec état '{task_node.state.value}' au lieu de READY. Skipping."
-                )
-                continue
+        self.logger.info(
+            f"[{self.execution_plan_id}] Fin du cycle de traitement d'exécution."
+        )
+        await self._update_status(AgentOperationalState.IDLE, "Cycle terminé")
 
-            current_overall_status = self.task_graph.as_dict().get("overall_status")
-            if (
-                task_node.task_type == ExecutionTaskType.DECOMPOSITION
-                and current_overall_status
-                not in ["INITIALIZING", "PENDING_DECOMPOSITION"]
+    async def _dispatch_ready_tasks(self, ready_tasks_nodes: List[ExecutionTaskNode]):
+        """
+        Dispatch les tâches prêtes par priorité (chemin critique restant), avec au plus
+        max_parallel_tasks appels d'agents simultanés. Dès qu'une tâche se termine, les
+        tâches débloquées sont reclassées et dispatchées dans le même cycle.
+        """
+        queue = self.scheduler.rank(ready_tasks_nodes, self.task_graph.as_dict())
+        in_flight = self._in_flight
+        attempted_ids = set()
+
+        while queue or in_flight:
+            while (
+                queue
+                and len(in_flight) < self.max_parallel_tasks
+                and not self._cancel_requested
             ):
-                self.logger.info(
-                    f"[{self.execution_plan_id}] Tâche de décomposition {task_node.id} READY, mais statut global ('{current_overall_status}') indique traitement déjà fait. Forcing COMPLETED."
+                next_task = queue.pop(0)
+                if next_task.id in attempted_ids:
+                    continue
+                attempted_ids.add(next_task.id)
+                in_flight[next_task.id] = asyncio.create_task(
+                    self._dispatch_ready_task(next_task)
                 )
-                self.task_graph.update_task_state(
-                    task_node.id,
-                    ExecutionTaskState.COMPLETED,
-                    "Forçage COMPLETED (décomposition déjà faite).",
-                )
-                continue
+            if not in_flight:
+                break
 
+            done, _ = await asyncio.wait(
+                in_flight.values(), return_when=asyncio.FIRST_COMPLETED
+            )
+            for task_id, running in list(in_flight.items()):
+                if running not in done:
+                    continue
+                del in_flight[task_id]
+                if running.cancelled():
+                    continue
+                error = running.exception()
+                if error:
+                    self.logger.error(
+                        f"[{self.execution_plan_id}] Erreur inattendue lors du dispatch de {task_id}: {error}",
+                        exc_info=error,
+                    )
+                    self.task_graph.update_task_state(
+                        task_id,
+                        ExecutionTaskState.FAILED,
+                        f"Erreur interne du superviseur: {error}",
+                        error_code=SUPERVISOR_ERROR,
+                    )
+                if not self._cancel_requested:
+                    self._apply_retry_policy(task_id)
+
+            # Les tâches remises à READY (ex. agent indisponible) attendent le cycle suivant.
+            newly_ready = [
+                task for task in self.task_graph.get_ready_tasks()
+                if task.id not in attempted_ids
+            ]
+            candidates = {
+                task.id: task
+                for task in queue + newly_ready
+                if task.id not in attempted_ids
+            }
+            queue = self.scheduler.rank(
+                list(candidates.values()), self.task_graph.as_dict()
+            )
+
+    def _apply_retry_policy(self, task_id: str):
+        """
+        Classe l'échec d'une tâche FAILED : relance différée (backoff) si la classe
+        est transitoire et le budget non épuisé, sinon blocage immédiat des dépendants.
+        """
+        task_node = self.task_graph.get_task(task_id)
+        if not task_node or task_node.state != ExecutionTaskState.FAILED:
+            return
+        failure_class = classify_failure(
+            task_node.meta.get("last_error"), task_node.meta.get("error_code")
+        )
+        decision = self.retry_policy.decide(
+            failure_class, int(task_node.meta.get("retry_attempts", 0))
+        )
+        if decision.retry:
+            self.logger.warning(
+                f"[{self.execution_plan_id}] Échec {failure_class.value} de {task_id} : relance automatique n°{decision.attempt} dans {decision.delay_seconds:.1f}s."
+            )
+            self.task_graph.schedule_retry(
+                task_id,
+                failure_class.value,
+                decision.attempt,
+                decision.delay_seconds,
+                f"Relance automatique n°{decision.attempt} ({failure_class.value}).",
+            )
+            return
+
+        with self.task_graph.unit_of_work():
+            task_node.meta["failure_class"] = failure_class.value
+            self.task_graph.add_task(task_node)
+            blocked_ids = self.task_graph.block_dependents(task_id)
+        self.logger.error(
+            f"[{self.execution_plan_id}] Échec définitif de {task_id} ({failure_class.value}, {decision.attempt} relance(s)). Dépendants bloqués: {blocked_ids}"
+        )
+
+    async def _dispatch_ready_task(self, task_node_from_ready: ExecutionTaskNode):
+        task_node = self.task_graph.get_task(task_node_from_ready.id)
+        if not task_node:
+            self.logger.warning(
+                f"[{self.execution_plan_id}] Tâche {task_node_from_ready.id} retournée par get_ready_tasks mais non trouvée ensuite. Skipping."
+            )
+            return
+
+        self.logger.debug(
+            f"[{self.execution_plan_id}] Tâche {task_node.id} rechargée, état actuel en DB: {task_node.state.value}"
+        )
+        if task_node.state != ExecutionTaskState.READY:
+            self.logger.info(
+                f"[{self.execution_plan_id}] Tâche {task_node.id} récupérée avec état '{task_node.state.value}' au lieu de READY. Skipping."
+            )
+            return
+
+        current_overall_status = self.task_graph.as_dict().get("overall_status")
+        if (
+            task_node.task_type == ExecutionTaskType.DECOMPOSITION
+            and current_overall_status
+            not in ["INITIALIZING", "PENDING_DECOMPOSITION"]
+        ):
             self.logger.info(
-                f"[{self.execution_plan_id}] Prise en charge tâche prête: {task_node.id} ('{task_node.objective}'), Type: {task_node.task_type.value}, État: {task_node.state.value}"
+                f"[{self.execution_plan_id}] Tâche de décomposition {task_node.id} READY, mais statut global ('{current_overall_status}') indique traitement déjà fait. Forcing COMPLETED."
             )
             self.task_graph.update_task_state(
-                task_node.id, ExecutionTaskState.ASSIGNED, "Assignation en cours..."
+                task_node.id,
+                ExecutionTaskState.COMPLETED,
+                "Forçage COMPLETED (décomposition déjà faite).",
             )
+            return
 
-            agent_skill_needed = task_node.assigned_agent_type
-            if not agent_skill_needed:
-                self.logger.error(
-                    f"[{self.execution_plan_id}] Tâche {task_node.id} sans assigned_agent_type. Passage FAILED."
-                )
-                self.task_graph.update_task_state(
-                    task_node.id,
-                    ExecutionTaskState.FAILED,
-                    "Type d'agent requis non spécifié.",
-                )
-                continue
+        self.logger.info(
+            f"[{self.execution_plan_id}] Prise en charge tâche prête: {task_node.id} ('{task_node.objective}'), Type: {task_node.task_type.value}, État: {task_node.state.value}"
+        )
 
-            agent_details = await self._get_agent_details_from_gra(agent_skill_needed)
-            if not agent_details or not agent_details.get("url"):
-                self.logger.error(
-                    f"[{self.execution_plan_id}] Aucun agent pour '{agent_skill_needed}' (tâche {task_node.id}). Remise à READY."
-                )
-                self.task_graph.update_task_state(
-                    task_node.id,
-                    ExecutionTaskState.READY,
-                    f"Agent pour '{agent_skill_needed}' non trouvé, en attente.",
-                )
-                continue
+        available_execution_skills: List[str] = []
+        if task_node.task_type == ExecutionTaskType.DECOMPOSITION:
+            available_execution_skills = (
+                await self._get_all_available_execution_skills_from_gra()
+            )
+            self._decomposition_cache_key = self.decomposition_cache.key(
+                self.team1_plan_final_text, available_execution_skills
+            )
+            cached_tasks = self.decomposition_cache.get(self._decomposition_cache_key)
+            if cached_tasks is not None and self._apply_cached_decomposition(
+                task_node, cached_tasks
+            ):
+                return
+        self.task_graph.update_task_state(
+            task_node.id, ExecutionTaskState.ASSIGNED, "Assignation en cours..."
+        )
 
-            agent_url = agent_details["url"]
-            agent_name_from_gra = agent_details.get("name", agent_skill_needed)
+        agent_skill_needed = task_node.assigned_agent_type
+        if not agent_skill_needed:
+            self.logger.error(
+                f"[{self.execution_plan_id}] Tâche {task_node.id} sans assigned_agent_type. Passage FAILED."
+            )
+            self.task_graph.update_task_state(
+                task_node.id,
+                ExecutionTaskState.FAILED,
+                "Type d'agent requis non spécifié.",
+            )
+            return
 
+        agent_details = await self._get_agent_details_from_gra(agent_skill_needed)
+        if not agent_details or not agent_details.get("url"):
+            self.logger.error(
+                f"[{self.execution_plan_id}] Aucun agent pour '{agent_skill_needed}' (tâche {task_node.id}). Remise à READY."
+            )
             self.task_graph.update_task_state(
                 task_node.id,
-                ExecutionTaskState.WORKING,
-                f"Appel agent {agent_name_from_gra} ({agent_skill_needed}) à {agent_url}.",
+                ExecutionTaskState.READY,
+                f"Agent pour '{agent_skill_needed}' non trouvé, en attente.",
             )
+            return
 
-            input_for_agent_text = ""
-            if task_node.task_type == ExecutionTaskType.DECOMPOSITION:
-                all_registered_agents_skills = (
-                    await self._get_all_available_execution_skills_from_gra()
+        agent_url = agent_details["url"]
+        agent_name_from_gra = agent_details.get("name", agent_skill_needed)
+
+        input_for_agent_text = ""
+        if task_node.task_type == ExecutionTaskType.DECOMPOSITION:
+            input_payload_for_decomposition = {
+                "team1_plan_text": self.team1_plan_final_text,
+                "available_execution_skills": available_execution_skills,
+            }
+            input_for_agent_text = json.dumps(
+                input_payload_for_decomposition, ensure_ascii=False
+            )
+        else:
+            input_for_agent_text = await self._prepare_input_for_execution_agent(
+                task_node
+            )
+
+        # La tâche reste ASSIGNED tant qu'elle attend son tour dans la file de capacité.
+        self.task_graph.update_task_state(
+            task_node.id,
+            ExecutionTaskState.ASSIGNED,
+            f"En attente d'un créneau sur {agent_name_from_gra} ({agent_skill_needed}).",
+        )
+        lease_id = await self._acquire_capacity_slot(agent_skill_needed, task_node.id)
+        try:
+            try:
+                self.task_graph.update_task_state(
+                    task_node.id,
+                    ExecutionTaskState.WORKING,
+                    f"Appel agent {agent_name_from_gra} ({agent_skill_needed}) à {agent_url}.",
                 )
-                input_payload_for_decomposition = {
-                    "team1_plan_text": self.team1_plan_final_text,
-                    "available_execution_skills": all_registered_agents_skills,
+                dispatch_started_at = time.monotonic()
+                dispatch = {
+                    "a2a_task_id": str(uuid.uuid4()),
+                    "agent_url": agent_url,
+                    "agent_name": agent_name_from_gra,
+                    "skill": agent_skill_needed,
+                    "deadline_ts": time.time() + EXECUTION_TASK_DEADLINE_SECONDS,
                 }
-                input_for_agent_text = json.dumps(
-                    input_payload_for_decomposition, ensure_ascii=False
+                self._pending_dispatches[task_node.id] = dispatch
+                self._save_checkpoint()
+                a2a_task_result = await call_a2a_agent(
+                    agent_url,
+                    input_for_agent_text,
+                    self.execution_plan_id,
+                    deadline_ts=dispatch["deadline_ts"],
+                    task_id=dispatch["a2a_task_id"],
                 )
-            else:
-                input_for_agent_text = await self._prepare_input_for_execution_agent(
-                    task_node
+            finally:
+                if lease_id:
+                    await self._release_capacity_slot(lease_id)
+            if (
+                a2a_task_result
+                and a2a_task_result.status
+                and a2a_task_result.status.state.value == "completed"
+            ):
+                self.scheduler.latency_tracker.record(
+                    agent_skill_needed, time.monotonic() - dispatch_started_at
                 )
 
-            a2a_task_result = await call_a2a_agent(
-                agent_url, input_for_agent_text, self.execution_plan_id
-            )
+            await self._handle_a2a_result(task_node, a2a_task_result, agent_name_from_gra)
+        finally:
+            self._forget_dispatch(task_node.id)
 
-            if a2a_task_result:
-                try:
-                    raw_result = (
-                        a2a_task_result.model_dump_json(indent=2)
-                        if hasattr(a2a_task_result, "model_dump_json")
-                        else str(a2a_task_result)
-                    )
-                except Exception:
-                    raw_result = str(a2a_task_result)
-                self.logger.debug(
-                    f"[{self.execution_plan_id}] Résultat brut de l'agent {agent_name_from_gra} pour la tâche {task_node.id}: {raw_result}"
+    def _apply_cached_decomposition(
+        self, task_node: ExecutionTaskNode, cached_tasks: List[Dict[str, Any]]
+    ) -> bool:
+        """
+        Reconstruit le graphe depuis une décomposition mémorisée (nouveaux ID globaux),
+        sans appel au DecompositionAgent. Retourne False si l'entrée est inutilisable.
+        Synchrone : l'unité de travail du graphe ne doit contenir aucune attente.
+        """
+        try:
+            with self._supervisor_state_rollback(), self.task_graph.unit_of_work():
+                self.task_graph.update_task_output(
+                    task_node.id, summary="Plan décomposé (cache)."
                 )
-            else:
-                self.logger.warning(
-                    f"[{self.execution_plan_id}] Aucun résultat A2A reçu de {agent_name_from_gra} pour la tâche {task_node.id}"
+                self._add_and_resolve_decomposed_tasks(cached_tasks, task_node.id)
+                self.task_graph.update_task_state(
+                    task_node.id,
+                    ExecutionTaskState.COMPLETED,
+                    "Décomposition reprise du cache, tâches enfants ajoutées.",
                 )
+                self.task_graph.set_overall_status("PLAN_DECOMPOSED")
+        except ValueError as e_graph:
+            self.logger.warning(
+                f"[{self.execution_plan_id}] Décomposition en cache inutilisable ({e_graph}). Invalidation et appel de l'agent."
+            )
+            self.decomposition_cache.invalidate(self._decomposition_cache_key)
+            return False
+        self.logger.info(
+            f"[{self.execution_plan_id}] Décomposition reprise du cache ({len(cached_tasks)} tâche(s) racine), appel LLM évité."
+        )
+        return True
 
-            if a2a_task_result and a2a_task_result.status:
-                a2a_state_val = a2a_task_result.status.state.value
-                gra_persisted_artifact_id: Optional[str] = None
-                artifact_text_content = None
-
-                if a2a_task_result.artifacts and len(a2a_task_result.artifacts) > 0:
-                    first_a2a_artifact = a2a_task_result.artifacts[0]
-                    gra_persisted_artifact_id = await self._store_a2a_artifact_in_gra(
-                        first_a2a_artifact,
-                        a2a_task_result.id,
-                        a2a_task_result.contextId,
-                        agent_name_from_gra,
-                    )
-                    if first_a2a_artifact.parts:
-                        part_cont = first_a2a_artifact.parts[0]
-                        if hasattr(part_cont, "root") and hasattr(
-                            part_cont.root, "text"
-                        ):
-                            artifact_text_content = part_cont.root.text
-                        elif hasattr(part_cont, "text"):
-                            artifact_text_content = part_cont.text
+    async def _handle_a2a_result(
+        self,
+        task_node: ExecutionTaskNode,
+        a2a_task_result: Optional[Any],
+        agent_name_from_gra: str,
+    ):
+        """Applique au graphe le résultat d'un appel A2A (artefact, décomposition, état final)."""
+        if a2a_task_result:
+            try:
+                raw_result = (
+                    a2a_task_result.model_dump_json(indent=2)
+                    if hasattr(a2a_task_result, "model_dump_json")
+                    else str(a2a_task_result)
+                )
+            except Exception:
+                raw_result = str(a2a_task_result)
+            self.logger.debug(
+                f"[{self.execution_plan_id}] Résultat brut de l'agent {agent_name_from_gra} pour la tâche {task_node.id}: {raw_result}"
+            )
+        else:
+            self.logger.warning(
+                f"[{self.execution_plan_id}] Aucun résultat A2A reçu de {agent_name_from_gra} pour la tâche {task_node.id}"
+            )
 
+        if a2a_task_result and a2a_task_result.status:
+            a2a_state_val = a2a_task_result.status.state.value
+            gra_persisted_artifact_id: Optional[str] = None
+            artifact_text_content = None
+
+            if a2a_task_result.artifacts and len(a2a_task_result.artifacts) > 0:
+                first_a2a_artifact = a2a_task_result.artifacts[0]
+                gra_persisted_artifact_id = await self._store_a2a_artifact_in_gra(
+                    first_a2a_artifact,
+                    a2a_task_result.id,
+                    a2a_task_result.contextId,
+                    agent_name_from_gra,
+                )
+                if first_a2a_artifact.parts:
+                    part_cont = first_a2a_artifact.parts[0]
+                    if hasattr(part_cont, "root") and hasattr(
+                        part_cont.root, "text"
+                    ):
+                        artifact_text_content = part_cont.root.text
+                    elif hasattr(part_cont, "text"):
+                        artifact_text_content = part_cont.text
+
+            # Toutes les mises à jour liées à la complétion sont regroupées en un
+            # seul commit du graphe (aucune attente réseau dans ce bloc), checkpoint compris.
+            with self._supervisor_state_rollback(), self.task_graph.unit_of_work():
+                self._forget_dispatch(task_node.id)
                 if a2a_state_val == "completed":
                     if task_node.task_type == ExecutionTaskType.DECOMPOSITION:
                         if artifact_text_content:
@@ -664,9 +1111,10 @@ class ExecutionSupervisorLogic:
                                             artifact_ref=gra_persisted_artifact_id,
                                             summary="Plan décomposé.",
                                         )
-                                        await self._add_and_resolve_decomposed_tasks(
-                                            tasks_to_create, task_node.id
-                                        )
+                                        with self._supervisor_state_rollback():
+                                            self._add_and_resolve_decomposed_tasks(
+                                                tasks_to_create, task_node.id
+                                            )
                                         self.task_graph.update_task_state(
                                             task_node.id,
                                             ExecutionTaskState.COMPLETED,
@@ -675,6 +1123,11 @@ class ExecutionSupervisorLogic:
                                         self.task_graph.set_overall_status(
                                             "PLAN_DECOMPOSED"
                                         )
+                                        if self._decomposition_cache_key:
+                                            self.decomposition_cache.put(
+                                                self._decomposition_cache_key,
+                                                tasks_to_create,
+                                            )
                                 else:
                                     self.task_graph.update_task_state(
                                         task_node.id,
@@ -694,6 +1147,18 @@ class ExecutionSupervisorLogic:
                                 self.task_graph.update_task_output(
                                     task_node.id, artifact_ref=gra_persisted_artifact_id
                                 )
+                            except ValueError as e_graph:
+                                self.logger.error(
+                                    f"[{self.execution_plan_id}] Décomposition rejetée pour {task_node.id}: {e_graph}"
+                                )
+                                self.task_graph.update_task_state(
+                                    task_node.id,
+                                    ExecutionTaskState.FAILED,
+                                    f"Décomposition invalide: {e_graph}",
+                                )
+                                self.task_graph.update_task_output(
+                                    task_node.id, artifact_ref=gra_persisted_artifact_id
+                                )
                         else:
                             self.task_graph.update_task_state(
                                 task_node.id,
@@ -707,7 +1172,7 @@ class ExecutionSupervisorLogic:
                             artifact_ref=gra_persisted_artifact_id,
                             summary="Exploration terminée (pré-traitement).",
                         )
-                        await self._process_completed_exploratory_task(
+                        self._process_completed_exploratory_task(
                             task_node, artifact_text_content
                         )
 
@@ -736,6 +1201,7 @@ class ExecutionSupervisorLogic:
                         )
 
                 elif a2a_state_val == "failed":
+                    failure_code = self._agent_failure_code(a2a_task_result)
                     error_summary = f"Échec tâche A2A {a2a_task_result.id} pour {task_node.id} (agent {agent_name_from_gra})."
                     if artifact_text_content:
                         error_summary += f" Détail: {artifact_text_content[:100]}"
@@ -747,10 +1213,34 @@ class ExecutionSupervisorLogic:
                     self.logger.debug(
                         f"[{self.execution_plan_id}] Marquage FAILED pour la tâche {task_node.id} suite à l'état 'failed' renvoyé par l'agent"
                     )
+                    # La politique de relance classe l'échec d'après le code publié par
+                    # l'agent ; le détail de l'état ne reprend ni les ID ni la sortie libre
+                    # de l'agent, gardés dans le résumé.
                     self.task_graph.update_task_state(
-                        task_node.id, ExecutionTaskState.FAILED, error_summary
+                        task_node.id,
+                        ExecutionTaskState.FAILED,
+                        f"Échec signalé par l'agent (code: {failure_code or 'aucun'}).",
+                        error_code=failure_code,
                     )
 
+                elif a2a_state_val == "canceled":
+                    if self._cancel_requested:
+                        self.task_graph.update_task_state(
+                            task_node.id, ExecutionTaskState.CANCELLED, "Plan annulé."
+                        )
+                    else:
+                        # Échéance atteinte côté client (tasks/cancel) : même issue que
+                        # l'échéance atteinte côté agent, publiée en 'failed' avec le code deadline.
+                        self.logger.warning(
+                            f"[{self.execution_plan_id}] Tâche {task_node.id} interrompue par l'agent {agent_name_from_gra} : échéance de {EXECUTION_TASK_DEADLINE_SECONDS:.0f}s dépassée."
+                        )
+                        self.task_graph.update_task_state(
+                            task_node.id,
+                            ExecutionTaskState.FAILED,
+                            f"Échéance dépassée ({EXECUTION_TASK_DEADLINE_SECONDS:.0f}s), tâche annulée sur l'agent.",
+                            error_code=FailureClass.DEADLINE.value,
+                        )
+
                 else:
                     unexpected_state_summary = (
                         f"État A2A inattendu: {a2a_state_val} pour {task_node.id}."
@@ -772,20 +1262,59 @@ class ExecutionSupervisorLogic:
                         ExecutionTaskState.FAILED,
                         f"État A2A inattendu: {a2a_state_val}",
                     )
-            else:
-                self.logger.debug(
-                    f"[{self.execution_plan_id}] Marquage FAILED pour la tâche {task_node.id} car aucune réponse A2A valide n'a été reçue"
-                )
+        else:
+            self.logger.debug(
+                f"[{self.execution_plan_id}] Marquage FAILED pour la tâche {task_node.id} car aucune réponse A2A valide n'a été reçue"
+            )
+            with self._supervisor_state_rollback(), self.task_graph.unit_of_work():
+                self._forget_dispatch(task_node.id)
                 self.task_graph.update_task_state(
                     task_node.id,
                     ExecutionTaskState.FAILED,
                     "Réponse agent A2A invalide/absente.",
+                    error_code=FailureClass.TRANSIENT.value,
                 )
 
-        self.logger.info(
-            f"[{self.execution_plan_id}] Fin du cycle de traitement d'exécution."
+    def _agent_failure_code(self, a2a_task_result: Any) -> Optional[str]:
+        """Code d'échec structuré publié par l'agent dans les métadonnées de son statut 'failed'."""
+        message = a2a_task_result.status.message
+        failure_code = (message.metadata or {}).get(A2A_FAILURE_CODE_METADATA_KEY) if message else None
+        if failure_code is None or is_failure_code(failure_code):
+            return failure_code
+        self.logger.warning(
+            f"[{self.execution_plan_id}] Code d'échec inconnu publié par l'agent ignoré: {failure_code!r}"
         )
-        await self._update_status(AgentOperationalState.IDLE, "Cycle terminé")
+        return None
+
+    async def cancel(self, reason: str = "Plan annulé.") -> List[str]:
+        """
+        Annule le plan : interrompt les appels d'agents en cours (tasks/cancel côté
+        agent, leases de capacité rendus), passe les tâches restantes à CANCELLED
+        et détruit l'environnement du plan.
+        """
+        self._cancel_requested = True
+        running = list(self._in_flight.values())
+        self.logger.warning(
+            f"[{self.execution_plan_id}] Annulation du plan ({len(running)} appel(s) d'agent en cours)."
+        )
+        for task in running:
+            task.cancel()
+        if running:
+            await asyncio.gather(*running, return_exceptions=True)
+
+        cancelled_ids = self.task_graph.cancel_open_tasks(reason)
+        if self.plan_environment_id:
+            try:
+                await self.environment_manager.destroy_environment(
+                    self.plan_environment_id
+                )
+            except Exception as e:
+                self.logger.error(
+                    f"[{self.execution_plan_id}] Destruction de l'environnement '{self.plan_environment_id}' impossible: {e}"
+                )
+            self.plan_environment_id = None
+        await self._update_status(AgentOperationalState.IDLE, "Plan annulé")
+        return cancelled_ids
 
     async def run_full_execution(self):
         if not self.plan_environment_id:
@@ -810,8 +1339,8 @@ class ExecutionSupervisorLogic:
 
         await self.initialize_and_decompose_plan()
 
-        max_cycles = 10
-        for i in range(max_cycles):
+        max_cycles = EXECUTION_MAX_CYCLES
+        for i in range(self._cycle_count, max_cycles):
             self.logger.info(
                 f"\n--- CYCLE D'EXÉCUTION TEAM 2 N°{i+1}/{max_cycles} pour le plan {self.execution_plan_id} ---"
             )
@@ -826,6 +1355,7 @@ class ExecutionSupervisorLogic:
                 or overall_status == "EXECUTION_COMPLETED_WITH_FAILURES"
                 or overall_status.startswith("FAILED")
                 or overall_status == "TIMEOUT_EXECUTION"
+                or overall_status == "CANCELLED"
             ):
                 self.logger.info(
                     f"[{self.execution_plan_id}] Statut global du plan d'exécution est terminal ({overall_status}). Arrêt de run_full_execution."
@@ -846,6 +1376,7 @@ class ExecutionSupervisorLogic:
                 not in [
                     ExecutionTaskState.COMPLETED,
                     ExecutionTaskState.FAILED,
+                    ExecutionTaskState.BLOCKED,
                     ExecutionTaskState.CANCELLED,
                 ]
             ]
@@ -881,7 +1412,7 @@ class ExecutionSupervisorLogic:
                 break
             await asyncio.sleep(5)
         if self.plan_environment_id:
-            self.environment_manager.destroy_environment(self.plan_environment_id)
+            await self.environment_manager.destroy_environment(self.plan_environment_id)
             self.plan_environment_id = None
             self.logger.info(
                 f"[{self.execution_plan_id}] Environment '{self.execution_plan_id}' cleaned up."
@@ -896,9 +1427,15 @@ class ExecutionSupervisorLogic:
         )
         success = final_status.startswith("EXECUTION_COMPLETED")
         update_agent_stats("ExecutionSupervisorLogic", success)
+        self.scheduler.latency_tracker.flush()
 
-    async def continue_execution(self, max_cycles: int = 5):
-        """Reprendre un plan existant pour traiter les tâches restantes."""
+    async def continue_execution(self, max_cycles: int = 5, reset_cycle_budget: bool = False):
+        """
+        Reprendre un plan existant pour traiter les tâches restantes. Les cycles sont
+        décomptés du budget du plan (EXECUTION_MAX_CYCLES), repris du checkpoint : un
+        superviseur qui redémarre en boucle finit par s'arrêter. `reset_cycle_budget`
+        rend un budget complet (relance demandée par l'utilisateur).
+        """
         if not self.plan_environment_id:
             self.plan_environment_id = (
                 await self.environment_manager.get_environment_or_fallback(
@@ -913,10 +1450,21 @@ class ExecutionSupervisorLogic:
                 return
 
         await self._update_status(AgentOperationalState.WORKING, "Reprise d'exécution")
+        self._restore_checkpoint()
+        if reset_cycle_budget:
+            self._cycle_count = 0
+        await self._resume_pending_dispatches()
 
-        for i in range(max_cycles):
+        cycle_limit = min(self._cycle_count + max_cycles, EXECUTION_MAX_CYCLES)
+        if self._cycle_count >= EXECUTION_MAX_CYCLES:
+            self.logger.warning(
+                f"[{self.execution_plan_id}] Budget de {EXECUTION_MAX_CYCLES} cycles déjà épuisé. Arrêt de la reprise."
+            )
+            if not self.task_graph.as_dict().get("overall_status", "").startswith("EXECUTION_COMPLETED"):
+                self.task_graph.set_overall_status("TIMEOUT_EXECUTION")
+        for i in range(self._cycle_count, cycle_limit):
             self.logger.info(
-                f"\n--- CYCLE DE REPRISE N°{i+1}/{max_cycles} pour le plan {self.execution_plan_id} ---"
+                f"\n--- CYCLE DE REPRISE N°{i+1}/{cycle_limit} pour le plan {self.execution_plan_id} ---"
             )
             await self.process_plan_execution()
 
@@ -928,6 +1476,7 @@ class ExecutionSupervisorLogic:
                 overall_status.startswith("EXECUTION_COMPLETED")
                 or overall_status.startswith("FAILED")
                 or overall_status == "TIMEOUT_EXECUTION"
+                or overall_status == "CANCELLED"
             ):
                 self.logger.info(
                     f"[{self.execution_plan_id}] Plan déjà terminé ({overall_status}). Arrêt de la reprise."
@@ -941,6 +1490,7 @@ class ExecutionSupervisorLogic:
                 not in [
                     ExecutionTaskState.COMPLETED,
                     ExecutionTaskState.FAILED,
+                    ExecutionTaskState.BLOCKED,
                     ExecutionTaskState.CANCELLED,
                 ]
             ]
@@ -961,15 +1511,17 @@ class ExecutionSupervisorLogic:
                 self.task_graph.set_overall_status(final_state)
                 break
 
-            if i == max_cycles - 1:
+            if i == cycle_limit - 1:
                 self.logger.warning(
                     f"[{self.execution_plan_id}] Nombre maximum de cycles de reprise atteint."
                 )
+                if cycle_limit == EXECUTION_MAX_CYCLES:
+                    self.task_graph.set_overall_status("TIMEOUT_EXECUTION")
                 break
 
             await asyncio.sleep(5)
         if self.plan_environment_id:
-            self.environment_manager.destroy_environment(self.plan_environment_id)
+            await self.environment_manager.destroy_environment(self.plan_environment_id)
             self.plan_environment_id = None
             self.logger.info(
                 f"[{self.execution_plan_id}] Environment '{self.execution_plan_id}' cleaned up after continuation."
@@ -978,6 +1530,7 @@ class ExecutionSupervisorLogic:
         final_status = self.task_graph.as_dict().get("overall_status", "UNKNOWN")
         success = final_status.startswith("EXECUTION_COMPLETED")
         update_agent_stats("ExecutionSupervisorLogic", success)
+        self.scheduler.latency_tracker.flush()
 
     async def retry_failed_tasks(self, max_cycles: int = 5):
         """Relance uniquement les tâches actuellement en échec."""
@@ -990,7 +1543,7 @@ class ExecutionSupervisorLogic:
             nid
             for nid, ndata in nodes.items()
             if ExecutionTaskState(ndata.get("state", ExecutionTaskState.PENDING))
-            == ExecutionTaskState.FAILED
+            in (ExecutionTaskState.FAILED, ExecutionTaskState.BLOCKED)
         ]
 
         if not failed_tasks:
@@ -1000,7 +1553,7 @@ class ExecutionSupervisorLogic:
         else:
             for task_id in failed_tasks:
                 self.logger.info(
-                    f"[{self.execution_plan_id}] Reset état FAILED -> PENDING pour la tâche {task_id}."
+                    f"[{self.execution_plan_id}] Reset état {nodes[task_id].get('state')} -> PENDING pour la tâche {task_id}."
                 )
                 self.task_graph.update_task_state(
                     task_id, ExecutionTaskState.PENDING, "Relance demandée."
@@ -1008,17 +1561,60 @@ class ExecutionSupervisorLogic:
 
             self.task_graph.set_overall_status("RETRYING_FAILED_TASKS")
 
-        await self.continue_execution(max_cycles=max_cycles)
+        await self.continue_execution(max_cycles=max_cycles, reset_cycle_budget=True)
         await self._update_status(AgentOperationalState.IDLE, "Relance terminée")
         final_status = self.task_graph.as_dict().get("overall_status", "UNKNOWN")
         success = final_status.startswith("EXECUTION_COMPLETED")
         update_agent_stats("ExecutionSupervisorLogic", success)
 
+    async def _fetch_skill_catalog(self) -> List[str]:
+        """
+        Compétences publiées par le catalogue du GRA. La copie locale est partagée par
+        les superviseurs du processus, réutilisée pendant SKILL_CATALOG_TTL_SECONDS puis
+        revalidée par ETag (304 : pas de retéléchargement). En cas d'erreur, la
+        dernière copie connue est utilisée.
+        """
+        cache = _skill_catalog_cache
+        if cache and time.monotonic() - cache["fetched_at"] < SKILL_CATALOG_TTL_SECONDS:
+            return cache["skills"]
+
+        gra_url = await self._ensure_gra_url()
+        headers = {"If-None-Match": cache["etag"]} if cache.get("etag") else {}
+        try:
+            async with httpx.AsyncClient() as client:
+                response = await client.get(
+                    f"{gra_url}/v1/skill_catalog", headers=headers, timeout=10.0
+                )
+            if response.status_code == 304:
+                cache["fetched_at"] = time.monotonic()
+                return cache["skills"]
+            response.raise_for_status()
+            catalog = response.json()
+        except (httpx.HTTPError, ValueError) as e:
+            if cache:
+                self.logger.warning(
+                    f"[{self.execution_plan_id}] Catalogue de compétences injoignable ({e}), copie locale v{cache.get('version')} utilisée."
+                )
+                return cache["skills"]
+            raise
+
+        cache.update(
+            {
+                "etag": response.headers.get("ETag"),
+                "version": catalog.get("version"),
+                "skills": list(catalog.get("skills") or []),
+                "fetched_at": time.monotonic(),
+            }
+        )
+        self.logger.info(
+            f"[{self.execution_plan_id}] Catalogue de compétences v{cache['version']} chargé ({len(cache['skills'])} compétences)."
+        )
+        return cache["skills"]
+
     async def _get_all_available_execution_skills_from_gra(self) -> List[str]:
         self.logger.info(
             f"[{self.execution_plan_id}] Récupération des compétences d'exécution disponibles depuis le GRA."
         )
-        gra_url = await self._ensure_gra_url()
         all_skills = set()
         execution_related_skills_keywords = [
             "coding",
@@ -1044,33 +1640,16 @@ class ExecutionSupervisorLogic:
             "execution_plan_decomposition",
         ]
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(f"{gra_url}/agents_status", timeout=10.0)
-                response.raise_for_status()
-                agents_list = response.json()
-                if isinstance(agents_list, list):
-                    for agent_info in agents_list:
-                        agent_skills = agent_info.get("skills", [])
-                        if isinstance(agent_skills, list):
-                            for skill in agent_skills:
-                                if (
-                                    isinstance(skill, str)
-                                    and skill
-                                    not in excluded_skills_for_decomposition_assignment
-                                ):
-                                    if any(
-                                        keyword in skill.lower()
-                                        for keyword in execution_related_skills_keywords
-                                    ):
-                                        all_skills.add(skill)
-                        else:
-                            self.logger.warning(
-                                f"[{self.execution_plan_id}] Champ 'skills' mal formaté pour l'agent: {agent_info.get('name', 'Inconnu')}"
-                            )
-                else:
-                    self.logger.error(
-                        f"[{self.execution_plan_id}] Réponse de /agents_status du GRA n'est pas une liste: {agents_list}"
+            for skill in await self._fetch_skill_catalog():
+                if (
+                    isinstance(skill, str)
+                    and skill not in excluded_skills_for_decomposition_assignment
+                    and any(
+                        keyword in skill.lower()
+                        for keyword in execution_related_skills_keywords
                     )
+                ):
+                    all_skills.add(skill)
             if not all_skills:
                 default_exec_skills = [
                     "coding_python",
@@ -1085,9 +1664,9 @@ class ExecutionSupervisorLogic:
                 )
                 return default_exec_skills
             self.logger.info(
-                f"[{self.execution_plan_id}] Compétences d'exécution disponibles filtrées: {list(all_skills)}"
+                f"[{self.execution_plan_id}] Compétences d'exécution disponibles filtrées: {sorted(all_skills)}"
             )
-            return list(all_skills)
+            return sorted(all_skills)
         except Exception as e:
             self.logger.error(
                 f"[{self.execution_plan_id}] Erreur récupération compétences via GRA: {e}",
@@ -1106,12 +1685,15 @@ class ExecutionSupervisorLogic:
             )
             return default_exec_skills
 
-    async def _add_and_resolve_decomposed_tasks(
+    def _add_and_resolve_decomposed_tasks(
         self,
         tasks_json_list: List[Dict],
         initial_dependency_id: str,
         existing_local_id_map: Optional[Dict[str, str]] = None,
+        parent_task_id: Optional[str] = None,
     ):
+        # Synchrone : appelée dans une unité de travail du graphe, qui ne doit pas
+        # englober d'attente (d'autres dispatches concurrents partagent l'instance).
         local_id_to_global_id_map = (
             existing_local_id_map if existing_local_id_map is not None else {}
         )
@@ -1133,10 +1715,12 @@ class ExecutionSupervisorLogic:
                 if json_sub_tasks:
                     first_pass_create_nodes_recursive(json_sub_tasks, node_obj.id)
 
-        first_pass_create_nodes_recursive(tasks_json_list, None)
+        first_pass_create_nodes_recursive(tasks_json_list, parent_task_id)
 
+        existing_task_ids = set(self.task_graph.as_dict().get("nodes", {}))
+        unresolved_local_refs: Dict[str, List[str]] = {}
         for global_id, (node_obj, task_json_original) in nodes_to_add_to_graph.items():
-            if node_obj.parent_id is None:
+            if node_obj.parent_id == parent_task_id:
                 node_obj.dependencies.append(initial_dependency_id)
 
             local_deps = task_json_original.get("dependances", [])
@@ -1149,17 +1733,50 @@ class ExecutionSupervisorLogic:
                         self.logger.warning(
                             f"[{self.execution_plan_id}] Tentative d'auto-dépendance (lot) pour {global_id}. Ignorée."
                         )
+                elif local_dep_id in existing_task_ids:
+                    node_obj.dependencies.append(local_dep_id)
                 else:
-                    self.logger.warning(
-                        f"[{self.execution_plan_id}] Dépendance locale (lot) '{local_dep_id}' pour '{task_json_original.get('id')}' non trouvée dans la map actuelle. Si elle réfère à une tâche hors de ce lot, elle doit être déjà dans le graphe avec un ID global connu."
-                    )
+                    unresolved_local_refs.setdefault(
+                        str(task_json_original.get("id", global_id)), []
+                    ).append(str(local_dep_id))
 
             node_obj.dependencies = list(set(node_obj.dependencies))
-            self.task_graph.add_task(node_obj)
             self.logger.info(
-                f"[{self.execution_plan_id}] Tâche (lot) '{node_obj.objective}' (ID: {node_obj.id}) ajoutée/résolue avec parent '{node_obj.parent_id}' et dépendances: {node_obj.dependencies}."
+                f"[{self.execution_plan_id}] Tâche (lot) '{node_obj.objective}' (ID: {node_obj.id}) résolue avec parent '{node_obj.parent_id}' et dépendances: {node_obj.dependencies}."
             )
 
+        if unresolved_local_refs:
+            raise DagValidationError(
+                f"Dépendances locales non résolues dans la décomposition: {unresolved_local_refs}",
+                unresolved=unresolved_local_refs,
+            )
+        batch_dependencies = {
+            global_id: node_obj.dependencies
+            for global_id, (node_obj, _) in nodes_to_add_to_graph.items()
+        }
+        try:
+            validate_dependencies(batch_dependencies, known_ids=existing_task_ids)
+        except DagValidationError as e_dag:
+            if e_dag.cycle:
+                global_to_local = {v: k for k, v in local_id_to_global_id_map.items()}
+                readable_cycle = [global_to_local.get(task_id, task_id) for task_id in e_dag.cycle]
+                raise DagValidationError(
+                    f"Cycle de dépendances dans la décomposition: {' -> '.join(readable_cycle)}",
+                    cycle=e_dag.cycle,
+                ) from e_dag
+            raise
+
+        self.task_graph.add_tasks(
+            [node_obj for node_obj, _ in nodes_to_add_to_graph.values()]
+        )
+        dag_metrics = self.task_graph.refresh_dag_metrics()
+        self.logger.info(
+            f"[{self.execution_plan_id}] {len(nodes_to_add_to_graph)} tâche(s) ajoutée(s) au graphe en un seul lot. "
+            f"DAG: profondeur {dag_metrics['depth']}, largeur max {dag_metrics['max_width']}, "
+            f"chemin critique {dag_metrics['critical_path_length']} tâche(s)."
+        )
+        self._save_checkpoint()
+
     def _create_node_from_json_data(
         self,
         task_data_dict: Dict[str, Any],
@@ -1214,7 +1831,7 @@ class ExecutionSupervisorLogic:
         )
         return new_node, task_data_dict
 
-    async def _process_completed_exploratory_task(
+    def _process_completed_exploratory_task(
         self,
         completed_task_node: ExecutionTaskNode,
         artifact_content_text: Optional[str],
@@ -1270,11 +1887,13 @@ class ExecutionSupervisorLogic:
                 f"[{self.execution_plan_id}] Tâche exploratoire {completed_task_node.id} a défini {len(new_sub_tasks_dicts)} nouvelle(s) sous-tâche(s)."
             )
 
-            await self._add_and_resolve_decomposed_tasks(
-                tasks_json_list=new_sub_tasks_dicts,
-                initial_dependency_id=completed_task_node.id,
-                existing_local_id_map=self._local_to_global_id_map_for_plan,
-            )
+            with self._supervisor_state_rollback():
+                self._add_and_resolve_decomposed_tasks(
+                    tasks_json_list=new_sub_tasks_dicts,
+                    initial_dependency_id=completed_task_node.id,
+                    existing_local_id_map=self._local_to_global_id_map_for_plan,
+                    parent_task_id=completed_task_node.id,
+                )
 
             self.task_graph.update_task_state(
                 completed_task_node.id,
@@ -1300,4 +1919,5 @@ class ExecutionSupervisorLogic:
                 completed_task_node.id,
                 ExecutionTaskState.FAILED,
                 f"Erreur traitement résultat exploration: {str(e)}",
+                error_code=SUPERVISOR_ERROR,
             )
@@ -36,6 +36,9 @@ if not logger.hasHandlers():
 GLOBAL_PLANS_FIRESTORE_COLLECTION = "global_plans"
 MAX_CLARIFICATION_ATTEMPTS = 3
 
+# Superviseurs TEAM 2 actifs dans ce processus, par plan global (annulation).
+_active_execution_supervisors: Dict[str, ExecutionSupervisorLogic] = {}
+
 
 class GlobalPlanState:
     INITIAL_OBJECTIVE_RECEIVED = "INITIAL_OBJECTIVE_RECEIVED"
@@ -53,6 +56,7 @@ class GlobalPlanState:
 
     FAILED_MAX_CLARIFICATION_ATTEMPTS = "FAILED_MAX_CLARIFICATION_ATTEMPTS"
     FAILED_AGENT_ERROR = "FAILED_AGENT_ERROR"
+    CANCELLED = "CANCELLED"
 
 
 class GlobalSupervisorLogic:
@@ -854,6 +858,7 @@ class GlobalSupervisorLogic:
                             global_plan_id=global_plan_id,
                             team1_plan_final_text=team1_final_plan_text,
                             plan_environment_id=self.plan_environment_id,
+                            user_id=(current_global_plan_data or {}).get("user_id"),
                         )
                         asyncio.create_task(
                             self._run_and_monitor_team2_execution(
@@ -932,9 +937,8 @@ class GlobalSupervisorLogic:
                 if artifact_content.get("validation_status") == "approved":
                     validation_tasks_completed.append(
                         {
-                            "timestamp": node_data.get("history", [{}])[-1].get(
-                                "timestamp", ""
-                            ),
+                            "timestamp": node_data.get("updated_at")
+                            or node_data.get("history", [{}])[-1].get("timestamp", ""),
                             "plan_text": artifact_content.get(
                                 "final_plan", artifact_content.get("evaluated_plan")
                             ),
@@ -978,6 +982,7 @@ class GlobalSupervisorLogic:
                 "team2_status": "RUNNING",
             },
         )
+        _active_execution_supervisors[global_plan_id] = execution_supervisor
         try:
             await execution_supervisor.run_full_execution()
 
@@ -988,11 +993,12 @@ class GlobalSupervisorLogic:
                 f"[GS] TEAM 2 pour plan global '{global_plan_id}' terminée. Statut final exécution: {final_exec_status}"
             )
 
-            new_global_state = (
-                "TEAM2_EXECUTION_COMPLETED"
-                if "COMPLETED" in final_exec_status.upper()
-                else "TEAM2_EXECUTION_FAILED"
-            )
+            if final_exec_status == "CANCELLED":
+                new_global_state = GlobalPlanState.CANCELLED
+            elif "COMPLETED" in final_exec_status.upper():
+                new_global_state = "TEAM2_EXECUTION_COMPLETED"
+            else:
+                new_global_state = "TEAM2_EXECUTION_FAILED"
             await self._save_global_plan_state(
                 global_plan_id,
                 {
@@ -1025,6 +1031,9 @@ class GlobalSupervisorLogic:
             )
             update_agent_stats("ExecutionSupervisorLogic", False)
             update_agent_stats("GlobalSupervisorLogic", False)
+        finally:
+            if _active_execution_supervisors.get(global_plan_id) is execution_supervisor:
+                _active_execution_supervisors.pop(global_plan_id, None)
 
     async def continue_team2_execution(self, global_plan_id: str) -> Dict[str, Any]:
         """Reprend l'exécution TEAM 2 pour un plan global existant."""
@@ -1065,12 +1074,18 @@ class GlobalSupervisorLogic:
             team1_plan_final_text=team1_text,
             execution_plan_id=exec_plan_id,
             plan_environment_id=self.plan_environment_id,
+            user_id=current_plan.get("user_id"),
         )
 
         await self._update_status(
             AgentOperationalState.WORKING, f"Reprise TEAM2 {global_plan_id}"
         )
-        await exec_supervisor.continue_execution()
+        _active_execution_supervisors[global_plan_id] = exec_supervisor
+        try:
+            await exec_supervisor.continue_execution()
+        finally:
+            if _active_execution_supervisors.get(global_plan_id) is exec_supervisor:
+                _active_execution_supervisors.pop(global_plan_id, None)
         await self._update_status(
             AgentOperationalState.IDLE, f"Reprise TEAM2 terminée {global_plan_id}"
         )
@@ -1141,12 +1156,18 @@ class GlobalSupervisorLogic:
             team1_plan_final_text=team1_text,
             execution_plan_id=exec_plan_id,
             plan_environment_id=self.plan_environment_id,
+            user_id=current_plan.get("user_id"),
         )
 
         await self._update_status(
             AgentOperationalState.WORKING, f"Relance TEAM2 {global_plan_id}"
         )
-        await exec_supervisor.retry_failed_tasks()
+        _active_execution_supervisors[global_plan_id] = exec_supervisor
+        try:
+            await exec_supervisor.retry_failed_tasks()
+        finally:
+            if _active_execution_supervisors.get(global_plan_id) is exec_supervisor:
+                _active_execution_supervisors.pop(global_plan_id, None)
         await self._update_status(
             AgentOperationalState.IDLE, f"Relance TEAM2 terminée {global_plan_id}"
         )
@@ -1178,6 +1199,55 @@ class GlobalSupervisorLogic:
             "current_supervisor_state": new_state,
         }
 
+    async def cancel_global_plan(self, global_plan_id: str) -> Dict[str, Any]:
+        """
+        Annule un plan global : interrompt le superviseur TEAM 2 actif (appels
+        d'agents annulés via A2A tasks/cancel), passe les tâches restantes à
+        CANCELLED et détruit l'environnement du plan.
+        """
+        current_plan = await self._load_global_plan_state(global_plan_id)
+        if not current_plan:
+            return {
+                "status": "error",
+                "message": f"Plan global '{global_plan_id}' non trouvé.",
+                "global_plan_id": global_plan_id,
+            }
+
+        cancelled_task_ids: List[str] = []
+        exec_supervisor = _active_execution_supervisors.get(global_plan_id)
+        if exec_supervisor:
+            cancelled_task_ids = await exec_supervisor.cancel()
+        elif current_plan.get("team2_execution_plan_id"):
+            exec_graph = ExecutionTaskGraph(
+                execution_plan_id=current_plan["team2_execution_plan_id"]
+            )
+            cancelled_task_ids = exec_graph.cancel_open_tasks()
+
+        if self.environment_manager:
+            try:
+                await self.environment_manager.destroy_environment(global_plan_id)
+            except Exception as e:
+                logger.warning(
+                    f"[GS] Destruction de l'environnement du plan '{global_plan_id}' impossible: {e}"
+                )
+
+        await self._save_global_plan_state(
+            global_plan_id,
+            {
+                "current_supervisor_state": GlobalPlanState.CANCELLED,
+                "team2_status": "CANCELLED",
+            },
+        )
+        logger.warning(
+            f"[GS] Plan global '{global_plan_id}' annulé ({len(cancelled_task_ids)} tâche(s) TEAM 2 annulée(s))."
+        )
+        return {
+            "status": "cancelled",
+            "message": f"{len(cancelled_task_ids)} tâche(s) annulée(s).",
+            "global_plan_id": global_plan_id,
+            "current_supervisor_state": GlobalPlanState.CANCELLED,
+        }
+
 
 async def main_test_global_supervisor():
     supervisor = GlobalSupervisorLogic()
@@ -238,9 +238,8 @@ class PlanningSupervisorLogic:
                         logger.info(f"Nb tâches reformulation complétées avec artefact: {len(completed_reformulation_tasks)}")
                         if completed_reformulation_tasks:
                             def get_completion_time(task: TaskNode):
-                                for entry in reversed(task.history):
-                                    if entry.get("to_state") == TaskState.COMPLETED.value: return entry.get("timestamp", "")
-                                return ""
+                                # Une tâche complétée n'évolue plus : updated_at est sa date de complétion.
+                                return task.updated_at or ""
                             completed_reformulation_tasks.sort(key=get_completion_time, reverse=True)
                             latest_reformulation_task = completed_reformulation_tasks[0]
                             if isinstance(latest_reformulation_task.artifact_ref, str):
@@ -270,9 +269,8 @@ class PlanningSupervisorLogic:
                         ]
                         if completed_evaluation_tasks:
                             def get_completion_time(task: TaskNode):
-                                for entry in reversed(task.history):
-                                    if entry.get("to_state") == TaskState.COMPLETED.value: return entry.get("timestamp", "")
-                                return ""
+                                # Une tâche complétée n'évolue plus : updated_at est sa date de complétion.
+                                return task.updated_at or ""
                             completed_evaluation_tasks.sort(key=get_completion_time, reverse=True)
                             latest_evaluation_task = completed_evaluation_tasks[0]
                             input_dict_for_validator = latest_evaluation_task.artifact_ref
@@ -446,6 +446,34 @@ class EnvironmentManager:
             description=f"read_file_from_environment: {file_path}"
         )
 
+    async def _drain_exec_stream(self, resp) -> tuple[io.BytesIO, io.BytesIO]:
+        """
+        Lit un flux exec Kubernetes jusqu'à sa fermeture sans bloquer la boucle
+        d'événements. Si la tâche appelante est annulée (délai dépassé, annulation
+        A2A), le websocket est fermé, ce qui interrompt la commande dans le pod.
+        """
+        stdout_buffer = io.BytesIO()
+        stderr_buffer = io.BytesIO()
+        try:
+            while resp.is_open():
+                await asyncio.to_thread(resp.update, timeout=1)
+                if resp.peek_stdout():
+                    chunk = resp.read_stdout()
+                    if chunk:
+                        stdout_buffer.write(chunk.encode('utf-8'))
+                if resp.peek_stderr():
+                    chunk = resp.read_stderr()
+                    if chunk:
+                        stderr_buffer.write(chunk.encode('utf-8'))
+        except asyncio.CancelledError:
+            logger.warning("Flux exec Kubernetes interrompu par annulation : fermeture du websocket.")
+            try:
+                resp.close()
+            except Exception as close_error:
+                logger.debug(f"Erreur à la fermeture du flux exec: {close_error}")
+            raise
+        return stdout_buffer, stderr_buffer
+
     async def execute_command_in_environment(self, environment_id: str, command: str, workdir: str = "/app") -> dict:
         pod_name = await self._get_valid_pod_name(environment_id)
         container_name = "developer-sandbox"
@@ -462,22 +490,8 @@ class EnvironmentManager:
                                         stderr=True, stdin=False, stdout=True, tty=False,
                                         _preload_content=False)
 
-            stdout_buffer = io.BytesIO()
-            stderr_buffer = io.BytesIO()
-            
-            while resp.is_open():
-                resp.update(timeout=1)
-                if resp.peek_stdout():
-                    chunk = resp.read_stdout()
-                    if chunk:
-                        stdout_buffer.write(chunk.encode('utf-8'))
-                if resp.peek_stderr():
-                    chunk = resp.read_stderr()
-                    if chunk:
-                        stderr_buffer.write(chunk.encode('utf-8'))
-                if not resp.is_open():
-                    break
-            
+            stdout_buffer, stderr_buffer = await self._drain_exec_stream(resp)
+
             stdout = stdout_buffer.getvalue().decode('utf-8', errors='ignore').strip()
             stderr = stderr_buffer.getvalue().decode('utf-8', errors='ignore').strip()
 
@@ -569,21 +583,7 @@ class EnvironmentManager:
                                         stderr=True, stdin=False, stdout=True, tty=False,
                                         _preload_content=False)
             
-            stdout_buffer = io.BytesIO()
-            stderr_buffer = io.BytesIO()
-
-            while resp.is_open():
-                resp.update(timeout=1)
-                if resp.peek_stdout():
-                    chunk = resp.read_stdout()
-                    if chunk:
-                        stdout_buffer.write(chunk.encode('utf-8'))
-                if resp.peek_stderr():
-                    chunk = resp.read_stderr()
-                    if chunk:
-                        stderr_buffer.write(chunk.encode('utf-8'))
-                if not resp.is_open():
-                    break
+            stdout_buffer, stderr_buffer = await self._drain_exec_stream(resp)
 
             stderr = stderr_buffer.getvalue().decode('utf-8', errors='ignore').strip()
             if stderr:
@@ -0,0 +1,120 @@
+"""
+Index de routage des agents vivants, fondé sur des baux renouvelés par heartbeat.
+
+Un agent obtient un bail en s'enregistrant (`/register`) puis le renouvelle
+périodiquement (`POST /agents/{name}/heartbeat`). Le GRA ne route que vers les
+agents dont le bail est valide : un balayage périodique retire les baux expirés
+de l'index, ce qui met à jour le catalogue de compétences et notifie les
+clients WebSocket. Un agent expulsé qui envoie encore un heartbeat reçoit une
+404 et se réenregistre.
+
+Variables d'environnement :
+    AGENT_LEASE_TTL_SECONDS             durée d'un bail (défaut : 45 s)
+    AGENT_HEARTBEAT_INTERVAL_SECONDS    intervalle conseillé aux agents (défaut : TTL / 3)
+    AGENT_LEASE_SWEEP_INTERVAL_SECONDS  période du balayage des baux expirés (défaut : 5 s)
+"""
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+AGENT_LEASE_TTL_SECONDS = float(os.environ.get("AGENT_LEASE_TTL_SECONDS", "45"))
+AGENT_HEARTBEAT_INTERVAL_SECONDS = float(
+    os.environ.get("AGENT_HEARTBEAT_INTERVAL_SECONDS", str(AGENT_LEASE_TTL_SECONDS / 3))
+)
+AGENT_LEASE_SWEEP_INTERVAL_SECONDS = float(os.environ.get("AGENT_LEASE_SWEEP_INTERVAL_SECONDS", "5"))
+
+
+class AgentLease:
+    def __init__(self, agent: Dict[str, Any], ttl_seconds: float, now: float):
+        self.agent = agent
+        self.ttl_seconds = ttl_seconds
+        self.registered_at = now
+        self.renewed_at = now
+        self.expires_at = now + ttl_seconds
+        self.heartbeats = 0
+
+    def renew(self, now: float) -> None:
+        self.renewed_at = now
+        self.expires_at = now + self.ttl_seconds
+        self.heartbeats += 1
+
+    def to_dict(self, now: float) -> Dict[str, Any]:
+        return {
+            "ttl_seconds": self.ttl_seconds,
+            "remaining_seconds": round(max(0.0, self.expires_at - now), 3),
+            "heartbeats": self.heartbeats,
+        }
+
+
+class AgentLeaseRegistry:
+    """Agents vivants indexés par nom, avec leurs compétences. Non thread-safe : utilisé depuis la boucle du GRA."""
+
+    def __init__(
+        self,
+        ttl_seconds: float = AGENT_LEASE_TTL_SECONDS,
+        heartbeat_interval_seconds: float = AGENT_HEARTBEAT_INTERVAL_SECONDS,
+        clock=time.monotonic,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.heartbeat_interval_seconds = heartbeat_interval_seconds
+        self._clock = clock
+        self._leases: Dict[str, AgentLease] = {}
+        self.evictions = 0
+
+    def register(self, agent: Dict[str, Any], ttl_seconds: Optional[float] = None) -> Dict[str, Any]:
+        """Enregistre (ou remplace) un agent et lui accorde un bail. Retourne les paramètres du bail."""
+        now = self._clock()
+        ttl = ttl_seconds if ttl_seconds is not None else self.ttl_seconds
+        self._leases[agent["name"]] = AgentLease(dict(agent), ttl, now)
+        return {
+            "lease_ttl_seconds": ttl,
+            "heartbeat_interval_seconds": self.heartbeat_interval_seconds,
+        }
+
+    def heartbeat(self, agent_name: str) -> bool:
+        """Renouvelle le bail. False si l'agent est inconnu ou déjà expulsé (il doit se réenregistrer)."""
+        lease = self._leases.get(agent_name)
+        now = self._clock()
+        if lease is None or lease.expires_at <= now:
+            return False
+        lease.renew(now)
+        return True
+
+    def update_agent(self, agent: Dict[str, Any]) -> None:
+        """Met à jour les infos statiques (URL, compétences) d'un agent vivant sans renouveler son bail."""
+        lease = self._leases.get(agent.get("name"))
+        if lease is not None:
+            lease.agent.update(agent)
+
+    def remove(self, agent_name: str) -> bool:
+        return self._leases.pop(agent_name, None) is not None
+
+    def evict_expired(self) -> List[str]:
+        now = self._clock()
+        expired = [name for name, lease in self._leases.items() if lease.expires_at <= now]
+        for name in expired:
+            del self._leases[name]
+            logger.warning(f"[GRA] Bail de l'agent '{name}' expiré : agent retiré de l'index de routage.")
+        self.evictions += len(expired)
+        return expired
+
+    def is_live(self, agent_name: str) -> bool:
+        lease = self._leases.get(agent_name)
+        return lease is not None and lease.expires_at > self._clock()
+
+    def live_agents(self, skill: Optional[str] = None) -> List[Dict[str, Any]]:
+        now = self._clock()
+        agents = []
+        for name, lease in sorted(self._leases.items()):
+            if lease.expires_at <= now:
+                continue
+            if skill and skill not in (lease.agent.get("skills") or []):
+                continue
+            agents.append({**lease.agent, "id": name, "lease": lease.to_dict(now)})
+        return agents
+
+    def skills_by_agent(self) -> Dict[str, List[str]]:
+        return {agent["name"]: agent.get("skills") or [] for agent in self.live_agents()}
@@ -0,0 +1,259 @@
+"""
+Partage équitable de la capacité des agents d'exécution entre plans concurrents.
+
+Chaque superviseur d'exécution demande un créneau (lease) pour une compétence
+avant d'appeler un agent, puis le rend à la fin de l'appel. Les demandes en
+attente sont servies par file équitable pondérée (WFQ) : chaque flux (plan ou
+utilisateur, selon CAPACITY_SHARE_KEY) reçoit une part de la capacité
+proportionnelle à son poids, dans la limite de son quota de créneaux simultanés.
+
+Configuration (variable d'environnement GRA_CAPACITY_CONFIG, JSON) :
+    {
+      "skills":  {"default": 2, "coding_python": 3},
+      "weights": {"default": 1, "user_vip": 3},
+      "quotas":  {"default": null, "plan_xyz": 1},
+      "lease_ttl_seconds": 1800
+    }
+"""
+import asyncio
+import itertools
+import json
+import logging
+import os
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+GRA_CAPACITY_CONFIG_ENV = "GRA_CAPACITY_CONFIG"
+CAPACITY_SHARE_KEY = os.environ.get("CAPACITY_SHARE_KEY", "plan").lower()
+DEFAULT_SKILL_CAPACITY = 2
+DEFAULT_LEASE_TTL_SECONDS = 1800
+
+
+class CapacityLease:
+    def __init__(self, skill: str, flow: str, plan_id: str, task_id: Optional[str], ttl_seconds: float):
+        self.lease_id = f"lease_{uuid.uuid4().hex[:12]}"
+        self.skill = skill
+        self.flow = flow
+        self.plan_id = plan_id
+        self.task_id = task_id
+        self.granted_at = time.monotonic()
+        self.expires_at = self.granted_at + ttl_seconds
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "lease_id": self.lease_id,
+            "skill": self.skill,
+            "flow": self.flow,
+            "plan_id": self.plan_id,
+            "task_id": self.task_id,
+            "held_seconds": round(time.monotonic() - self.granted_at, 3),
+        }
+
+
+class _Waiter:
+    def __init__(self, skill: str, flow: str, plan_id: str, task_id: Optional[str], finish_tag: float, seq: int):
+        self.skill = skill
+        self.flow = flow
+        self.plan_id = plan_id
+        self.task_id = task_id
+        self.finish_tag = finish_tag
+        self.seq = seq
+        self.enqueued_at = time.monotonic()
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+
+class _SkillState:
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.in_use = 0
+        self.virtual_time = 0.0
+        self.last_finish: Dict[str, float] = {}
+        self.waiters: List[_Waiter] = []
+        self.granted_total = 0
+        self.total_wait_seconds = 0.0
+
+
+class CapacityScheduler:
+    """Ordonnanceur de créneaux d'agents, par compétence, en file équitable pondérée."""
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        config = config if config is not None else load_capacity_config()
+        self.skill_capacity: Dict[str, int] = dict(config.get("skills", {}))
+        self.weights: Dict[str, float] = dict(config.get("weights", {}))
+        self.quotas: Dict[str, Optional[int]] = dict(config.get("quotas", {}))
+        self.lease_ttl_seconds = float(config.get("lease_ttl_seconds", DEFAULT_LEASE_TTL_SECONDS))
+        self._skills: Dict[str, _SkillState] = {}
+        self._leases: Dict[str, CapacityLease] = {}
+        self._seq = itertools.count()
+
+    @staticmethod
+    def flow_key(plan_id: str, user_id: Optional[str] = None) -> str:
+        if CAPACITY_SHARE_KEY == "user" and user_id:
+            return f"user:{user_id}"
+        return f"plan:{plan_id}"
+
+    def _skill_state(self, skill: str) -> _SkillState:
+        state = self._skills.get(skill)
+        if state is None:
+            capacity = self.skill_capacity.get(skill, self.skill_capacity.get("default", DEFAULT_SKILL_CAPACITY))
+            state = _SkillState(max(1, int(capacity)))
+            self._skills[skill] = state
+        return state
+
+    def _weight(self, flow: str) -> float:
+        flow_id = flow.split(":", 1)[-1]
+        weight = self.weights.get(flow, self.weights.get(flow_id, self.weights.get("default", 1)))
+        return max(float(weight), 0.01)
+
+    def _quota(self, flow: str) -> Optional[int]:
+        flow_id = flow.split(":", 1)[-1]
+        return self.quotas.get(flow, self.quotas.get(flow_id, self.quotas.get("default")))
+
+    def _active_leases_for_flow(self, flow: str) -> int:
+        return sum(1 for lease in self._leases.values() if lease.flow == flow)
+
+    async def acquire(
+        self,
+        skill: str,
+        plan_id: str,
+        user_id: Optional[str] = None,
+        task_id: Optional[str] = None,
+        timeout: Optional[float] = None,
+    ) -> Optional[CapacityLease]:
+        """Attend un créneau pour `skill`. Retourne None si `timeout` expire avant l'attribution."""
+        self._expire_stale_leases()
+        flow = self.flow_key(plan_id, user_id)
+        state = self._skill_state(skill)
+
+        start_tag = max(state.virtual_time, state.last_finish.get(flow, 0.0))
+        finish_tag = start_tag + 1.0 / self._weight(flow)
+        state.last_finish[flow] = finish_tag
+        waiter = _Waiter(skill, flow, plan_id, task_id, finish_tag, next(self._seq))
+        state.waiters.append(waiter)
+        self._dispatch(skill)
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(waiter.future), timeout)
+        except asyncio.TimeoutError:
+            if waiter.future.done():
+                return waiter.future.result()
+            self._withdraw(waiter)
+            return None
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                self.release(waiter.future.result().lease_id)
+            else:
+                self._withdraw(waiter)
+            raise
+
+    def _withdraw(self, waiter: _Waiter):
+        state = self._skill_state(waiter.skill)
+        if waiter in state.waiters:
+            state.waiters.remove(waiter)
+        # La place réservée dans le temps virtuel est rendue au flux.
+        if state.last_finish.get(waiter.flow) == waiter.finish_tag:
+            state.last_finish[waiter.flow] = waiter.finish_tag - 1.0 / self._weight(waiter.flow)
+        if not waiter.future.done():
+            waiter.future.cancel()
+
+    def release(self, lease_id: str) -> bool:
+        lease = self._leases.pop(lease_id, None)
+        if lease is None:
+            return False
+        state = self._skill_state(lease.skill)
+        state.in_use = max(0, state.in_use - 1)
+        # Un créneau libéré peut débloquer ce flux sur d'autres compétences (quota).
+        for skill in list(self._skills):
+            self._dispatch(skill)
+        return True
+
+    def release_plan(self, plan_id: str) -> int:
+        """Rend tous les leases d'un plan et retire ses demandes en attente (annulation du plan)."""
+        for state in self._skills.values():
+            for waiter in [w for w in state.waiters if w.plan_id == plan_id]:
+                # La demande en attente reçoit "non attribué" plutôt qu'une annulation.
+                if not waiter.future.done():
+                    waiter.future.set_result(None)
+                self._withdraw(waiter)
+        lease_ids = [lease_id for lease_id, lease in self._leases.items() if lease.plan_id == plan_id]
+        for lease_id in lease_ids:
+            self.release(lease_id)
+        if lease_ids:
+            logger.info(f"[Capacity] {len(lease_ids)} lease(s) du plan {plan_id} libéré(s).")
+        return len(lease_ids)
+
+    def _dispatch(self, skill: str):
+        state = self._skill_state(skill)
+        while state.in_use < state.capacity and state.waiters:
+            eligible = [
+                waiter for waiter in state.waiters
+                if self._quota(waiter.flow) is None
+                or self._active_leases_for_flow(waiter.flow) < int(self._quota(waiter.flow))
+            ]
+            if not eligible:
+                return
+            waiter = min(eligible, key=lambda w: (w.finish_tag, w.seq))
+            state.waiters.remove(waiter)
+            if waiter.future.done():
+                continue
+            lease = CapacityLease(skill, waiter.flow, waiter.plan_id, waiter.task_id, self.lease_ttl_seconds)
+            self._leases[lease.lease_id] = lease
+            state.in_use += 1
+            state.virtual_time = max(state.virtual_time, waiter.finish_tag - 1.0 / self._weight(waiter.flow))
+            state.granted_total += 1
+            state.total_wait_seconds += time.monotonic() - waiter.enqueued_at
+            waiter.future.set_result(lease)
+
+    def _expire_stale_leases(self):
+        now = time.monotonic()
+        expired = [lease_id for lease_id, lease in self._leases.items() if lease.expires_at <= now]
+        for lease_id in expired:
+            lease = self._leases[lease_id]
+            logger.warning(
+                f"[Capacity] Lease {lease_id} ({lease.skill}, {lease.flow}) expiré sans libération. Récupération du créneau."
+            )
+            self.release(lease_id)
+
+    def metrics(self) -> Dict[str, Any]:
+        self._expire_stale_leases()
+        skills = {}
+        for skill, state in self._skills.items():
+            queued_by_flow: Dict[str, int] = {}
+            for waiter in state.waiters:
+                queued_by_flow[waiter.flow] = queued_by_flow.get(waiter.flow, 0) + 1
+            active_by_flow: Dict[str, int] = {}
+            for lease in self._leases.values():
+                if lease.skill == skill:
+                    active_by_flow[lease.flow] = active_by_flow.get(lease.flow, 0) + 1
+            skills[skill] = {
+                "capacity": state.capacity,
+                "in_use": state.in_use,
+                "queue_depth": len(state.waiters),
+                "queued_by_flow": queued_by_flow,
+                "active_by_flow": active_by_flow,
+                "granted_total": state.granted_total,
+                "avg_wait_seconds": round(state.total_wait_seconds / state.granted_total, 3)
+                if state.granted_total else 0.0,
+            }
+        return {
+            "share_key": CAPACITY_SHARE_KEY,
+            "skills": skills,
+            "active_leases": [lease.to_dict() for lease in self._leases.values()],
+        }
+
+
+def load_capacity_config() -> Dict[str, Any]:
+    raw = os.environ.get(GRA_CAPACITY_CONFIG_ENV)
+    if not raw:
+        return {}
+    try:
+        config = json.loads(raw)
+        if not isinstance(config, dict):
+            raise ValueError("la configuration doit être un objet JSON")
+        return config
+    except ValueError as e:
+        logger.error(f"{GRA_CAPACITY_CONFIG_ENV} invalide ({e}). Configuration par défaut utilisée.")
+        return {}
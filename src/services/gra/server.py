@@ -13,8 +13,8 @@ from datetime import datetime, timezone
 import asyncio
 import uuid
 from collections import Counter
-from fastapi import FastAPI, HTTPException, Body, Path, File, UploadFile, Form, Depends
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi import FastAPI, HTTPException, Body, Path, File, UploadFile, Form, Depends, Request
+from fastapi.responses import JSONResponse, StreamingResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 import json
 from src.shared.execution_task_graph_management import ExecutionTaskGraph
@@ -29,6 +29,10 @@ from google.auth.transport.requests import Request as GoogleAuthRequest
 
 from starlette.applications import Starlette
 from src.shared.log_handler import InMemoryLogHandler
+from src.services.gra.capacity_scheduler import CapacityScheduler
+from src.services.gra.skill_catalog import SkillCatalog
+from src.services.gra.agent_registry import AgentLeaseRegistry, AGENT_LEASE_SWEEP_INTERVAL_SECONDS
+from src.shared.llm_usage import LLM_USAGE_COLLECTION, agent_usage_from_stats, usage_breakdown
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -125,7 +129,7 @@ class GlobalPlanSummaryItem(BaseModel):
     created_at: str
     updated_at: str
 
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, suppress
 class NewPlanRequest(BaseModel):
     objective: str
 
@@ -155,6 +159,20 @@ class AllAgentTasksStatsResponse(BaseModel):
     stats: List[AllAgentTaskStats]
     last_updated: str
 
+class CircuitBreakerReport(BaseModel):
+    agent_url: str
+    state: str
+    previous_state: Optional[str] = None
+    last_error: Optional[str] = None
+    reporter: str = "unknown"
+
+class CapacityAcquireRequest(BaseModel):
+    skill: str
+    plan_id: str
+    user_id: Optional[str] = None
+    task_id: Optional[str] = None
+    wait_seconds: float = Field(25.0, ge=0, le=60, description="Attente maximale côté serveur avant de répondre 'non attribué'.")
+
 
 # --- NOUVEAU : Gestionnaire de connexions WebSocket ---
 class ConnectionManager:
@@ -173,6 +191,14 @@ class ConnectionManager:
             await connection.send_text(message)
 
 manager = ConnectionManager()
+# Répartition équitable de la capacité des agents entre plans concurrents.
+capacity_scheduler = CapacityScheduler()
+# Catalogue versionné des compétences, republié à chaque changement du registre.
+skill_catalog = SkillCatalog()
+# Index de routage : seuls les agents dont le bail (heartbeat) est valide y figurent.
+agent_registry = AgentLeaseRegistry()
+# Derniers états de disjoncteur signalés, par URL d'agent puis par appelant.
+circuit_breaker_reports: Dict[str, Dict[str, Dict[str, Any]]] = {}
 # Cache in-memory des statuts des agents.
 agent_statuses: Dict[str, Dict[str, Any]] = {}
 # Statut interne du serveur GRA lui-même.
@@ -258,7 +284,12 @@ async def lifespan(app: Starlette):
                         # S'il est en ligne, il enverra sa mise à jour peu après.
                         agent_data["health_status"] = {"state": "Offline"}
                         agent_statuses[agent_name] = agent_data
+                        # Bail de grâce : un agent vivant a un TTL pour envoyer son
+                        # premier heartbeat, sinon il est retiré de l'index.
+                        agent_registry.register(_routing_entry(agent_data))
             logger.info(f"[GRA] Cache initialisé avec {len(agent_statuses)} agents depuis Firestore.")
+            skill_catalog.publish(agent_registry.skills_by_agent())
+            logger.info(f"[GRA] Catalogue de compétences publié (version {skill_catalog.version}).")
         except Exception as e:
             logger.error(f"[GRA] Erreur lors de l'initialisation du cache depuis Firestore: {e}", exc_info=True)
     # -----------------------------------------------------------
@@ -273,9 +304,14 @@ async def lifespan(app: Starlette):
         json.dumps({"gra_status": gra_status, "agents": list(agent_statuses.values())}, default=json_serializer)
     )
     await publish_gra_location()
+    lease_sweeper = asyncio.create_task(_sweep_expired_agent_leases())
 
     yield  # L'application tourne ici
 
+    lease_sweeper.cancel()
+    with suppress(asyncio.CancelledError):
+        await lease_sweeper
+
     gra_status.update(
         {
             "state": "stopped",
@@ -322,28 +358,6 @@ except Exception as e:
     logging.error(f"Failed to initialize EnvironmentManager: {e}", exc_info=True)
     environment_manager = None
 
-@app.post("/register", status_code=201)
-async def register_agent(payload: AgentRegistration):
-    """Point de terminaison pour que les agents puissent s'enregistrer."""
-    try:
-        agent_ref = db.collection("service_registry").document(payload.name)
-        
-        agent_data = {
-            "name": payload.name,
-            "public_url": payload.public_url,
-            "internal_url": payload.internal_url,
-            "skills": payload.skills,
-            "timestamp": firestore.SERVER_TIMESTAMP
-        }
-        
-        await asyncio.to_thread(agent_ref.set, agent_data)
-        logger.info(f"Agent '{payload.name}' enregistré/mis à jour.")
-        return {"status": "success", "name": payload.name}
-    except Exception as e:
-        logger.error(f"Erreur enregistrement agent '{payload.name}': {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=str(e))
-
-
 @app.post("/register", status_code=201)
 async def register_agent(payload: AgentRegistration):
     """Point de terminaison pour que les agents puissent s'enregistrer ou mettre à jour leur statut."""
@@ -359,9 +373,12 @@ async def register_agent(payload: AgentRegistration):
         }
         
         await asyncio.to_thread(agent_ref.set, agent_data)
+        lease = agent_registry.register(_routing_entry(agent_data))
+        if skill_catalog.update_agent(payload.name, payload.skills):
+            logger.info(f"[GRA] Catalogue de compétences mis à jour (version {skill_catalog.version}).")
         
-        logger.info(f"Agent '{payload.name}' enregistré/mis à jour.")
-        return {"status": "success", "name": payload.name}
+        logger.info(f"Agent '{payload.name}' enregistré/mis à jour (bail de {lease['lease_ttl_seconds']}s).")
+        return {"status": "success", "name": payload.name, **lease}
         
     except Exception as e:
         logger.error(f"Erreur enregistrement agent '{payload.name}': {e}", exc_info=True)
@@ -371,39 +388,67 @@ async def register_agent(payload: AgentRegistration):
 @app.get("/agents", response_model=List[Dict[str, Any]])
 async def get_agents(skill: Optional[str] = None):
     """
-    Récupère les agents. Si une compétence ('skill') est fournie, filtre les résultats.
+    Récupère les agents vivants (bail valide). Si une compétence ('skill') est fournie, filtre les résultats.
     Cette fonction retourne TOUJOURS une liste d'agents.
     """
-    try:
-        agents_ref = db.collection(GRA_SERVICE_REGISTRY_COLLECTION)
+    if skill:
+        logger.info(f"Recherche d'agents avec la compétence: {skill}")
+    else:
+        logger.info("Récupération de tous les agents vivants.")
 
-        if skill:
-            logger.info(f"Recherche d'agents avec la compétence: {skill}")
-            query = agents_ref.where("skills", "array_contains", skill)
-        else:
-            logger.info("Récupération de tous les agents enregistrés.")
-            query = agents_ref
-
-        docs_snapshots = await asyncio.to_thread(list, query.stream())
-        if not docs_snapshots:
-            logger.warning(f"Aucun agent trouvé pour la compétence '{skill}'. Retour de 404.")
-            raise HTTPException(status_code=404, detail=f"Aucun agent trouvé avec la compétence: {skill}")
-   
-        agents = []
-        for doc in docs_snapshots:
-            if doc.id != GRA_CONFIG_DOCUMENT_ID:
-                agent_data = doc.to_dict()
-                agent_data['id'] = doc.id
-                agents.append(agent_data)
-
-        logger.info(f"{len(agents)} agents trouvés pour la requête.")
-        return agents
-    except HTTPException as http_exc:
-        raise http_exc
-    except Exception as e:
-        logger.error(f"Erreur interne lors de la recherche d'agent pour la compétence '{skill}': {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail="Erreur interne du serveur lors de la recherche d'agent.")
-    
+    agents = agent_registry.live_agents(skill)
+    if not agents:
+        logger.warning(f"Aucun agent vivant trouvé pour la compétence '{skill}'. Retour de 404.")
+        raise HTTPException(status_code=404, detail=f"Aucun agent trouvé avec la compétence: {skill}")
+
+    logger.info(f"{len(agents)} agents trouvés pour la requête.")
+    return agents
+
+
+@app.post("/agents/{agent_name}/heartbeat")
+async def agent_heartbeat(agent_name: str):
+    """Renouvelle le bail d'un agent. 404 si le bail a expiré : l'agent doit se réenregistrer."""
+    if not agent_registry.heartbeat(agent_name):
+        raise HTTPException(status_code=404, detail=f"Aucun bail actif pour l'agent '{agent_name}'.")
+    return {"status": "renewed", "lease_ttl_seconds": agent_registry.ttl_seconds}
+
+
+@app.delete("/agents/{agent_name}/lease")
+async def release_agent_lease(agent_name: str):
+    """Retrait volontaire d'un agent de l'index de routage (arrêt propre)."""
+    if agent_registry.remove(agent_name):
+        await _on_agents_evicted([agent_name], "Arrêt de l'agent")
+    return {"status": "released"}
+
+
+def _routing_entry(agent_data: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: agent_data.get(key) for key in ("name", "public_url", "internal_url", "skills")}
+
+
+async def _on_agents_evicted(agent_names: List[str], reason: str) -> None:
+    """Retire les agents du catalogue et pousse le changement aux abonnés WebSocket."""
+    for agent_name in agent_names:
+        skill_catalog.remove_agent(agent_name)
+        if agent_name in agent_statuses:
+            agent_statuses[agent_name]["health_status"] = {
+                "state": AgentOperationalState.OFFLINE.value,
+                "detail": reason,
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+            }
+    logger.info(f"[GRA] Agents retirés de l'index ({reason}) : {agent_names}. Catalogue version {skill_catalog.version}.")
+    payload = {"gra_status": gra_status, "agents": list(agent_statuses.values())}
+    await manager.broadcast(json.dumps(payload, default=json_serializer))
+
+
+async def _sweep_expired_agent_leases() -> None:
+    while True:
+        await asyncio.sleep(AGENT_LEASE_SWEEP_INTERVAL_SECONDS)
+        try:
+            expired = agent_registry.evict_expired()
+            if expired:
+                await _on_agents_evicted(expired, "Bail expiré (heartbeat absent)")
+        except Exception as e:
+            logger.error(f"[GRA] Erreur lors du balayage des baux d'agents: {e}", exc_info=True)
 
 
 @app.post("/v1/global_plans", response_model=GlobalPlanResponse, status_code=202)
@@ -564,6 +609,7 @@ async def publish_gra_location():
         doc_ref = db.collection(GRA_SERVICE_REGISTRY_COLLECTION).document(GRA_CONFIG_DOCUMENT_ID)
         doc_data = {
             "service_name": "GestionnaireRessourcesAgents",
+            "url": GRA_PUBLIC_URL,
             "current_url": GRA_PUBLIC_URL,
             "last_heartbeat": datetime.now(timezone.utc).isoformat()
         }
@@ -604,11 +650,11 @@ async def get_all_plans_summary():
             plan_id = doc.id
             root_node_data = plan_data.get("nodes", {}).get(plan_id, {})
             
-            created_at_timestamp = "N/A"
+            created_at_timestamp = root_node_data.get("created_at", "N/A")
             history = root_node_data.get("history", [])
-            if history and isinstance(history, list) and len(history) > 0:
-                first_event = history[0]
-                created_at_timestamp = first_event.get("timestamp", "N/A")
+            if created_at_timestamp == "N/A" and history and isinstance(history, list):
+                # Anciens documents : date déduite de l'historique embarqué.
+                created_at_timestamp = history[0].get("timestamp", "N/A")
 
             summaries.append(PlanSummary(
                 plan_id=plan_id,
@@ -655,8 +701,11 @@ async def get_agents_status_endpoint():
 
     agents_from_db = []
     try:
-        docs_stream = db.collection("service_registry").stream()
+        docs_stream = await asyncio.to_thread(list, db.collection("service_registry").stream())
         agents_from_db = [doc.to_dict() for doc in docs_stream if doc.id != 'gra_instance_config']
+        for agent_data in agents_from_db:
+            agent_registry.update_agent(_routing_entry(agent_data))
+        skill_catalog.publish(agent_registry.skills_by_agent())
     except Exception as e:
         logger.error(f"[GRA] Erreur Firestore: {e}", exc_info=True)
         # On ne lève pas d'exception, on peut continuer avec le cache
@@ -675,6 +724,18 @@ async def get_agents_status_endpoint():
     # Retourne la vue la plus à jour
     return {"gra_status": gra_status, "agents": list(agent_statuses.values())}
 
+@app.get("/v1/skill_catalog")
+async def get_skill_catalog(request: Request):
+    """
+    Catalogue versionné des compétences des agents enregistrés. Le client peut
+    revalider sa copie avec If-None-Match : réponse 304 si le catalogue est inchangé.
+    """
+    etag = f'"{skill_catalog.etag}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(content=skill_catalog.to_dict(), headers=headers)
+
 @app.post("/v1/global_plans/{global_plan_id}/accept_and_plan", response_model=GlobalPlanResponse)
 async def accept_objective_and_trigger_team1_planning(
     global_plan_id: str = Path(..., description="L'ID du plan global."),
@@ -734,6 +795,27 @@ async def retry_team2_failed_tasks_endpoint(global_plan_id: str = Path(..., desc
         )
         raise HTTPException(status_code=500, detail=f"Erreur interne du serveur: {str(e)}")
 
+@app.post("/v1/global_plans/{global_plan_id}/cancel", response_model=GlobalPlanResponse)
+async def cancel_global_plan_endpoint(global_plan_id: str = Path(..., description="ID du plan global")):
+    """
+    Annule un plan global : appels d'agents en cours interrompus, tâches TEAM 2
+    restantes passées à CANCELLED, créneaux de capacité rendus et environnement détruit.
+    """
+    logger.info(f"[GRA API] Requête d'annulation du plan '{global_plan_id}'.")
+    try:
+        supervisor = GlobalSupervisorLogic()
+        result = await supervisor.cancel_global_plan(global_plan_id)
+        released = capacity_scheduler.release_plan(global_plan_id)
+        if result.get("status") == "error":
+            raise HTTPException(status_code=404, detail=result.get("message"))
+        logger.info(f"[GRA API] Plan '{global_plan_id}' annulé, {released} lease(s) de capacité récupéré(s).")
+        return GlobalPlanResponse(**result)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"[GRA API] Erreur lors de l'annulation du plan '{global_plan_id}': {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Erreur interne du serveur: {str(e)}")
+
 @app.get("/v1/stats/team1_agent_tasks_count", response_model=Team1AgentTasksCountResponse)
 async def get_team1_agent_tasks_count_stats():
     """
@@ -875,6 +957,87 @@ async def get_execution_task_graph_details_endpoint(execution_plan_id: str):
         logger.error(f"[GRA] Erreur lors de la récupération des détails du plan d'exécution '{execution_plan_id}': {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Erreur interne du serveur: {str(e)}")
 
+@app.get("/v1/execution_task_graphs/{execution_plan_id}/history")
+async def get_execution_task_graph_history_endpoint(execution_plan_id: str, task_id: Optional[str] = None):
+    """Récupère le journal des transitions d'un plan d'exécution (optionnellement filtré par tâche)."""
+    try:
+        graph_manager = ExecutionTaskGraph(execution_plan_id=execution_plan_id)
+        events = await asyncio.to_thread(graph_manager.get_task_history, task_id)
+        return {"execution_plan_id": execution_plan_id, "task_id": task_id, "events": events}
+    except Exception as e:
+        logger.error(f"[GRA] Erreur lors de la lecture de l'historique du plan d'exécution '{execution_plan_id}': {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Erreur interne du serveur: {str(e)}")
+
+@app.get("/plans/{plan_id}/history")
+async def get_plan_history_endpoint(plan_id: str, task_id: Optional[str] = None):
+    """Récupère le journal des transitions d'un plan TEAM 1 (optionnellement filtré par tâche)."""
+    try:
+        from src.shared.task_graph_management import TaskGraph
+        graph_manager = TaskGraph(plan_id=plan_id)
+        events = await asyncio.to_thread(graph_manager.get_task_history, task_id)
+        return {"plan_id": plan_id, "task_id": task_id, "events": events}
+    except Exception as e:
+        logger.error(f"[GRA] Erreur lors de la lecture de l'historique du plan '{plan_id}': {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Erreur interne du serveur: {str(e)}")
+
+@app.post("/v1/capacity/acquire")
+async def acquire_capacity_slot(request: CapacityAcquireRequest):
+    """
+    Demande un créneau d'agent pour une compétence. La requête attend au plus
+    `wait_seconds` ; si aucun créneau n'est attribué, le client doit réessayer.
+    """
+    lease = await capacity_scheduler.acquire(
+        skill=request.skill,
+        plan_id=request.plan_id,
+        user_id=request.user_id,
+        task_id=request.task_id,
+        timeout=request.wait_seconds,
+    )
+    skill_metrics = capacity_scheduler.metrics()["skills"].get(request.skill, {})
+    return {
+        "granted": lease is not None,
+        "lease": lease.to_dict() if lease else None,
+        "queue_depth": skill_metrics.get("queue_depth", 0),
+    }
+
+@app.post("/v1/capacity/leases/{lease_id}/release")
+async def release_capacity_slot(lease_id: str):
+    """Rend un créneau obtenu via /v1/capacity/acquire."""
+    released = capacity_scheduler.release(lease_id)
+    if not released:
+        logger.info(f"[GRA] Lease '{lease_id}' inconnu ou déjà libéré.")
+    return {"lease_id": lease_id, "released": released}
+
+@app.get("/v1/capacity/metrics")
+async def get_capacity_metrics():
+    """Capacité, occupation et profondeur de file par compétence."""
+    return capacity_scheduler.metrics()
+
+@app.post("/v1/circuit_breakers")
+async def report_circuit_breaker_transition(report: CircuitBreakerReport):
+    """Changement d'état d'un disjoncteur côté appelant (superviseur ou agent)."""
+    agent_url = report.agent_url.rstrip("/")
+    entry = report.model_dump()
+    entry["timestamp"] = datetime.now(timezone.utc).isoformat()
+    circuit_breaker_reports.setdefault(agent_url, {})[report.reporter] = entry
+    logger.warning(
+        f"[GRA] Disjoncteur vers {agent_url} signalé par {report.reporter} : "
+        f"{report.previous_state} -> {report.state} ({report.last_error or 'sans détail'})."
+    )
+
+    for agent_info in agent_statuses.values():
+        urls = {(agent_info.get(key) or "").rstrip("/") for key in ("internal_url", "public_url")}
+        if agent_url in urls:
+            agent_info["circuit_breakers"] = circuit_breaker_reports[agent_url]
+    payload = {"gra_status": gra_status, "agents": list(agent_statuses.values())}
+    await manager.broadcast(json.dumps(payload, default=json_serializer))
+    return {"status": "received"}
+
+@app.get("/v1/circuit_breakers")
+async def get_circuit_breaker_reports():
+    """Derniers états de disjoncteur signalés, par URL d'agent."""
+    return circuit_breaker_reports
+
 @app.get("/v1/stats/agents")
 async def get_agent_stats():
     """Récupère les statistiques de traitement des tâches pour chaque agent."""
@@ -895,6 +1058,59 @@ async def get_agent_stats():
         logger.error(f"Erreur lors de la récupération des statistiques des agents: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Erreur interne du serveur.")
 
+async def _load_llm_usage_docs(plan_ids: List[str]) -> List[Dict[str, Any]]:
+    docs = []
+    for plan_id in plan_ids:
+        snapshot = await asyncio.to_thread(db.collection(LLM_USAGE_COLLECTION).document(plan_id).get)
+        if snapshot.exists:
+            docs.append({"plan_id": plan_id, **snapshot.to_dict()})
+    return docs
+
+@app.get("/v1/llm_usage/plans/{plan_id}")
+async def get_plan_llm_usage(plan_id: str):
+    """Jetons et latence LLM d'un plan (TEAM 1, TEAM 2 ou global), par agent et par tâche."""
+    try:
+        docs = await _load_llm_usage_docs([plan_id])
+    except Exception as e:
+        logger.error(f"Erreur lors de la lecture de l'usage LLM du plan '{plan_id}': {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Erreur interne du serveur.")
+    if not docs:
+        raise HTTPException(status_code=404, detail=f"Aucun usage LLM enregistré pour le plan '{plan_id}'.")
+    return usage_breakdown(docs)
+
+@app.get("/v1/global_plans/{global_plan_id}/llm_usage")
+async def get_global_plan_llm_usage(global_plan_id: str):
+    """Usage LLM cumulé d'un plan global : clarification, plan TEAM 1 et plan d'exécution TEAM 2."""
+    plan_details = await GlobalSupervisorLogic()._load_global_plan_state(global_plan_id)
+    if not plan_details:
+        raise HTTPException(status_code=404, detail=f"Plan global '{global_plan_id}' non trouvé.")
+    plan_ids = [global_plan_id] + [
+        plan_id
+        for plan_id in (plan_details.get("team1_plan_id"), plan_details.get("team2_execution_plan_id"))
+        if plan_id
+    ]
+    try:
+        docs = await _load_llm_usage_docs(plan_ids)
+    except Exception as e:
+        logger.error(f"Erreur lors de la lecture de l'usage LLM du plan global '{global_plan_id}': {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Erreur interne du serveur.")
+    return {"global_plan_id": global_plan_id, **usage_breakdown(docs)}
+
+@app.get("/v1/llm_usage/agents")
+async def get_agents_llm_usage():
+    """Cumul des jetons et de la latence LLM par agent, tous plans confondus."""
+    try:
+        docs_snapshots = await asyncio.to_thread(list, db.collection("agent_stats").stream())
+    except Exception as e:
+        logger.error(f"Erreur lors de la lecture de l'usage LLM des agents: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Erreur interne du serveur.")
+    return {
+        "agents": {
+            doc.id: agent_usage_from_stats(doc.to_dict() or {})
+            for doc in docs_snapshots
+        }
+    }
+
 @app.get("/api/environments/{environment_id}/files")
 async def list_files(environment_id: str, path: Optional[str] = "."):
     """Liste les fichiers dans un environnement. Le chemin est relatif à /workspace."""
@@ -1070,6 +1286,8 @@ async def update_agent_status(status_update: Dict[str, Any]):
     current_agent_info['status_history'] = history[-10:]
 
     agent_statuses[agent_name] = current_agent_info
+    # Une mise à jour de statut prouve que l'agent est vivant : elle vaut heartbeat.
+    agent_registry.heartbeat(agent_name)
 
     gra_status.update(
         {
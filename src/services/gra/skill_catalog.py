@@ -0,0 +1,59 @@
+"""
+Catalogue versionné des compétences des agents enregistrés.
+
+Le GRA reconstruit le catalogue au démarrage depuis le registre puis le met à
+jour à chaque enregistrement d'agent. La version n'est incrémentée que si le
+contenu change ; l'ETag est l'empreinte du contenu, ce qui permet aux clients
+de revalider leur copie (If-None-Match) sans retélécharger le catalogue.
+"""
+import hashlib
+import json
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+
+class SkillCatalog:
+    def __init__(self):
+        self.version = 0
+        self.etag: Optional[str] = None
+        self.updated_at: Optional[str] = None
+        self._agents: Dict[str, List[str]] = {}
+        self._refresh_etag()
+
+    @staticmethod
+    def _normalize(skills: Optional[Iterable[Any]]) -> List[str]:
+        return sorted({skill for skill in (skills or []) if isinstance(skill, str) and skill})
+
+    def _refresh_etag(self) -> bool:
+        payload = json.dumps(self._agents, sort_keys=True, ensure_ascii=False)
+        etag = hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+        if etag == self.etag:
+            return False
+        self.etag = etag
+        self.version += 1
+        self.updated_at = datetime.now(timezone.utc).isoformat()
+        return True
+
+    def publish(self, agents: Dict[str, Iterable[Any]]) -> bool:
+        """Remplace le catalogue (chargement du registre). Retourne True si le contenu a changé."""
+        self._agents = {name: self._normalize(skills) for name, skills in agents.items() if name}
+        return self._refresh_etag()
+
+    def update_agent(self, agent_name: str, skills: Optional[Iterable[Any]]) -> bool:
+        """Enregistre les compétences d'un agent. Retourne True si le catalogue a changé."""
+        self._agents[agent_name] = self._normalize(skills)
+        return self._refresh_etag()
+
+    def remove_agent(self, agent_name: str) -> bool:
+        if self._agents.pop(agent_name, None) is None:
+            return False
+        return self._refresh_etag()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "etag": self.etag,
+            "updated_at": self.updated_at,
+            "skills": sorted({skill for skills in self._agents.values() for skill in skills}),
+            "agents": {name: list(skills) for name, skills in sorted(self._agents.items())},
+        }
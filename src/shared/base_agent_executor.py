@@ -1,4 +1,6 @@
 import os
+import asyncio
+import json
 import logging
 from typing_extensions import override
 from abc import ABC, abstractmethod
@@ -16,16 +18,149 @@ from a2a.types import (
     Artifact,
     Task,
 )
-from a2a.utils import new_task, new_agent_text_message
+from a2a.utils import new_task, new_agent_text_message, new_text_artifact
 
 from .base_agent_logic import BaseAgentLogic
 import time
 from src.shared.firebase_init import db
 from google.cloud import firestore
 from src.shared.agent_state import AgentOperationalState
+from src.clients.a2a_api_client import A2A_DEADLINE_METADATA_KEY, A2A_FAILURE_CODE_METADATA_KEY
+from src.shared.service_discovery import get_gra_resolution_metrics
+from src.shared.llm_cache import get_llm_cache
+from src.shared.llm_client import bind_llm_stream, get_llm_client
+from src.shared.structured_output import structured_output_metrics
+from src.shared.llm_usage import bind_llm_usage, get_llm_usage_tracker
+from src.shared.llm_routing import bind_llm_route
+from src.shared.retry_policy import FailureClass, failure_code_for_exception
 
 logger = logging.getLogger(__name__)
 
+# Relais du flux LLM : taille minimale d'un fragment publié et cadence des statuts.
+LLM_STREAM_MIN_CHUNK_CHARS = int(os.environ.get("LLM_STREAM_MIN_CHUNK_CHARS", "200"))
+LLM_STREAM_FLUSH_INTERVAL_SECONDS = float(os.environ.get("LLM_STREAM_FLUSH_INTERVAL_SECONDS", "0.5"))
+LLM_STREAM_STATUS_INTERVAL_SECONDS = float(os.environ.get("LLM_STREAM_STATUS_INTERVAL_SECONDS", "2"))
+
+
+def failure_status_message(
+    text: str, context_id: str | None, task_id: str | None, failure_code: str | None = None
+) -> Message:
+    """Message du statut 'failed' ; le code d'échec structuré guide la relance côté superviseur."""
+    message = new_agent_text_message(text=text, context_id=context_id, task_id=task_id)
+    if failure_code:
+        message.metadata = {A2A_FAILURE_CODE_METADATA_KEY: failure_code}
+    return message
+
+
+class LLMStreamRelay:
+    """
+    Relaie au client A2A les fragments produits par les appels LLM d'une tâche :
+    fragments regroupés en `TaskArtifactUpdateEvent` (append) sur un artefact
+    d'aperçu, et `TaskStatusUpdateEvent` 'working' espacés pour la progression.
+    L'artefact final adopte l'identifiant de l'aperçu (`adopt`) et le remplace :
+    la tâche ne conserve qu'un seul artefact et rien n'est bufferisé en double.
+    Sur une issue sans résultat (échec, abandon), `replace_preview` remplace
+    l'aperçu pour qu'il ne reste pas le dernier artefact vu par le superviseur.
+    """
+
+    def __init__(
+        self,
+        event_queue: EventQueue,
+        task_id: str,
+        context_id: str,
+        artifact_name: str = "result",
+        min_chunk_chars: int = LLM_STREAM_MIN_CHUNK_CHARS,
+        flush_interval_seconds: float = LLM_STREAM_FLUSH_INTERVAL_SECONDS,
+        status_interval_seconds: float = LLM_STREAM_STATUS_INTERVAL_SECONDS,
+        clock=time.monotonic,
+    ):
+        self.event_queue = event_queue
+        self.task_id = task_id
+        self.context_id = context_id
+        self.artifact_name = artifact_name
+        self.min_chunk_chars = min_chunk_chars
+        self.flush_interval_seconds = flush_interval_seconds
+        self.status_interval_seconds = status_interval_seconds
+        self._clock = clock
+        self.artifact_id: str | None = None
+        self.chars_received = 0
+        self._pending: list[str] = []
+        self._pending_chars = 0
+        self._last_flush = clock()
+        self._last_status = float("-inf")
+
+    async def on_chunk(self, chunk: str) -> None:
+        self._pending.append(chunk)
+        self._pending_chars += len(chunk)
+        self.chars_received += len(chunk)
+        now = self._clock()
+        if (self._pending_chars >= self.min_chunk_chars
+                or now - self._last_flush >= self.flush_interval_seconds):
+            await self._flush()
+        if now - self._last_status >= self.status_interval_seconds:
+            self._last_status = now
+            await self.event_queue.enqueue_event(
+                TaskStatusUpdateEvent(
+                    status=TaskStatus(
+                        state=TaskState.working,
+                        message=new_agent_text_message(
+                            text=f"Génération LLM en cours : {self.chars_received} caractères reçus.",
+                            context_id=self.context_id,
+                            task_id=self.task_id,
+                        ),
+                    ),
+                    final=False,
+                    contextId=self.context_id,
+                    taskId=self.task_id,
+                )
+            )
+
+    async def _flush(self) -> None:
+        self._last_flush = self._clock()
+        if not self._pending:
+            return
+        text = "".join(self._pending)
+        self._pending.clear()
+        self._pending_chars = 0
+        artifact = new_text_artifact(name=self.artifact_name, text=text, description="Génération LLM en cours.")
+        first = self.artifact_id is None
+        if first:
+            self.artifact_id = artifact.artifactId
+        else:
+            artifact.artifactId = self.artifact_id
+        await self.event_queue.enqueue_event(
+            TaskArtifactUpdateEvent(
+                append=not first,
+                lastChunk=False,
+                contextId=self.context_id,
+                taskId=self.task_id,
+                artifact=artifact,
+            )
+        )
+
+    async def close(self) -> None:
+        await self._flush()
+
+    def adopt(self, artifact: Artifact) -> Artifact:
+        """Donne à l'artefact final l'identifiant de l'aperçu, qu'il remplace alors."""
+        if self.artifact_id is not None:
+            artifact.artifactId = self.artifact_id
+        return artifact
+
+    async def replace_preview(self, artifact: Artifact) -> None:
+        """Publie `artifact` à la place de l'aperçu, s'il y en a un (sinon rien n'est publié)."""
+        if self.artifact_id is None:
+            return
+        await self.event_queue.enqueue_event(
+            TaskArtifactUpdateEvent(
+                append=False,
+                lastChunk=True,
+                contextId=self.context_id,
+                taskId=self.task_id,
+                artifact=self.adopt(artifact),
+            )
+        )
+
 
 class BaseAgentExecutor(AgentExecutor, ABC):
     """
@@ -49,6 +184,10 @@ class BaseAgentExecutor(AgentExecutor, ABC):
         self.last_activity_time: float = time.time()
         self.status_detail: str | None = None
         # ------------------------------------
+        # Tâches A2A en cours, par identifiant, pour l'annulation et les échéances.
+        self._running_tasks: dict[str, asyncio.Task] = {}
+        # Annulations en cours : levées une fois l'état 'canceled' publié par cancel().
+        self._cancellations: dict[str, asyncio.Event] = {}
 
         logger.info(
             f"Executor de type '{self.__class__.__name__}' initialisé avec la logique '{type(agent_logic).__name__}'."
@@ -75,17 +214,22 @@ class BaseAgentExecutor(AgentExecutor, ABC):
             ),
             "last_activity_time": self.last_activity_time,
             "detail": self.status_detail,
+            "gra_url_resolution": get_gra_resolution_metrics(),
+            "llm_cache": get_llm_cache().stats(),
+            "llm_client": get_llm_client().timings_summary(),
+            "structured_output": structured_output_metrics(),
+            "llm_usage": get_llm_usage_tracker().summary(),
         }
 
     # ---------------------------------------------
     # --- NOUVEAU : Méthode pour notifier le GRA ---
     async def _notify_gra_of_status_change(self):
         import os
-        from src.shared.service_discovery import get_gra_base_url
+        from src.shared.service_discovery import get_gra_base_url, invalidate_gra_base_url
 
-        # Tente de récupérer l'URL du GRA depuis l'environnement, sinon via la
-        # fonction de discovery (Firestore ou autre)
-        self.gra_url = os.environ.get("GRA_PUBLIC_URL") or await get_gra_base_url()
+        # L'environnement est prioritaire ; sinon l'URL vient du cache de
+        # découverte (Firestore n'est relu qu'à expiration ou invalidation).
+        self.gra_url = await get_gra_base_url()
 
         if not self.gra_url:
             logger.warning(
@@ -115,6 +259,9 @@ class BaseAgentExecutor(AgentExecutor, ABC):
                     timeout=5.0,
                 )
             logger.debug(f"Statut {status_payload['state']} notifié au GRA.")
+        except httpx.TransportError as e:
+            logger.error(f"Échec de la notification du statut au GRA: {e}")
+            invalidate_gra_base_url(self.gra_url)
         except Exception as e:
             logger.error(f"Échec de la notification du statut au GRA: {e}")
 
@@ -149,6 +296,13 @@ class BaseAgentExecutor(AgentExecutor, ABC):
         """
         pass
 
+    async def _flush_llm_usage(self) -> None:
+        """Verse dans Firestore l'usage LLM (jetons, latence) accumulé par plan et par tâche."""
+        try:
+            await asyncio.to_thread(get_llm_usage_tracker().flush)
+        except Exception as e:
+            logger.error(f"Impossible de verser l'usage LLM: {e}")
+
     def _update_stats(self, success: bool):
         """Met à jour les compteurs de statistiques dans Firestore."""
         try:
@@ -206,8 +360,85 @@ class BaseAgentExecutor(AgentExecutor, ABC):
         except Exception as e:
             logger.error(f"Erreur lors de _update_task_state: {e}")
 
+    @staticmethod
+    def _extract_deadline(message: Message | None) -> float | None:
+        """Échéance absolue (epoch, secondes) transmise par le superviseur dans les métadonnées A2A."""
+        if not message or not message.metadata:
+            return None
+        deadline = message.metadata.get(A2A_DEADLINE_METADATA_KEY)
+        try:
+            return float(deadline) if deadline is not None else None
+        except (TypeError, ValueError):
+            logger.warning(f"Échéance A2A invalide ignorée: {deadline!r}")
+            return None
+
+    def _extract_skill(self, message: Message | None) -> str | None:
+        """Compétence assignée par le superviseur (`assigned_skill` de l'entrée JSON), pour le routage LLM."""
+        # Extraction textuelle de base : certaines classes filles retournent un dict déjà décodé.
+        input_text = BaseAgentExecutor._extract_input_from_message(self, message) if message and message.parts else None
+        if not input_text:
+            return None
+        try:
+            payload = json.loads(input_text)
+        except ValueError:
+            return None
+        return payload.get("assigned_skill") if isinstance(payload, dict) else None
+
     @override
     async def execute(self, context: RequestContext, event_queue: EventQueue) -> None:
+        """
+        Exécute la tâche dans une tâche asyncio enregistrée, afin que `cancel` et
+        l'échéance transmise par le superviseur puissent l'interrompre (appels LLM
+        et flux exec Kubernetes compris).
+        """
+        message = context.message
+        task_id = context.task_id or (message.taskId if message else None)
+        context_id = context.context_id or (message.contextId if message else None)
+        deadline = self._extract_deadline(message)
+
+        # La tâche d'exécution hérite du contexte : ses appels LLM sont imputés à ce
+        # plan et cette tâche, et routés selon sa compétence et son échéance.
+        with bind_llm_usage(context_id, task_id), bind_llm_route(self._extract_skill(message), deadline):
+            runner = asyncio.create_task(self._execute_task(context, event_queue))
+        if task_id:
+            self._running_tasks[task_id] = runner
+        try:
+            timeout = max(0.0, deadline - time.time()) if deadline is not None else None
+            await asyncio.wait_for(runner, timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"Tâche {task_id} interrompue : échéance dépassée.")
+            self._update_stats(success=False)
+            if task_id and context_id:
+                await event_queue.enqueue_event(
+                    TaskStatusUpdateEvent(
+                        status=TaskStatus(
+                            state=TaskState.failed,
+                            message=failure_status_message(
+                                "Échéance de la tâche dépassée, exécution interrompue.",
+                                context_id,
+                                task_id,
+                                FailureClass.DEADLINE.value,
+                            ),
+                        ),
+                        final=True,
+                        contextId=context_id,
+                        taskId=task_id,
+                    )
+                )
+        except asyncio.CancelledError:
+            # Exécution interrompue par cancel() : l'état 'canceled' y est publié. La
+            # file est fermée au retour d'execute, il faut donc attendre cette publication.
+            if not runner.cancelled() or asyncio.current_task().cancelling():
+                raise
+            cancellation = self._cancellations.get(task_id) if task_id else None
+            if cancellation is not None:
+                await cancellation.wait()
+        finally:
+            if task_id:
+                self._running_tasks.pop(task_id, None)
+            await self._flush_llm_usage()
+
+    async def _execute_task(self, context: RequestContext, event_queue: EventQueue) -> None:
         # VÉRIFIEZ QUE CE BLOC EST PRÉSENT
         self.state = AgentOperationalState.BUSY
         self.current_task_id = context.current_task.id if context.current_task else None
@@ -240,7 +471,7 @@ class BaseAgentExecutor(AgentExecutor, ABC):
                 logger.info(
                     f"Nouvelle tâche créée: ID={task.id}, ContextID={task.contextId}"
                 )
-                event_queue.enqueue_event(task)
+                await event_queue.enqueue_event(task)
 
             current_task_id = task.id
             current_context_id = task.contextId
@@ -282,15 +513,24 @@ class BaseAgentExecutor(AgentExecutor, ABC):
                 )
             )
 
+            stream_relay = LLMStreamRelay(
+                event_queue, current_task_id, current_context_id, self.default_artifact_name
+            )
             try:
                 self.status_detail = "Exécution de la logique"
                 await self._notify_gra_of_status_change()
-                result_data = await self.agent_logic.process(
-                    user_input, current_context_id
+                try:
+                    with bind_llm_stream(stream_relay.on_chunk):
+                        result_data = await self.agent_logic.process(
+                            user_input, current_context_id
+                        )
+                finally:
+                    await stream_relay.close()
+
+                result_artifact = stream_relay.adopt(
+                    self._create_artifact_from_result(result_data, task)
                 )
 
-                result_artifact = self._create_artifact_from_result(result_data, task)
-
                 await event_queue.enqueue_event(
                     TaskArtifactUpdateEvent(
                         append=False,
@@ -321,14 +561,21 @@ class BaseAgentExecutor(AgentExecutor, ABC):
                     f"Erreur pendant le traitement de la tâche {current_task_id}: {e}",
                     exc_info=True,
                 )
+                await stream_relay.replace_preview(
+                    new_text_artifact(
+                        name=self.default_artifact_name,
+                        text=f"Erreur interne de l'agent: {str(e)}",
+                    )
+                )
                 await event_queue.enqueue_event(
                     TaskStatusUpdateEvent(
                         status=TaskStatus(
                             state=TaskState.failed,
-                            message=new_agent_text_message(
-                                text=f"Erreur interne de l'agent: {str(e)}",
-                                context_id=current_context_id,
-                                task_id=current_task_id,
+                            message=failure_status_message(
+                                f"Erreur interne de l'agent: {str(e)}",
+                                current_context_id,
+                                current_task_id,
+                                failure_code_for_exception(e),
                             ),
                         ),
                         final=True,
@@ -353,10 +600,48 @@ class BaseAgentExecutor(AgentExecutor, ABC):
 
     @override
     async def cancel(self, context: RequestContext, event_queue: EventQueue) -> None:
-        task_id_for_log = (
-            context.current_task.id if context.current_task else "inconnue"
+        """Annule la tâche en cours (A2A tasks/cancel) et publie l'état 'canceled'."""
+        task_id = context.task_id or (
+            context.current_task.id if context.current_task else None
         )
-        logger.warning(
-            f"Tentative d'annulation pour la tâche {task_id_for_log}, non implémentée dans BaseAgentExecutor."
+        context_id = context.context_id or (
+            context.current_task.contextId if context.current_task else None
         )
-        pass
+        runner = self._running_tasks.get(task_id) if task_id else None
+        published = asyncio.Event()
+        try:
+            if runner and not runner.done():
+                logger.warning(f"Annulation de la tâche {task_id} demandée : interruption de l'exécution.")
+                # execute() ne rend la main (et ne laisse fermer la file) qu'après la publication ci-dessous.
+                self._cancellations[task_id] = published
+                runner.cancel()
+                try:
+                    await runner
+                except asyncio.CancelledError:
+                    pass
+                except Exception as e:
+                    logger.error(f"Erreur lors de l'interruption de la tâche {task_id}: {e}")
+                self._update_stats(success=False)
+            else:
+                logger.info(f"Annulation demandée pour la tâche {task_id}, qui n'est plus en cours sur cet agent.")
+
+            if task_id and context_id:
+                await event_queue.enqueue_event(
+                    TaskStatusUpdateEvent(
+                        status=TaskStatus(
+                            state=TaskState.canceled,
+                            message=new_agent_text_message(
+                                text="Tâche annulée à la demande du superviseur.",
+                                context_id=context_id,
+                                task_id=task_id,
+                            ),
+                        ),
+                        final=True,
+                        contextId=context_id,
+                        taskId=task_id,
+                    )
+                )
+        finally:
+            published.set()
+            if task_id and self._cancellations.get(task_id) is published:
+                del self._cancellations[task_id]
@@ -0,0 +1,190 @@
+"""
+Disjoncteurs (circuit breakers) par URL d'agent, partagés par tout le processus.
+
+Un disjoncteur est fermé (closed) tant que l'agent répond. Après
+CIRCUIT_BREAKER_FAILURE_THRESHOLD échecs consécutifs il s'ouvre (open) : les
+appels vers cet agent échouent immédiatement, sans réseau. Passé
+CIRCUIT_BREAKER_RECOVERY_SECONDS, il devient semi-ouvert (half_open) et laisse
+passer CIRCUIT_BREAKER_HALF_OPEN_PROBES appel(s) de test : un succès le referme,
+un échec le rouvre pour une nouvelle période.
+
+Les changements d'état sont diffusés aux écouteurs enregistrés avec
+`add_transition_listener` (le client A2A les remonte au GRA).
+"""
+import logging
+import os
+import threading
+import time
+from enum import Enum
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+CIRCUIT_BREAKER_FAILURE_THRESHOLD = int(os.environ.get("CIRCUIT_BREAKER_FAILURE_THRESHOLD", "5"))
+CIRCUIT_BREAKER_RECOVERY_SECONDS = float(os.environ.get("CIRCUIT_BREAKER_RECOVERY_SECONDS", "30"))
+CIRCUIT_BREAKER_HALF_OPEN_PROBES = int(os.environ.get("CIRCUIT_BREAKER_HALF_OPEN_PROBES", "1"))
+
+
+class CircuitState(str, Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+TransitionListener = Callable[["CircuitBreaker", CircuitState, CircuitState], None]
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        key: str,
+        failure_threshold: int = CIRCUIT_BREAKER_FAILURE_THRESHOLD,
+        recovery_seconds: float = CIRCUIT_BREAKER_RECOVERY_SECONDS,
+        half_open_probes: int = CIRCUIT_BREAKER_HALF_OPEN_PROBES,
+        clock: Callable[[], float] = time.monotonic,
+        on_transition: Optional[TransitionListener] = None,
+    ):
+        self.key = key
+        self.failure_threshold = max(1, failure_threshold)
+        self.recovery_seconds = recovery_seconds
+        self.half_open_probes = max(1, half_open_probes)
+        self._clock = clock
+        self._on_transition = on_transition
+        self._lock = threading.Lock()
+        self._state = CircuitState.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._probe_started_at = 0.0
+        self.rejected_calls = 0
+        self.last_error: Optional[str] = None
+
+    @property
+    def state(self) -> CircuitState:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> CircuitState:
+        # L'ouverture expire d'elle-même : pas besoin de minuterie.
+        if self._state == CircuitState.OPEN and self._clock() - self._opened_at >= self.recovery_seconds:
+            self._transition(CircuitState.HALF_OPEN)
+        return self._state
+
+    def _transition(self, new_state: CircuitState) -> None:
+        old_state = self._state
+        if old_state == new_state:
+            return
+        self._state = new_state
+        if new_state == CircuitState.OPEN:
+            self._opened_at = self._clock()
+        if new_state != CircuitState.HALF_OPEN:
+            self._probes_in_flight = 0
+        logger.warning(f"Disjoncteur '{self.key}' : {old_state.value} -> {new_state.value}.")
+        if self._on_transition:
+            try:
+                self._on_transition(self, old_state, new_state)
+            except Exception as e:
+                logger.error(f"Écouteur du disjoncteur '{self.key}' en erreur : {e}")
+
+    def allow_request(self) -> bool:
+        """True si un appel peut partir. En semi-ouvert, réserve un des appels de test."""
+        with self._lock:
+            state = self._current_state()
+            if state == CircuitState.CLOSED:
+                return True
+            if state == CircuitState.HALF_OPEN:
+                # Un appel de test sans issue (annulé, réponse inexploitable) ne
+                # bloque pas le disjoncteur : son créneau expire avec la période.
+                if (self._probes_in_flight < self.half_open_probes
+                        or self._clock() - self._probe_started_at >= self.recovery_seconds):
+                    if self._probes_in_flight >= self.half_open_probes:
+                        self._probes_in_flight = 0
+                    self._probes_in_flight += 1
+                    self._probe_started_at = self._clock()
+                    return True
+            self.rejected_calls += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._consecutive_failures = 0
+            self.last_error = None
+            self._transition(CircuitState.CLOSED)
+
+    def record_failure(self, error: Optional[str] = None) -> None:
+        with self._lock:
+            self._consecutive_failures += 1
+            self.last_error = error
+            state = self._current_state()
+            if state == CircuitState.HALF_OPEN:
+                self._transition(CircuitState.OPEN)
+            elif state == CircuitState.CLOSED and self._consecutive_failures >= self.failure_threshold:
+                self._transition(CircuitState.OPEN)
+
+    def retry_after_seconds(self) -> float:
+        with self._lock:
+            if self._current_state() != CircuitState.OPEN:
+                return 0.0
+            return max(0.0, self.recovery_seconds - (self._clock() - self._opened_at))
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            state = self._current_state()
+            return {
+                "key": self.key,
+                "state": state.value,
+                "consecutive_failures": self._consecutive_failures,
+                "rejected_calls": self.rejected_calls,
+                "last_error": self.last_error,
+            }
+
+
+class CircuitBreakerRegistry:
+    """Un disjoncteur par clé (URL d'agent), créé à la demande."""
+
+    def __init__(self, **breaker_kwargs):
+        self._breaker_kwargs = breaker_kwargs
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._listeners: List[TransitionListener] = []
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> CircuitBreaker:
+        key = key.rstrip("/")
+        with self._lock:
+            breaker = self._breakers.get(key)
+            if breaker is None:
+                breaker = CircuitBreaker(key, on_transition=self._notify, **self._breaker_kwargs)
+                self._breakers[key] = breaker
+            return breaker
+
+    def is_open(self, key: str) -> bool:
+        """True si les appels vers `key` sont actuellement refusés (sans réserver d'appel de test)."""
+        with self._lock:
+            breaker = self._breakers.get(key.rstrip("/"))
+        return breaker is not None and breaker.state == CircuitState.OPEN
+
+    def add_transition_listener(self, listener: TransitionListener) -> None:
+        with self._lock:
+            if listener not in self._listeners:
+                self._listeners.append(listener)
+
+    def _notify(self, breaker: CircuitBreaker, old_state: CircuitState, new_state: CircuitState) -> None:
+        # Appelé sous le verrou du disjoncteur : les écouteurs ne doivent pas le rappeler.
+        for listener in list(self._listeners):
+            listener(breaker, old_state, new_state)
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return [breaker.to_dict() for breaker in breakers]
+
+
+_registry = CircuitBreakerRegistry()
+
+
+def get_circuit_breaker(key: str) -> CircuitBreaker:
+    return _registry.get(key)
+
+
+def get_circuit_breaker_registry() -> CircuitBreakerRegistry:
+    return _registry
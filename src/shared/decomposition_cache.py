@@ -0,0 +1,88 @@
+"""
+Cache des décompositions TEAM 2, adressé par contenu.
+
+La clé est l'empreinte SHA-256 du texte final du plan TEAM 1 et de la liste
+(triée) des compétences d'exécution disponibles : un même plan validé, relancé
+avec les mêmes agents, reçoit la même liste de tâches sans nouvel appel au
+DecompositionAgent. Seule la liste de tâches au format de l'agent (ID locaux)
+est conservée ; le superviseur reconstruit le graphe avec de nouveaux ID globaux.
+
+Variables d'environnement :
+    DECOMPOSITION_CACHE_ENABLED      "false" pour désactiver le cache (défaut : activé)
+    DECOMPOSITION_CACHE_TTL_SECONDS  durée de validité d'une entrée (défaut : 7 jours, 0 = illimitée)
+"""
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+from src.shared.graph_storage import GraphStorageBackend, get_graph_storage
+
+logger = logging.getLogger(__name__)
+
+DECOMPOSITION_CACHE_COLLECTION = "decomposition_cache"
+DECOMPOSITION_CACHE_ENABLED = os.environ.get("DECOMPOSITION_CACHE_ENABLED", "true").lower() not in ("0", "false", "no")
+DECOMPOSITION_CACHE_TTL_SECONDS = float(os.environ.get("DECOMPOSITION_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+
+
+class DecompositionCache:
+    def __init__(
+        self,
+        storage: Optional[GraphStorageBackend] = None,
+        enabled: bool = DECOMPOSITION_CACHE_ENABLED,
+        ttl_seconds: float = DECOMPOSITION_CACHE_TTL_SECONDS,
+    ):
+        self._storage = storage
+        self.enabled = enabled
+        self.ttl_seconds = ttl_seconds
+
+    @property
+    def storage(self) -> GraphStorageBackend:
+        if self._storage is None:
+            self._storage = get_graph_storage()
+        return self._storage
+
+    @staticmethod
+    def key(plan_text: str, available_skills: List[str]) -> str:
+        payload = json.dumps(
+            {"plan": plan_text.strip(), "skills": sorted(set(available_skills))},
+            ensure_ascii=False,
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        """Liste de tâches mémorisée pour cette clé, ou None (absente, expirée ou cache désactivé)."""
+        if not self.enabled:
+            return None
+        try:
+            entry = self.storage.load(DECOMPOSITION_CACHE_COLLECTION, key)
+        except Exception as e:
+            logger.warning(f"Lecture du cache de décomposition impossible: {e}")
+            return None
+        if not entry or not isinstance(entry.get("tasks"), list):
+            return None
+        if self.ttl_seconds and time.time() - float(entry.get("stored_at", 0)) > self.ttl_seconds:
+            logger.info(f"Entrée de cache de décomposition {key[:12]} expirée.")
+            return None
+        return entry["tasks"]
+
+    def put(self, key: str, tasks: List[Dict[str, Any]]) -> None:
+        if not self.enabled or not tasks:
+            return
+        try:
+            self.storage.save(
+                DECOMPOSITION_CACHE_COLLECTION,
+                key,
+                {"tasks": tasks, "task_count": len(tasks), "stored_at": time.time()},
+            )
+        except Exception as e:
+            logger.warning(f"Écriture du cache de décomposition impossible: {e}")
+
+    def invalidate(self, key: str) -> None:
+        try:
+            self.storage.delete(DECOMPOSITION_CACHE_COLLECTION, key)
+        except Exception as e:
+            logger.warning(f"Invalidation du cache de décomposition impossible: {e}")
@@ -0,0 +1,189 @@
+"""
+Ordonnancement des tâches d'exécution prêtes (TEAM 2).
+
+Les tâches READY sont classées par longueur du chemin critique restant : somme
+des latences estimées le long de la plus longue chaîne de dépendants encore à
+exécuter. La latence d'une tâche est estimée par compétence (moyenne mobile
+exponentielle des durées observées). À égalité, la tâche qui débloque le plus
+de dépendants passe en premier, puis l'ordre d'insertion est conservé.
+"""
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src.shared.execution_task_graph_management import ExecutionTaskNode, ExecutionTaskState
+from src.shared.graph_analysis import DagValidationError, topological_levels
+from src.shared.graph_storage import GraphStorageBackend, get_graph_storage
+
+logger = logging.getLogger(__name__)
+
+SKILL_LATENCY_COLLECTION = "skill_latency_stats"
+SKILL_LATENCY_DOC_ID = "execution_tasks"
+SKILL_LATENCY_EWMA_ALPHA = float(os.environ.get("SKILL_LATENCY_EWMA_ALPHA", "0.3"))
+# Intervalle minimal entre deux écritures des statistiques (les mesures intermédiaires sont regroupées).
+SKILL_LATENCY_FLUSH_INTERVAL_SECONDS = float(os.environ.get("SKILL_LATENCY_FLUSH_INTERVAL_SECONDS", "30"))
+DEFAULT_TASK_WEIGHT = 1.0
+
+_TERMINAL_STATES = {
+    ExecutionTaskState.COMPLETED.value,
+    ExecutionTaskState.FAILED.value,
+    ExecutionTaskState.BLOCKED.value,
+    ExecutionTaskState.CANCELLED.value,
+}
+
+
+class SkillLatencyTracker:
+    """
+    Latence historique par compétence (EWMA, en secondes), partagée entre plans.
+    Les statistiques sont chargées paresseusement depuis le backend de stockage
+    des graphes. Les mesures sont regroupées : le document est réécrit au plus une
+    fois par `flush_interval_seconds`, et par `flush()` en fin d'exécution.
+    """
+
+    def __init__(
+        self,
+        storage: Optional[GraphStorageBackend] = None,
+        alpha: float = SKILL_LATENCY_EWMA_ALPHA,
+        flush_interval_seconds: float = SKILL_LATENCY_FLUSH_INTERVAL_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._storage = storage
+        self.alpha = alpha
+        self.flush_interval_seconds = flush_interval_seconds
+        self._clock = clock
+        self._stats: Optional[Dict[str, Dict[str, Any]]] = None
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._last_flush = float("-inf")
+
+    @property
+    def storage(self) -> GraphStorageBackend:
+        if self._storage is None:
+            self._storage = get_graph_storage()
+        return self._storage
+
+    def _ensure_loaded(self) -> Dict[str, Dict[str, Any]]:
+        if self._stats is None:
+            try:
+                data = self.storage.load(SKILL_LATENCY_COLLECTION, SKILL_LATENCY_DOC_ID) or {}
+            except Exception as e:
+                logger.warning(f"Lecture des latences par compétence impossible: {e}")
+                data = {}
+            self._stats = data.get("skills", {})
+        return self._stats
+
+    def estimate(self, skill: Optional[str]) -> float:
+        """Latence estimée pour une compétence ; moyenne des compétences connues sinon."""
+        with self._lock:
+            stats = self._ensure_loaded()
+            if skill and skill in stats:
+                return float(stats[skill]["ewma_seconds"])
+            if stats:
+                return sum(float(s["ewma_seconds"]) for s in stats.values()) / len(stats)
+            return DEFAULT_TASK_WEIGHT
+
+    def record(self, skill: Optional[str], duration_seconds: float) -> None:
+        if not skill or duration_seconds < 0:
+            return
+        with self._lock:
+            stats = self._ensure_loaded()
+            entry = stats.get(skill)
+            if entry is None:
+                entry = {"ewma_seconds": float(duration_seconds), "samples": 0}
+            else:
+                entry["ewma_seconds"] = (
+                    self.alpha * float(duration_seconds) + (1 - self.alpha) * float(entry["ewma_seconds"])
+                )
+            entry["samples"] = int(entry.get("samples", 0)) + 1
+            entry["last_seconds"] = round(float(duration_seconds), 3)
+            stats[skill] = entry
+            self._dirty = True
+            due = self._clock() - self._last_flush >= self.flush_interval_seconds
+        if due:
+            self.flush()
+
+    def flush(self) -> bool:
+        """Écrit les statistiques si des mesures sont en attente ; retourne True si une écriture a eu lieu."""
+        with self._lock:
+            if not self._dirty or self._stats is None:
+                return False
+            snapshot = {"skills": {k: dict(v) for k, v in self._stats.items()}}
+            self._dirty = False
+            self._last_flush = self._clock()
+        try:
+            self.storage.save(SKILL_LATENCY_COLLECTION, SKILL_LATENCY_DOC_ID, snapshot)
+            return True
+        except Exception as e:
+            logger.warning(f"Enregistrement des latences par compétence impossible: {e}")
+            with self._lock:
+                self._dirty = True
+            return False
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {k: dict(v) for k, v in self._ensure_loaded().items()}
+
+
+class CriticalPathScheduler:
+    """Classe les tâches READY d'un ExecutionTaskGraph par chemin critique restant."""
+
+    def __init__(self, latency_tracker: Optional[SkillLatencyTracker] = None):
+        self.latency_tracker = latency_tracker or get_skill_latency_tracker()
+
+    def compute_priorities(self, graph_data: Dict[str, Any]) -> Dict[str, Tuple[float, int]]:
+        """Retourne {task_id: (chemin critique restant, nombre de dépendants)} pour les tâches non terminales."""
+        nodes = graph_data.get("nodes", {})
+        pending = {
+            task_id: node_data for task_id, node_data in nodes.items()
+            if node_data.get("state") not in _TERMINAL_STATES
+        }
+        dependents: Dict[str, List[str]] = {task_id: [] for task_id in pending}
+        for task_id, node_data in pending.items():
+            for dep_id in node_data.get("dependencies") or []:
+                if dep_id in dependents:
+                    dependents[dep_id].append(task_id)
+
+        try:
+            levels = topological_levels(
+                {task_id: list(node_data.get("dependencies") or []) for task_id, node_data in pending.items()}
+            )
+        except DagValidationError as e:
+            logger.warning(f"Graphe cyclique, priorités neutres: {e}")
+            return {task_id: (0.0, len(dependents[task_id])) for task_id in pending}
+
+        remaining: Dict[str, float] = {}
+        for task_id in sorted(levels, key=levels.get, reverse=True):
+            weight = self.latency_tracker.estimate(pending[task_id].get("assigned_agent_type"))
+            downstream = max((remaining[d] for d in dependents[task_id]), default=0.0)
+            remaining[task_id] = weight + downstream
+        return {task_id: (remaining[task_id], len(dependents[task_id])) for task_id in pending}
+
+    def rank(self, ready_tasks: List[ExecutionTaskNode], graph_data: Dict[str, Any]) -> List[ExecutionTaskNode]:
+        priorities = self.compute_priorities(graph_data)
+
+        def sort_key(task: ExecutionTaskNode):
+            remaining, dependents_count = priorities.get(task.id, (0.0, 0))
+            return (-remaining, -dependents_count)
+
+        ranked = sorted(ready_tasks, key=sort_key)
+        logger.debug(
+            "Ordre de dispatch: "
+            + ", ".join(f"{t.id}({priorities.get(t.id, (0.0, 0))[0]:.1f})" for t in ranked)
+        )
+        return ranked
+
+
+_tracker_instance: Optional[SkillLatencyTracker] = None
+_tracker_lock = threading.Lock()
+
+
+def get_skill_latency_tracker() -> SkillLatencyTracker:
+    """Retourne le suivi de latence partagé du processus."""
+    global _tracker_instance
+    if _tracker_instance is None:
+        with _tracker_lock:
+            if _tracker_instance is None:
+                _tracker_instance = SkillLatencyTracker()
+    return _tracker_instance
@@ -1,14 +1,27 @@
 from typing import Optional, Dict, List, Any, Union
 from enum import Enum
 from datetime import datetime
+from contextlib import contextmanager
 import uuid
-import firebase_admin
-from firebase_admin import firestore
 import logging
+import time
+
+from src.shared.graph_analysis import compute_dag_metrics, dependencies_from_graph_nodes
+from src.shared.graph_storage import GraphStorageBackend, get_graph_storage
 
 logger = logging.getLogger(__name__)
 
-from src.shared.firebase_init import db
+EXECUTION_TASK_GRAPHS_COLLECTION = "execution_task_graphs"
+
+# Clés de `meta` tenues par la politique de relance automatique.
+META_LAST_ERROR = "last_error"
+META_ERROR_CODE = "error_code"
+META_FAILURE_CLASS = "failure_class"
+META_RETRY_ATTEMPTS = "retry_attempts"
+META_RETRY_NOT_BEFORE = "retry_not_before"
+_RETRY_META_KEYS = (
+    META_LAST_ERROR, META_ERROR_CODE, META_FAILURE_CLASS, META_RETRY_ATTEMPTS, META_RETRY_NOT_BEFORE
+)
 
 class ExecutionTaskType(str, Enum):
     EXECUTABLE = "executable"
@@ -28,6 +41,40 @@ class ExecutionTaskState(str, Enum):
     CANCELLED = "cancelled"
 
 class ExecutionTaskNode:
+    """
+    Noeud du graphe d'exécution. La représentation est compacte : attributs en
+    __slots__, et sérialisation sans les champs vides. Les transitions d'état ne
+    sont pas stockées dans le noeud : elles sont accumulées dans pending_events
+    puis ajoutées au journal d'événements du plan lors de l'enregistrement.
+    """
+
+    __slots__ = (
+        "id",
+        "objective",
+        "task_type",
+        "parent_id",
+        "sub_task_ids",
+        "state",
+        "dependencies",
+        "assigned_agent_type",
+        "assigned_agent_id",
+        "input_data_refs",
+        "output_artifact_ref",
+        "result_summary",
+        "meta",
+        "created_at",
+        "updated_at",
+        "pending_events",
+    )
+
+    _OPTIONAL_SCALAR_FIELDS = (
+        "parent_id",
+        "assigned_agent_type",
+        "assigned_agent_id",
+        "output_artifact_ref",
+        "result_summary",
+    )
+
     def __init__(
         self,
         task_id: str,
@@ -55,15 +102,16 @@ class ExecutionTaskNode:
         self.output_artifact_ref: Optional[str] = None
         self.result_summary: Optional[str] = None
 
-        self.history: List[Dict[str, Any]] = []
         self.meta: Dict[str, Any] = meta if meta is not None else {}
         self.created_at: str = datetime.utcnow().isoformat()
         self.updated_at: str = self.created_at
+        self.pending_events: List[Dict[str, Any]] = []
 
     def update_state(self, new_state: ExecutionTaskState, details: Optional[str] = None):
         now = datetime.utcnow().isoformat()
         old_state = self.state
-        self.history.append({
+        self.pending_events.append({
+            "task_id": self.id,
             "from_state": str(old_state.value),
             "to_state": str(new_state.value),
             "timestamp": now,
@@ -73,57 +121,115 @@ class ExecutionTaskNode:
         self.updated_at = now
 
     def to_dict(self) -> Dict[str, Any]:
-        data = self.__dict__.copy()
-        data['task_type'] = self.task_type.value
-        data['state'] = self.state.value
-        data['output_artifact_ref'] = self.output_artifact_ref 
-
+        data: Dict[str, Any] = {
+            "id": self.id,
+            "objective": self.objective,
+            "task_type": self.task_type.value,
+            "state": self.state.value,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+        for field in self._OPTIONAL_SCALAR_FIELDS:
+            value = getattr(self, field)
+            if value is not None:
+                data[field] = value
+        if self.sub_task_ids:
+            data["sub_task_ids"] = list(self.sub_task_ids)
+        if self.dependencies:
+            data["dependencies"] = list(self.dependencies)
+        if self.input_data_refs:
+            data["input_data_refs"] = dict(self.input_data_refs)
+        if self.meta:
+            data["meta"] = dict(self.meta)
         return data
 
     @staticmethod
     def from_dict(data: Dict[str, Any]) -> 'ExecutionTaskNode':
         node = ExecutionTaskNode(
             task_id=data['id'],
-            objective=data['objective'],
-            task_type=ExecutionTaskType(data['task_type'])
+            objective=data.get('objective', ''),
+            task_type=ExecutionTaskType(data['task_type']),
+            parent_id=data.get('parent_id'),
+            dependencies=list(data.get('dependencies') or []),
+            assigned_agent_type=data.get('assigned_agent_type'),
+            meta=dict(data.get('meta') or {}),
+            input_data_refs=dict(data.get('input_data_refs') or {}),
         )
-        
-        for key, value in data.items():
-            if key in ['id', 'objective', 'task_type']:
-                continue
-            
-            if key == 'state':
-                if value is not None:
-                    try:
-                        node.state = ExecutionTaskState(value)
-                    except ValueError:
-                        logger.error(f"Valeur d'état invalide '{value}' pour la tâche {data.get('id')}. Conservation de PENDING.")
-                        node.state = ExecutionTaskState.PENDING
-                continue
-            
-            if hasattr(node, key):
-                setattr(node, key, value)
+        node.sub_task_ids = list(data.get('sub_task_ids') or [])
+        node.assigned_agent_id = data.get('assigned_agent_id')
+        node.output_artifact_ref = data.get('output_artifact_ref')
+        node.result_summary = data.get('result_summary')
+        node.created_at = data.get('created_at', node.created_at)
+        node.updated_at = data.get('updated_at', node.created_at)
+
+        state_value = data.get('state')
+        if state_value is not None:
+            try:
+                node.state = ExecutionTaskState(state_value)
+            except ValueError:
+                logger.error(f"Valeur d'état invalide '{state_value}' pour la tâche {data.get('id')}. Conservation de PENDING.")
+                node.state = ExecutionTaskState.PENDING
 
-        node.dependencies = data.get('dependencies', [])
-        node.sub_task_ids = data.get('sub_task_ids', [])
-        node.history = data.get('history', [])
-        node.input_data_refs = data.get('input_data_refs', {})
-        node.meta = data.get('meta', {})
+        # Documents antérieurs au journal d'événements : l'historique embarqué est
+        # migré vers le journal au prochain enregistrement du noeud.
+        legacy_history = data.get('history')
+        if legacy_history:
+            node.pending_events = [{"task_id": node.id, **entry} for entry in legacy_history]
 
         return node
 
 class ExecutionTaskGraph:
-    def __init__(self, execution_plan_id: str):
+    def __init__(self, execution_plan_id: str, storage: Optional[GraphStorageBackend] = None):
         if not execution_plan_id:
             raise ValueError("Un execution_plan_id est requis.")
         self.execution_plan_id = execution_plan_id
-        self.collection_ref = db.collection("execution_task_graphs") 
-        self.doc_ref = self.collection_ref.document(self.execution_plan_id)
+        self.storage = storage or get_graph_storage()
+        self.collection_name = EXECUTION_TASK_GRAPHS_COLLECTION
         self.logger = logging.getLogger(f"{__name__}.ExecutionTaskGraph.{self.execution_plan_id}")
+        self._uow_data: Optional[Dict[str, Any]] = None
+        self._uow_dirty = False
+        self._uow_events: List[Dict[str, Any]] = []
+
+    @contextmanager
+    def unit_of_work(self):
+        """
+        Regroupe plusieurs mutations du graphe en une seule lecture et une seule écriture.
+
+        À l'intérieur du bloc, toutes les méthodes du graphe travaillent sur une copie
+        en mémoire chargée une fois ; le document est écrit en une seule fois à la
+        sortie du bloc (et abandonné si une exception est levée). Les entrées
+        d'historique sont ajoutées dans l'ordre des appels. Les blocs imbriqués
+        rejoignent le bloc englobant. Le bloc ne doit pas englober d'attente réseau :
+        une autre coroutine utilisant la même instance verrait l'état non commité.
+        """
+        if self._uow_data is not None:
+            yield self
+            return
+
+        self._uow_data = self._load_or_create_graph_data()
+        self._uow_dirty = False
+        self._uow_events = []
+        try:
+            yield self
+            graph_data, events = self._uow_data, self._uow_events
+            self._uow_data = None
+            if self._uow_dirty:
+                self._write_graph_data(graph_data)
+            if events:
+                self.storage.append_events(self.collection_name, self.execution_plan_id, events)
+        finally:
+            self._uow_data = None
+            self._uow_dirty = False
+            self._uow_events = []
 
     def _get_graph_data(self) -> Dict[str, Any]:
-        doc = self.doc_ref.get()
-        if not doc.exists:
+        if self._uow_data is not None:
+            return self._uow_data
+        return self._load_or_create_graph_data()
+
+    def _load_or_create_graph_data(self) -> Dict[str, Any]:
+        graph_data = self.storage.load(self.collection_name, self.execution_plan_id)
+        if graph_data is None:
             initial_data = {
                 "execution_plan_id": self.execution_plan_id,
                 "root_task_ids": [],
@@ -132,13 +238,20 @@ class ExecutionTaskGraph:
                 "updated_at": datetime.utcnow().isoformat(),
                 "overall_status": "PENDING"
             }
-            self.doc_ref.set(initial_data)
+            self.storage.save(self.collection_name, self.execution_plan_id, initial_data)
             return initial_data
-        return doc.to_dict()
+        return graph_data
 
     def _save_graph_data(self, graph_data: Dict[str, Any]):
+        if self._uow_data is not None:
+            self._uow_data = graph_data
+            self._uow_dirty = True
+            return
+        self._write_graph_data(graph_data)
+
+    def _write_graph_data(self, graph_data: Dict[str, Any]):
         graph_data['updated_at'] = datetime.utcnow().isoformat()
-        self.doc_ref.set(graph_data)
+        self.storage.save(self.collection_name, self.execution_plan_id, graph_data)
 
     def add_task(self, task_node: ExecutionTaskNode, is_root: bool = False):
         self.logger.debug(f"[{self.execution_plan_id}] ExecutionTaskGraph.add_task pour {task_node.id}, état: {task_node.state.value}, output_artifact_ref initial: {task_node.output_artifact_ref}")
@@ -153,12 +266,103 @@ class ExecutionTaskGraph:
             graph_data.setdefault("root_task_ids", []).append(task_node.id)
         
         if task_node.parent_id and task_node.parent_id in nodes:
-            if task_node.id not in nodes[task_node.parent_id]['sub_task_ids']:
-                 nodes[task_node.parent_id]['sub_task_ids'].append(task_node.id)
+            parent_sub_tasks = nodes[task_node.parent_id].setdefault('sub_task_ids', [])
+            if task_node.id not in parent_sub_tasks:
+                parent_sub_tasks.append(task_node.id)
 
+        self._index_dependencies(graph_data, task_node)
         self._save_graph_data(graph_data)
+        self._record_events(task_node)
         return task_node
 
+    def add_tasks(self, task_nodes: List[ExecutionTaskNode], root_task_ids: Optional[List[str]] = None) -> List[ExecutionTaskNode]:
+        """
+        Ajoute un lot de nouvelles tâches en une seule écriture du graphe.
+
+        Les références (parent, dépendances) doivent pointer vers une tâche déjà
+        présente dans le graphe ou vers une tâche du lot ; sinon une ValueError est
+        levée avant toute modification. Les sub_task_ids des parents et l'index des
+        dépendants sont mis à jour dans le même commit.
+        """
+        if not task_nodes:
+            return []
+        root_task_ids = root_task_ids or []
+
+        with self.unit_of_work():
+            graph_data = self._get_graph_data()
+            nodes = graph_data.setdefault("nodes", {})
+
+            batch_ids = [node.id for node in task_nodes]
+            if len(set(batch_ids)) != len(batch_ids):
+                raise ValueError(f"Identifiants de tâches dupliqués dans le lot pour le plan {self.execution_plan_id}.")
+            already_present = [task_id for task_id in batch_ids if task_id in nodes]
+            if already_present:
+                raise ValueError(f"Tâches déjà présentes dans le graphe {self.execution_plan_id}: {already_present}")
+
+            known_ids = set(nodes) | set(batch_ids)
+            for node in task_nodes:
+                if node.parent_id and node.parent_id not in known_ids:
+                    raise ValueError(f"Parent '{node.parent_id}' introuvable pour la tâche {node.id}.")
+                if node.id in node.dependencies:
+                    raise ValueError(f"La tâche {node.id} dépend d'elle-même.")
+                missing_deps = [dep_id for dep_id in node.dependencies if dep_id not in known_ids]
+                if missing_deps:
+                    raise ValueError(f"Dépendances introuvables pour la tâche {node.id}: {missing_deps}")
+
+            for node in task_nodes:
+                nodes[node.id] = node.to_dict()
+
+            root_ids = graph_data.setdefault("root_task_ids", [])
+            for node in task_nodes:
+                if node.id in root_task_ids and node.id not in root_ids:
+                    root_ids.append(node.id)
+                if node.parent_id:
+                    parent_sub_tasks = nodes[node.parent_id].setdefault('sub_task_ids', [])
+                    if node.id not in parent_sub_tasks:
+                        parent_sub_tasks.append(node.id)
+                self._index_dependencies(graph_data, node)
+
+            self._save_graph_data(graph_data)
+            for node in task_nodes:
+                self._record_events(node)
+
+        self.logger.debug(f"[{self.execution_plan_id}] add_tasks: {len(task_nodes)} tâche(s) ajoutée(s) en un seul commit.")
+        return task_nodes
+
+    def _record_events(self, task_node: ExecutionTaskNode):
+        if not task_node.pending_events:
+            return
+        events, task_node.pending_events = task_node.pending_events, []
+        if self._uow_data is not None:
+            self._uow_events.extend(events)
+        else:
+            self.storage.append_events(self.collection_name, self.execution_plan_id, events)
+
+    def get_task_history(self, task_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Lit le journal des transitions du plan (toutes les tâches, ou une seule)."""
+        events = self.storage.load_events(self.collection_name, self.execution_plan_id)
+        if task_id is None:
+            return events
+        return [event for event in events if event.get("task_id") == task_id]
+
+    @staticmethod
+    def _index_dependencies(graph_data: Dict[str, Any], task_node: ExecutionTaskNode):
+        dependents_index = graph_data.setdefault("dependents_index", {})
+        for dep_id in task_node.dependencies:
+            dependents = dependents_index.setdefault(dep_id, [])
+            if task_node.id not in dependents:
+                dependents.append(task_node.id)
+
+    def get_dependents(self, task_id: str) -> List[str]:
+        graph_data = self._get_graph_data()
+        if "dependents_index" in graph_data:
+            return list(graph_data["dependents_index"].get(task_id, []))
+        # Graphes créés avant l'index : reconstruction par parcours des noeuds.
+        return [
+            node_id for node_id, node_data in graph_data.get("nodes", {}).items()
+            if task_id in node_data.get("dependencies", [])
+        ]
+
     def get_task(self, task_id: str) -> Optional[ExecutionTaskNode]:
         graph_data = self._get_graph_data()
         node_data = graph_data.get("nodes", {}).get(task_id)
@@ -184,6 +388,10 @@ class ExecutionTaskGraph:
 
 
     def get_ready_tasks(self) -> List[ExecutionTaskNode]:
+        with self.unit_of_work():
+            return self._collect_ready_tasks()
+
+    def _collect_ready_tasks(self) -> List[ExecutionTaskNode]:
         graph_data = self._get_graph_data()
         nodes_dict = graph_data.get("nodes", {})
         ready_tasks = []
@@ -194,6 +402,10 @@ class ExecutionTaskGraph:
             self.logger.debug(f"get_ready_tasks: Examen noeud '{node_id}', État brut DB: '{current_node_state_from_db}'")
             
             if current_node_state_from_db == ExecutionTaskState.PENDING.value:
+                retry_not_before = (node_data.get("meta") or {}).get(META_RETRY_NOT_BEFORE)
+                if retry_not_before and float(retry_not_before) > time.time():
+                    self.logger.debug(f"get_ready_tasks: Noeud '{node_id}' en attente de relance (backoff).")
+                    continue
                 node = ExecutionTaskNode.from_dict(node_data)
 
                 self.logger.debug(f"get_ready_tasks: Noeud '{node_id}' est PENDING. Vérification dépendances...")
@@ -229,21 +441,113 @@ class ExecutionTaskGraph:
         self.logger.debug(f"get_ready_tasks: Tâches prêtes trouvées pour {self.execution_plan_id}: {[t.id for t in ready_tasks]}")
         return ready_tasks
 
-    def update_task_state(self, task_id: str, new_state: ExecutionTaskState, details: Optional[str] = None):
+    def update_task_state(
+        self,
+        task_id: str,
+        new_state: ExecutionTaskState,
+        details: Optional[str] = None,
+        error_code: Optional[str] = None,
+    ):
         task_node = self.get_task(task_id)
         if not task_node:
             self.logger.error(f"[{self.execution_plan_id}] Tâche {task_id} non trouvée dans update_task_state.")
             raise ValueError(f"Tâche d'exécution {task_id} introuvable pour update_task_state.")
 
+        if new_state == ExecutionTaskState.FAILED:
+            task_node.meta[META_LAST_ERROR] = details
+            if error_code:
+                task_node.meta[META_ERROR_CODE] = error_code
+            else:
+                task_node.meta.pop(META_ERROR_CODE, None)
+        elif new_state == ExecutionTaskState.PENDING:
+            # Remise à zéro explicite (relance manuelle) : nouveau budget de relances.
+            for key in _RETRY_META_KEYS:
+                task_node.meta.pop(key, None)
         task_node.update_state(new_state, details)
         task_node.updated_at = datetime.utcnow().isoformat()
         self.add_task(task_node)
 
+    def schedule_retry(self, task_id: str, failure_class: str, attempt: int, delay_seconds: float, details: Optional[str] = None):
+        """Repasse une tâche FAILED à PENDING, éligible au dispatch après `delay_seconds`."""
+        task_node = self.get_task(task_id)
+        if not task_node:
+            raise ValueError(f"Tâche d'exécution {task_id} introuvable pour schedule_retry.")
+        task_node.meta[META_FAILURE_CLASS] = failure_class
+        task_node.meta[META_RETRY_ATTEMPTS] = attempt
+        task_node.meta[META_RETRY_NOT_BEFORE] = time.time() + delay_seconds
+        task_node.update_state(ExecutionTaskState.PENDING, details)
+        self.add_task(task_node)
+
+    def block_dependents(self, task_id: str, details: Optional[str] = None) -> List[str]:
+        """Passe à BLOCKED tous les dépendants (transitifs) non terminaux d'une tâche en échec définitif."""
+        terminal_states = {
+            ExecutionTaskState.COMPLETED.value,
+            ExecutionTaskState.FAILED.value,
+            ExecutionTaskState.BLOCKED.value,
+            ExecutionTaskState.CANCELLED.value,
+        }
+        blocked_ids: List[str] = []
+        with self.unit_of_work():
+            nodes = self._get_graph_data().get("nodes", {})
+            to_visit = list(self.get_dependents(task_id))
+            seen = set()
+            while to_visit:
+                dependent_id = to_visit.pop()
+                if dependent_id in seen:
+                    continue
+                seen.add(dependent_id)
+                node_data = nodes.get(dependent_id)
+                if not node_data or node_data.get("state") in terminal_states:
+                    continue
+                self.update_task_state(
+                    dependent_id,
+                    ExecutionTaskState.BLOCKED,
+                    details or f"Dépendance {task_id} en échec définitif.",
+                )
+                blocked_ids.append(dependent_id)
+                to_visit.extend(self.get_dependents(dependent_id))
+        return blocked_ids
+
     def set_overall_status(self, status: str):
         graph_data = self._get_graph_data()
         graph_data["overall_status"] = status
         self._save_graph_data(graph_data)
 
+    def cancel_open_tasks(self, details: str = "Plan annulé.") -> List[str]:
+        """Passe toutes les tâches non terminales à CANCELLED et le plan au statut CANCELLED."""
+        terminal_states = {
+            ExecutionTaskState.COMPLETED.value,
+            ExecutionTaskState.FAILED.value,
+            ExecutionTaskState.BLOCKED.value,
+            ExecutionTaskState.CANCELLED.value,
+        }
+        cancelled_ids = []
+        with self.unit_of_work():
+            for task_id, node_data in list(self._get_graph_data().get("nodes", {}).items()):
+                if node_data.get("state") not in terminal_states:
+                    self.update_task_state(task_id, ExecutionTaskState.CANCELLED, details)
+                    cancelled_ids.append(task_id)
+            self.set_overall_status("CANCELLED")
+        self.logger.info(f"[{self.execution_plan_id}] Plan annulé, {len(cancelled_ids)} tâche(s) passée(s) à CANCELLED.")
+        return cancelled_ids
+
+    def save_supervisor_checkpoint(self, checkpoint: Dict[str, Any]):
+        """Range l'état du superviseur (table des ID locaux, cycle, dispatchs en cours) dans l'en-tête."""
+        graph_data = self._get_graph_data()
+        graph_data["supervisor_checkpoint"] = {**checkpoint, "updated_at": datetime.utcnow().isoformat()}
+        self._save_graph_data(graph_data)
+
+    def load_supervisor_checkpoint(self) -> Dict[str, Any]:
+        return dict(self._get_graph_data().get("supervisor_checkpoint") or {})
+
+    def refresh_dag_metrics(self, weights: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+        """Recalcule les métriques du DAG (niveaux, chemin critique, largeur) et les range dans l'en-tête."""
+        graph_data = self._get_graph_data()
+        metrics = compute_dag_metrics(dependencies_from_graph_nodes(graph_data.get("nodes", {})), weights)
+        graph_data["dag_metrics"] = metrics
+        self._save_graph_data(graph_data)
+        return metrics
+
     def as_dict(self) -> Dict[str, Any]:
         return self._get_graph_data()
     
\ No newline at end of file
@@ -0,0 +1,185 @@
+"""
+Analyse des graphes de dépendances produits par la décomposition.
+
+Les fonctions travaillent sur une table {task_id: [ids des dépendances]} et sont
+indépendantes du stockage : elles servent à valider un lot de tâches avant son
+insertion, puis à calculer les métriques du DAG (niveaux, chemin critique,
+largeur) conservées dans l'en-tête du graphe d'exécution.
+"""
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class DagValidationError(ValueError):
+    """Lot de tâches inutilisable : cycle de dépendances ou références non résolues."""
+
+    def __init__(
+        self,
+        message: str,
+        cycle: Optional[List[str]] = None,
+        unresolved: Optional[Dict[str, List[str]]] = None,
+    ):
+        super().__init__(message)
+        self.cycle = cycle or []
+        self.unresolved = unresolved or {}
+
+
+def find_unresolved_references(
+    dependencies: Dict[str, List[str]], known_ids: Iterable[str]
+) -> Dict[str, List[str]]:
+    """Retourne, par tâche, les dépendances qui ne désignent aucune tâche connue."""
+    known = set(known_ids) | set(dependencies)
+    unresolved = {}
+    for task_id, deps in dependencies.items():
+        missing = [dep_id for dep_id in deps if dep_id not in known]
+        if missing:
+            unresolved[task_id] = missing
+    return unresolved
+
+
+def find_cycle(dependencies: Dict[str, List[str]]) -> Optional[List[str]]:
+    """
+    Cherche un cycle (parcours en profondeur itératif). Retourne la liste des
+    tâches du cycle, la première étant répétée en fin de liste, ou None.
+    Les dépendances vers des tâches absentes de la table sont ignorées.
+    """
+    WHITE, GREY, BLACK = 0, 1, 2
+    color = {task_id: WHITE for task_id in dependencies}
+
+    for start in dependencies:
+        if color[start] != WHITE:
+            continue
+        path = [start]
+        stack = [iter(dependencies[start])]
+        color[start] = GREY
+        while stack:
+            advanced = False
+            for dep_id in stack[-1]:
+                if dep_id not in color:
+                    continue
+                if color[dep_id] == GREY:
+                    return path[path.index(dep_id):] + [dep_id]
+                if color[dep_id] == WHITE:
+                    color[dep_id] = GREY
+                    path.append(dep_id)
+                    stack.append(iter(dependencies[dep_id]))
+                    advanced = True
+                    break
+            if not advanced:
+                color[path.pop()] = BLACK
+                stack.pop()
+    return None
+
+
+def validate_dependencies(
+    dependencies: Dict[str, List[str]], known_ids: Iterable[str] = ()
+) -> None:
+    """Lève DagValidationError si le lot référence des tâches inconnues ou contient un cycle."""
+    unresolved = find_unresolved_references(dependencies, known_ids)
+    if unresolved:
+        raise DagValidationError(
+            f"Références de dépendances non résolues: {unresolved}", unresolved=unresolved
+        )
+    cycle = find_cycle(dependencies)
+    if cycle:
+        raise DagValidationError(
+            f"Cycle de dépendances détecté: {' -> '.join(cycle)}", cycle=cycle
+        )
+
+
+def topological_levels(dependencies: Dict[str, List[str]]) -> Dict[str, int]:
+    """
+    Niveau topologique de chaque tâche (0 pour les tâches sans dépendance dans la
+    table). Lève DagValidationError si le graphe contient un cycle.
+    """
+    in_table = {
+        task_id: [dep_id for dep_id in deps if dep_id in dependencies]
+        for task_id, deps in dependencies.items()
+    }
+    dependents: Dict[str, List[str]] = {task_id: [] for task_id in in_table}
+    remaining = {}
+    for task_id, deps in in_table.items():
+        remaining[task_id] = len(deps)
+        for dep_id in deps:
+            dependents[dep_id].append(task_id)
+
+    levels = {}
+    frontier = [task_id for task_id, count in remaining.items() if count == 0]
+    level = 0
+    while frontier:
+        next_frontier = []
+        for task_id in frontier:
+            levels[task_id] = level
+            for dependent_id in dependents[task_id]:
+                remaining[dependent_id] -= 1
+                if remaining[dependent_id] == 0:
+                    next_frontier.append(dependent_id)
+        frontier = next_frontier
+        level += 1
+
+    if len(levels) != len(in_table):
+        cycle = find_cycle(in_table) or sorted(set(in_table) - set(levels))
+        raise DagValidationError(
+            f"Cycle de dépendances détecté: {' -> '.join(cycle)}", cycle=cycle
+        )
+    return levels
+
+
+def compute_dag_metrics(
+    dependencies: Dict[str, List[str]],
+    weights: Optional[Dict[str, float]] = None,
+) -> Dict[str, Any]:
+    """
+    Calcule les métriques du DAG : niveaux topologiques, largeur par niveau,
+    largeur maximale et chemin critique. Le poids d'une tâche vaut 1 par défaut
+    (longueur du chemin critique en nombre de tâches).
+    """
+    levels = topological_levels(dependencies)
+    weights = weights or {}
+
+    width_by_level: List[int] = []
+    for level in levels.values():
+        while len(width_by_level) <= level:
+            width_by_level.append(0)
+        width_by_level[level] += 1
+
+    # Plus long chemin pondéré se terminant sur chaque tâche, dans l'ordre topologique.
+    finish: Dict[str, float] = {}
+    predecessor: Dict[str, Optional[str]] = {}
+    for task_id in sorted(levels, key=levels.get):
+        best_dep, best_finish = None, 0.0
+        for dep_id in dependencies[task_id]:
+            if dep_id in finish and finish[dep_id] > best_finish:
+                best_dep, best_finish = dep_id, finish[dep_id]
+        finish[task_id] = best_finish + float(weights.get(task_id, 1.0))
+        predecessor[task_id] = best_dep
+
+    critical_path: List[str] = []
+    if finish:
+        current: Optional[str] = max(finish, key=finish.get)
+        while current is not None:
+            critical_path.append(current)
+            current = predecessor[current]
+        critical_path.reverse()
+
+    return {
+        "node_count": len(levels),
+        "depth": len(width_by_level),
+        "max_width": max(width_by_level, default=0),
+        "width_by_level": width_by_level,
+        "critical_path_length": round(max(finish.values(), default=0.0), 3),
+        "critical_path": critical_path,
+        "levels": levels,
+        "computed_at": datetime.utcnow().isoformat(),
+    }
+
+
+def dependencies_from_graph_nodes(nodes: Dict[str, Dict[str, Any]]) -> Dict[str, List[str]]:
+    """Extrait la table des dépendances des noeuds sérialisés d'un ExecutionTaskGraph."""
+    return {
+        task_id: list(node_data.get("dependencies") or [])
+        for task_id, node_data in nodes.items()
+    }
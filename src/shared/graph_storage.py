@@ -0,0 +1,255 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+GRAPH_STORAGE_BACKEND_ENV = "GRAPH_STORAGE_BACKEND"
+GRAPH_STORAGE_SQLITE_PATH_ENV = "GRAPH_STORAGE_SQLITE_PATH"
+DEFAULT_SQLITE_PATH = "orchestrai_graphs.sqlite3"
+GRAPH_EVENTS_SUBCOLLECTION = "events"
+
+
+class GraphStorageBackend(ABC):
+    """
+    Interface de stockage des documents de graphes (TaskGraph, ExecutionTaskGraph).
+    Un document est identifié par une collection et un identifiant, et contient
+    l'état courant du graphe sous forme de dictionnaire JSON-sérialisable.
+    L'historique des transitions est conservé à part, dans un journal
+    d'événements en ajout seul associé au document.
+    """
+
+    name: str = "abstract"
+
+    @abstractmethod
+    def load(self, collection: str, doc_id: str) -> Optional[Dict[str, Any]]:
+        """Retourne le document ou None s'il n'existe pas."""
+
+    @abstractmethod
+    def save(self, collection: str, doc_id: str, data: Dict[str, Any]) -> None:
+        """Remplace intégralement le document."""
+
+    @abstractmethod
+    def delete(self, collection: str, doc_id: str) -> None:
+        """Supprime le document s'il existe."""
+
+    @abstractmethod
+    def append_events(self, collection: str, doc_id: str, events: List[Dict[str, Any]]) -> None:
+        """Ajoute des événements au journal du document, dans l'ordre fourni."""
+
+    @abstractmethod
+    def load_events(self, collection: str, doc_id: str) -> List[Dict[str, Any]]:
+        """Retourne le journal complet du document, dans l'ordre d'ajout."""
+
+
+class FirestoreGraphStorage(GraphStorageBackend):
+    """Backend de production : un document Firestore par graphe."""
+
+    name = "firestore"
+
+    def __init__(self, db: Any = None):
+        self._db = db
+
+    def _client(self):
+        if self._db is None:
+            from src.shared.firebase_init import get_firestore_client
+
+            self._db = get_firestore_client()
+            if self._db is None:
+                raise RuntimeError("Client Firestore indisponible pour le stockage des graphes.")
+        return self._db
+
+    def _doc_ref(self, collection: str, doc_id: str):
+        return self._client().collection(collection).document(doc_id)
+
+    def load(self, collection: str, doc_id: str) -> Optional[Dict[str, Any]]:
+        doc = self._doc_ref(collection, doc_id).get()
+        if not doc.exists:
+            return None
+        return doc.to_dict()
+
+    def save(self, collection: str, doc_id: str, data: Dict[str, Any]) -> None:
+        self._doc_ref(collection, doc_id).set(data)
+
+    def delete(self, collection: str, doc_id: str) -> None:
+        self._doc_ref(collection, doc_id).delete()
+
+    def append_events(self, collection: str, doc_id: str, events: List[Dict[str, Any]]) -> None:
+        if not events:
+            return
+        events_ref = self._doc_ref(collection, doc_id).collection(GRAPH_EVENTS_SUBCOLLECTION)
+        batch = self._client().batch()
+        base_seq = time.time_ns()
+        for offset, event in enumerate(events):
+            batch.set(events_ref.document(), {**event, "seq": base_seq + offset})
+        batch.commit()
+
+    def load_events(self, collection: str, doc_id: str) -> List[Dict[str, Any]]:
+        events_ref = self._doc_ref(collection, doc_id).collection(GRAPH_EVENTS_SUBCOLLECTION)
+        events = [doc.to_dict() for doc in events_ref.order_by("seq").stream()]
+        for event in events:
+            event.pop("seq", None)
+        return events
+
+
+class InMemoryGraphStorage(GraphStorageBackend):
+    """
+    Backend en mémoire, pour les tests et les exécutions locales.
+    Les documents sont conservés sérialisés en JSON pour reproduire la
+    sémantique d'un stockage distant (aucun aliasing entre appelants).
+    """
+
+    name = "memory"
+
+    def __init__(self):
+        self._docs: Dict[tuple, str] = {}
+        self._events: Dict[tuple, List[str]] = {}
+        self._lock = threading.Lock()
+
+    def load(self, collection: str, doc_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            payload = self._docs.get((collection, doc_id))
+        return json.loads(payload) if payload is not None else None
+
+    def save(self, collection: str, doc_id: str, data: Dict[str, Any]) -> None:
+        payload = json.dumps(data, ensure_ascii=False)
+        with self._lock:
+            self._docs[(collection, doc_id)] = payload
+
+    def delete(self, collection: str, doc_id: str) -> None:
+        with self._lock:
+            self._docs.pop((collection, doc_id), None)
+            self._events.pop((collection, doc_id), None)
+
+    def append_events(self, collection: str, doc_id: str, events: List[Dict[str, Any]]) -> None:
+        payloads = [json.dumps(event, ensure_ascii=False) for event in events]
+        with self._lock:
+            self._events.setdefault((collection, doc_id), []).extend(payloads)
+
+    def load_events(self, collection: str, doc_id: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            payloads = list(self._events.get((collection, doc_id), []))
+        return [json.loads(payload) for payload in payloads]
+
+
+class SQLiteGraphStorage(GraphStorageBackend):
+    """
+    Backend SQLite (journal WAL) : persistance locale sans réseau.
+    Chaque document est stocké en JSON dans une table unique.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str = DEFAULT_SQLITE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS graph_documents ("
+            " collection TEXT NOT NULL,"
+            " doc_id TEXT NOT NULL,"
+            " data TEXT NOT NULL,"
+            " PRIMARY KEY (collection, doc_id))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS graph_events ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " collection TEXT NOT NULL,"
+            " doc_id TEXT NOT NULL,"
+            " data TEXT NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_graph_events_doc ON graph_events (collection, doc_id, seq)"
+        )
+        logger.info(f"Stockage SQLite des graphes initialisé ({path}, WAL).")
+
+    def load(self, collection: str, doc_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM graph_documents WHERE collection = ? AND doc_id = ?",
+                (collection, doc_id),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save(self, collection: str, doc_id: str, data: Dict[str, Any]) -> None:
+        payload = json.dumps(data, ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO graph_documents (collection, doc_id, data) VALUES (?, ?, ?)",
+                (collection, doc_id, payload),
+            )
+
+    def delete(self, collection: str, doc_id: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM graph_documents WHERE collection = ? AND doc_id = ?",
+                (collection, doc_id),
+            )
+            self._conn.execute(
+                "DELETE FROM graph_events WHERE collection = ? AND doc_id = ?",
+                (collection, doc_id),
+            )
+
+    def append_events(self, collection: str, doc_id: str, events: List[Dict[str, Any]]) -> None:
+        if not events:
+            return
+        rows = [(collection, doc_id, json.dumps(event, ensure_ascii=False)) for event in events]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT INTO graph_events (collection, doc_id, data) VALUES (?, ?, ?)", rows
+            )
+            self._conn.execute("COMMIT")
+
+    def load_events(self, collection: str, doc_id: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT data FROM graph_events WHERE collection = ? AND doc_id = ? ORDER BY seq",
+                (collection, doc_id),
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_storage_instance: Optional[GraphStorageBackend] = None
+_storage_lock = threading.Lock()
+
+
+def create_graph_storage(backend: Optional[str] = None) -> GraphStorageBackend:
+    """Construit un backend à partir de son nom ('firestore', 'memory', 'sqlite')."""
+    backend_name = (backend or os.environ.get(GRAPH_STORAGE_BACKEND_ENV, "firestore")).lower()
+    if backend_name == "memory":
+        return InMemoryGraphStorage()
+    if backend_name == "sqlite":
+        return SQLiteGraphStorage(os.environ.get(GRAPH_STORAGE_SQLITE_PATH_ENV, DEFAULT_SQLITE_PATH))
+    if backend_name != "firestore":
+        logger.warning(f"Backend de stockage '{backend_name}' inconnu, utilisation de Firestore.")
+    return FirestoreGraphStorage()
+
+
+def get_graph_storage() -> GraphStorageBackend:
+    """Retourne le backend partagé du processus, sélectionné par GRAPH_STORAGE_BACKEND."""
+    global _storage_instance
+    if _storage_instance is None:
+        with _storage_lock:
+            if _storage_instance is None:
+                _storage_instance = create_graph_storage()
+                logger.info(f"Backend de stockage des graphes: {_storage_instance.name}")
+    return _storage_instance
+
+
+def set_graph_storage(storage: Optional[GraphStorageBackend]) -> None:
+    """Remplace le backend partagé (tests, benchmarks)."""
+    global _storage_instance
+    with _storage_lock:
+        _storage_instance = storage
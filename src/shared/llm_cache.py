@@ -0,0 +1,237 @@
+"""
+Cache des réponses LLM adressé par contenu (optionnel).
+
+La clé est l'empreinte SHA-256 du modèle, du prompt système, du prompt, de la
+température et du mode JSON. Deux niveaux : un LRU en mémoire devant une base
+SQLite locale (journal WAL) qui survit aux redémarrages de l'agent. Les entrées
+expirent après LLM_CACHE_TTL_SECONDS. En mode JSON, seule une réponse qui se
+parse (et, si un schéma est fourni, qui le respecte) est mémorisée, pour ne pas
+figer une sortie malformée.
+
+Variables d'environnement :
+    LLM_CACHE_ENABLED         "true" pour activer le cache (défaut : désactivé)
+    LLM_CACHE_PATH            fichier SQLite (défaut : orchestrai_llm_cache.sqlite3, "" = mémoire seule)
+    LLM_CACHE_TTL_SECONDS     durée de validité d'une entrée (défaut : 24 h, 0 = illimitée)
+    LLM_CACHE_MEMORY_ENTRIES  taille du LRU en mémoire (défaut : 256)
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from src.shared.structured_output import StructuredOutputError, parse_json_output
+
+logger = logging.getLogger(__name__)
+
+LLM_CACHE_ENABLED = os.environ.get("LLM_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+LLM_CACHE_PATH = os.environ.get("LLM_CACHE_PATH", "orchestrai_llm_cache.sqlite3")
+LLM_CACHE_TTL_SECONDS = float(os.environ.get("LLM_CACHE_TTL_SECONDS", str(24 * 3600)))
+LLM_CACHE_MEMORY_ENTRIES = int(os.environ.get("LLM_CACHE_MEMORY_ENTRIES", "256"))
+
+_STAT_KEYS = ("memory_hits", "disk_hits", "misses", "bypassed", "writes", "rejected")
+
+
+class LLMResponseCache:
+    def __init__(
+        self,
+        path: Optional[str] = LLM_CACHE_PATH,
+        enabled: bool = LLM_CACHE_ENABLED,
+        ttl_seconds: float = LLM_CACHE_TTL_SECONDS,
+        max_memory_entries: int = LLM_CACHE_MEMORY_ENTRIES,
+    ):
+        self.enabled = enabled
+        self.ttl_seconds = ttl_seconds
+        self.max_memory_entries = max(1, max_memory_entries)
+        self._memory: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._conn: Optional[sqlite3.Connection] = None
+        if enabled and path:
+            self._open(path)
+
+    def _open(self, path: str) -> None:
+        try:
+            self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_responses ("
+                " key TEXT PRIMARY KEY,"
+                " response TEXT NOT NULL,"
+                " stored_at REAL NOT NULL)"
+            )
+            if self.ttl_seconds:
+                self._conn.execute(
+                    "DELETE FROM llm_responses WHERE stored_at < ?", (time.time() - self.ttl_seconds,)
+                )
+            logger.info(f"Cache LLM persistant initialisé ({path}).")
+        except sqlite3.Error as e:
+            logger.warning(f"Cache LLM persistant indisponible ({path}) : {e}. Cache en mémoire seul.")
+            self._conn = None
+
+    @staticmethod
+    def key(
+        model: str,
+        system_prompt: Optional[str],
+        prompt: str,
+        temperature: float,
+        json_mode: bool,
+        response_schema: Optional[Dict[str, Any]] = None,
+        max_output_tokens: Optional[int] = None,
+        top_p: Optional[float] = None,
+        constrain_decoding: bool = True,
+    ) -> str:
+        fields = {
+            "model": model,
+            "system": system_prompt,
+            "prompt": prompt,
+            "temperature": temperature,
+            "json_mode": json_mode,
+        }
+        # Champs absents à leur valeur par défaut : les clés existantes restent valides.
+        if response_schema:
+            fields["response_schema"] = response_schema
+            if not constrain_decoding:
+                fields["constrain_decoding"] = False
+        # Configuration de génération de la route : deux routes sur le même modèle
+        # (plafond de sortie différent) ne partagent ni réponse ni appel en cours.
+        if max_output_tokens is not None:
+            fields["max_output_tokens"] = max_output_tokens
+        if top_p is not None:
+            fields["top_p"] = top_p
+        payload = json.dumps(fields, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _count(self, agent: Optional[str], stat: str) -> None:
+        agent_stats = self._stats.setdefault(agent or "default", dict.fromkeys(_STAT_KEYS, 0))
+        agent_stats[stat] += 1
+
+    def _expired(self, stored_at: float) -> bool:
+        return bool(self.ttl_seconds) and time.time() - stored_at > self.ttl_seconds
+
+    def get(self, key: str, agent: Optional[str] = None) -> Optional[str]:
+        """Réponse mémorisée pour cette clé, ou None (absente, expirée ou cache désactivé)."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and not self._expired(entry[1]):
+                self._memory.move_to_end(key)
+                self._count(agent, "memory_hits")
+                return entry[0]
+            self._memory.pop(key, None)
+
+            row = None
+            if self._conn is not None:
+                try:
+                    row = self._conn.execute(
+                        "SELECT response, stored_at FROM llm_responses WHERE key = ?", (key,)
+                    ).fetchone()
+                except sqlite3.Error as e:
+                    logger.warning(f"Lecture du cache LLM impossible : {e}")
+            if row is None or self._expired(row[1]):
+                self._count(agent, "misses")
+                return None
+            self._remember(key, row[0], row[1])
+            self._count(agent, "disk_hits")
+            return row[0]
+
+    def put(
+        self,
+        key: str,
+        response: str,
+        json_mode: bool = False,
+        agent: Optional[str] = None,
+        response_schema: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        if not self.enabled or not response:
+            return
+        if json_mode:
+            try:
+                if response_schema:
+                    # Même contrôle que `generate_json` : une réponse rejetée ne doit pas être resservie.
+                    parse_json_output(response, response_schema)
+                else:
+                    json.loads(response)
+            except (ValueError, StructuredOutputError):
+                with self._lock:
+                    self._count(agent, "rejected")
+                return
+        stored_at = time.time()
+        with self._lock:
+            self._remember(key, response, stored_at)
+            self._count(agent, "writes")
+            if self._conn is not None:
+                try:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO llm_responses (key, response, stored_at) VALUES (?, ?, ?)",
+                        (key, response, stored_at),
+                    )
+                except sqlite3.Error as e:
+                    logger.warning(f"Écriture du cache LLM impossible : {e}")
+
+    def record_bypass(self, agent: Optional[str] = None) -> None:
+        with self._lock:
+            self._count(agent, "bypassed")
+
+    def _remember(self, key: str, response: str, stored_at: float) -> None:
+        self._memory[key] = (response, stored_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            self._memory.pop(key, None)
+            if self._conn is not None:
+                try:
+                    self._conn.execute("DELETE FROM llm_responses WHERE key = ?", (key,))
+                except sqlite3.Error as e:
+                    logger.warning(f"Invalidation du cache LLM impossible : {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Compteurs et taux de réussite par agent."""
+        with self._lock:
+            per_agent = {agent: dict(counts) for agent, counts in self._stats.items()}
+        for counts in per_agent.values():
+            hits = counts["memory_hits"] + counts["disk_hits"]
+            lookups = hits + counts["misses"]
+            counts["hit_rate"] = round(hits / lookups, 4) if lookups else None
+        return {
+            "enabled": self.enabled,
+            "persistent": self._conn is not None,
+            "memory_entries": len(self._memory),
+            "agents": per_agent,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+_cache_instance: Optional[LLMResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> LLMResponseCache:
+    """Cache partagé du processus, configuré par les variables LLM_CACHE_*."""
+    global _cache_instance
+    if _cache_instance is None:
+        with _cache_lock:
+            if _cache_instance is None:
+                _cache_instance = LLMResponseCache()
+    return _cache_instance
+
+
+def set_llm_cache(cache: Optional[LLMResponseCache]) -> None:
+    """Remplace le cache partagé (tests, benchmarks)."""
+    global _cache_instance
+    with _cache_lock:
+        _cache_instance = cache
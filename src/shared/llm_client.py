@@ -1,63 +1,519 @@
 import os
+import asyncio
+import contextlib
+import contextvars
 import logging
-import vertexai
-from vertexai.generative_models import GenerativeModel, GenerationConfig
-from typing import Optional
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Iterator, Optional, Tuple
 
-logger = logging.getLogger(__name__)
+from src.shared.llm_cache import LLMResponseCache, get_llm_cache
+from src.shared.llm_usage import get_llm_usage_tracker
+from src.shared.llm_providers import LLMProvider, LLMRequest, get_llm_provider, get_llm_recorder
+from src.shared.llm_rate_limiter import LLMRateLimiter, estimate_tokens, retryable_status
+from src.shared.llm_routing import LLMRoute, LLMRouter, get_llm_router
 
-GCP_PROJECT_ID = os.environ.get("GCP_PROJECT_ID")
-GCP_REGION = os.environ.get("GCP_REGION")
+logger = logging.getLogger(__name__)
 
 LLM_MODEL = os.environ.get("LLM_MODEL", "gemini-1.5-flash-001")
 LLM_MODEL = os.environ.get("LLM_MODEL", "gemini-2.0-flash-001")
+LLM_TEMPERATURE = float(os.environ.get("LLM_TEMPERATURE", "0.5"))
+# Nombre d'appels récents conservés pour les statistiques de latence.
+LLM_TIMING_HISTORY = int(os.environ.get("LLM_TIMING_HISTORY", "200"))
+# Jetons de sortie comptés d'avance dans le seau TPM, corrigés avec l'usage réel.
+LLM_ESTIMATED_OUTPUT_TOKENS = int(os.environ.get("LLM_ESTIMATED_OUTPUT_TOKENS", "1024"))
+
+# Destinataire des fragments générés dans le contexte courant (relais A2A de l'exécuteur).
+LLMChunkSink = Callable[[str], Awaitable[None]]
+_llm_chunk_sink: contextvars.ContextVar[Optional[LLMChunkSink]] = contextvars.ContextVar("llm_chunk_sink", default=None)
 
-try:
-    if GCP_PROJECT_ID and GCP_REGION:
-        vertexai.init(project=GCP_PROJECT_ID, location=GCP_REGION)
-        logger.info(f"Client Vertex AI initialisé pour le projet '{GCP_PROJECT_ID}' dans la région '{GCP_REGION}'.")
-    else:
-        logger.warning("Veuillez définir GCP_PROJECT_ID et GCP_REGION pour une initialisation explicite de Vertex AI.")
-except Exception as e:
-    logger.error(f"Erreur lors de l'initialisation de Vertex AI : {e}")
+
+@contextlib.contextmanager
+def bind_llm_stream(sink: Optional[LLMChunkSink]) -> Iterator[None]:
+    """Transmet à `sink` les fragments de tous les appels LLM faits dans ce contexte."""
+    token = _llm_chunk_sink.set(sink)
+    try:
+        yield
+    finally:
+        _llm_chunk_sink.reset(token)
 
 
-async def call_llm(prompt: str, system_prompt: Optional[str] = "You are a helpful assistant.", json_mode: bool = False) -> str:
+async def _relay_chunk(chunk: str) -> None:
+    sink = _llm_chunk_sink.get()
+    if sink is not None:
+        await _deliver_chunk(sink, chunk)
+
+
+async def _deliver_chunk(sink: LLMChunkSink, chunk: str) -> None:
+    try:
+        await sink(chunk)
+    except Exception as e:
+        # Le relais est un aperçu : son échec ne doit pas faire échouer la génération.
+        logger.warning(f"Relais du flux LLM en erreur : {e}")
+
+
+def _consume_flight_result(task: asyncio.Task) -> None:
+    # Un appel amont abandonné par toutes ses requêtes ne doit pas laisser
+    # d'exception « jamais récupérée ».
+    if not task.cancelled():
+        task.exception()
+
+
+def _request_cache_key(cache: LLMResponseCache, request: LLMRequest) -> str:
+    """Clé de cache et d'appel partagé : tout ce qui, dans la requête routée, change la réponse."""
+    return cache.key(
+        request.model_name,
+        request.system_prompt,
+        request.prompt,
+        request.temperature,
+        request.json_mode,
+        response_schema=request.response_schema,
+        max_output_tokens=request.max_output_tokens,
+        top_p=request.top_p,
+        constrain_decoding=request.constrain_decoding,
+    )
+
+
+class LLMCallTiming:
     """
-    Appelle l'API Vertex AI de manière asynchrone en utilisant le SDK de Google Cloud.
+    Chronométrage d'un appel : attente avant l'envoi (queue), délai jusqu'au
+    premier fragment de réponse (ttfb) et durée totale, en secondes.
     """
-    if not (GCP_PROJECT_ID and GCP_REGION):
-        error_msg = "Le projet/région GCP ne sont pas configurés. Appel LLM annulé."
-        logger.error(error_msg)
-        raise ValueError(error_msg)
 
-    try:
-        generation_config = GenerationConfig(
-            temperature=0.5,
-            response_mime_type="application/json" if json_mode else "text/plain"
-        )
+    def __init__(self, model: str, json_mode: bool, model_reused: bool, route: Optional[LLMRoute] = None):
+        self.model = model
+        self.route = route.name if route else None
+        self.fallback_from = route.fallback_from if route else None
+        self.size_class = route.size_class if route else None
+        self.json_mode = json_mode
+        self.model_reused = model_reused
+        self.queue_seconds = 0.0
+        self.ttfb_seconds: Optional[float] = None
+        self.total_seconds = 0.0
+        self.attempts = 0
+        self.prompt_tokens: Optional[int] = None
+        self.output_tokens: Optional[int] = None
+        self.total_tokens: Optional[int] = None
+        self.succeeded = False
+        # Appel interrompu (échéance de la tâche, annulation) avant la fin de la réponse.
+        self.timed_out = False
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "model": self.model,
+            "route": self.route,
+            "fallback_from": self.fallback_from,
+            "size_class": self.size_class,
+            "json_mode": self.json_mode,
+            "model_reused": self.model_reused,
+            "queue_seconds": round(self.queue_seconds, 4),
+            "ttfb_seconds": round(self.ttfb_seconds, 4) if self.ttfb_seconds is not None else None,
+            "total_seconds": round(self.total_seconds, 4),
+            "attempts": self.attempts,
+            "prompt_tokens": self.prompt_tokens,
+            "output_tokens": self.output_tokens,
+            "total_tokens": self.total_tokens,
+            "succeeded": self.succeeded,
+            "timed_out": self.timed_out,
+        }
+
+
+def _percentile(values, fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))], 4)
+
+
+class _InFlightCall:
+    """Appel LLM en cours, partagé par toutes les requêtes identiques qui l'attendent."""
+
+    def __init__(self):
+        self.parts: list = []
+        self.sinks: list = []
+        self.waiters = 0
+        self.task: Optional[asyncio.Task] = None
+
+    async def publish(self, chunk: str) -> None:
+        self.parts.append(chunk)
+        for sink in list(self.sinks):
+            await _deliver_chunk(sink, chunk)
+
+    async def subscribe(self, sink: LLMChunkSink) -> None:
+        # Rattrape d'abord les fragments déjà reçus ; l'abonnement est pris sans
+        # point d'attente après le dernier rattrapage, donc sans perte ni doublon.
+        delivered = 0
+        while delivered < len(self.parts):
+            chunk = "".join(self.parts[delivered:])
+            delivered = len(self.parts)
+            await _deliver_chunk(sink, chunk)
+        self.sinks.append(sink)
+
+
+class LLMClient:
+    """
+    Client LLM réutilisable par un agent. Le backend (Vertex AI ou stub local)
+    est choisi par LLM_PROVIDER ; voir `llm_providers.py`.
+
+    Les requêtes identiques (même clé que le cache de réponses) lancées pendant
+    qu'un appel est en cours l'attendent au lieu d'en émettre un second : un seul
+    appel amont, dont le résultat est remis à chacune. Annuler une requête ne
+    l'annule que pour elle ; l'appel amont n'est abandonné qu'avec la dernière.
+
+    Les appels passent par le limiteur partagé du processus (concurrence,
+    requêtes et jetons par minute, relances 429/503 ; voir `llm_rate_limiter.py`).
+
+    Le modèle et la configuration de génération de chaque appel sont choisis par
+    la table de routage (agent, compétence, taille du prompt, budget de latence ;
+    voir `llm_routing.py`) ; `model_name` et `temperature` sont ceux de la route
+    par défaut.
+
+    Le backend réutilise ses modèles d'un appel à l'autre ; `warm_up` établit
+    la connexion dès le démarrage de l'agent, hors du chemin critique d'une tâche.
+    """
 
-        model = GenerativeModel(
-            model_name=LLM_MODEL,
-            system_instruction=system_prompt
+    def __init__(self, model_name: str = LLM_MODEL, temperature: float = LLM_TEMPERATURE,
+                 cache: Optional[LLMResponseCache] = None, agent_name: Optional[str] = None,
+                 rate_limiter: Optional[LLMRateLimiter] = None, provider: Optional[LLMProvider] = None,
+                 router: Optional[LLMRouter] = None):
+        self.model_name = model_name
+        self.temperature = temperature
+        self._cache = cache
+        self._rate_limiter = rate_limiter
+        self._provider = provider
+        self._router = router
+        # Les statistiques du cache sont ventilées par agent.
+        self.agent_name = agent_name or os.environ.get("AGENT_NAME")
+        self._timings: Deque[LLMCallTiming] = deque(maxlen=LLM_TIMING_HISTORY)
+        self._in_flight: Dict[str, _InFlightCall] = {}
+        self.coalesced_calls = 0
+        self.warmed_up = False
+
+    async def warm_up(self) -> bool:
+        """Préchauffe le backend. Ne lève pas d'exception : un échec est journalisé."""
+        started = time.perf_counter()
+        try:
+            if not await self.provider.warm_up(self.model_name):
+                return False
+        except Exception as e:
+            logger.warning(f"Préchauffage du client LLM ({self.model_name}) impossible : {e}")
+            return False
+        self.warmed_up = True
+        logger.info(f"Client LLM ({self.model_name}) préchauffé en {time.perf_counter() - started:.2f}s.")
+        return True
+
+    @property
+    def provider(self) -> LLMProvider:
+        if self._provider is None:
+            self._provider = get_llm_provider()
+        return self._provider
+
+    @property
+    def router(self) -> LLMRouter:
+        if self._router is None:
+            self._router = get_llm_router()
+        return self._router
+
+    def _route(
+        self,
+        prompt: str,
+        system_prompt: Optional[str],
+        json_mode: bool,
+        response_schema: Optional[Dict[str, Any]] = None,
+        constrain_decoding: bool = True,
+    ) -> LLMRequest:
+        """Requête vers le modèle et la configuration retenus par la table de routage."""
+        route = self.router.route(
+            estimate_tokens(system_prompt, prompt), self.model_name, self.temperature, self.agent_name
+        )
+        return LLMRequest(
+            route.model_name, route.temperature, prompt, system_prompt, json_mode,
+            response_schema, constrain_decoding,
+            max_output_tokens=route.max_output_tokens, top_p=route.top_p, route=route,
         )
 
-        logger.info(f"Appel au modèle Vertex AI ({LLM_MODEL})...")
-        
-        response = await model.generate_content_async(prompt, generation_config=generation_config)
+    @property
+    def rate_limiter(self) -> LLMRateLimiter:
+        if self._rate_limiter is None:
+            self._rate_limiter = get_llm_rate_limiter()
+        return self._rate_limiter
 
-        if hasattr(response, 'text') and response.text:
-            logger.info("Réponse de Vertex AI reçue avec succès.")
-            return response.text
+    @property
+    def cache(self) -> LLMResponseCache:
+        if self._cache is None:
+            self._cache = get_llm_cache()
+        return self._cache
+
+    async def generate(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = "You are a helpful assistant.",
+        json_mode: bool = False,
+        bypass_cache: bool = False,
+        response_schema: Optional[Dict[str, Any]] = None,
+        constrain_decoding: bool = True,
+    ) -> str:
+        """
+        Génère une réponse, servie par le cache si une réponse identique est mémorisée.
+        `bypass_cache` force un nouvel appel ; la réponse obtenue remplace l'entrée.
+        `response_schema` (mode JSON) décrit la réponse attendue ; il contraint la
+        génération côté backend si `constrain_decoding`.
+        Si un relais de flux est lié au contexte (`bind_llm_stream`), chaque
+        fragment lui est transmis au fil de la génération.
+        """
+        cache = self.cache
+        request = self._route(prompt, system_prompt, json_mode, response_schema, constrain_decoding)
+        request_key = _request_cache_key(cache, request)
+        if cache.enabled:
+            if bypass_cache:
+                cache.record_bypass(self.agent_name)
+            else:
+                cached = cache.get(request_key, self.agent_name)
+                if cached is not None:
+                    logger.info(f"Réponse LLM servie par le cache ({request_key[:12]}).")
+                    await _relay_chunk(cached)
+                    return cached
+
+        # Un appel en cours est toujours plus récent que le cache : même un
+        # `bypass_cache` peut s'y joindre.
+        flight = self._in_flight.get(request_key)
+        if flight is None:
+            flight = self._in_flight[request_key] = _InFlightCall()
+            flight.task = asyncio.create_task(
+                self._run_flight(request_key, flight, request)
+            )
+            flight.task.add_done_callback(_consume_flight_result)
         else:
-            if hasattr(response, 'prompt_feedback') and response.prompt_feedback.block_reason:
-                block_reason = response.prompt_feedback.block_reason.name
-                logger.error(f"Appel bloqué par Vertex AI. Raison: {block_reason}")
-                raise Exception(f"Vertex AI response was blocked due to: {block_reason}")
+            self.coalesced_calls += 1
+            logger.info(f"Appel LLM identique en cours ({request_key[:12]}) : réponse partagée.")
+
+        flight.waiters += 1
+        sink = _llm_chunk_sink.get()
+        try:
+            if sink is not None:
+                await flight.subscribe(sink)
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if flight.waiters == 1 and not flight.task.done():
+                logger.info(f"Appel LLM {request_key[:12]} abandonné par sa dernière requête.")
+                if self._in_flight.get(request_key) is flight:
+                    del self._in_flight[request_key]
+                flight.task.cancel()
+            raise
+        finally:
+            flight.waiters -= 1
+            if sink is not None and sink in flight.sinks:
+                flight.sinks.remove(sink)
+
+    async def _run_flight(
+        self,
+        request_key: str,
+        flight: _InFlightCall,
+        request: LLMRequest,
+    ) -> str:
+        try:
+            timing = LLMCallTiming(request.model_name, request.json_mode, False, request.route)
+            async for chunk in self._stream_with_retries(request, timing):
+                await flight.publish(chunk)
+            text = "".join(flight.parts)
+            self.cache.put(
+                request_key, text, json_mode=request.json_mode, agent=self.agent_name,
+                response_schema=request.response_schema,
+            )
+            return text
+        finally:
+            if self._in_flight.get(request_key) is flight:
+                del self._in_flight[request_key]
+
+    async def generate_with_timing(
+        self, prompt: str, system_prompt: Optional[str] = "You are a helpful assistant.", json_mode: bool = False
+    ) -> Tuple[str, LLMCallTiming]:
+        """Comme `generate` (sans cache), et retourne aussi le chronométrage de l'appel."""
+        request = self._route(prompt, system_prompt, json_mode)
+        timing = LLMCallTiming(request.model_name, json_mode, False, request.route)
+        parts = [chunk async for chunk in self._stream_with_retries(request, timing)]
+        return "".join(parts), timing
+
+    async def stream(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = "You are a helpful assistant.",
+        json_mode: bool = False,
+        bypass_cache: bool = False,
+    ) -> AsyncIterator[str]:
+        """
+        Génère une réponse fragment par fragment. Le texte n'est conservé ici que
+        si le cache est actif (pour l'y enregistrer) : l'appelant assemble la réponse.
+        """
+        cache = self.cache
+        request = self._route(prompt, system_prompt, json_mode)
+        cache_key = None
+        if cache.enabled:
+            cache_key = _request_cache_key(cache, request)
+            if bypass_cache:
+                cache.record_bypass(self.agent_name)
             else:
-                logger.error(f"Vertex AI a retourné une réponse vide ou invalide. Contenu: {response}")
-                raise Exception("Vertex AI returned an empty or invalid response.")
+                cached = cache.get(cache_key, self.agent_name)
+                if cached is not None:
+                    yield cached
+                    return
 
-    except Exception as e:
-        logger.error(f"Erreur inattendue lors de l'appel à Vertex AI: {e}", exc_info=True)
-        raise
\ No newline at end of file
+        timing = LLMCallTiming(request.model_name, json_mode, False, request.route)
+        parts = [] if cache_key else None
+        async for chunk in self._stream_with_retries(request, timing):
+            if parts is not None:
+                parts.append(chunk)
+            yield chunk
+        if cache_key:
+            cache.put(cache_key, "".join(parts), json_mode=json_mode, agent=self.agent_name)
+
+    async def _stream_with_retries(self, request: LLMRequest, timing: LLMCallTiming) -> AsyncIterator[str]:
+        """
+        Fragments de la réponse, obtenus via le limiteur du processus. Les erreurs
+        429/503 sont relancées tant qu'aucun fragment n'a été transmis.
+        """
+        provider = self.provider
+        provider.check_configured()
+
+        started = time.perf_counter()
+        limiter = self.rate_limiter
+        estimated_tokens = estimate_tokens(request.system_prompt, request.prompt) + LLM_ESTIMATED_OUTPUT_TOKENS
+        recorder = get_llm_recorder()
+        recorded = [] if recorder is not None else None
+        waited = 0.0
+        try:
+            while True:
+                timing.attempts += 1
+                yielded = False
+                async with limiter.acquire(request.model_name, estimated_tokens) as permit:
+                    waited += permit.waited_seconds
+                    timing.queue_seconds = waited
+                    try:
+                        async for chunk in provider.stream(request, timing):
+                            yielded = True
+                            if recorded is not None:
+                                recorded.append(chunk)
+                            yield chunk
+                    except Exception as e:
+                        delay = None if yielded else limiter.retry_delay(e, timing.attempts)
+                        if delay is None:
+                            raise
+                        if retryable_status(e) == 429:
+                            permit.throttled()
+                            limiter.throttled_calls += 1
+                    else:
+                        permit.succeeded(timing.total_tokens)
+                        timing.succeeded = True
+                        logger.info(f"Réponse LLM ({provider.name}) reçue avec succès.")
+                        if recorder is not None:
+                            recorder.record(request, "".join(recorded))
+                        return
+                limiter.retried_calls += 1
+                logger.warning(
+                    f"Backend LLM ({provider.name}) saturé ou indisponible (tentative {timing.attempts}) : "
+                    f"nouvel essai dans {delay:.1f}s."
+                )
+                await asyncio.sleep(delay)
+                waited += delay
+                timing.ttfb_seconds = None
+
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            timing.timed_out = True
+            raise
+        except Exception as e:
+            logger.error(f"Erreur inattendue lors de l'appel au backend LLM ({provider.name}): {e}", exc_info=True)
+            raise
+        finally:
+            timing.total_seconds = time.perf_counter() - started
+            self._timings.append(timing)
+            # Temps passé chez le backend seulement : l'attente du limiteur et les
+            # pauses entre relances reflètent la congestion, pas le modèle.
+            self.router.observe(
+                timing.model, timing.total_seconds - timing.queue_seconds, timing.succeeded, timing.timed_out
+            )
+            get_llm_usage_tracker().record(timing)
+            logger.info(f"Chronométrage LLM : {timing.to_dict()}")
+
+    def timings_summary(self) -> Dict[str, Any]:
+        """Statistiques (médiane, p95) sur les appels récents."""
+        timings = list(self._timings)
+        ttfb = [t.ttfb_seconds for t in timings if t.ttfb_seconds is not None]
+        return {
+            "model": self.model_name,
+            "warmed_up": self.warmed_up,
+            "provider": self.provider.name,
+            "cached_models": self.provider.cached_models(),
+            "calls": len(timings),
+            "failures": sum(1 for t in timings if not t.succeeded),
+            "queue_p50": _percentile([t.queue_seconds for t in timings], 0.5),
+            "ttfb_p50": _percentile(ttfb, 0.5),
+            "ttfb_p95": _percentile(ttfb, 0.95),
+            "total_p50": _percentile([t.total_seconds for t in timings], 0.5),
+            "total_p95": _percentile([t.total_seconds for t in timings], 0.95),
+            "coalesced_calls": self.coalesced_calls,
+            "in_flight_calls": len(self._in_flight),
+            "rate_limiter": self.rate_limiter.metrics(),
+            "routing": self.router.metrics(),
+            "last_call": timings[-1].to_dict() if timings else None,
+        }
+
+
+_default_client: Optional[LLMClient] = None
+_default_rate_limiter: Optional[LLMRateLimiter] = None
+
+
+def get_llm_rate_limiter() -> LLMRateLimiter:
+    """Limiteur partagé par tous les clients LLM du processus (configuré par LLM_RATE_LIMITS)."""
+    global _default_rate_limiter
+    if _default_rate_limiter is None:
+        _default_rate_limiter = LLMRateLimiter()
+    return _default_rate_limiter
+
+
+def get_llm_client() -> LLMClient:
+    global _default_client
+    if _default_client is None:
+        _default_client = LLMClient()
+    return _default_client
+
+
+def set_llm_agent_name(name: str) -> str:
+    """
+    Identité de l'agent pour le cache, le routage et la comptabilité LLM du
+    processus : AGENT_NAME s'il est défini (déploiement), sinon `name` (constante
+    du serveur), qui devient alors AGENT_NAME pour le reste du processus.
+    À appeler au démarrage du serveur, avant le premier appel LLM.
+    """
+    agent_name = os.environ.setdefault("AGENT_NAME", name)
+    get_llm_client().agent_name = agent_name
+    get_llm_usage_tracker().agent_name = agent_name
+    return agent_name
+
+
+async def call_llm(
+    prompt: str,
+    system_prompt: Optional[str] = "You are a helpful assistant.",
+    json_mode: bool = False,
+    bypass_cache: bool = False,
+    response_schema: Optional[Dict[str, Any]] = None,
+    constrain_decoding: bool = True,
+) -> str:
+    """
+    Appelle le LLM de manière asynchrone via le client partagé du processus.
+    `bypass_cache` ignore le cache de réponses (voir `llm_cache.py`) pour cet appel ;
+    `response_schema` décrit la réponse JSON attendue (voir `structured_output.py`).
+    """
+    return await get_llm_client().generate(
+        prompt, system_prompt, json_mode, bypass_cache=bypass_cache,
+        response_schema=response_schema, constrain_decoding=constrain_decoding,
+    )
+
+
+def stream_llm(
+    prompt: str,
+    system_prompt: Optional[str] = "You are a helpful assistant.",
+    json_mode: bool = False,
+    bypass_cache: bool = False,
+) -> AsyncIterator[str]:
+    """Variante en flux de `call_llm` : itérateur asynchrone des fragments de la réponse."""
+    return get_llm_client().stream(prompt, system_prompt, json_mode, bypass_cache=bypass_cache)
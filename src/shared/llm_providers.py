@@ -0,0 +1,409 @@
+"""
+Backends LLM interchangeables, choisis par la variable d'environnement LLM_PROVIDER.
+
+    vertex  (défaut) Vertex AI ; `vertexai.init` n'est appelé qu'au premier usage.
+    stub    backend local déterministe, sans réseau, pour les tests de charge :
+            rejoue les réponses enregistrées (empreinte du prompt), sinon produit
+            un JSON conforme au schéma attendu (ou un texte factice), avec une
+            latence tirée d'une distribution configurable.
+
+Enregistrement : avec LLM_RECORD_PATH, chaque réponse obtenue est ajoutée (JSONL)
+au fichier, que le stub peut ensuite rejouer (LLM_STUB_RECORDINGS).
+
+Configuration du stub (LLM_STUB_CONFIG, JSON) :
+    {
+      "latency": {"distribution": "lognormal", "median_seconds": 1.2, "sigma": 0.4},
+      "ttfb_fraction": 0.3,
+      "chunk_chars": 80,
+      "array_items": 2,
+      "error_rate": 0.0,
+      "seed": 0
+    }
+Distributions : constant (seconds), uniform (min_seconds, max_seconds),
+normal (mean_seconds, stddev_seconds), lognormal (median_seconds, sigma).
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import os
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+import vertexai
+from vertexai.generative_models import GenerativeModel, GenerationConfig
+
+from src.shared.llm_rate_limiter import estimate_tokens
+from src.shared.llm_routing import LLMRoute
+
+logger = logging.getLogger(__name__)
+
+GCP_PROJECT_ID = os.environ.get("GCP_PROJECT_ID")
+GCP_REGION = os.environ.get("GCP_REGION")
+
+LLM_PROVIDER = os.environ.get("LLM_PROVIDER", "vertex").lower()
+LLM_STUB_CONFIG_ENV = "LLM_STUB_CONFIG"
+LLM_STUB_RECORDINGS = os.environ.get("LLM_STUB_RECORDINGS")
+LLM_RECORD_PATH = os.environ.get("LLM_RECORD_PATH")
+
+
+def prompt_key(system_prompt: Optional[str], prompt: str) -> str:
+    """Empreinte d'un prompt, indépendante du modèle et du backend (clé des enregistrements)."""
+    payload = json.dumps({"system": system_prompt, "prompt": prompt}, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMRequest:
+    def __init__(
+        self,
+        model_name: str,
+        temperature: float,
+        prompt: str,
+        system_prompt: Optional[str],
+        json_mode: bool,
+        response_schema: Optional[Dict[str, Any]] = None,
+        constrain_decoding: bool = True,
+        max_output_tokens: Optional[int] = None,
+        top_p: Optional[float] = None,
+        route: Optional[LLMRoute] = None,
+    ):
+        self.model_name = model_name
+        self.temperature = temperature
+        self.prompt = prompt
+        self.system_prompt = system_prompt
+        self.json_mode = json_mode
+        # Schéma attendu ; transmis au backend pour contraindre la génération
+        # seulement si `constrain_decoding`.
+        self.response_schema = response_schema if json_mode else None
+        self.constrain_decoding = constrain_decoding
+        # Configuration de génération fixée par la route (voir `llm_routing.py`).
+        self.max_output_tokens = max_output_tokens
+        self.top_p = top_p
+        self.route = route
+
+
+class LLMProvider(ABC):
+    name = "abstract"
+
+    def check_configured(self) -> None:
+        """Lève ValueError si le backend ne peut pas être appelé."""
+
+    async def warm_up(self, model_name: str) -> bool:
+        return True
+
+    def cached_models(self) -> int:
+        return 0
+
+    @abstractmethod
+    def stream(self, request: LLMRequest, timing: Any) -> AsyncIterator[str]:
+        """
+        Fragments de texte de la réponse. Renseigne sur `timing` (un LLMCallTiming)
+        model_reused, ttfb_seconds et l'usage en jetons.
+        """
+
+
+def _chunk_text(chunk: Any) -> str:
+    # `chunk.text` lève ValueError pour un fragment sans texte (ex. bloqué, ou
+    # dernier fragment ne portant que les métadonnées d'usage).
+    try:
+        return chunk.text or ""
+    except (ValueError, AttributeError):
+        return ""
+
+
+class VertexLLMProvider(LLMProvider):
+    """
+    Vertex AI. Les instances `GenerativeModel` et `GenerationConfig` sont
+    construites une fois par (modèle, prompt système, mode JSON, schéma,
+    configuration de génération) puis
+    réutilisées ; le canal gRPC sous-jacent reste ainsi ouvert d'un appel à l'autre.
+    """
+
+    name = "vertex"
+
+    def __init__(self):
+        self._models: Dict[Tuple[Any, ...], Tuple[GenerativeModel, GenerationConfig]] = {}
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    def check_configured(self) -> None:
+        if not (GCP_PROJECT_ID and GCP_REGION):
+            error_msg = "Le projet/région GCP ne sont pas configurés. Appel LLM annulé."
+            logger.error(error_msg)
+            raise ValueError(error_msg)
+        with self._lock:
+            if self._initialized:
+                return
+            vertexai.init(project=GCP_PROJECT_ID, location=GCP_REGION)
+            self._initialized = True
+        logger.info(f"Client Vertex AI initialisé pour le projet '{GCP_PROJECT_ID}' dans la région '{GCP_REGION}'.")
+
+    def cached_models(self) -> int:
+        return len(self._models)
+
+    def _get_model(self, request: LLMRequest) -> Tuple[GenerativeModel, GenerationConfig, bool]:
+        response_schema = request.response_schema if request.constrain_decoding else None
+        schema_key = json.dumps(response_schema, sort_keys=True) if response_schema else None
+        key = (
+            request.model_name, request.system_prompt, request.json_mode, schema_key,
+            request.temperature, request.max_output_tokens, request.top_p,
+        )
+        with self._lock:
+            cached = self._models.get(key)
+            if cached is not None:
+                return cached[0], cached[1], True
+            generation_config = GenerationConfig(
+                temperature=request.temperature,
+                response_mime_type="application/json" if request.json_mode else "text/plain",
+                response_schema=response_schema,
+                max_output_tokens=request.max_output_tokens,
+                top_p=request.top_p,
+            )
+            model = GenerativeModel(
+                model_name=request.model_name,
+                system_instruction=request.system_prompt
+            )
+            self._models[key] = (model, generation_config)
+            return model, generation_config, False
+
+    async def warm_up(self, model_name: str) -> bool:
+        """Ouvre le canal avec une requête de comptage de jetons (non facturée en génération)."""
+        if not (GCP_PROJECT_ID and GCP_REGION):
+            logger.info("Préchauffage du client LLM ignoré : projet/région GCP non configurés.")
+            return False
+        self.check_configured()
+        model, _, _ = self._get_model(LLMRequest(model_name, 0.0, "", None, False))
+        await model.count_tokens_async("ping")
+        return True
+
+    async def stream(self, request: LLMRequest, timing: Any) -> AsyncIterator[str]:
+        model, generation_config, timing.model_reused = self._get_model(request)
+        logger.info(f"Appel au modèle Vertex AI ({request.model_name})...")
+        sent = time.perf_counter()
+        # Réponse en flux : le premier fragment donne le délai de premier octet.
+        response_stream = await model.generate_content_async(
+            request.prompt, generation_config=generation_config, stream=True
+        )
+        has_text = False
+        block_reason = None
+        async for chunk in response_stream:
+            if timing.ttfb_seconds is None:
+                timing.ttfb_seconds = time.perf_counter() - sent
+            feedback = getattr(chunk, 'prompt_feedback', None)
+            if feedback is not None and getattr(feedback, 'block_reason', None):
+                block_reason = feedback.block_reason.name
+            usage = getattr(chunk, 'usage_metadata', None)
+            if usage is not None and getattr(usage, 'total_token_count', 0):
+                timing.total_tokens = usage.total_token_count
+                timing.prompt_tokens = getattr(usage, 'prompt_token_count', None)
+                timing.output_tokens = getattr(usage, 'candidates_token_count', None)
+            text = _chunk_text(chunk)
+            if text:
+                has_text = True
+                yield text
+
+        if has_text:
+            return
+        if block_reason:
+            logger.error(f"Appel bloqué par Vertex AI. Raison: {block_reason}")
+            raise Exception(f"Vertex AI response was blocked due to: {block_reason}")
+        logger.error("Vertex AI a retourné une réponse vide ou invalide.")
+        raise Exception("Vertex AI returned an empty or invalid response.")
+
+
+class StubProviderError(Exception):
+    """Erreur simulée par le stub (`error_rate`), vue comme un 429 par le limiteur."""
+
+    code = 429
+
+
+class StubLLMProvider(LLMProvider):
+    name = "stub"
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None, recordings: Optional[Dict[str, str]] = None):
+        config = config if config is not None else load_stub_config()
+        self.latency = config.get("latency", {"distribution": "constant", "seconds": 0.0})
+        self.ttfb_fraction = min(1.0, max(0.0, float(config.get("ttfb_fraction", 0.3))))
+        self.chunk_chars = max(1, int(config.get("chunk_chars", 80)))
+        self.array_items = max(0, int(config.get("array_items", 2)))
+        self.error_rate = float(config.get("error_rate", 0.0))
+        self._rng = random.Random(config.get("seed", 0))
+        if recordings is None:
+            recordings = load_recordings(config.get("recordings") or LLM_STUB_RECORDINGS)
+        self.recordings = recordings
+        self.replayed = 0
+        self.synthesized = 0
+
+    def sample_latency(self) -> float:
+        spec = self.latency
+        distribution = spec.get("distribution", "constant")
+        if distribution == "uniform":
+            value = self._rng.uniform(float(spec.get("min_seconds", 0)), float(spec.get("max_seconds", 0)))
+        elif distribution == "normal":
+            value = self._rng.gauss(float(spec.get("mean_seconds", 0)), float(spec.get("stddev_seconds", 0)))
+        elif distribution == "lognormal":
+            median = float(spec.get("median_seconds", 0))
+            value = self._rng.lognormvariate(math.log(median), float(spec.get("sigma", 0))) if median > 0 else 0.0
+        else:
+            value = float(spec.get("seconds", 0))
+        return max(0.0, value)
+
+    def respond(self, request: LLMRequest) -> str:
+        """Réponse déterministe : enregistrement rejoué, sinon réponse synthétique."""
+        key = prompt_key(request.system_prompt, request.prompt)
+        recorded = self.recordings.get(key)
+        if recorded is not None:
+            self.replayed += 1
+            return recorded
+        self.synthesized += 1
+        rng = random.Random(key)
+        if request.json_mode:
+            return json.dumps(synthesize_from_schema(request.response_schema, rng, self.array_items), ensure_ascii=False)
+        return f"Réponse simulée {key[:12]} : {request.prompt[:200]}"
+
+    async def stream(self, request: LLMRequest, timing: Any) -> AsyncIterator[str]:
+        timing.model_reused = True
+        latency = self.sample_latency()
+        if self.error_rate and self._rng.random() < self.error_rate:
+            await asyncio.sleep(latency * self.ttfb_fraction)
+            raise StubProviderError("Stub LLM : quota simulé (429 resource exhausted).")
+        text = self.respond(request)
+        chunks = [text[i:i + self.chunk_chars] for i in range(0, len(text), self.chunk_chars)] or [""]
+        sent = time.perf_counter()
+        await asyncio.sleep(latency * self.ttfb_fraction)
+        timing.ttfb_seconds = time.perf_counter() - sent
+        pause = latency * (1 - self.ttfb_fraction) / max(1, len(chunks) - 1)
+        for index, chunk in enumerate(chunks):
+            if index:
+                await asyncio.sleep(pause)
+            yield chunk
+        timing.prompt_tokens = estimate_tokens(request.system_prompt, request.prompt)
+        timing.output_tokens = estimate_tokens(text)
+        timing.total_tokens = timing.prompt_tokens + timing.output_tokens
+
+
+def synthesize_from_schema(schema: Optional[Dict[str, Any]], rng: random.Random, array_items: int = 2, path: str = "") -> Any:
+    """Valeur conforme au schéma (sous-ensemble OpenAPI de `structured_output`)."""
+    if not schema:
+        return {}
+    if "enum" in schema:
+        return rng.choice(schema["enum"])
+    schema_type = (schema.get("type") or "object").lower()
+    if schema_type == "object":
+        return {
+            key: synthesize_from_schema(sub_schema, rng, array_items, f"{path}_{key}" if path else key)
+            for key, sub_schema in schema.get("properties", {}).items()
+        }
+    if schema_type == "array":
+        items = schema.get("items")
+        # Des chaînes inventées dans un tableau (dépendances, références) pointeraient
+        # vers des éléments inexistants : seuls les tableaux d'objets sont remplis.
+        if not items or (items.get("type") or "object").lower() != "object":
+            return []
+        return [synthesize_from_schema(items, rng, array_items, f"{path}_{index}") for index in range(array_items)]
+    if schema_type == "integer":
+        return rng.randint(1, 10)
+    if schema_type == "number":
+        return rng.randint(1, 10)
+    if schema_type == "boolean":
+        return True
+    return f"stub_{path or 'value'}"
+
+
+class LLMResponseRecorder:
+    """Ajoute les réponses obtenues à un fichier JSONL rejouable par le stub."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def record(self, request: LLMRequest, response: str) -> None:
+        line = json.dumps(
+            {
+                "key": prompt_key(request.system_prompt, request.prompt),
+                "model": request.model_name,
+                "json_mode": request.json_mode,
+                "response": response,
+                "recorded_at": time.time(),
+            },
+            ensure_ascii=False,
+        )
+        try:
+            with self._lock, open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+        except OSError as e:
+            logger.warning(f"Enregistrement de la réponse LLM impossible ({self.path}) : {e}")
+
+
+def load_recordings(path: Optional[str]) -> Dict[str, str]:
+    if not path:
+        return {}
+    recordings: Dict[str, str] = {}
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                entry = json.loads(line)
+                recordings[entry["key"]] = entry["response"]
+    except (OSError, ValueError, KeyError) as e:
+        logger.error(f"Enregistrements LLM illisibles ({path}) : {e}. Réponses synthétiques uniquement.")
+    logger.info(f"{len(recordings)} réponse(s) LLM enregistrée(s) chargée(s) depuis {path}.")
+    return recordings
+
+
+def load_stub_config() -> Dict[str, Any]:
+    raw = os.environ.get(LLM_STUB_CONFIG_ENV)
+    if not raw:
+        return {}
+    try:
+        config = json.loads(raw)
+        if not isinstance(config, dict):
+            raise ValueError("la configuration doit être un objet JSON")
+        return config
+    except ValueError as e:
+        logger.error(f"{LLM_STUB_CONFIG_ENV} invalide ({e}). Configuration par défaut du stub utilisée.")
+        return {}
+
+
+_PROVIDERS = {
+    VertexLLMProvider.name: VertexLLMProvider,
+    StubLLMProvider.name: StubLLMProvider,
+}
+_provider: Optional[LLMProvider] = None
+_recorder: Optional[LLMResponseRecorder] = None
+_provider_lock = threading.Lock()
+
+
+def get_llm_provider() -> LLMProvider:
+    """Backend partagé du processus, choisi par LLM_PROVIDER."""
+    global _provider
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                provider_class = _PROVIDERS.get(LLM_PROVIDER)
+                if provider_class is None:
+                    logger.error(f"LLM_PROVIDER '{LLM_PROVIDER}' inconnu. Vertex AI utilisé.")
+                    provider_class = VertexLLMProvider
+                _provider = provider_class()
+                logger.info(f"Backend LLM : {_provider.name}.")
+    return _provider
+
+
+def set_llm_provider(provider: Optional[LLMProvider]) -> None:
+    """Remplace le backend partagé (tests, benchmarks)."""
+    global _provider
+    with _provider_lock:
+        _provider = provider
+
+
+def get_llm_recorder() -> Optional[LLMResponseRecorder]:
+    global _recorder
+    if _recorder is None and LLM_RECORD_PATH:
+        _recorder = LLMResponseRecorder(LLM_RECORD_PATH)
+    return _recorder
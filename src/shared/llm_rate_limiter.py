@@ -0,0 +1,277 @@
+"""
+Limitation côté client des appels Vertex AI.
+
+Chaque appel LLM passe par `LLMRateLimiter.acquire(model, tokens)`, dans cet ordre :
+    1. deux seaux à jetons par modèle : requêtes par minute et jetons par
+       minute (estimation à l'envoi, corrigée avec l'usage réel), attendus sans
+       détenir de créneau de concurrence ;
+    2. un plafond par modèle, adaptatif (AIMD) : divisé par deux à chaque
+       réponse 429, puis réaugmenté d'une unité après une série de succès ;
+    3. un plafond global de requêtes simultanées pour le processus.
+
+Les erreurs 429 et 503 sont relancées avec un backoff exponentiel à gigue
+complète ; un délai `Retry-After` (en-tête ou `retryDelay` du détail d'erreur)
+est respecté s'il est plus long.
+
+Configuration (variable d'environnement LLM_RATE_LIMITS, JSON) :
+    {
+      "max_concurrency": 16,
+      "models": {"default": {"max_concurrency": 8, "requests_per_minute": 300, "tokens_per_minute": 1000000}},
+      "max_retries": 4,
+      "base_delay_seconds": 1,
+      "max_delay_seconds": 30
+    }
+"""
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import random
+import re
+import time
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+LLM_RATE_LIMITS_ENV = "LLM_RATE_LIMITS"
+DEFAULT_GLOBAL_CONCURRENCY = 16
+DEFAULT_MODEL_LIMITS: Dict[str, Any] = {
+    "max_concurrency": 8,
+    "requests_per_minute": 300,
+    "tokens_per_minute": 1_000_000,
+}
+DEFAULT_MAX_RETRIES = 4
+DEFAULT_BASE_DELAY_SECONDS = 1.0
+DEFAULT_MAX_DELAY_SECONDS = 30.0
+
+_RETRYABLE_STATUS = {429, 503}
+_RETRY_DELAY_PATTERN = re.compile(r"retry[ _-]?(?:after|delay)\D{0,5}(\d+(?:\.\d+)?)\s*s?", re.IGNORECASE)
+
+
+def estimate_tokens(*texts: Optional[str]) -> int:
+    """Estimation grossière (≈ 4 caractères par jeton), suffisante pour le seau TPM."""
+    return max(1, sum(len(text) for text in texts if text) // 4)
+
+
+class TokenBucket:
+    """
+    Seau à jetons rempli à `rate_per_minute`. Le niveau peut devenir négatif
+    (dette) quand l'usage réel dépasse l'estimation : les appels suivants attendent.
+    """
+
+    def __init__(self, rate_per_minute: float, clock: Callable[[], float] = time.monotonic):
+        self.rate_per_second = rate_per_minute / 60.0
+        self.capacity = float(rate_per_minute)
+        self._clock = clock
+        self._level = self.capacity
+        self._updated_at = clock()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._level = min(self.capacity, self._level + (now - self._updated_at) * self.rate_per_second)
+        self._updated_at = now
+
+    def wait_seconds(self, amount: float) -> float:
+        self._refill()
+        # Une demande plus grosse que le seau passe dès qu'il est plein.
+        amount = min(amount, self.capacity)
+        if self._level >= amount:
+            return 0.0
+        return (amount - self._level) / self.rate_per_second
+
+    async def acquire(self, amount: float) -> None:
+        # Le verrou sert les demandes dans l'ordre d'arrivée.
+        async with self._lock:
+            while True:
+                delay = self.wait_seconds(amount)
+                if delay <= 0:
+                    self._level -= amount
+                    return
+                await asyncio.sleep(delay)
+
+    def adjust(self, delta: float) -> None:
+        """Corrige le niveau après coup (delta > 0 : jetons consommés en plus)."""
+        self._refill()
+        self._level -= delta
+
+
+class AdaptiveConcurrencyLimit:
+    """Sémaphore dont la limite baisse sur saturation (429) et remonte progressivement."""
+
+    def __init__(self, max_limit: int):
+        self.max_limit = max(1, max_limit)
+        self.limit = self.max_limit
+        self.in_flight = 0
+        self._successes = 0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self) -> None:
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+
+    async def release(self) -> None:
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def on_success(self) -> None:
+        self._successes += 1
+        if self.limit < self.max_limit and self._successes >= self.limit:
+            self.limit += 1
+            self._successes = 0
+
+    def on_throttled(self) -> None:
+        self.limit = max(1, self.limit // 2)
+        self._successes = 0
+
+
+class LLMPermit:
+    """Créneau obtenu pour un appel ; l'appelant y signale l'issue et l'usage réel."""
+
+    def __init__(self, model_limits: "_ModelLimits", estimated_tokens: int, waited_seconds: float):
+        self._model_limits = model_limits
+        self.estimated_tokens = estimated_tokens
+        self.waited_seconds = waited_seconds
+
+    def succeeded(self, actual_tokens: Optional[int] = None) -> None:
+        self._model_limits.concurrency.on_success()
+        if actual_tokens and self._model_limits.tokens is not None:
+            self._model_limits.tokens.adjust(actual_tokens - self.estimated_tokens)
+
+    def throttled(self) -> None:
+        self._model_limits.concurrency.on_throttled()
+        logger.warning(
+            f"Quota LLM atteint : concurrence réduite à {self._model_limits.concurrency.limit} pour ce modèle."
+        )
+
+
+class _ModelLimits:
+    def __init__(self, config: Dict[str, Any]):
+        self.concurrency = AdaptiveConcurrencyLimit(int(config.get("max_concurrency") or 1))
+        rpm = config.get("requests_per_minute")
+        tpm = config.get("tokens_per_minute")
+        self.requests = TokenBucket(float(rpm)) if rpm else None
+        self.tokens = TokenBucket(float(tpm)) if tpm else None
+
+
+class LLMRateLimiter:
+    def __init__(self, config: Optional[Dict[str, Any]] = None, rng: Optional[random.Random] = None):
+        config = config if config is not None else load_llm_rate_limits_config()
+        self.global_concurrency = int(config.get("max_concurrency", DEFAULT_GLOBAL_CONCURRENCY))
+        self._model_configs: Dict[str, Dict[str, Any]] = config.get("models", {})
+        self.max_retries = int(config.get("max_retries", DEFAULT_MAX_RETRIES))
+        self.base_delay_seconds = float(config.get("base_delay_seconds", DEFAULT_BASE_DELAY_SECONDS))
+        self.max_delay_seconds = float(config.get("max_delay_seconds", DEFAULT_MAX_DELAY_SECONDS))
+        self._rng = rng or random.Random()
+        self._global: Optional[asyncio.Semaphore] = None
+        self._models: Dict[str, _ModelLimits] = {}
+        self.throttled_calls = 0
+        self.retried_calls = 0
+
+    def _model_limits(self, model: str) -> _ModelLimits:
+        limits = self._models.get(model)
+        if limits is None:
+            model_config = {
+                **DEFAULT_MODEL_LIMITS,
+                **self._model_configs.get("default", {}),
+                **self._model_configs.get(model, {}),
+            }
+            limits = self._models[model] = _ModelLimits(model_config)
+        return limits
+
+    @contextlib.asynccontextmanager
+    async def acquire(self, model: str, estimated_tokens: int) -> AsyncIterator[LLMPermit]:
+        if self._global is None:
+            self._global = asyncio.Semaphore(self.global_concurrency)
+        limits = self._model_limits(model)
+        started = time.perf_counter()
+        # Quotas du modèle d'abord, sans créneau de concurrence : un modèle à court
+        # de quota ne doit pas bloquer les appels aux autres modèles.
+        if limits.requests is not None:
+            await limits.requests.acquire(1)
+        if limits.tokens is not None:
+            await limits.tokens.acquire(estimated_tokens)
+        await limits.concurrency.acquire()
+        try:
+            async with self._global:
+                yield LLMPermit(limits, estimated_tokens, time.perf_counter() - started)
+        finally:
+            await limits.concurrency.release()
+
+    def retry_delay(self, error: BaseException, attempt: int) -> Optional[float]:
+        """Délai avant la relance `attempt` (1 = première), ou None si l'erreur n'est pas relançable."""
+        if attempt > self.max_retries or retryable_status(error) is None:
+            return None
+        ceiling = min(self.max_delay_seconds, self.base_delay_seconds * (2 ** (attempt - 1)))
+        delay = self._rng.uniform(0, ceiling)
+        retry_after = retry_after_seconds(error)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_delay_seconds))
+        return delay
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "global_concurrency": self.global_concurrency,
+            "throttled_calls": self.throttled_calls,
+            "retried_calls": self.retried_calls,
+            "models": {
+                model: {
+                    "concurrency_limit": limits.concurrency.limit,
+                    "in_flight": limits.concurrency.in_flight,
+                }
+                for model, limits in self._models.items()
+            },
+        }
+
+
+def retryable_status(error: BaseException) -> Optional[int]:
+    """429 ou 503 si l'erreur correspond à une saturation ou une indisponibilité, sinon None."""
+    code = getattr(error, "code", None)
+    code = getattr(code, "value", code)
+    if isinstance(code, tuple):  # grpc.StatusCode : (numéro, nom)
+        code = code[0]
+    grpc_to_http = {8: 429, 14: 503}
+    if isinstance(code, int):
+        code = grpc_to_http.get(code, code)
+        if code in _RETRYABLE_STATUS:
+            return code
+    status_code = getattr(getattr(error, "response", None), "status_code", None)
+    if status_code in _RETRYABLE_STATUS:
+        return status_code
+    text = str(error).lower()
+    if "429" in text or "resource exhausted" in text or "resource_exhausted" in text or "quota" in text:
+        return 429
+    if "503" in text or "unavailable" in text:
+        return 503
+    return None
+
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    """Délai demandé par le serveur (en-tête Retry-After ou retryDelay du détail d'erreur)."""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if headers:
+        value = headers.get("Retry-After") or headers.get("retry-after")
+        if value:
+            try:
+                return float(value)
+            except ValueError:
+                pass
+    match = _RETRY_DELAY_PATTERN.search(str(error))
+    return float(match.group(1)) if match else None
+
+
+def load_llm_rate_limits_config() -> Dict[str, Any]:
+    raw = os.environ.get(LLM_RATE_LIMITS_ENV)
+    if not raw:
+        return {}
+    try:
+        config = json.loads(raw)
+        if not isinstance(config, dict):
+            raise ValueError("la configuration doit être un objet JSON")
+        return config
+    except ValueError as e:
+        logger.error(f"{LLM_RATE_LIMITS_ENV} invalide ({e}). Limites par défaut utilisées.")
+        return {}
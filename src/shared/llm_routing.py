@@ -0,0 +1,297 @@
+"""
+Routage des appels LLM vers un modèle selon l'agent, la compétence et la taille du prompt.
+
+Chaque appel est classé par taille (jetons estimés du prompt et du prompt
+système : small, medium, large) puis confronté, dans l'ordre, aux routes de la
+table ; la première dont tous les critères correspondent fixe le modèle et sa
+configuration de génération. Sans route correspondante, le modèle et la
+température du client (LLM_MODEL, LLM_TEMPERATURE) s'appliquent.
+
+Budget de latence : une route peut désigner un `fallback_model` plus rapide.
+Il est utilisé quand la latence observée du modèle principal (p95 des appels
+récents, ou `expected_latency_seconds` tant qu'il n'y a pas d'historique)
+dépasse le budget, c'est-à-dire le plus petit de `latency_budget_seconds` et du
+temps restant avant l'échéance A2A de la tâche.
+
+La latence observée est le temps passé chez le backend (attente du limiteur et
+pauses entre relances exclues) ; un appel interrompu (échéance, annulation)
+compte pour sa durée, minorant de sa latence réelle. Pour que le modèle principal
+puisse redevenir éligible, les mesures expirent après
+LLM_ROUTING_LATENCY_MAX_AGE_SECONDS et, pour les tâches sans échéance, un appel
+sur LLM_ROUTING_PROBE_INTERVAL replié est envoyé au modèle principal (sonde).
+
+Configuration (variable d'environnement LLM_ROUTING, JSON) :
+    {
+      "size_classes": {"small": 1500, "medium": 8000},
+      "routes": [
+        {"name": "evaluation", "agent": "EvaluatorAgentServer", "model": "gemini-2.0-flash-lite-001",
+         "temperature": 0.2, "max_output_tokens": 1024},
+        {"name": "code-large", "skill": "coding_python", "size": ["medium", "large"],
+         "model": "gemini-1.5-pro-002", "max_output_tokens": 8192,
+         "fallback_model": "gemini-2.0-flash-001", "latency_budget_seconds": 90,
+         "expected_latency_seconds": 40}
+      ]
+    }
+Critères d'une route (chaîne ou liste) : agent (AGENT_NAME : nom du serveur,
+ex. EvaluatorAgentServer, sauf surcharge par l'environnement), skill (compétence
+assignée par le superviseur), size. Une route sans critère s'applique à tout.
+"""
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+LLM_ROUTING_ENV = "LLM_ROUTING"
+DEFAULT_SIZE_CLASSES = {"small": 1500, "medium": 8000}
+# Nombre de durées d'appel conservées par modèle pour estimer sa latence.
+LLM_ROUTING_LATENCY_HISTORY = int(os.environ.get("LLM_ROUTING_LATENCY_HISTORY", "50"))
+# Âge au-delà duquel une mesure de latence n'est plus prise en compte.
+LLM_ROUTING_LATENCY_MAX_AGE_SECONDS = float(os.environ.get("LLM_ROUTING_LATENCY_MAX_AGE_SECONDS", "300"))
+# Un appel replié sur N est envoyé au modèle principal pour rafraîchir sa mesure (0 = jamais).
+LLM_ROUTING_PROBE_INTERVAL = int(os.environ.get("LLM_ROUTING_PROBE_INTERVAL", "10"))
+# Marge retirée du temps restant avant l'échéance (traitement de la réponse, publication).
+LLM_ROUTING_DEADLINE_MARGIN_SECONDS = float(os.environ.get("LLM_ROUTING_DEADLINE_MARGIN_SECONDS", "5"))
+
+_MATCH_KEYS = ("agent", "skill", "size")
+
+# Compétence et échéance de la tâche A2A en cours, liées par l'exécuteur.
+_route_scope: contextvars.ContextVar[Tuple[Optional[str], Optional[float]]] = contextvars.ContextVar(
+    "llm_route_scope", default=(None, None)
+)
+
+
+@contextlib.contextmanager
+def bind_llm_route(skill: Optional[str], deadline: Optional[float]) -> Iterator[None]:
+    """Route les appels LLM de ce contexte selon la compétence et l'échéance (epoch) données."""
+    token = _route_scope.set((skill, deadline))
+    try:
+        yield
+    finally:
+        _route_scope.reset(token)
+
+
+class LLMRoute:
+    """Modèle et configuration de génération retenus pour un appel."""
+
+    def __init__(
+        self,
+        name: str,
+        model_name: str,
+        temperature: float,
+        size_class: str,
+        max_output_tokens: Optional[int] = None,
+        top_p: Optional[float] = None,
+        fallback_from: Optional[str] = None,
+    ):
+        self.name = name
+        self.model_name = model_name
+        self.temperature = temperature
+        self.size_class = size_class
+        self.max_output_tokens = max_output_tokens
+        self.top_p = top_p
+        # Modèle principal de la route quand le modèle de repli a été retenu.
+        self.fallback_from = fallback_from
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "model": self.model_name,
+            "temperature": self.temperature,
+            "size_class": self.size_class,
+            "max_output_tokens": self.max_output_tokens,
+            "top_p": self.top_p,
+            "fallback_from": self.fallback_from,
+        }
+
+
+def _matches(criterion: Any, value: Optional[str]) -> bool:
+    if criterion is None:
+        return True
+    if isinstance(criterion, str):
+        return criterion == value
+    return value in criterion
+
+
+class LLMRouter:
+    def __init__(
+        self,
+        config: Optional[Dict[str, Any]] = None,
+        clock: Callable[[], float] = time.monotonic,
+        probe_interval: int = LLM_ROUTING_PROBE_INTERVAL,
+        max_sample_age_seconds: float = LLM_ROUTING_LATENCY_MAX_AGE_SECONDS,
+    ):
+        config = load_llm_routing_config() if config is None else config
+        self.size_classes = sorted(
+            config.get("size_classes", DEFAULT_SIZE_CLASSES).items(), key=lambda item: item[1]
+        )
+        self.routes: List[Dict[str, Any]] = []
+        for index, route in enumerate(config.get("routes", [])):
+            if not route.get("model"):
+                logger.error(f"Route LLM sans modèle ignorée : {route}")
+                continue
+            self.routes.append({"name": f"route{index}", **route})
+        self._clock = clock
+        self.probe_interval = probe_interval
+        self.max_sample_age_seconds = max_sample_age_seconds
+        # Mesures par modèle : (instant d'observation, durée).
+        self._latencies: Dict[str, Deque[Tuple[float, float]]] = {}
+        self._lock = threading.Lock()
+        self._counts: Dict[str, int] = {}
+        # Décisions de repli par route, pour espacer les sondes.
+        self._fallback_streaks: Dict[str, int] = {}
+        self.fallbacks = 0
+        self.probes = 0
+
+    def size_class(self, prompt_tokens: int) -> str:
+        for name, max_tokens in self.size_classes:
+            if prompt_tokens <= max_tokens:
+                return name
+        return "large"
+
+    def route(
+        self,
+        prompt_tokens: int,
+        default_model: str,
+        default_temperature: float,
+        agent: Optional[str] = None,
+        now: Optional[float] = None,
+    ) -> LLMRoute:
+        """Route d'un appel de `prompt_tokens` jetons, pour l'agent donné et la tâche du contexte."""
+        skill, deadline = _route_scope.get()
+        size = self.size_class(prompt_tokens)
+        values = {"agent": agent or os.environ.get("AGENT_NAME"), "skill": skill, "size": size}
+        config = next(
+            (route for route in self.routes if all(_matches(route.get(key), values[key]) for key in _MATCH_KEYS)),
+            None,
+        )
+        if config is None:
+            return self._count(LLMRoute("default", default_model, default_temperature, size))
+
+        route = LLMRoute(
+            config["name"],
+            config["model"],
+            config.get("temperature", default_temperature),
+            size,
+            max_output_tokens=config.get("max_output_tokens"),
+            top_p=config.get("top_p"),
+        )
+        fallback_model = config.get("fallback_model")
+        if fallback_model:
+            budget = self._latency_budget(config, deadline, time.time() if now is None else now)
+            expected = self.expected_latency(route.model_name, config.get("expected_latency_seconds"))
+            if budget is not None and expected is not None and expected > budget:
+                # Sans échéance, le repli n'est qu'une préférence : un appel de temps
+                # en temps sonde le modèle principal.
+                if deadline is None and self._probe_due(route.name):
+                    logger.info(f"Route LLM '{route.name}' : sonde du modèle principal {route.model_name}.")
+                    return self._count(route)
+                logger.info(
+                    f"Route LLM '{route.name}' : {route.model_name} (≈{expected:.1f}s) dépasse le budget "
+                    f"de {budget:.1f}s, repli sur {fallback_model}."
+                )
+                route.fallback_from = route.model_name
+                route.model_name = fallback_model
+        return self._count(route)
+
+    def _probe_due(self, route_name: str) -> bool:
+        if self.probe_interval <= 0:
+            return False
+        with self._lock:
+            streak = self._fallback_streaks.get(route_name, 0) + 1
+            if streak < self.probe_interval:
+                self._fallback_streaks[route_name] = streak
+                return False
+            self._fallback_streaks[route_name] = 0
+            self.probes += 1
+            return True
+
+    @staticmethod
+    def _latency_budget(config: Dict[str, Any], deadline: Optional[float], now: float) -> Optional[float]:
+        budgets = []
+        if config.get("latency_budget_seconds") is not None:
+            budgets.append(float(config["latency_budget_seconds"]))
+        if deadline is not None:
+            budgets.append(deadline - now - LLM_ROUTING_DEADLINE_MARGIN_SECONDS)
+        return min(budgets) if budgets else None
+
+    def _count(self, route: LLMRoute) -> LLMRoute:
+        label = f"{route.name}:fallback" if route.fallback_from else route.name
+        with self._lock:
+            self._counts[label] = self._counts.get(label, 0) + 1
+            if route.fallback_from:
+                self.fallbacks += 1
+        return route
+
+    def observe(self, model_name: str, provider_seconds: float, succeeded: bool, timed_out: bool = False) -> None:
+        """
+        Enregistre le temps passé chez le backend pour un appel au modèle. Les
+        échecs rapides (erreur, quota) sont ignorés ; un appel interrompu compte.
+        """
+        if not (succeeded or timed_out):
+            return
+        with self._lock:
+            history = self._latencies.setdefault(model_name, deque(maxlen=LLM_ROUTING_LATENCY_HISTORY))
+            history.append((self._clock(), provider_seconds))
+
+    def expected_latency(self, model_name: str, default: Optional[float] = None) -> Optional[float]:
+        """p95 des durées récentes (non expirées) du modèle, ou `default` sans historique."""
+        oldest = self._clock() - self.max_sample_age_seconds
+        with self._lock:
+            samples = self._latencies.get(model_name)
+            while samples and samples[0][0] < oldest:
+                samples.popleft()
+            history = sorted(seconds for _, seconds in samples or ())
+        if not history:
+            return float(default) if default is not None else None
+        return history[min(len(history) - 1, int(0.95 * len(history)))]
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = dict(self._counts)
+            models = list(self._latencies)
+        return {
+            "routes": len(self.routes),
+            "requests_by_route": counts,
+            "fallbacks": self.fallbacks,
+            "probes": self.probes,
+            "expected_latency_seconds": {
+                model: round(latency, 4)
+                for model in models
+                if (latency := self.expected_latency(model)) is not None
+            },
+        }
+
+
+def load_llm_routing_config() -> Dict[str, Any]:
+    raw = os.environ.get(LLM_ROUTING_ENV)
+    if not raw:
+        return {}
+    try:
+        config = json.loads(raw)
+        if not isinstance(config, dict):
+            raise ValueError("la configuration doit être un objet JSON")
+        return config
+    except ValueError as e:
+        logger.error(f"{LLM_ROUTING_ENV} invalide ({e}). Modèle unique LLM_MODEL utilisé.")
+        return {}
+
+
+_router: Optional[LLMRouter] = None
+_router_lock = threading.Lock()
+
+
+def get_llm_router() -> LLMRouter:
+    """Table de routage partagée du processus (configurée par LLM_ROUTING)."""
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = LLMRouter()
+    return _router
@@ -0,0 +1,232 @@
+"""
+Comptabilité des appels LLM : jetons et latence par agent, par plan et par tâche.
+
+Chaque appel (réussi ou non) est enregistré avec l'agent (AGENT_NAME), le plan
+(`context_id` A2A) et la tâche liés au contexte par `bind_llm_usage`. Les
+compteurs sont agrégés en mémoire puis versés dans Firestore par `flush`
+(à la fin de chaque tâche A2A), en incréments :
+    llm_usage/{plan_id}   totals, agents.{agent}, tasks.{task_id}, routes.{route}
+                          (document de coût du plan)
+    agent_stats/{agent}   llm_calls, llm_total_tokens, ... (cumul tous plans)
+
+La route de chaque appel (voir `llm_routing.py`) est comptée sous son nom,
+suffixé de `:fallback` quand le modèle de repli a été retenu, avec le dernier
+modèle utilisé ; la tâche retient aussi sa dernière route et son dernier modèle.
+
+Le GRA en publie les ventilations (`/v1/llm_usage/...`).
+"""
+import contextlib
+import contextvars
+import logging
+import os
+import threading
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+
+UsageKey = Tuple[Optional[str], Optional[str], str, Optional[str]]
+
+logger = logging.getLogger(__name__)
+
+LLM_USAGE_COLLECTION = "llm_usage"
+USAGE_COUNTERS = ("calls", "failures", "prompt_tokens", "output_tokens", "total_tokens", "latency_seconds", "queue_seconds")
+
+_usage_scope: contextvars.ContextVar[Tuple[Optional[str], Optional[str]]] = contextvars.ContextVar(
+    "llm_usage_scope", default=(None, None)
+)
+
+
+@contextlib.contextmanager
+def bind_llm_usage(plan_id: Optional[str], task_id: Optional[str]) -> Iterator[None]:
+    """Impute au plan et à la tâche donnés les appels LLM faits dans ce contexte."""
+    token = _usage_scope.set((plan_id, task_id))
+    try:
+        yield
+    finally:
+        _usage_scope.reset(token)
+
+
+def _empty_counters() -> Dict[str, float]:
+    return dict.fromkeys(USAGE_COUNTERS, 0)
+
+
+def _timing_counters(timing: Any) -> Dict[str, float]:
+    prompt_tokens = timing.prompt_tokens or 0
+    output_tokens = timing.output_tokens or 0
+    return {
+        "calls": 1,
+        "failures": 0 if timing.succeeded else 1,
+        "prompt_tokens": prompt_tokens,
+        "output_tokens": output_tokens,
+        "total_tokens": timing.total_tokens or prompt_tokens + output_tokens,
+        "latency_seconds": timing.total_seconds,
+        "queue_seconds": timing.queue_seconds,
+    }
+
+
+def _route_label(timing: Any) -> str:
+    route = getattr(timing, "route", None) or "default"
+    return f"{route}:fallback" if getattr(timing, "fallback_from", None) else route
+
+
+def _add(target: Dict[str, float], counters: Dict[str, float]) -> None:
+    for name, value in counters.items():
+        target[name] = target.get(name, 0) + value
+
+
+class LLMUsageTracker:
+    def __init__(self, agent_name: Optional[str] = None):
+        self.agent_name = agent_name or os.environ.get("AGENT_NAME") or "unknown_agent"
+        self._lock = threading.Lock()
+        # Incréments pas encore versés, par (plan, tâche, route, modèle).
+        self._pending: Dict[UsageKey, Dict[str, float]] = {}
+        self._totals = _empty_counters()
+        self.flush_failures = 0
+
+    def record(self, timing: Any) -> None:
+        """Enregistre un appel (un `LLMCallTiming`) pour le plan et la tâche du contexte."""
+        counters = _timing_counters(timing)
+        key = (*_usage_scope.get(), _route_label(timing), getattr(timing, "model", None))
+        with self._lock:
+            _add(self._pending.setdefault(key, _empty_counters()), counters)
+            _add(self._totals, counters)
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            totals = dict(self._totals)
+            pending_plans = len({key[0] for key in self._pending})
+        return {"agent": self.agent_name, **_with_averages(totals), "pending_plans": pending_plans}
+
+    def flush(self, db: Any = None) -> int:
+        """Verse les incréments en attente dans Firestore ; retourne le nombre d'entrées versées."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        if db is None:
+            from src.shared.firebase_init import db
+        try:
+            if not db:
+                raise RuntimeError("client Firestore non initialisé")
+            self._write(db, pending)
+            return len(pending)
+        except Exception as e:
+            # Rien n'est perdu : les incréments seront retentés au prochain versement.
+            self.flush_failures += 1
+            logger.error(f"Versement de l'usage LLM impossible : {e}")
+            with self._lock:
+                for key, counters in pending.items():
+                    _add(self._pending.setdefault(key, _empty_counters()), counters)
+            return 0
+
+    def _write(self, db: Any, pending: Dict[UsageKey, Dict[str, float]]) -> None:
+        from google.cloud import firestore
+
+        def increments(counters: Dict[str, float]) -> Dict[str, Any]:
+            return {name: firestore.Increment(value) for name, value in counters.items() if value}
+
+        per_plan: Dict[str, Dict[Tuple[str, str, Optional[str]], Dict[str, float]]] = {}
+        agent_totals = _empty_counters()
+        for (plan_id, task_id, route, model), counters in pending.items():
+            _add(agent_totals, counters)
+            if plan_id:
+                per_plan.setdefault(plan_id, {})[(task_id or "", route, model)] = counters
+
+        for plan_id, entries in per_plan.items():
+            plan_totals = _empty_counters()
+            tasks: Dict[str, Dict[str, Any]] = {}
+            routes: Dict[str, Dict[str, Any]] = {}
+            for (task_id, route, model), counters in entries.items():
+                _add(plan_totals, counters)
+                _add(routes.setdefault(route, {}), counters)
+                if model:
+                    routes[route]["model"] = model
+                if task_id:
+                    _add(tasks.setdefault(task_id, {}), counters)
+                    tasks[task_id].update({"route": route, "model": model})
+            update: Dict[str, Any] = {
+                "plan_id": plan_id,
+                "updated_at": firestore.SERVER_TIMESTAMP,
+                "totals": increments(plan_totals),
+                "agents": {self.agent_name: increments(plan_totals)},
+                "routes": {
+                    route: {**increments(_counters_only(counters)), **_labels(counters)}
+                    for route, counters in routes.items()
+                },
+            }
+            if tasks:
+                update["tasks"] = {
+                    task_id: {**increments(_counters_only(counters)), **_labels(counters), "agent": self.agent_name}
+                    for task_id, counters in tasks.items()
+                }
+            db.collection(LLM_USAGE_COLLECTION).document(plan_id).set(update, merge=True)
+
+        db.collection("agent_stats").document(self.agent_name).set(
+            {f"llm_{name}": value for name, value in increments(agent_totals).items()}, merge=True
+        )
+        logger.info(f"Usage LLM versé : {int(agent_totals['calls'])} appel(s), {len(per_plan)} plan(s).")
+
+
+def _counters_only(entry: Dict[str, Any]) -> Dict[str, float]:
+    return {name: entry[name] for name in USAGE_COUNTERS if name in entry}
+
+
+def _labels(entry: Dict[str, Any]) -> Dict[str, Any]:
+    return {name: entry[name] for name in ("route", "model") if entry.get(name)}
+
+
+def _with_averages(counters: Dict[str, Any]) -> Dict[str, Any]:
+    counters = {name: counters.get(name, 0) for name in USAGE_COUNTERS}
+    calls = counters["calls"]
+    counters["latency_seconds"] = round(counters["latency_seconds"], 4)
+    counters["queue_seconds"] = round(counters["queue_seconds"], 4)
+    counters["avg_latency_seconds"] = round(counters["latency_seconds"] / calls, 4) if calls else None
+    return counters
+
+
+def usage_breakdown(plan_docs: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """Fusionne des documents `llm_usage` (un plan ou les plans d'un plan global) en une ventilation."""
+    totals: Dict[str, float] = {}
+    agents: Dict[str, Dict[str, float]] = {}
+    tasks: Dict[str, Dict[str, Any]] = {}
+    routes: Dict[str, Dict[str, Any]] = {}
+    plan_ids = []
+    for doc in plan_docs:
+        plan_ids.append(doc.get("plan_id"))
+        _add(totals, {name: doc.get("totals", {}).get(name, 0) for name in USAGE_COUNTERS})
+        for agent, counters in (doc.get("agents") or {}).items():
+            _add(agents.setdefault(agent, {}), {name: counters.get(name, 0) for name in USAGE_COUNTERS})
+        for route, counters in (doc.get("routes") or {}).items():
+            _add(routes.setdefault(route, {}), {name: counters.get(name, 0) for name in USAGE_COUNTERS})
+            if counters.get("model"):
+                routes[route]["model"] = counters["model"]
+        for task_id, counters in (doc.get("tasks") or {}).items():
+            tasks[task_id] = {
+                "agent": counters.get("agent"),
+                "plan_id": doc.get("plan_id"),
+                **_labels(counters),
+                **_with_averages(counters),
+            }
+    return {
+        "plan_ids": plan_ids,
+        "totals": _with_averages(totals),
+        "agents": {agent: _with_averages(counters) for agent, counters in agents.items()},
+        "routes": {route: {**_labels(counters), **_with_averages(counters)} for route, counters in routes.items()},
+        "tasks": tasks,
+    }
+
+
+def agent_usage_from_stats(stats: Dict[str, Any]) -> Dict[str, Any]:
+    """Cumul LLM d'un agent à partir de son document `agent_stats` (champs `llm_*`)."""
+    return _with_averages({name: stats.get(f"llm_{name}", 0) for name in USAGE_COUNTERS})
+
+
+_tracker: Optional[LLMUsageTracker] = None
+_tracker_lock = threading.Lock()
+
+
+def get_llm_usage_tracker() -> LLMUsageTracker:
+    global _tracker
+    if _tracker is None:
+        with _tracker_lock:
+            if _tracker is None:
+                _tracker = LLMUsageTracker()
+    return _tracker
@@ -0,0 +1,159 @@
+"""
+Politique de relance automatique des tâches d'exécution en échec (TEAM 2).
+
+Chaque échec est classé d'après son code d'erreur structuré (meta `error_code`),
+posé par le superviseur ou publié par l'agent dans les métadonnées de son statut
+A2A 'failed' (voir `failure_code_for_exception`), ou, à défaut, d'après le détail
+de l'état FAILED rédigé par le superviseur ; la sortie libre des agents (résumé,
+artefact) n'est jamais analysée. Les erreurs internes du superviseur sont
+permanentes. Les classes transitoires (réseau, quota LLM, environnement, échéance) sont
+relancées avec un backoff exponentiel à gigue complète, dans la limite d'un
+nombre de tentatives propre à chaque classe. Les échecs permanents (ou dont le
+budget est épuisé) ne sont pas relancés : leurs dépendants sont bloqués.
+
+Configuration (variable d'environnement EXECUTION_RETRY_POLICY, JSON) :
+    {
+      "limits": {"transient": 3, "rate_limited": 5, "environment": 2, "deadline": 1},
+      "base_delay_seconds": 2,
+      "max_delay_seconds": 60
+    }
+"""
+import json
+import logging
+import os
+import random
+import re
+from enum import Enum
+from typing import Any, Dict, Optional
+
+import httpx
+
+from src.shared.llm_rate_limiter import retryable_status
+
+logger = logging.getLogger(__name__)
+
+EXECUTION_RETRY_POLICY_ENV = "EXECUTION_RETRY_POLICY"
+DEFAULT_BASE_DELAY_SECONDS = 2.0
+DEFAULT_MAX_DELAY_SECONDS = 60.0
+
+
+class FailureClass(str, Enum):
+    TRANSIENT = "transient"
+    RATE_LIMITED = "rate_limited"
+    ENVIRONMENT = "environment"
+    DEADLINE = "deadline"
+    PERMANENT = "permanent"
+
+
+DEFAULT_RETRY_LIMITS: Dict[str, int] = {
+    FailureClass.TRANSIENT.value: 3,
+    FailureClass.RATE_LIMITED.value: 5,
+    FailureClass.ENVIRONMENT.value: 2,
+    FailureClass.DEADLINE.value: 1,
+    FailureClass.PERMANENT.value: 0,
+}
+
+# Codes d'erreur structurés (meta `error_code` de la tâche) : les agents publient
+# la valeur d'une classe d'échec, le superviseur SUPERVISOR_ERROR pour ses propres erreurs.
+SUPERVISOR_ERROR = "supervisor_error"
+_ERROR_CODE_CLASSES: Dict[str, FailureClass] = {
+    **{failure_class.value: failure_class for failure_class in FailureClass},
+    SUPERVISOR_ERROR: FailureClass.PERMANENT,
+}
+
+# Ordre significatif : la première classe reconnue l'emporte.
+_FAILURE_PATTERNS = [
+    (FailureClass.RATE_LIMITED, re.compile(
+        r"\b429\b|resource[ _]?exhausted|quota|rate[ _-]?limit|too many requests", re.IGNORECASE)),
+    (FailureClass.DEADLINE, re.compile(
+        r"échéance|deadline|timed? ?out|timeout|délai dépassé", re.IGNORECASE)),
+    (FailureClass.ENVIRONMENT, re.compile(
+        r"\bpod\b|not running|environnement|environment|kubernetes|apiexception|\bpvc\b", re.IGNORECASE)),
+    (FailureClass.TRANSIENT, re.compile(
+        r"réponse agent a2a invalide/absente|connexion|connection|unavailable|indisponible|\b50[234]\b"
+        r"|erreur réseau|network|reset by peer", re.IGNORECASE)),
+]
+
+
+def classify_failure(details: Optional[str], error_code: Optional[str] = None) -> FailureClass:
+    """Classe un échec d'après son code d'erreur structuré, sinon le détail de l'état FAILED."""
+    if error_code in _ERROR_CODE_CLASSES:
+        return _ERROR_CODE_CLASSES[error_code]
+    for failure_class, pattern in _FAILURE_PATTERNS:
+        if details and pattern.search(details):
+            return failure_class
+    return FailureClass.PERMANENT
+
+
+def is_failure_code(value: Any) -> bool:
+    return isinstance(value, str) and value in _ERROR_CODE_CLASSES
+
+
+def failure_code_for_exception(error: BaseException) -> Optional[str]:
+    """
+    Code d'échec structuré d'une exception levée côté agent, à publier avec le statut
+    A2A 'failed' : classe transitoire reconnue d'après le type de l'erreur, sinon
+    d'après son seul message. None si l'échec n'est pas reconnu comme transitoire.
+    """
+    status = retryable_status(error)
+    if status == 429:
+        return FailureClass.RATE_LIMITED.value
+    if status == 503:
+        return FailureClass.TRANSIENT.value
+    if type(error).__module__.startswith("kubernetes"):
+        return FailureClass.ENVIRONMENT.value
+    if isinstance(error, (httpx.TransportError, ConnectionError, TimeoutError)):
+        return FailureClass.TRANSIENT.value
+    failure_class = classify_failure(str(error))
+    return None if failure_class == FailureClass.PERMANENT else failure_class.value
+
+
+class RetryDecision:
+    def __init__(self, failure_class: FailureClass, retry: bool, attempt: int, delay_seconds: float = 0.0):
+        self.failure_class = failure_class
+        self.retry = retry
+        self.attempt = attempt
+        self.delay_seconds = delay_seconds
+
+    def __repr__(self) -> str:
+        return (
+            f"RetryDecision(class={self.failure_class.value}, retry={self.retry}, "
+            f"attempt={self.attempt}, delay={self.delay_seconds:.1f}s)"
+        )
+
+
+class RetryPolicy:
+    """Limites de relance par classe d'échec et backoff exponentiel à gigue complète."""
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None, rng: Optional[random.Random] = None):
+        config = config if config is not None else load_retry_policy_config()
+        self.limits: Dict[str, int] = {**DEFAULT_RETRY_LIMITS, **config.get("limits", {})}
+        self.base_delay_seconds = float(config.get("base_delay_seconds", DEFAULT_BASE_DELAY_SECONDS))
+        self.max_delay_seconds = float(config.get("max_delay_seconds", DEFAULT_MAX_DELAY_SECONDS))
+        self._rng = rng or random.Random()
+
+    def backoff_seconds(self, attempt: int) -> float:
+        """Délai avant la tentative `attempt` (1 = première relance) : uniforme sur [0, base * 2^(attempt-1)], plafonné."""
+        ceiling = min(self.max_delay_seconds, self.base_delay_seconds * (2 ** max(0, attempt - 1)))
+        return self._rng.uniform(0, ceiling)
+
+    def decide(self, failure_class: FailureClass, previous_attempts: int) -> RetryDecision:
+        attempt = previous_attempts + 1
+        limit = int(self.limits.get(failure_class.value, 0))
+        if previous_attempts >= limit:
+            return RetryDecision(failure_class, False, previous_attempts)
+        return RetryDecision(failure_class, True, attempt, self.backoff_seconds(attempt))
+
+
+def load_retry_policy_config() -> Dict[str, Any]:
+    raw = os.environ.get(EXECUTION_RETRY_POLICY_ENV)
+    if not raw:
+        return {}
+    try:
+        config = json.loads(raw)
+        if not isinstance(config, dict):
+            raise ValueError("la configuration doit être un objet JSON")
+        return config
+    except ValueError as e:
+        logger.error(f"{EXECUTION_RETRY_POLICY_ENV} invalide ({e}). Politique par défaut utilisée.")
+        return {}
@@ -3,59 +3,227 @@ from src.shared.firebase_init import get_firestore_client
 import logging
 import os
 import asyncio
-from typing import List, Optional
+import threading
+import time
+from typing import Any, Dict, List, Optional
 logger = logging.getLogger(__name__)
 if not logger.hasHandlers():
     logging.basicConfig(level=logging.INFO)
 
 GRA_SERVICE_REGISTRY_COLLECTION = "service_registry"
 GRA_CONFIG_DOCUMENT_ID = "gra_instance_config"
+# Durée de validité de l'URL du GRA mise en cache. L'écouteur Firestore la
+# rafraîchit dès que le document change ; le TTL borne l'obsolescence si
+# l'écouteur n'a pas pu être démarré ou a été interrompu.
+GRA_URL_CACHE_TTL_SECONDS = float(os.environ.get("GRA_URL_CACHE_TTL_SECONDS", "300"))
+# Un échec de découverte n'est mémorisé que brièvement, pour ne pas marteler
+# Firestore sans pour autant rester aveugle au démarrage du GRA.
+GRA_URL_NEGATIVE_TTL_SECONDS = float(os.environ.get("GRA_URL_NEGATIVE_TTL_SECONDS", "10"))
 
 
-async def get_gra_base_url() -> str:
+def _url_from_config(config: Optional[Dict[str, Any]]) -> Optional[str]:
+    # Le GRA publie son adresse sous `current_url` ; `url` est conservé pour les anciens documents.
+    config = config or {}
+    return config.get('url') or config.get('current_url')
+
+
+class GraUrlResolver:
+    """
+    Résolution de l'URL du GRA avec cache, lecture unique partagée et écoute des changements.
+
+    Les appelants concurrents attendent la même lecture Firestore au lieu d'en
+    lancer chacun une. Après la première lecture réussie, un écouteur
+    `on_snapshot` sur le document de configuration met à jour le cache quand le
+    GRA republie son URL.
+    """
+
+    def __init__(self, ttl_seconds: float = GRA_URL_CACHE_TTL_SECONDS,
+                 negative_ttl_seconds: float = GRA_URL_NEGATIVE_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self._url: str = ""
+        self._expires_at = 0.0
+        self._inflight: Optional[asyncio.Task] = None
+        self._watch = None
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, int] = {
+            "lookups": 0,
+            "env_hits": 0,
+            "cache_hits": 0,
+            "shared_waits": 0,
+            "firestore_reads": 0,
+            "failures": 0,
+            "watch_updates": 0,
+            "invalidations": 0,
+        }
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._metrics[key] += 1
+
+    def _store(self, url: str) -> None:
+        ttl = self.ttl_seconds if url else self.negative_ttl_seconds
+        with self._lock:
+            self._url = url
+            self._expires_at = time.monotonic() + ttl
+
+    def _cached(self) -> Optional[str]:
+        with self._lock:
+            if time.monotonic() < self._expires_at:
+                return self._url
+        return None
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            snapshot: Dict[str, Any] = dict(self._metrics)
+            snapshot["cached_url"] = self._url or None
+            snapshot["watching"] = self._watch is not None
+        return snapshot
+
+    def invalidate(self, url: Optional[str] = None) -> None:
+        """Oublie l'URL en cache ; si `url` est fournie, seulement si c'est encore celle-ci."""
+        with self._lock:
+            if url is not None and url != self._url:
+                return
+            self._expires_at = 0.0
+            self._metrics["invalidations"] += 1
+
+    async def resolve(self, force_refresh: bool = False) -> str:
+        self._count("lookups")
+        gra_url_from_env = os.environ.get("GRA_PUBLIC_URL")
+        if gra_url_from_env:
+            self._count("env_hits")
+            return gra_url_from_env
+
+        if not force_refresh:
+            cached = self._cached()
+            if cached is not None:
+                self._count("cache_hits")
+                return cached
+
+        inflight = self._inflight
+        if inflight is not None and not inflight.done() and inflight.get_loop() is asyncio.get_running_loop():
+            self._count("shared_waits")
+            return await asyncio.shield(inflight)
+
+        self._inflight = asyncio.create_task(self._lookup())
+        return await asyncio.shield(self._inflight)
+
+    async def _lookup(self) -> str:
+        logger.info("Variable d'environnement GRA_PUBLIC_URL non trouvée, tentative via Firestore.")
+        self._count("firestore_reads")
+        db = get_firestore_client()
+        if not db:
+            logger.error("Impossible d'obtenir le client Firestore. Le GRA ne sera pas joignable.")
+            self._count("failures")
+            self._store("")
+            return ""
+
+        doc_ref = db.collection(GRA_SERVICE_REGISTRY_COLLECTION).document(GRA_CONFIG_DOCUMENT_ID)
+        try:
+            doc = await asyncio.to_thread(doc_ref.get)
+        except Exception as e:
+            logger.error(f"Erreur lors de la découverte du GRA via Firestore : {e}", exc_info=True)
+            self._count("failures")
+            self._store("")
+            return ""
+
+        gra_url = _url_from_config(doc.to_dict() if doc.exists else None)
+        if not gra_url:
+            logger.warning("Document de configuration du GRA non trouvé dans Firestore.")
+            self._count("failures")
+            self._store("")
+            return ""
+
+        logger.info(f"URL du GRA découverte depuis Firestore : {gra_url}")
+        self._store(gra_url)
+        self._start_watch(doc_ref)
+        return gra_url
+
+    def _start_watch(self, doc_ref) -> None:
+        if self._watch is not None:
+            return
+        try:
+            self._watch = doc_ref.on_snapshot(self._on_snapshot)
+            logger.info("Écoute des changements de l'URL du GRA dans Firestore activée.")
+        except Exception as e:
+            logger.warning(f"Écoute Firestore de l'URL du GRA impossible, repli sur le TTL : {e}")
+            self._watch = None
+
+    def _on_snapshot(self, doc_snapshots, changes, read_time) -> None:
+        # Appelé depuis un thread du client Firestore.
+        for doc in doc_snapshots:
+            gra_url = _url_from_config(doc.to_dict() if doc.exists else None)
+            if gra_url and gra_url != self._url:
+                logger.info(f"URL du GRA mise à jour par Firestore : {gra_url}")
+            self._count("watch_updates")
+            self._store(gra_url or "")
+
+    def close(self) -> None:
+        if self._watch is not None:
+            try:
+                self._watch.unsubscribe()
+            except Exception as e:
+                logger.debug(f"Arrêt de l'écoute Firestore du GRA : {e}")
+            self._watch = None
+
+
+_gra_url_resolver = GraUrlResolver()
+
+
+async def get_gra_base_url(force_refresh: bool = False) -> str:
     """
     Détermine l'URL du GRA.
     Priorité 1: Variable d'environnement (idéal pour Docker).
-    Priorité 2: Firestore (pour les déploiements plus complexes ou non-Docker).
+    Priorité 2: Cache local, tenu à jour par un écouteur Firestore (TTL GRA_URL_CACHE_TTL_SECONDS).
+    Priorité 3: Lecture Firestore, partagée entre les appelants concurrents.
     """
-    gra_url_from_env = os.environ.get("GRA_PUBLIC_URL")
-    if gra_url_from_env:
-        logger.info(f"URL du GRA trouvée via la variable d'environnement : {gra_url_from_env}")
-        return gra_url_from_env
-
-    logger.info("Variable d'environnement GRA_PUBLIC_URL non trouvée, tentative via Firestore.")
-    db = get_firestore_client()
-    if not db:
-        logger.error("Impossible d'obtenir le client Firestore. Le GRA ne sera pas joignable.")
-        return ""
-
-    doc_ref = db.collection(GRA_SERVICE_REGISTRY_COLLECTION).document(GRA_CONFIG_DOCUMENT_ID)
-    try:
-        doc = await asyncio.to_thread(doc_ref.get)
-        if doc.exists:
-            gra_url = doc.to_dict().get('url')
-            if gra_url:
-                logger.info(f"URL du GRA découverte depuis Firestore : {gra_url}")
-                return gra_url
-        logger.warning("Document de configuration du GRA non trouvé dans Firestore.")
-        return ""
-    except Exception as e:
-        logger.error(f"Erreur lors de la découverte du GRA via Firestore : {e}", exc_info=True)
-        return ""
-    
-async def register_self_with_gra(agent_name: str, agent_public_url: str, agent_internal_url: str, skills: List[str]):
-    gra_base_url = await get_gra_base_url()
-    if not gra_base_url:
-        logger.error(f"[{agent_name}] URL du GRA non disponible, impossible de s'enregistrer.")
-        return
+    return await _gra_url_resolver.resolve(force_refresh=force_refresh)
 
-    register_url = f"{gra_base_url}/register"
+
+def invalidate_gra_base_url(url: Optional[str] = None) -> None:
+    """À appeler quand l'URL en cache ne répond plus : la prochaine résolution relira Firestore."""
+    _gra_url_resolver.invalidate(url)
+
+
+def get_gra_resolution_metrics() -> Dict[str, Any]:
+    """Compteurs de résolution de l'URL du GRA pour ce processus."""
+    return _gra_url_resolver.metrics()
+
+
+# Intervalle de heartbeat utilisé tant que le GRA n'en a pas communiqué un.
+DEFAULT_HEARTBEAT_INTERVAL_SECONDS = float(os.environ.get("AGENT_HEARTBEAT_INTERVAL_SECONDS", "15"))
+_heartbeat_tasks: Dict[str, asyncio.Task] = {}
+
+
+async def register_self_with_gra(agent_name: str, agent_public_url: str, agent_internal_url: str, skills: List[str],
+                                 heartbeat: bool = True) -> Optional[Dict[str, Any]]:
+    """
+    Enregistre l'agent auprès du GRA et, par défaut, démarre les heartbeats qui
+    renouvellent son bail. Retourne la réponse d'enregistrement (paramètres du bail) ou None.
+    """
     payload = {
         "agent_name": agent_name,
         "public_url": agent_public_url,
         "internal_url": agent_internal_url,
         "skills": skills
     }
+    registration = await _register_with_retries(agent_name, payload)
+    if heartbeat:
+        # Démarré même si l'enregistrement a échoué : le premier heartbeat refusé
+        # (404) déclenchera un nouvel enregistrement quand le GRA sera joignable.
+        interval = (registration or {}).get("heartbeat_interval_seconds") or DEFAULT_HEARTBEAT_INTERVAL_SECONDS
+        start_gra_heartbeat(agent_name, payload, float(interval))
+    return registration
+
+
+async def _register_with_retries(agent_name: str, payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    gra_base_url = await get_gra_base_url()
+    if not gra_base_url:
+        logger.error(f"[{agent_name}] URL du GRA non disponible, impossible de s'enregistrer.")
+        return None
+
+    register_url = f"{gra_base_url}/register"
     
     max_retries = 4
     delay_between_retries = 2
@@ -67,7 +235,7 @@ async def register_self_with_gra(agent_name: str, agent_public_url: str, agent_i
                 response = await client.post(register_url, json=payload, timeout=5.0)
                 response.raise_for_status()
                 logger.info(f"[{agent_name}] Enregistré avec succès auprès du GRA.")
-                return
+                return response.json()
         except Exception as e:
             logger.error(f"[{agent_name}] Échec de l'enregistrement (tentative {attempt}/{max_retries}) : {e}")
             if attempt < max_retries:
@@ -75,3 +243,54 @@ async def register_self_with_gra(agent_name: str, agent_public_url: str, agent_i
                 await asyncio.sleep(delay_between_retries)
             else:
                 logger.error(f"[{agent_name}] Toutes les tentatives d'enregistrement ont échoué.")
+    return None
+
+
+def start_gra_heartbeat(agent_name: str, registration_payload: Dict[str, Any], interval_seconds: float) -> asyncio.Task:
+    existing = _heartbeat_tasks.get(agent_name)
+    if existing is not None and not existing.done():
+        existing.cancel()
+    task = asyncio.create_task(_heartbeat_loop(agent_name, registration_payload, interval_seconds))
+    _heartbeat_tasks[agent_name] = task
+    logger.info(f"[{agent_name}] Heartbeats vers le GRA toutes les {interval_seconds:.1f}s.")
+    return task
+
+
+async def _heartbeat_loop(agent_name: str, registration_payload: Dict[str, Any], interval_seconds: float) -> None:
+    while True:
+        await asyncio.sleep(interval_seconds)
+        gra_base_url = await get_gra_base_url()
+        if not gra_base_url:
+            continue
+        try:
+            async with httpx.AsyncClient() as client:
+                response = await client.post(f"{gra_base_url}/agents/{agent_name}/heartbeat", timeout=5.0)
+                if response.status_code == 404:
+                    logger.warning(f"[{agent_name}] Bail inconnu ou expiré côté GRA : nouvel enregistrement.")
+                    response = await client.post(f"{gra_base_url}/register", json=registration_payload, timeout=5.0)
+                    response.raise_for_status()
+                    interval_seconds = float(response.json().get("heartbeat_interval_seconds") or interval_seconds)
+                else:
+                    response.raise_for_status()
+        except httpx.TransportError as e:
+            logger.warning(f"[{agent_name}] Heartbeat impossible ({e}) : l'URL du GRA sera redécouverte.")
+            invalidate_gra_base_url(gra_base_url)
+        except Exception as e:
+            logger.warning(f"[{agent_name}] Heartbeat refusé par le GRA : {e}")
+
+
+async def stop_gra_heartbeat(agent_name: str) -> None:
+    """Arrête les heartbeats et retire l'agent de l'index de routage du GRA (arrêt propre)."""
+    task = _heartbeat_tasks.pop(agent_name, None)
+    if task is None:
+        return
+    task.cancel()
+    gra_base_url = await get_gra_base_url()
+    if not gra_base_url:
+        return
+    try:
+        async with httpx.AsyncClient() as client:
+            await client.delete(f"{gra_base_url}/agents/{agent_name}/lease", timeout=3.0)
+        logger.info(f"[{agent_name}] Bail rendu au GRA.")
+    except Exception as e:
+        logger.warning(f"[{agent_name}] Impossible de rendre le bail au GRA : {e}")
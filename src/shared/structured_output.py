@@ -0,0 +1,232 @@
+"""
+Sorties JSON structurées des agents.
+
+`generate_json` demande une réponse JSON au LLM, puis :
+    1. la parse telle quelle ;
+    2. sinon la répare localement (blocs ```json, texte avant/après l'objet,
+       virgules finales, crochets ou chaînes tronqués) ;
+    3. la valide contre le schéma de l'appelant ;
+    4. en dernier recours seulement, redemande au LLM en lui indiquant les erreurs.
+
+Les schémas suivent le sous-ensemble OpenAPI accepté par `response_schema` de
+Vertex AI (type, properties, required, items, enum, nullable). Avec
+`constrain_decoding=True`, le schéma est aussi transmis à Vertex pour contraindre
+la génération ; à éviter quand il contient des champs libres (objets sans
+propriétés, structures récursives), que Vertex ne produirait plus.
+
+Variables d'environnement :
+    STRUCTURED_OUTPUT_MAX_REASKS   nouvelles demandes après un échec (défaut : 1)
+    LLM_RESPONSE_SCHEMA_ENABLED    "false" pour ne jamais transmettre le schéma à Vertex
+"""
+import json
+import logging
+import os
+import re
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+STRUCTURED_OUTPUT_MAX_REASKS = int(os.environ.get("STRUCTURED_OUTPUT_MAX_REASKS", "1"))
+LLM_RESPONSE_SCHEMA_ENABLED = os.environ.get("LLM_RESPONSE_SCHEMA_ENABLED", "true").lower() in ("1", "true", "yes")
+
+_CODE_FENCE_PATTERN = re.compile(r"```(?:json|JSON)?\s*\n?(.*?)(?:```|$)", re.DOTALL)
+_DANGLING_KEY_PATTERN = re.compile(r'(?:,\s*)?"(?:[^"\\]|\\.)*"\s*:?\s*$')
+_CLOSERS = {"{": "}", "[": "]"}
+_JSON_TYPES = {
+    "object": dict,
+    "array": list,
+    "string": str,
+    "integer": int,
+    "number": (int, float),
+    "boolean": bool,
+}
+
+_metrics: Dict[str, int] = {"parsed": 0, "repaired": 0, "reasked": 0, "failed": 0}
+
+
+class StructuredOutputError(ValueError):
+    """Réponse du LLM inexploitable, même après réparation locale et nouvelles demandes."""
+
+    def __init__(self, message: str, raw_response: Optional[str] = None, errors: Optional[List[str]] = None):
+        super().__init__(message)
+        self.raw_response = raw_response
+        self.errors = errors or []
+
+
+def repair_json(text: str) -> str:
+    """
+    Extrait et complète le premier objet ou tableau JSON de `text`. Le résultat
+    n'est pas garanti parsable ; `parse_json_output` le vérifie.
+    """
+    fenced = _CODE_FENCE_PATTERN.search(text)
+    if fenced and fenced.group(1).strip():
+        text = fenced.group(1)
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    if not starts:
+        return text.strip()
+    text = text[min(starts):]
+
+    out: List[str] = []
+    stack: List[str] = []
+    in_string = False
+    escaped = False
+    for char in text:
+        if in_string:
+            out.append(char)
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+            continue
+        if char == '"':
+            in_string = True
+        elif char in _CLOSERS:
+            stack.append(_CLOSERS[char])
+        elif char in "}]":
+            if not stack or stack[-1] != char:
+                break
+            # Virgule finale avant la fermeture : ignorée.
+            while out and out[-1].isspace():
+                out.pop()
+            if out and out[-1] == ",":
+                out.pop()
+            stack.pop()
+            out.append(char)
+            if not stack:
+                # Fin de l'objet racine : le texte qui suit est ignoré.
+                return "".join(out)
+            continue
+        out.append(char)
+
+    # Réponse tronquée : on referme la chaîne, on retire la paire clé/valeur
+    # incomplète, puis on ferme les structures encore ouvertes.
+    repaired = "".join(out)
+    if in_string:
+        if escaped:
+            repaired = repaired[:-1]
+        repaired += '"'
+    repaired = repaired.rstrip()
+    if stack and stack[-1] == "}" and _ends_with_key(repaired):
+        repaired = _DANGLING_KEY_PATTERN.sub("", repaired)
+    repaired = repaired.rstrip().rstrip(",")
+    return repaired + "".join(reversed(stack))
+
+
+def _ends_with_key(text: str) -> bool:
+    """True si `text` se termine par une clé d'objet sans valeur (`"clé"` ou `"clé":`)."""
+    stripped = text.rstrip()
+    if stripped.endswith(":"):
+        return True
+    # Une chaîne terminale est une clé si elle suit `{` ou `,` dans un objet.
+    return re.search(r'[{,]\s*"(?:[^"\\]|\\.)*"$', stripped) is not None
+
+
+def validate_json(data: Any, schema: Optional[Dict[str, Any]], path: str = "$") -> List[str]:
+    """Erreurs de conformité de `data` au schéma (liste vide si conforme)."""
+    if not schema:
+        return []
+    if data is None:
+        return [] if schema.get("nullable") else [f"{path} : valeur nulle non autorisée"]
+    errors: List[str] = []
+    expected = schema.get("type")
+    if expected:
+        python_type = _JSON_TYPES.get(expected.lower())
+        is_bool = isinstance(data, bool)
+        if python_type and (not isinstance(data, python_type) or (is_bool and expected.lower() != "boolean")):
+            return [f"{path} : type {expected} attendu, {type(data).__name__} reçu"]
+    if "enum" in schema and data not in schema["enum"]:
+        errors.append(f"{path} : valeur {data!r} hors de {schema['enum']}")
+    if isinstance(data, dict):
+        for key in schema.get("required", []):
+            if key not in data:
+                errors.append(f"{path} : clé obligatoire '{key}' absente")
+        for key, sub_schema in schema.get("properties", {}).items():
+            if key in data:
+                errors.extend(validate_json(data[key], sub_schema, f"{path}.{key}"))
+    elif isinstance(data, list) and schema.get("items"):
+        for index, item in enumerate(data):
+            errors.extend(validate_json(item, schema["items"], f"{path}[{index}]"))
+    return errors
+
+
+def parse_json_output(text: Optional[str], schema: Optional[Dict[str, Any]] = None) -> Any:
+    """Parse (et au besoin répare) une réponse JSON, puis la valide contre `schema`."""
+    if not text or not text.strip():
+        raise StructuredOutputError("Réponse vide.", raw_response=text)
+    try:
+        data = json.loads(text)
+    except ValueError as e:
+        repaired = repair_json(text)
+        try:
+            data = json.loads(repaired)
+        except ValueError:
+            raise StructuredOutputError(f"JSON invalide : {e}", raw_response=text, errors=[str(e)]) from e
+        _metrics["repaired"] += 1
+        logger.info("Réponse JSON du LLM réparée localement.")
+    errors = validate_json(data, schema)
+    if errors:
+        raise StructuredOutputError(
+            f"Réponse non conforme au schéma : {'; '.join(errors[:5])}", raw_response=text, errors=errors
+        )
+    return data
+
+
+async def generate_json(
+    prompt: str,
+    system_prompt: Optional[str] = "You are a helpful assistant.",
+    schema: Optional[Dict[str, Any]] = None,
+    llm_call: Optional[Callable[..., Awaitable[str]]] = None,
+    constrain_decoding: bool = False,
+    max_reasks: int = STRUCTURED_OUTPUT_MAX_REASKS,
+) -> Any:
+    """
+    Réponse JSON du LLM, parsée, réparée si besoin et validée contre `schema`.
+    `llm_call` (défaut : `call_llm`) permet à l'appelant de fournir sa référence,
+    par exemple celle importée dans son module. Lève `StructuredOutputError`.
+    """
+    if llm_call is None:
+        from src.shared.llm_client import call_llm as llm_call
+
+    call_kwargs: Dict[str, Any] = {"json_mode": True}
+    if schema:
+        # Le schéma accompagne toujours l'appel (le backend stub en dérive sa
+        # réponse) ; il ne contraint la génération que sur demande.
+        call_kwargs["response_schema"] = schema
+        call_kwargs["constrain_decoding"] = constrain_decoding and LLM_RESPONSE_SCHEMA_ENABLED
+
+    attempt_prompt = prompt
+    last_error: Optional[StructuredOutputError] = None
+    for attempt in range(max_reasks + 1):
+        raw_response = await llm_call(attempt_prompt, system_prompt, **call_kwargs)
+        try:
+            data = parse_json_output(raw_response, schema)
+            _metrics["parsed"] += 1
+            return data
+        except StructuredOutputError as e:
+            last_error = e
+            if attempt >= max_reasks:
+                break
+            _metrics["reasked"] += 1
+            logger.warning(f"Réponse JSON du LLM inexploitable ({e}). Nouvelle demande ({attempt + 1}/{max_reasks}).")
+            attempt_prompt = _reask_prompt(prompt, raw_response, e, schema)
+
+    _metrics["failed"] += 1
+    raise last_error
+
+
+def _reask_prompt(prompt: str, raw_response: Optional[str], error: StructuredOutputError, schema: Optional[Dict[str, Any]]) -> str:
+    previous = (raw_response or "")[:2000]
+    reask = (
+        f"{prompt}\n\n"
+        f"Ta réponse précédente était inexploitable : {error}\n"
+        f"Réponse précédente (extrait) :\n'''{previous}'''\n"
+    )
+    if schema:
+        reask += f"Le JSON doit respecter ce schéma : {json.dumps(schema, ensure_ascii=False)}\n"
+    return reask + "Réponds UNIQUEMENT avec l'objet JSON corrigé, sans texte autour."
+
+
+def structured_output_metrics() -> Dict[str, int]:
+    return dict(_metrics)
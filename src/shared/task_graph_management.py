@@ -2,16 +2,10 @@ from typing import Optional, Dict, List, Any
 from enum import Enum
 from datetime import datetime
 import uuid
-import firebase_admin
-from firebase_admin import firestore, credentials
 
-if not firebase_admin._apps:
-    try:
-        cred = credentials.ApplicationDefault()
-        firebase_admin.initialize_app(cred)
-    except Exception as e:
-        print(f"CRITICAL: Firestore initialization failed. Ensure GOOGLE_APPLICATION_CREDENTIALS is set. Error: {e}")
-db = firestore.client()
+from src.shared.graph_storage import GraphStorageBackend, get_graph_storage
+
+TASK_GRAPHS_COLLECTION = "task_graphs"
 
 class TaskState(str, Enum):
     SUBMITTED = "submitted"
@@ -23,6 +17,26 @@ class TaskState(str, Enum):
 
 
 class TaskNode:
+    """
+    Noeud du graphe de planification (TEAM 1). Attributs en __slots__ et
+    sérialisation compacte ; les transitions d'état sont envoyées au journal
+    d'événements du plan plutôt que conservées dans le noeud.
+    """
+
+    __slots__ = (
+        "id",
+        "parent",
+        "children",
+        "state",
+        "assigned_agent",
+        "objective",
+        "artifact_ref",
+        "meta",
+        "created_at",
+        "updated_at",
+        "pending_events",
+    )
+
     def __init__(
         self,
         task_id: str,
@@ -39,37 +53,69 @@ class TaskNode:
         self.assigned_agent: Optional[str] = assigned_agent
         self.objective: Optional[str] = objective
         self.artifact_ref: Optional[Any] = artifact_ref
-        self.history: List[Dict[str, Any]] = []
         self.meta: Dict[str, Any] = meta if meta is not None else {}
+        self.created_at: str = datetime.utcnow().isoformat()
+        self.updated_at: str = self.created_at
+        self.pending_events: List[Dict[str, Any]] = []
 
     def to_dict(self) -> Dict[str, Any]:
-        """Convertit l'objet TaskNode en dictionnaire pour Firestore."""
-        data = self.__dict__.copy()
-        data['state'] = self.state.value
+        """Convertit l'objet TaskNode en dictionnaire compact (champs vides omis)."""
+        data: Dict[str, Any] = {
+            "id": self.id,
+            "state": self.state.value,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+        for field in ("parent", "assigned_agent", "objective", "artifact_ref"):
+            value = getattr(self, field)
+            if value is not None:
+                data[field] = value
+        if self.children:
+            data["children"] = list(self.children)
+        if self.meta:
+            data["meta"] = dict(self.meta)
         return data
 
     @staticmethod
     def from_dict(data: Dict[str, Any]) -> 'TaskNode':
-        """Crée un objet TaskNode à partir d'un dictionnaire Firestore."""
-        node = TaskNode(task_id=data['id'])
-        for key, value in data.items():
-            if key == 'state':
-                setattr(node, key, TaskState(value))
-            else:
-                setattr(node, key, value)
+        """Crée un objet TaskNode à partir d'un dictionnaire stocké."""
+        node = TaskNode(
+            task_id=data['id'],
+            parent=data.get('parent'),
+            assigned_agent=data.get('assigned_agent'),
+            objective=data.get('objective'),
+            meta=dict(data.get('meta') or {}),
+            artifact_ref=data.get('artifact_ref'),
+        )
+        node.children = list(data.get('children') or [])
+        if data.get('state') is not None:
+            node.state = TaskState(data['state'])
+        legacy_history = data.get('history') or []
+        # Anciens documents : la date de création est déduite de l'historique embarqué,
+        # qui est migré vers le journal d'événements au prochain enregistrement.
+        node.created_at = data.get('created_at') or (
+            legacy_history[0].get('timestamp') if legacy_history else node.created_at
+        )
+        node.updated_at = data.get('updated_at') or (
+            legacy_history[-1].get('timestamp') if legacy_history else node.created_at
+        )
+        if legacy_history:
+            node.pending_events = [{"task_id": node.id, **entry} for entry in legacy_history]
         return node
     
     def update_state(self, new_state: TaskState, details: Optional[str] = None):
-        """Met à jour l'état et l'historique de la tâche."""
+        """Met à jour l'état et enregistre la transition pour le journal d'événements."""
         now = datetime.utcnow().isoformat()
         old_state = self.state
-        self.history.append({
+        self.pending_events.append({
+            "task_id": self.id,
             "from_state": str(old_state.value),
             "to_state": str(new_state.value),
             "timestamp": now,
             "details": details
         })
         self.state = new_state
+        self.updated_at = now
 
     def __repr__(self):
         return (
@@ -79,25 +125,25 @@ class TaskNode:
 
 
 class TaskGraph:
-    def __init__(self, plan_id: str):
+    def __init__(self, plan_id: str, storage: Optional[GraphStorageBackend] = None):
         if not plan_id:
-            raise ValueError("Un plan_id est requis pour initialiser un TaskGraph avec Firestore.")
+            raise ValueError("Un plan_id est requis pour initialiser un TaskGraph.")
         self.plan_id = plan_id
-        self.collection_ref = db.collection("task_graphs")
-        self.doc_ref = self.collection_ref.document(self.plan_id)
+        self.storage = storage or get_graph_storage()
+        self.collection_name = TASK_GRAPHS_COLLECTION
 
     def _get_graph_data(self) -> Dict[str, Any]:
-        """Récupère les données complètes du graphe depuis Firestore."""
-        doc = self.doc_ref.get()
-        if not doc.exists:
+        """Récupère les données complètes du graphe depuis le backend de stockage."""
+        graph_data = self.storage.load(self.collection_name, self.plan_id)
+        if graph_data is None:
             initial_data = {"plan_id": self.plan_id, "roots": [], "nodes": {}}
-            self.doc_ref.set(initial_data)
+            self.storage.save(self.collection_name, self.plan_id, initial_data)
             return initial_data
-        return doc.to_dict()
+        return graph_data
 
     def _save_graph_data(self, graph_data: Dict[str, Any]):
-        """Sauvegarde l'intégralité du graphe dans Firestore."""
-        self.doc_ref.set(graph_data)
+        """Sauvegarde l'intégralité du graphe dans le backend de stockage."""
+        self.storage.save(self.collection_name, self.plan_id, graph_data)
 
     def add_task(self, task_node: TaskNode):
         """Ajoute ou met à jour une tâche dans Firestore."""
@@ -107,13 +153,18 @@ class TaskGraph:
         nodes[task_node.id] = task_node.to_dict()
 
         if task_node.parent:
-            if task_node.parent in nodes and task_node.id not in nodes[task_node.parent]['children']:
-                nodes[task_node.parent]['children'].append(task_node.id)
+            if task_node.parent in nodes:
+                parent_children = nodes[task_node.parent].setdefault('children', [])
+                if task_node.id not in parent_children:
+                    parent_children.append(task_node.id)
         else:
             if task_node.id not in graph_data.get("roots", []):
-                graph_data["roots"].append(task_node.id)
+                graph_data.setdefault("roots", []).append(task_node.id)
 
         self._save_graph_data(graph_data)
+        if task_node.pending_events:
+            events, task_node.pending_events = task_node.pending_events, []
+            self.storage.append_events(self.collection_name, self.plan_id, events)
         return task_node
 
     def get_task(self, task_id: str) -> Optional[TaskNode]:
@@ -171,6 +222,18 @@ class TaskGraph:
             nodes[sub_task.id] = sub_task.to_dict()
 
         self._save_graph_data(graph_data)
+        events = [event for sub_task in new_subtasks for event in sub_task.pending_events]
+        for sub_task in new_subtasks:
+            sub_task.pending_events = []
+        if events:
+            self.storage.append_events(self.collection_name, self.plan_id, events)
+
+    def get_task_history(self, task_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Lit le journal des transitions du plan (toutes les tâches, ou une seule)."""
+        events = self.storage.load_events(self.collection_name, self.plan_id)
+        if task_id is None:
+            return events
+        return [event for event in events if event.get("task_id") == task_id]
 
     def as_dict(self) -> Dict[str, Any]:
         """CORRIGÉ : Retourne simplement les données brutes de Firestore."""
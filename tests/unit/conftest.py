@@ -0,0 +1,16 @@
+import pytest
+
+
+class ManualClock:
+    """Horloge avancée à la main par le test, à injecter à la place de time.monotonic."""
+
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock() -> ManualClock:
+    return ManualClock()
@@ -0,0 +1,135 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from a2a.types import (
+    CancelTaskResponse,
+    CancelTaskSuccessResponse,
+    GetTaskResponse,
+    GetTaskSuccessResponse,
+    SendMessageResponse,
+    SendMessageSuccessResponse,
+    Task,
+    TaskState,
+    TaskStatus,
+)
+
+from src.clients import a2a_api_client
+
+
+class _FakeA2AClient:
+    """Agent qui ne répond jamais à send_message et accepte tasks/cancel."""
+
+    def __init__(self):
+        self.sent_task_ids = []
+        self.cancelled_task_ids = []
+
+    async def send_message(self, request, http_kwargs=None):
+        self.sent_task_ids.append(request.params.message.taskId)
+        timeout = (http_kwargs or {}).get("timeout")
+        if timeout is None:
+            await asyncio.Event().wait()
+        await asyncio.sleep(timeout)
+        raise httpx.ReadTimeout("délai de lecture dépassé")
+
+    async def get_task(self, request, http_kwargs=None):
+        raise httpx.ConnectError("tâche inconnue")
+
+    async def cancel_task(self, request, http_kwargs=None):
+        task_id = request.params.id
+        self.cancelled_task_ids.append(task_id)
+        task = Task(id=task_id, contextId="ctx", status=TaskStatus(state=TaskState.canceled))
+        return CancelTaskResponse(root=CancelTaskSuccessResponse(id=request.id, result=task))
+
+
+class _SlowA2AClient(_FakeA2AClient):
+    """Agent qui accepte la tâche puis la laisse indéfiniment dans l'état 'working'."""
+
+    def __init__(self):
+        super().__init__()
+        self.polls = 0
+
+    async def send_message(self, request, http_kwargs=None):
+        task_id = request.params.message.taskId
+        self.sent_task_ids.append(task_id)
+        task = Task(id=task_id, contextId="ctx", status=TaskStatus(state=TaskState.working))
+        return SendMessageResponse(root=SendMessageSuccessResponse(id=request.id, result=task))
+
+    async def get_task(self, request, http_kwargs=None):
+        self.polls += 1
+        task = Task(id=request.params.id, contextId="ctx", status=TaskStatus(state=TaskState.working))
+        return GetTaskResponse(root=GetTaskSuccessResponse(id=request.id, result=task))
+
+
+def _install(monkeypatch, agent):
+    async def get_client(httpx_client, base_url):
+        return agent
+
+    monkeypatch.setattr(a2a_api_client.A2AClient, "get_client_from_agent_card_url", staticmethod(get_client))
+    monkeypatch.setattr(a2a_api_client, "GoogleIDTokenAuth", lambda: None)
+    return agent
+
+
+@pytest.fixture
+def fake_agent(monkeypatch):
+    return _install(monkeypatch, _FakeA2AClient())
+
+
+@pytest.fixture
+def slow_agent(monkeypatch):
+    return _install(monkeypatch, _SlowA2AClient())
+
+
+@pytest.mark.asyncio
+async def test_deadline_cancels_the_remote_task(fake_agent):
+    result = await asyncio.wait_for(
+        a2a_api_client.call_a2a_agent(
+            "http://agent-deadline", "objectif", "ctx", deadline_ts=time.time() + 1.0, task_id="a2a-deadline"
+        ),
+        5,
+    )
+
+    assert result.status.state == TaskState.canceled
+    assert fake_agent.sent_task_ids[0] == "a2a-deadline"
+    assert fake_agent.cancelled_task_ids == ["a2a-deadline"]
+
+
+@pytest.mark.asyncio
+async def test_cancelling_the_caller_cancels_the_remote_task(fake_agent):
+    call = asyncio.create_task(
+        a2a_api_client.call_a2a_agent("http://agent-cancel", "objectif", "ctx", task_id="a2a-cancel")
+    )
+    await asyncio.sleep(0.05)
+    assert fake_agent.sent_task_ids == ["a2a-cancel"]
+
+    call.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await call
+    assert fake_agent.cancelled_task_ids == ["a2a-cancel"]
+
+
+@pytest.mark.asyncio
+async def test_polling_lasts_until_the_deadline_not_max_retries(slow_agent):
+    result = await asyncio.wait_for(
+        a2a_api_client.call_a2a_agent(
+            "http://agent-slow", "objectif", "ctx", max_retries=2, retry_delay=0.05,
+            deadline_ts=time.time() + 0.5, task_id="a2a-slow",
+        ),
+        5,
+    )
+
+    assert result.status.state == TaskState.canceled
+    assert slow_agent.polls > 2
+    assert slow_agent.cancelled_task_ids == ["a2a-slow"]
+
+
+@pytest.mark.asyncio
+async def test_polling_without_final_state_cancels_the_remote_task(slow_agent):
+    result = await a2a_api_client.call_a2a_agent(
+        "http://agent-stuck", "objectif", "ctx", max_retries=2, retry_delay=0.01, task_id="a2a-stuck"
+    )
+
+    assert result is None
+    assert slow_agent.polls == 2
+    assert slow_agent.cancelled_task_ids == ["a2a-stuck"]
@@ -0,0 +1,25 @@
+from src.services.gra.agent_registry import AgentLeaseRegistry
+
+
+def _agent(name, skills):
+    return {"name": name, "public_url": f"http://{name}", "internal_url": f"http://{name}:8080", "skills": skills}
+
+
+def test_expired_leases_are_evicted_and_not_routed(clock):
+    registry = AgentLeaseRegistry(ttl_seconds=30, heartbeat_interval_seconds=10, clock=clock)
+    lease = registry.register(_agent("DevAgent", ["coding_python"]))
+    registry.register(_agent("TestAgent", ["software_testing"]))
+    assert lease == {"lease_ttl_seconds": 30, "heartbeat_interval_seconds": 10}
+
+    clock.now += 20
+    assert registry.heartbeat("DevAgent")
+    clock.now += 15
+    assert [a["name"] for a in registry.live_agents("coding_python")] == ["DevAgent"]
+    assert registry.live_agents("software_testing") == []
+
+    assert registry.evict_expired() == ["TestAgent"]
+    assert not registry.heartbeat("TestAgent")
+    assert registry.skills_by_agent() == {"DevAgent": ["coding_python"]}
+
+    registry.register(_agent("TestAgent", ["software_testing"]))
+    assert registry.is_live("TestAgent") and registry.evictions == 1
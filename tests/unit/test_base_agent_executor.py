@@ -0,0 +1,117 @@
+import asyncio
+
+import pytest
+from a2a.server.agent_execution import RequestContext
+from a2a.server.events.event_queue import EventQueue
+from a2a.types import (
+    Message,
+    MessageSendParams,
+    Part,
+    Role,
+    Task,
+    TaskArtifactUpdateEvent,
+    TaskState,
+    TaskStatus,
+    TextPart,
+)
+from a2a.utils import new_text_artifact
+
+from src.shared import llm_client
+from src.shared.base_agent_executor import BaseAgentExecutor, LLMStreamRelay
+from src.shared.base_agent_logic import BaseAgentLogic
+
+
+class _FakeQueue:
+    def __init__(self):
+        self.events = []
+
+    async def enqueue_event(self, event):
+        self.events.append(event)
+
+
+class _StreamingThenFailingLogic(BaseAgentLogic):
+    async def process(self, input_data, context_id=None):
+        await llm_client._llm_chunk_sink.get()("aperçu partiel de la réponse")
+        raise RuntimeError("réponse LLM tronquée")
+
+
+class _Executor(BaseAgentExecutor):
+    def _create_artifact_from_result(self, result_data, task):
+        return new_text_artifact(name=self.default_artifact_name, text=str(result_data))
+
+    async def _notify_gra_of_status_change(self):
+        pass
+
+
+def _context(task_id="task-1", context_id="ctx-1"):
+    message = Message(
+        role=Role.user,
+        messageId="msg-1",
+        taskId=task_id,
+        contextId=context_id,
+        parts=[Part(root=TextPart(text='{"objective": "test"}'))],
+    )
+    return RequestContext(request=MessageSendParams(message=message), task_id=task_id, context_id=context_id)
+
+
+@pytest.mark.asyncio
+async def test_failed_task_replaces_streamed_preview():
+    queue = _FakeQueue()
+    executor = _Executor(_StreamingThenFailingLogic())
+    await executor._execute_task(_context(), queue)
+
+    artifact_events = [e for e in queue.events if isinstance(e, TaskArtifactUpdateEvent)]
+    preview, replacement = artifact_events
+    assert preview.artifact.parts[0].root.text == "aperçu partiel de la réponse"
+    assert replacement.artifact.artifactId == preview.artifact.artifactId
+    assert not replacement.append and replacement.lastChunk
+    assert "réponse LLM tronquée" in replacement.artifact.parts[0].root.text
+    assert queue.events[-1].status.state == TaskState.failed
+
+
+@pytest.mark.asyncio
+async def test_replace_preview_without_preview_publishes_nothing():
+    queue = _FakeQueue()
+    relay = LLMStreamRelay(queue, "task-1", "ctx-1")
+    await relay.replace_preview(new_text_artifact(name="result", text="échec"))
+    assert queue.events == []
+
+
+class _BlockingLogic(BaseAgentLogic):
+    async def process(self, input_data, context_id=None):
+        await asyncio.Event().wait()
+
+
+async def _drain(queue, events):
+    while True:
+        events.append(await queue.dequeue_event())
+        queue.task_done()
+
+
+@pytest.mark.asyncio
+async def test_cancel_publishes_canceled_state_before_the_queue_closes():
+    executor = _Executor(_BlockingLogic())
+    queue = EventQueue()
+
+    # Comme le gestionnaire de requêtes A2A : la file est fermée dès le retour d'execute,
+    # et l'annulation publie sur une file dérivée.
+    async def run_event_stream():
+        await executor.execute(_context(), queue)
+        await queue.close()
+
+    producer = asyncio.create_task(run_event_stream())
+    consumers = [asyncio.create_task(_drain(queue, []))]
+    await asyncio.sleep(0.05)
+    assert "task-1" in executor._running_tasks
+
+    cancel_queue = queue.tap()
+    cancel_events = []
+    consumers.append(asyncio.create_task(_drain(cancel_queue, cancel_events)))
+    task = Task(id="task-1", contextId="ctx-1", status=TaskStatus(state=TaskState.working))
+    await executor.cancel(RequestContext(None, task_id="task-1", context_id="ctx-1", task=task), cancel_queue)
+    await asyncio.wait_for(producer, 5)
+    for consumer in consumers:
+        consumer.cancel()
+
+    assert cancel_events[-1].status.state == TaskState.canceled and cancel_events[-1].final
+    assert executor._running_tasks == {} and executor._cancellations == {}
@@ -0,0 +1,58 @@
+import asyncio
+
+import pytest
+
+from src.services.gra.capacity_scheduler import CapacityScheduler
+
+
+@pytest.mark.asyncio
+async def test_small_plan_is_not_starved_by_large_plan():
+    scheduler = CapacityScheduler({"skills": {"coding_python": 1}})
+    first = await scheduler.acquire("coding_python", "big")
+
+    grants = []
+
+    async def request(plan_id):
+        lease = await scheduler.acquire("coding_python", plan_id)
+        grants.append(plan_id)
+        scheduler.release(lease.lease_id)
+
+    big_requests = [asyncio.create_task(request("big")) for _ in range(5)]
+    await asyncio.sleep(0)
+    small_request = asyncio.create_task(request("small"))
+    await asyncio.sleep(0)
+
+    scheduler.release(first.lease_id)
+    await asyncio.gather(*big_requests, small_request)
+
+    assert grants.index("small") <= 1
+    assert scheduler.metrics()["skills"]["coding_python"]["queue_depth"] == 0
+
+
+@pytest.mark.asyncio
+async def test_quota_and_timeout():
+    scheduler = CapacityScheduler({"skills": {"default": 4}, "quotas": {"default": 1}})
+    lease = await scheduler.acquire("software_testing", "plan_a")
+
+    assert await scheduler.acquire("software_testing", "plan_a", timeout=0.01) is None
+    other = await scheduler.acquire("software_testing", "plan_b", timeout=0.01)
+    assert other is not None
+
+    metrics = scheduler.metrics()["skills"]["software_testing"]
+    assert metrics["in_use"] == 2 and metrics["queue_depth"] == 0
+    assert scheduler.release(lease.lease_id)
+    assert not scheduler.release(lease.lease_id)
+
+
+@pytest.mark.asyncio
+async def test_release_plan_frees_leases_and_waiters():
+    scheduler = CapacityScheduler({"skills": {"coding_python": 1}})
+    await scheduler.acquire("coding_python", "cancelled_plan")
+    waiting = asyncio.create_task(scheduler.acquire("coding_python", "cancelled_plan"))
+    other = asyncio.create_task(scheduler.acquire("coding_python", "other_plan"))
+    await asyncio.sleep(0)
+
+    assert scheduler.release_plan("cancelled_plan") == 1
+    assert await waiting is None
+    assert (await other).plan_id == "other_plan"
+    assert scheduler.metrics()["skills"]["coding_python"]["queue_depth"] == 0
@@ -0,0 +1,31 @@
+from src.shared.circuit_breaker import CircuitBreaker, CircuitState
+
+
+def test_breaker_opens_fails_fast_and_recovers_through_half_open(clock):
+    transitions = []
+    breaker = CircuitBreaker(
+        "http://dev-agent:8080", failure_threshold=3, recovery_seconds=30, clock=clock,
+        on_transition=lambda b, old, new: transitions.append((old.value, new.value)),
+    )
+
+    for _ in range(3):
+        assert breaker.allow_request()
+        breaker.record_failure("connection refused")
+    assert breaker.state == CircuitState.OPEN
+    assert not breaker.allow_request()
+    assert breaker.retry_after_seconds() == 30
+
+    clock.now = 31
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+    breaker.record_failure("connection refused")
+    assert breaker.state == CircuitState.OPEN
+
+    clock.now = 62
+    assert breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == CircuitState.CLOSED and breaker.allow_request()
+    assert transitions == [
+        ("closed", "open"), ("open", "half_open"), ("half_open", "open"),
+        ("open", "half_open"), ("half_open", "closed"),
+    ]
@@ -0,0 +1,20 @@
+from src.shared.decomposition_cache import DecompositionCache
+from src.shared.graph_storage import InMemoryGraphStorage
+
+
+def test_cache_key_and_ttl():
+    key = DecompositionCache.key("Plan final", ["software_testing", "coding_python"])
+    assert key == DecompositionCache.key("Plan final\n", ["coding_python", "software_testing"])
+    assert key != DecompositionCache.key("Plan final", ["coding_python"])
+
+    storage = InMemoryGraphStorage()
+    tasks = [{"id": "T01", "type": "executable"}]
+    cache = DecompositionCache(storage=storage, ttl_seconds=0)
+    assert cache.get(key) is None
+    cache.put(key, tasks)
+    assert cache.get(key) == tasks
+
+    assert DecompositionCache(storage=storage, ttl_seconds=1e-9).get(key) is None
+    assert DecompositionCache(storage=storage, enabled=False).get(key) is None
+    cache.invalidate(key)
+    assert cache.get(key) is None
@@ -0,0 +1,47 @@
+from src.agents.development_agent.context_builder import DevelopmentContextBuilder, truncate_output
+
+BIG_FILE = "\n".join(f"line {i}" for i in range(2000))
+
+
+def test_truncation_keeps_head_and_tail_with_pointer():
+    text = truncate_output(BIG_FILE, 100, "/app/main.py")
+    assert text.startswith("line 0\n") and text.endswith("line 1999")
+    assert "omises" in text and "sed -n '" in text and "/app/main.py" in text
+    assert len(text) < 500
+
+
+def test_history_is_compacted_and_file_contents_deduplicated():
+    builder = DevelopmentContextBuilder(token_budget=2000, output_max_tokens=300, recent_steps=2)
+    builder.record("read_file", {"file_path": "/app/main.py"}, "Fichier '/app/main.py' lu.",
+                   {"file_path": "/app/main.py", "content": BIG_FILE})
+    builder.record("read_file", {"file_path": "/app/main.py"}, "Fichier '/app/main.py' lu.",
+                   {"file_path": "/app/main.py", "content": BIG_FILE})
+
+    payload = builder.build("Écrire un script")
+    assert "inchangé" in payload["last_action_result"]["details"]["content"]
+    assert "sed -n" in payload["recent_actions"][0]["details"]["content"]
+
+    builder.record("execute_command", {"command": "pytest"}, "Tests en échec",
+                   {"stdout": BIG_FILE, "stderr": "", "exit_code": 1, "error": "Tests en échec"})
+    copies = builder.pop_output_copies()
+    assert copies == [("/tmp/dev_agent_outputs/step-3-stdout.txt", BIG_FILE)]
+
+    for step in range(20):
+        builder.record("list_directory", {"path": "/app"}, "Contenu de '/app' listé.",
+                       {"path": "/app", "files": [{"name": f"f{step}.py"}]})
+    payload = builder.build("Écrire un script")
+    assert builder.last_context_tokens <= 2000
+    assert payload["action_history"][0].startswith("#1 read_file /app/main.py")
+    assert payload["action_history"][2].endswith("[ÉCHEC]")
+    assert payload["last_action_result"]["step"] == 23
+
+
+def test_oldest_steps_are_folded_when_budget_is_tight():
+    builder = DevelopmentContextBuilder(token_budget=300, output_max_tokens=300, recent_steps=3)
+    for step in range(30):
+        builder.record("execute_command", {"command": f"python step{step}.py"}, "Commande exécutée.",
+                       {"stdout": "ok " * 400, "stderr": "", "exit_code": 0})
+    payload = builder.build("Écrire un script")
+    assert builder.last_context_tokens <= 300
+    assert payload["action_history"][0].startswith("#1-#")
+    assert payload["last_action_result"]["step"] == 30
@@ -0,0 +1,91 @@
+import heapq
+
+from src.shared.execution_scheduler import CriticalPathScheduler, SkillLatencyTracker
+from src.shared.execution_task_graph_management import (
+    ExecutionTaskGraph,
+    ExecutionTaskNode,
+    ExecutionTaskState,
+    ExecutionTaskType,
+)
+from src.shared.graph_storage import InMemoryGraphStorage
+
+LATENCIES = {"quick": 1.0, "slow": 3.0}
+
+
+def build_graph(storage, chain_length=4, quick_tasks=4):
+    graph = ExecutionTaskGraph("exec_sched", storage=storage)
+    nodes = [
+        ExecutionTaskNode(f"q{i}", "quick", ExecutionTaskType.EXECUTABLE, assigned_agent_type="quick")
+        for i in range(quick_tasks)
+    ]
+    previous = None
+    for i in range(chain_length):
+        nodes.append(ExecutionTaskNode(
+            f"c{i}", "slow", ExecutionTaskType.EXECUTABLE,
+            dependencies=[previous] if previous else [], assigned_agent_type="slow",
+        ))
+        previous = f"c{i}"
+    graph.add_tasks(nodes)
+    return graph
+
+
+def simulate_makespan(graph, scheduler, workers=2):
+    """Simulation à événements discrets : `workers` agents, latence fixe par compétence."""
+    clock, running, dispatched = 0.0, [], set()
+    while True:
+        ready = [t for t in graph.get_ready_tasks() if t.id not in dispatched]
+        if scheduler is not None:
+            ready = scheduler.rank(ready, graph.as_dict())
+        while ready and len(running) < workers:
+            task = ready.pop(0)
+            dispatched.add(task.id)
+            heapq.heappush(running, (clock + LATENCIES[task.assigned_agent_type], task.id))
+        if not running:
+            return clock
+        clock, finished_id = heapq.heappop(running)
+        graph.update_task_state(finished_id, ExecutionTaskState.COMPLETED, "sim")
+
+
+def test_critical_path_first_reduces_makespan():
+    tracker = SkillLatencyTracker(storage=InMemoryGraphStorage())
+    for skill, latency in LATENCIES.items():
+        tracker.record(skill, latency)
+    scheduler = CriticalPathScheduler(latency_tracker=tracker)
+
+    fifo_makespan = simulate_makespan(build_graph(InMemoryGraphStorage()), None)
+    priority_makespan = simulate_makespan(build_graph(InMemoryGraphStorage()), scheduler)
+
+    assert priority_makespan == 12.0
+    assert priority_makespan < fifo_makespan
+
+
+def test_latency_tracker_ewma_and_default():
+    tracker = SkillLatencyTracker(storage=InMemoryGraphStorage(), alpha=0.5)
+    assert tracker.estimate("unknown") == 1.0
+    tracker.record("coding_python", 10.0)
+    tracker.record("coding_python", 20.0)
+    assert tracker.estimate("coding_python") == 15.0
+    assert tracker.estimate("unknown") == 15.0
+
+
+def test_latency_writes_are_batched(clock):
+    class CountingStorage(InMemoryGraphStorage):
+        saves = 0
+
+        def save(self, collection, doc_id, data):
+            CountingStorage.saves += 1
+            super().save(collection, doc_id, data)
+
+    storage = CountingStorage()
+    tracker = SkillLatencyTracker(storage=storage, flush_interval_seconds=30, clock=clock)
+    for duration in (1.0, 2.0, 3.0):
+        tracker.record("quick", duration)
+    assert CountingStorage.saves == 1  # première mesure écrite, les suivantes regroupées
+
+    clock.now = 31.0
+    tracker.record("slow", 5.0)
+    assert CountingStorage.saves == 2
+    tracker.record("slow", 6.0)
+    assert tracker.flush() and not tracker.flush()
+    assert CountingStorage.saves == 3
+    assert SkillLatencyTracker(storage=storage).snapshot()["slow"]["samples"] == 2
@@ -0,0 +1,381 @@
+import asyncio
+import sys
+import types
+
+import pytest
+from a2a.server.agent_execution import RequestContext
+from a2a.types import Artifact, Message, MessageSendParams, Part, Role, Task, TaskState, TaskStatus, TextPart
+from a2a.utils import new_text_artifact
+
+from src.shared.execution_task_graph_management import (
+    ExecutionTaskGraph,
+    ExecutionTaskNode,
+    ExecutionTaskState,
+    ExecutionTaskType,
+)
+from src.shared.base_agent_executor import BaseAgentExecutor
+from src.shared.base_agent_logic import BaseAgentLogic
+from src.shared.execution_scheduler import CriticalPathScheduler, SkillLatencyTracker
+from src.shared.graph_storage import InMemoryGraphStorage
+from src.shared.llm_providers import StubProviderError
+
+
+class _DummyEnvMgr:
+    async def get_environment_or_fallback(self, environment_id):
+        return environment_id
+
+    async def destroy_environment(self, environment_id):
+        pass
+
+
+@pytest.fixture
+def supervisor_module(monkeypatch):
+    """Module du superviseur sans Firestore ni Kubernetes, graphes en mémoire partagée."""
+    fake_fb_init = types.ModuleType("src.shared.firebase_init")
+    fake_fb_init.db = None
+    fake_fb_init.get_firestore_client = lambda: None
+    monkeypatch.setitem(sys.modules, "src.shared.firebase_init", fake_fb_init)
+    from src.orchestrators import execution_supervisor_logic as module
+
+    storage = InMemoryGraphStorage()
+    monkeypatch.setattr(module, "EnvironmentManager", _DummyEnvMgr)
+    monkeypatch.setattr(
+        module, "ExecutionTaskGraph", lambda execution_plan_id: ExecutionTaskGraph(execution_plan_id, storage=storage)
+    )
+
+    async def no_status_notification(self):
+        pass
+
+    async def store_artifact(self, artifact, a2a_task_id, a2a_context_id, producing_agent_name):
+        return f"gra-{a2a_task_id}"
+
+    monkeypatch.setattr(module.ExecutionSupervisorLogic, "_notify_gra_of_status_change", no_status_notification)
+    monkeypatch.setattr(module.ExecutionSupervisorLogic, "_store_a2a_artifact_in_gra", store_artifact)
+    return module
+
+
+async def _no_sleep(delay, result=None):
+    return result
+
+
+def _completed_task(task_id: str, text: str) -> Task:
+    return Task(
+        id=task_id,
+        contextId="exec_resume",
+        status=TaskStatus(state=TaskState.completed),
+        artifacts=[Artifact(artifactId=f"art-{task_id}", parts=[Part(root=TextPart(text=text))])],
+    )
+
+
+def _track_leases(logic, events):
+    async def acquire(skill, task_id):
+        events.append(("acquire", skill, task_id))
+        return f"lease-{task_id}"
+
+    async def release(lease_id):
+        events.append(("release", lease_id))
+
+    logic._acquire_capacity_slot = acquire
+    logic._release_capacity_slot = release
+
+
+@pytest.mark.asyncio
+async def test_restarted_supervisor_resumes_and_completes_pending_dispatch(supervisor_module, monkeypatch):
+    module = supervisor_module
+    first = module.ExecutionSupervisorLogic("gp", "plan", execution_plan_id="exec_resume")
+    first.task_graph.add_task(
+        ExecutionTaskNode("t1", "Coder", ExecutionTaskType.EXECUTABLE, assigned_agent_type="coding_python"),
+        is_root=True,
+    )
+    first.task_graph.update_task_state("t1", ExecutionTaskState.WORKING, "Appel agent.")
+    # Le premier superviseur s'arrête après avoir envoyé la tâche A2A.
+    first._pending_dispatches["t1"] = {
+        "a2a_task_id": "a2a-1",
+        "agent_url": "http://dev-agent",
+        "agent_name": "DevelopmentAgentServer",
+        "skill": "coding_python",
+        "deadline_ts": None,
+    }
+    first._save_checkpoint()
+
+    writes = []
+    save = ExecutionTaskGraph.save_supervisor_checkpoint
+    monkeypatch.setattr(
+        ExecutionTaskGraph, "save_supervisor_checkpoint", lambda graph, data: (writes.append(data), save(graph, data))
+    )
+    first._save_checkpoint()
+    assert writes == []  # rien de nouveau à écrire
+    first._cycle_count += 1
+    first._save_checkpoint()
+    assert [data["cycle"] for data in writes] == [1]
+
+    awaited = []
+
+    async def fake_await(agent_url, task_id, context_id=None, deadline_ts=None):
+        awaited.append((agent_url, task_id))
+        return _completed_task(task_id, "print('ok')")
+
+    async def fail_call(*args, **kwargs):
+        raise AssertionError("la tâche ne doit pas être renvoyée")
+
+    monkeypatch.setattr(module, "await_a2a_task", fake_await)
+    monkeypatch.setattr(module, "call_a2a_agent", fail_call)
+
+    second = module.ExecutionSupervisorLogic("gp", "plan", execution_plan_id="exec_resume")
+    leases = []
+    _track_leases(second, leases)
+    second._restore_checkpoint()
+    assert second._cycle_count == 1
+    assert set(second._pending_dispatches) == {"t1"}
+    await second._resume_pending_dispatches()
+
+    assert awaited == [("http://dev-agent", "a2a-1")]
+    assert leases == [("acquire", "coding_python", "t1"), ("release", "lease-t1")]
+    node = second.task_graph.get_task("t1")
+    assert node.state == ExecutionTaskState.COMPLETED
+    assert node.output_artifact_ref == "gra-a2a-1"
+    assert second._pending_dispatches == {}
+    assert second.task_graph.load_supervisor_checkpoint()["pending_dispatches"] == {}
+    assert len(writes) == 2
+
+
+@pytest.mark.asyncio
+async def test_failed_resume_releases_lease_and_clears_dispatch(supervisor_module, monkeypatch):
+    module = supervisor_module
+    logic = module.ExecutionSupervisorLogic("gp", "plan", execution_plan_id="exec_resume_error")
+    logic.task_graph.add_task(
+        ExecutionTaskNode("t1", "Coder", ExecutionTaskType.EXECUTABLE, assigned_agent_type="coding_python"),
+        is_root=True,
+    )
+    logic.task_graph.update_task_state("t1", ExecutionTaskState.WORKING, "Appel agent.")
+    logic._pending_dispatches["t1"] = {"a2a_task_id": "a2a-1", "agent_url": "http://dev-agent", "skill": "coding_python"}
+    logic._save_checkpoint()
+
+    async def broken_await(*args, **kwargs):
+        raise RuntimeError("réponse illisible")
+
+    monkeypatch.setattr(module, "await_a2a_task", broken_await)
+    leases = []
+    _track_leases(logic, leases)
+    await logic._resume_pending_dispatches()
+
+    assert leases == [("acquire", "coding_python", "t1"), ("release", "lease-t1")]
+    assert logic.task_graph.load_supervisor_checkpoint()["pending_dispatches"] == {}
+    node = logic.task_graph.get_task("t1")
+    assert node.state == ExecutionTaskState.FAILED
+    assert node.meta["failure_class"] == "permanent"
+
+
+@pytest.mark.asyncio
+async def test_ready_tasks_are_dispatched_concurrently_and_attempted_once(supervisor_module):
+    module = supervisor_module
+    logic = module.ExecutionSupervisorLogic("gp", "plan", execution_plan_id="exec_parallel")
+    logic.max_parallel_tasks = 2
+    logic.scheduler = CriticalPathScheduler(SkillLatencyTracker(storage=InMemoryGraphStorage()))
+    graph = logic.task_graph
+    graph.add_tasks([
+        ExecutionTaskNode("b", "B", ExecutionTaskType.EXECUTABLE),
+        ExecutionTaskNode("a", "A", ExecutionTaskType.EXECUTABLE),
+        ExecutionTaskNode("unavailable", "Sans agent", ExecutionTaskType.EXECUTABLE),
+        ExecutionTaskNode("c", "C", ExecutionTaskType.EXECUTABLE, dependencies=["a"]),
+    ])
+
+    events, running, peak = [], set(), 0
+
+    async def fake_dispatch(task_node):
+        nonlocal peak
+        events.append(("start", task_node.id))
+        running.add(task_node.id)
+        peak = max(peak, len(running))
+        await asyncio.sleep(0.02)
+        running.discard(task_node.id)
+        if task_node.id == "unavailable":
+            # Aucun agent disponible : la tâche redevient READY pour le cycle suivant.
+            graph.update_task_state(task_node.id, ExecutionTaskState.READY, "Aucun agent.")
+        else:
+            graph.update_task_state(task_node.id, ExecutionTaskState.COMPLETED, "OK")
+        events.append(("end", task_node.id))
+
+    logic._dispatch_ready_task = fake_dispatch
+    await logic._dispatch_ready_tasks(graph.get_ready_tasks())
+
+    starts = [task_id for kind, task_id in events if kind == "start"]
+    # "a" débloque "c" (chemin critique plus long) : il part en premier, avec "b" en parallèle.
+    assert starts[:2] == ["a", "b"] and events[2][0] == "end"
+    assert peak == 2
+    assert sorted(starts) == ["a", "b", "c", "unavailable"]
+    assert graph.get_task("c").state == ExecutionTaskState.COMPLETED
+    assert graph.get_task("unavailable").state == ExecutionTaskState.READY
+    assert logic._in_flight == {}
+
+
+class _QuotaExhaustedLogic(BaseAgentLogic):
+    async def process(self, input_data, context_id=None):
+        raise StubProviderError("Stub LLM : quota simulé (429 resource exhausted).")
+
+
+class _Executor(BaseAgentExecutor):
+    def _create_artifact_from_result(self, result_data, task):
+        return new_text_artifact(name=self.default_artifact_name, text=str(result_data))
+
+    async def _notify_gra_of_status_change(self):
+        pass
+
+
+class _CollectingQueue:
+    def __init__(self):
+        self.events = []
+
+    async def enqueue_event(self, event):
+        self.events.append(event)
+
+
+def _agent_call(agent_logic):
+    """call_a2a_agent exécutant la tâche sur un exécuteur réel ; l'état final est celui du dernier statut publié."""
+
+    async def call_agent(agent_url, input_text, context_id, deadline_ts=None, task_id=None):
+        message = Message(
+            role=Role.user, messageId="msg-1", taskId=task_id, contextId=context_id,
+            parts=[Part(root=TextPart(text=input_text))],
+            metadata={"deadline_ts": deadline_ts},
+        )
+        queue = _CollectingQueue()
+        await _Executor(agent_logic).execute(
+            RequestContext(request=MessageSendParams(message=message), task_id=task_id, context_id=context_id), queue
+        )
+        return Task(id=task_id, contextId=context_id, status=queue.events[-1].status)
+
+    return call_agent
+
+
+def _supervisor_with_agent(module, monkeypatch, execution_plan_id, task_id, agent_logic):
+    logic = module.ExecutionSupervisorLogic("gp", "plan", execution_plan_id=execution_plan_id)
+    logic.task_graph.add_task(
+        ExecutionTaskNode(task_id, "Coder", ExecutionTaskType.EXECUTABLE, assigned_agent_type="coding_python"),
+        is_root=True,
+    )
+    _track_leases(logic, [])
+
+    async def agent_details(skill):
+        return {"url": "http://dev-agent", "name": "DevelopmentAgentServer"}
+
+    logic._get_agent_details_from_gra = agent_details
+    monkeypatch.setattr(module, "call_a2a_agent", _agent_call(agent_logic))
+    return logic
+
+
+@pytest.mark.asyncio
+async def test_agent_rate_limit_failure_schedules_a_retry(supervisor_module, monkeypatch):
+    # L'ID local choisi par le LLM ne doit pas influencer le classement de l'échec.
+    task_id = "exec_task_unavailable_timeout_abc123"
+    logic = _supervisor_with_agent(
+        supervisor_module, monkeypatch, "exec_agent_failure", task_id, _QuotaExhaustedLogic()
+    )
+    await logic._dispatch_ready_tasks(logic.task_graph.get_ready_tasks())
+
+    node = logic.task_graph.get_task(task_id)
+    assert node.state == ExecutionTaskState.PENDING
+    assert node.meta["error_code"] == "rate_limited"
+    assert node.meta["failure_class"] == "rate_limited" and node.meta["retry_attempts"] == 1
+
+
+class _SlowLogic(BaseAgentLogic):
+    async def process(self, input_data, context_id=None):
+        await asyncio.Event().wait()
+
+
+@pytest.mark.asyncio
+async def test_agent_side_deadline_is_a_deadline_failure(supervisor_module, monkeypatch):
+    module = supervisor_module
+    monkeypatch.setattr(module, "EXECUTION_TASK_DEADLINE_SECONDS", 0.05)
+    logic = _supervisor_with_agent(module, monkeypatch, "exec_agent_deadline", "t1", _SlowLogic())
+    await logic._dispatch_ready_tasks(logic.task_graph.get_ready_tasks())
+
+    node = logic.task_graph.get_task("t1")
+    assert node.state == ExecutionTaskState.PENDING
+    assert node.meta["error_code"] == "deadline" and node.meta["failure_class"] == "deadline"
+
+
+@pytest.mark.asyncio
+async def test_task_waits_for_its_slot_as_assigned_and_never_leaks_the_lease(supervisor_module, monkeypatch):
+    logic = _supervisor_with_agent(supervisor_module, monkeypatch, "exec_slot", "t1", _QuotaExhaustedLogic())
+    events = []
+
+    async def acquire(skill, task_id):
+        events.append(("acquire", logic.task_graph.get_task(task_id).state))
+        return "lease-t1"
+
+    async def release(lease_id):
+        events.append(("release", lease_id))
+
+    def broken_checkpoint():
+        raise RuntimeError("stockage indisponible")
+
+    logic._acquire_capacity_slot = acquire
+    logic._release_capacity_slot = release
+    logic._save_checkpoint = broken_checkpoint
+    with pytest.raises(RuntimeError):
+        await logic._dispatch_ready_task(logic.task_graph.get_ready_tasks()[0])
+
+    assert events == [("acquire", ExecutionTaskState.ASSIGNED), ("release", "lease-t1")]
+
+
+@pytest.mark.asyncio
+async def test_restarts_share_the_plan_cycle_budget(supervisor_module, monkeypatch):
+    module = supervisor_module
+    monkeypatch.setattr(module, "EXECUTION_MAX_CYCLES", 3)
+    monkeypatch.setattr(module.asyncio, "sleep", _no_sleep)
+
+    def supervisor():
+        logic = module.ExecutionSupervisorLogic("gp", "plan", execution_plan_id="exec_budget")
+        logic.scheduler = CriticalPathScheduler(SkillLatencyTracker(storage=InMemoryGraphStorage()))
+        return logic
+
+    first = supervisor()
+    first.task_graph.add_task(
+        ExecutionTaskNode("t1", "Coder", ExecutionTaskType.EXECUTABLE, assigned_agent_type="coding_python"),
+        is_root=True,
+    )
+    first.task_graph.set_overall_status("PLAN_DECOMPOSED")
+
+    async def agent_not_found(skill):
+        return None
+
+    # Aucun agent disponible : la tâche reste READY et chaque reprise consomme des cycles.
+    cycles = []
+    for _ in range(3):
+        logic = supervisor()
+        logic._get_agent_details_from_gra = agent_not_found
+        await logic.continue_execution(max_cycles=2)
+        cycles.append(logic._cycle_count)
+
+    assert cycles == [2, 3, 3]
+    assert first.task_graph.as_dict()["overall_status"] == "TIMEOUT_EXECUTION"
+
+
+@pytest.mark.asyncio
+async def test_rejected_batches_leave_no_id_mapping_behind(supervisor_module, monkeypatch):
+    module = supervisor_module
+    logic = module.ExecutionSupervisorLogic("gp", "plan", execution_plan_id="exec_rejected_batch")
+    graph = logic.task_graph
+    graph.add_task(ExecutionTaskNode("decomp", "Décomposer", ExecutionTaskType.DECOMPOSITION), is_root=True)
+    graph.add_task(ExecutionTaskNode("explore", "Explorer", ExecutionTaskType.EXPLORATORY), is_root=True)
+    logic._local_to_global_id_map_for_plan["existant"] = "explore"
+    logic._save_checkpoint()
+    saved_state = logic._checkpoint_state
+
+    def reject(task_nodes, root_task_ids=None):
+        raise ValueError("lot rejeté")
+
+    monkeypatch.setattr(graph, "add_tasks", reject)
+    logic._decomposition_cache_key = "clé"
+    assert not logic._apply_cached_decomposition(graph.get_task("decomp"), [{"id": "a", "nom": "A"}])
+    assert logic._local_to_global_id_map_for_plan == {"existant": "explore"}
+    assert logic._checkpoint_state == saved_state
+
+    logic._process_completed_exploratory_task(
+        graph.get_task("explore"), '{"new_sub_tasks": [{"id": "b", "nom": "B"}]}'
+    )
+    assert graph.get_task("explore").state == ExecutionTaskState.FAILED
+    assert logic._local_to_global_id_map_for_plan == {"existant": "explore"}
+    assert graph.load_supervisor_checkpoint()["local_to_global_id_map"] == {"existant": "explore"}
@@ -0,0 +1,38 @@
+import pytest
+
+from src.shared.graph_analysis import (
+    DagValidationError,
+    compute_dag_metrics,
+    find_cycle,
+    validate_dependencies,
+)
+
+
+def test_metrics_on_diamond():
+    deps = {"a": [], "b": ["a"], "c": ["a"], "d": ["b", "c"], "e": ["d"]}
+    metrics = compute_dag_metrics(deps)
+
+    assert metrics["depth"] == 4
+    assert metrics["max_width"] == 2
+    assert metrics["critical_path_length"] == 4
+    assert metrics["critical_path"][0] == "a" and metrics["critical_path"][-2:] == ["d", "e"]
+    assert metrics["levels"]["d"] == 2
+
+
+def test_weighted_critical_path():
+    deps = {"a": [], "b": ["a"], "c": ["a"], "d": ["b", "c"]}
+    metrics = compute_dag_metrics(deps, weights={"c": 5.0})
+    assert metrics["critical_path"] == ["a", "c", "d"]
+    assert metrics["critical_path_length"] == 7.0
+
+
+def test_cycle_and_unresolved_references_are_rejected():
+    assert find_cycle({"a": ["c"], "b": ["a"], "c": ["b"]}) is not None
+
+    with pytest.raises(DagValidationError) as cycle_error:
+        validate_dependencies({"a": ["b"], "b": ["a"]})
+    assert set(cycle_error.value.cycle) == {"a", "b"}
+
+    with pytest.raises(DagValidationError) as ref_error:
+        validate_dependencies({"a": ["root", "ghost"]}, known_ids=["root"])
+    assert ref_error.value.unresolved == {"a": ["ghost"]}
@@ -0,0 +1,108 @@
+import pytest
+
+from src.shared.graph_storage import InMemoryGraphStorage, SQLiteGraphStorage
+from src.shared.execution_task_graph_management import (
+    ExecutionTaskGraph,
+    ExecutionTaskNode,
+    ExecutionTaskState,
+    ExecutionTaskType,
+)
+from src.shared.task_graph_management import TaskGraph, TaskNode, TaskState
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def storage(request, tmp_path):
+    if request.param == "memory":
+        yield InMemoryGraphStorage()
+        return
+    backend = SQLiteGraphStorage(str(tmp_path / "graphs.sqlite3"))
+    yield backend
+    backend.close()
+
+
+def test_execution_graph_ready_and_completion(storage):
+    graph = ExecutionTaskGraph("exec_test", storage=storage)
+    graph.add_task(
+        ExecutionTaskNode("a", "A", ExecutionTaskType.EXECUTABLE, assigned_agent_type="coding_python"),
+        is_root=True,
+    )
+    graph.add_task(
+        ExecutionTaskNode("b", "B", ExecutionTaskType.EXECUTABLE, dependencies=["a"])
+    )
+
+    assert [t.id for t in graph.get_ready_tasks()] == ["a"]
+
+    graph.update_task_output("a", artifact_ref="art_a", summary="done")
+    graph.update_task_state("a", ExecutionTaskState.COMPLETED, "ok")
+
+    assert [t.id for t in graph.get_ready_tasks()] == ["b"]
+    reloaded = ExecutionTaskGraph("exec_test", storage=storage).get_task("a")
+    assert reloaded.output_artifact_ref == "art_a"
+    assert reloaded.state == ExecutionTaskState.COMPLETED
+
+
+def test_team1_graph_roundtrip(storage):
+    graph = TaskGraph("plan_test", storage=storage)
+    graph.add_task(TaskNode("root", objective="obj"))
+    graph.add_task(TaskNode("child", parent="root", assigned_agent="Agent"))
+    graph.update_state("child", TaskState.COMPLETED, artifact_ref={"k": "v"})
+
+    data = graph.as_dict()
+    assert data["roots"] == ["root"]
+    assert data["nodes"]["root"]["children"] == ["child"]
+    assert graph.get_task("child").artifact_ref == {"k": "v"}
+
+
+def test_unit_of_work_commits_once():
+    class CountingStorage(InMemoryGraphStorage):
+        def __init__(self):
+            super().__init__()
+            self.saves = 0
+
+        def save(self, collection, doc_id, data):
+            self.saves += 1
+            super().save(collection, doc_id, data)
+
+    storage = CountingStorage()
+    graph = ExecutionTaskGraph("exec_uow", storage=storage)
+    graph.add_task(ExecutionTaskNode("a", "A", ExecutionTaskType.EXECUTABLE), is_root=True)
+    saves_before = storage.saves
+
+    with graph.unit_of_work():
+        graph.update_task_output("a", artifact_ref="art_a", summary="done")
+        graph.update_task_state("a", ExecutionTaskState.COMPLETED, "ok")
+        graph.set_overall_status("EXECUTION_COMPLETED_SUCCESSFULLY")
+        assert storage.saves == saves_before
+
+    assert storage.saves == saves_before + 1
+    assert graph.get_task("a").state == ExecutionTaskState.COMPLETED
+
+
+def test_add_tasks_bulk_insert_and_validation(storage):
+    graph = ExecutionTaskGraph("exec_bulk", storage=storage)
+    graph.add_task(ExecutionTaskNode("root", "R", ExecutionTaskType.EXPLORATORY), is_root=True)
+
+    graph.add_tasks([
+        ExecutionTaskNode("c1", "C1", ExecutionTaskType.EXECUTABLE, parent_id="root", dependencies=["root"]),
+        ExecutionTaskNode("c2", "C2", ExecutionTaskType.EXECUTABLE, parent_id="root", dependencies=["c1"]),
+    ])
+
+    assert graph.get_task("root").sub_task_ids == ["c1", "c2"]
+    assert graph.get_dependents("root") == ["c1"]
+    assert graph.get_dependents("c1") == ["c2"]
+
+    with pytest.raises(ValueError):
+        graph.add_tasks([ExecutionTaskNode("c3", "C3", ExecutionTaskType.EXECUTABLE, dependencies=["missing"])])
+    assert graph.get_task("c3") is None
+
+
+def test_history_is_kept_out_of_graph_document(storage):
+    graph = ExecutionTaskGraph("exec_history", storage=storage)
+    graph.add_task(ExecutionTaskNode("a", "A", ExecutionTaskType.EXECUTABLE), is_root=True)
+    graph.update_task_state("a", ExecutionTaskState.WORKING, "start")
+    graph.update_task_state("a", ExecutionTaskState.COMPLETED, "done")
+
+    node_data = graph.as_dict()["nodes"]["a"]
+    assert "history" not in node_data
+    assert "sub_task_ids" not in node_data
+    assert [e["to_state"] for e in graph.get_task_history("a")] == ["working", "completed"]
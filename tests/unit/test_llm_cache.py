@@ -0,0 +1,32 @@
+from src.shared.llm_cache import LLMResponseCache
+
+
+def test_cache_layers_ttl_and_per_agent_stats(tmp_path, monkeypatch):
+    path = str(tmp_path / "llm_cache.sqlite3")
+    key = LLMResponseCache.key("model", "system", "prompt", 0.5, True)
+    assert key != LLMResponseCache.key("model", "system", "prompt", 0.5, False)
+    assert key != LLMResponseCache.key("model", "system", "prompt", 0.5, True, max_output_tokens=1024)
+    assert key != LLMResponseCache.key("model", "system", "prompt", 0.5, True, top_p=0.9)
+    schema = {"type": "object"}
+    assert LLMResponseCache.key("model", "system", "prompt", 0.5, True, schema) != LLMResponseCache.key(
+        "model", "system", "prompt", 0.5, True, schema, constrain_decoding=False
+    )
+
+    cache = LLMResponseCache(path=path, enabled=True, ttl_seconds=60, max_memory_entries=1)
+    assert cache.get(key, "DevAgent") is None
+    cache.put(key, '{"a": 1}', json_mode=True, agent="DevAgent")
+    cache.put("other", "not json", json_mode=True, agent="DevAgent")
+    assert cache.get(key, "DevAgent") == '{"a": 1}'
+    assert cache.get("other", "DevAgent") is None
+    cache.close()
+
+    reopened = LLMResponseCache(path=path, enabled=True, ttl_seconds=60)
+    assert reopened.get(key, "TestAgent") == '{"a": 1}'
+    stats = reopened.stats()["agents"]["TestAgent"]
+    assert stats["disk_hits"] == 1 and stats["hit_rate"] == 1.0
+    assert cache.stats()["agents"]["DevAgent"]["rejected"] == 1
+
+    import src.shared.llm_cache as llm_cache_module
+    real_time = llm_cache_module.time.time
+    monkeypatch.setattr(llm_cache_module.time, "time", lambda: real_time() + 120)
+    assert reopened.get(key, "TestAgent") is None
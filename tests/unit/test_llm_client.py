@@ -0,0 +1,164 @@
+import asyncio
+
+import pytest
+
+from src.shared import llm_client, llm_providers
+from src.shared.llm_cache import LLMResponseCache
+from src.shared.llm_routing import LLMRouter, bind_llm_route
+
+
+def _vertex_provider(monkeypatch):
+    monkeypatch.setattr(llm_providers.vertexai, "init", lambda **kwargs: None)
+    return llm_providers.VertexLLMProvider()
+
+
+class _Chunk:
+    prompt_feedback = None
+
+    def __init__(self, text):
+        self._text = text
+
+    @property
+    def text(self):
+        if self._text is None:
+            raise ValueError("fragment sans texte")
+        return self._text
+
+
+class _FakeModel:
+    built = 0
+
+    def __init__(self, model_name, system_instruction):
+        _FakeModel.built += 1
+
+    async def generate_content_async(self, prompt, generation_config, stream):
+        async def chunks():
+            await asyncio.sleep(0.01)
+            yield _Chunk('{"ok": ')
+            yield _Chunk("true}")
+            yield _Chunk(None)
+        return chunks()
+
+
+@pytest.mark.asyncio
+async def test_model_handles_are_reused_and_calls_are_timed(monkeypatch):
+    monkeypatch.setattr(llm_providers, "GCP_PROJECT_ID", "test-project")
+    monkeypatch.setattr(llm_providers, "GCP_REGION", "europe-west1")
+    monkeypatch.setattr(llm_providers, "GenerativeModel", _FakeModel)
+    _FakeModel.built = 0
+    client = llm_client.LLMClient(model_name="test-model", provider=_vertex_provider(monkeypatch))
+
+    for _ in range(3):
+        text, timing = await client.generate_with_timing("prompt", "system", json_mode=True)
+        assert text == '{"ok": true}'
+    await client.generate("prompt", "other system")
+
+    assert _FakeModel.built == 2
+    assert timing.model_reused and timing.succeeded
+    assert timing.ttfb_seconds is not None and timing.total_seconds >= timing.ttfb_seconds
+    summary = client.timings_summary()
+    assert summary["calls"] == 4 and summary["cached_models"] == 2 and summary["failures"] == 0
+
+
+class _FakeQueue:
+    def __init__(self):
+        self.events = []
+
+    async def enqueue_event(self, event):
+        self.events.append(event)
+
+
+@pytest.mark.asyncio
+async def test_streamed_chunks_are_relayed_as_one_appended_artifact(monkeypatch):
+    from a2a.types import TaskArtifactUpdateEvent, TaskStatusUpdateEvent
+    from a2a.utils import new_text_artifact
+    from src.shared.base_agent_executor import LLMStreamRelay
+
+    monkeypatch.setattr(llm_providers, "GCP_PROJECT_ID", "test-project")
+    monkeypatch.setattr(llm_providers, "GCP_REGION", "europe-west1")
+    monkeypatch.setattr(llm_providers, "GenerativeModel", _FakeModel)
+    client = llm_client.LLMClient(model_name="test-model", provider=_vertex_provider(monkeypatch))
+
+    assert [chunk async for chunk in client.stream("prompt", "system")] == ['{"ok": ', "true}"]
+
+    queue = _FakeQueue()
+    relay = LLMStreamRelay(queue, "task-1", "ctx-1", min_chunk_chars=1, status_interval_seconds=60)
+    with llm_client.bind_llm_stream(relay.on_chunk):
+        text = await client.generate("prompt", "system")
+    await relay.close()
+    final = relay.adopt(new_text_artifact(name="result", text=text))
+
+    artifact_events = [e for e in queue.events if isinstance(e, TaskArtifactUpdateEvent)]
+    assert [e.append for e in artifact_events] == [False, True]
+    assert {e.artifact.artifactId for e in artifact_events} == {final.artifactId}
+    assert sum(isinstance(e, TaskStatusUpdateEvent) for e in queue.events) == 1
+
+
+class _SlowModel:
+    calls = 0
+
+    def __init__(self, model_name, system_instruction):
+        pass
+
+    async def generate_content_async(self, prompt, generation_config, stream):
+        _SlowModel.calls += 1
+
+        async def chunks():
+            await asyncio.sleep(0.05)
+            yield _Chunk("partagé")
+        return chunks()
+
+
+@pytest.mark.asyncio
+async def test_identical_concurrent_calls_share_one_upstream_call(monkeypatch):
+    monkeypatch.setattr(llm_providers, "GCP_PROJECT_ID", "test-project")
+    monkeypatch.setattr(llm_providers, "GCP_REGION", "europe-west1")
+    monkeypatch.setattr(llm_providers, "GenerativeModel", _SlowModel)
+    _SlowModel.calls = 0
+    client = llm_client.LLMClient(model_name="test-model", provider=_vertex_provider(monkeypatch))
+
+    waiters = [asyncio.create_task(client.generate("prompt", "system")) for _ in range(3)]
+    await asyncio.sleep(0.01)
+    waiters[0].cancel()
+    results = await asyncio.gather(*waiters, return_exceptions=True)
+
+    assert isinstance(results[0], asyncio.CancelledError)
+    assert results[1:] == ["partagé", "partagé"]
+    assert _SlowModel.calls == 1
+    assert client.coalesced_calls == 2
+    assert client.timings_summary()["in_flight_calls"] == 0
+
+    # La dernière requête annulée abandonne l'appel amont.
+    lone = asyncio.create_task(client.generate("autre prompt", "system"))
+    await asyncio.sleep(0.01)
+    lone.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await lone
+    assert client.timings_summary()["in_flight_calls"] == 0
+
+
+@pytest.mark.asyncio
+async def test_routes_with_different_output_caps_share_neither_cache_nor_call(monkeypatch, tmp_path):
+    monkeypatch.setattr(llm_providers, "GCP_PROJECT_ID", "test-project")
+    monkeypatch.setattr(llm_providers, "GCP_REGION", "europe-west1")
+    monkeypatch.setattr(llm_providers, "GenerativeModel", _SlowModel)
+    _SlowModel.calls = 0
+    router = LLMRouter({"routes": [
+        {"name": "evaluation", "skill": "evaluation", "model": "test-model", "max_output_tokens": 1024},
+        {"name": "code", "skill": "coding_python", "model": "test-model"},
+    ]})
+    cache = LLMResponseCache(path=str(tmp_path / "llm_cache.sqlite3"), enabled=True, ttl_seconds=60)
+    client = llm_client.LLMClient(
+        model_name="test-model", provider=_vertex_provider(monkeypatch), router=router, cache=cache
+    )
+
+    async def generate(skill):
+        with bind_llm_route(skill, None):
+            return await client.generate("prompt", "system")
+
+    await asyncio.gather(generate("evaluation"), generate("coding_python"))
+    assert _SlowModel.calls == 2 and client.coalesced_calls == 0
+
+    await generate("evaluation")
+    await generate("coding_python")
+    assert _SlowModel.calls == 2
@@ -0,0 +1,69 @@
+import json
+import random
+
+import pytest
+
+from src.agents.decomposition_agent.logic import DECOMPOSITION_SCHEMA
+from src.agents.testing_agent.logic import TEST_REPORT_SCHEMA
+from src.shared.llm_client import LLMClient
+from src.shared.llm_providers import (
+    LLMRequest,
+    LLMResponseRecorder,
+    StubLLMProvider,
+    StubProviderError,
+    load_recordings,
+    synthesize_from_schema,
+)
+from src.shared.llm_rate_limiter import LLMRateLimiter, retryable_status
+from src.shared.structured_output import generate_json, validate_json
+
+
+@pytest.mark.parametrize("schema", [DECOMPOSITION_SCHEMA, TEST_REPORT_SCHEMA])
+def test_synthesized_json_matches_agent_schemas(schema):
+    data = synthesize_from_schema(schema, random.Random("seed"))
+    assert validate_json(data, schema) == []
+
+
+@pytest.mark.asyncio
+async def test_stub_replays_recordings_and_fills_schemas(tmp_path):
+    recordings = tmp_path / "recordings.jsonl"
+    LLMResponseRecorder(str(recordings)).record(
+        LLMRequest("m", 0.5, "bonjour", "system", False), "réponse enregistrée"
+    )
+    stub = StubLLMProvider(
+        {"latency": {"distribution": "uniform", "min_seconds": 0.0, "max_seconds": 0.01}, "chunk_chars": 4},
+        recordings=load_recordings(str(recordings)),
+    )
+    client = LLMClient(model_name="stub-model", provider=stub, rate_limiter=LLMRateLimiter({}))
+
+    assert await client.generate("bonjour", "system") == "réponse enregistrée"
+    assert stub.replayed == 1
+
+    async def stub_call(prompt, system_prompt, **kwargs):
+        return await client.generate(prompt, system_prompt, **kwargs)
+
+    report = await generate_json("autre prompt", "system", TEST_REPORT_SCHEMA, llm_call=stub_call)
+    assert report["test_status"] in ("passed", "failed", "partial_success")
+    assert stub.synthesized == 1
+    assert client.timings_summary()["provider"] == "stub"
+    assert client.timings_summary()["last_call"]["total_tokens"] > 0
+    again = await generate_json("autre prompt", "system", TEST_REPORT_SCHEMA, llm_call=stub_call)
+    assert json.dumps(again, sort_keys=True) == json.dumps(report, sort_keys=True)
+
+
+@pytest.mark.asyncio
+async def test_injected_quota_errors_are_throttled_and_retried():
+    # Graine 1 : le premier appel tire une erreur (0.13 < 0.5), la relance passe (0.85).
+    stub = StubLLMProvider(
+        {"latency": {"distribution": "constant", "seconds": 0.0}, "error_rate": 0.5, "seed": 1}, recordings={}
+    )
+    limiter = LLMRateLimiter({"base_delay_seconds": 0.001, "models": {"stub-model": {"max_concurrency": 4}}})
+    client = LLMClient(model_name="stub-model", provider=stub, rate_limiter=limiter)
+
+    assert retryable_status(StubProviderError("Stub LLM : quota simulé (429 resource exhausted).")) == 429
+    text, timing = await client.generate_with_timing("bonjour", "system")
+
+    assert text.startswith("Réponse simulée")
+    assert timing.attempts == 2 and timing.succeeded
+    assert limiter.throttled_calls == 1 and limiter.retried_calls == 1
+    assert limiter.metrics()["models"]["stub-model"]["concurrency_limit"] == 2
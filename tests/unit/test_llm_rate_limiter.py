@@ -0,0 +1,65 @@
+import asyncio
+import random
+
+import pytest
+from google.api_core.exceptions import InvalidArgument, ResourceExhausted, ServiceUnavailable
+
+from src.shared.llm_rate_limiter import LLMRateLimiter, TokenBucket, retry_after_seconds
+
+
+def test_token_bucket_debt_and_refill(clock):
+    bucket = TokenBucket(60, clock=clock)
+    assert bucket.wait_seconds(60) == 0
+    bucket.adjust(60 + 30)
+    assert bucket.wait_seconds(1) == pytest.approx(31)
+    clock.now = 31
+    assert bucket.wait_seconds(1) == pytest.approx(0)
+
+
+def test_retry_decisions_honor_retry_after():
+    limiter = LLMRateLimiter({"max_retries": 2, "base_delay_seconds": 1, "max_delay_seconds": 30}, rng=random.Random(0))
+    throttled = ResourceExhausted("Quota exceeded. Please retry after 7s.")
+    assert retry_after_seconds(throttled) == 7
+    assert limiter.retry_delay(throttled, 1) >= 7
+    assert limiter.retry_delay(ServiceUnavailable("backend down"), 2) <= 2
+    assert limiter.retry_delay(throttled, 3) is None
+    assert limiter.retry_delay(InvalidArgument("bad prompt"), 1) is None
+
+
+@pytest.mark.asyncio
+async def test_concurrency_is_capped_and_halved_on_throttling():
+    limiter = LLMRateLimiter({"max_concurrency": 10, "models": {"m": {"max_concurrency": 2}}})
+    peak = 0
+    running = 0
+
+    async def call():
+        nonlocal peak, running
+        async with limiter.acquire("m", 10):
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+    await asyncio.gather(*(call() for _ in range(6)))
+    assert peak == 2
+
+    async with limiter.acquire("m", 10) as permit:
+        permit.throttled()
+    assert limiter.metrics()["models"]["m"]["concurrency_limit"] == 1
+
+
+@pytest.mark.asyncio
+async def test_quota_starved_model_does_not_block_other_models():
+    limiter = LLMRateLimiter({"max_concurrency": 1, "models": {"a": {"max_concurrency": 1, "requests_per_minute": 1}}})
+    async with limiter.acquire("a", 10):
+        pass
+    # Le seau RPM de "a" est vide : cet appel attend environ une minute.
+    starved = asyncio.create_task(limiter.acquire("a", 10).__aenter__())
+    await asyncio.sleep(0.01)
+
+    async with limiter.acquire("b", 10) as permit:
+        assert permit.waited_seconds < 1
+    assert not starved.done()
+    starved.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await starved
@@ -0,0 +1,68 @@
+from src.shared.llm_routing import LLMRouter, bind_llm_route
+
+ROUTING = {
+    "size_classes": {"small": 100, "medium": 1000},
+    "routes": [
+        {"name": "evaluation", "agent": "EvaluatorAgentServer", "model": "flash-lite", "temperature": 0.1},
+        {"name": "code-large", "skill": "coding_python", "size": ["medium", "large"], "model": "pro",
+         "max_output_tokens": 8192, "fallback_model": "flash", "expected_latency_seconds": 40},
+    ],
+}
+
+
+def test_routes_by_agent_skill_and_size():
+    router = LLMRouter(ROUTING)
+
+    evaluation = router.route(50, "default-model", 0.5, agent="EvaluatorAgentServer")
+    assert (evaluation.name, evaluation.model_name, evaluation.temperature) == ("evaluation", "flash-lite", 0.1)
+
+    with bind_llm_route("coding_python", None):
+        small = router.route(50, "default-model", 0.5, agent="development_agent")
+        large = router.route(5000, "default-model", 0.5, agent="development_agent")
+    assert (small.name, small.model_name, small.size_class) == ("default", "default-model", "small")
+    assert (large.name, large.model_name, large.max_output_tokens) == ("code-large", "pro", 8192)
+    assert large.fallback_from is None
+
+
+def test_falls_back_to_faster_model_when_deadline_is_tight():
+    router = LLMRouter(ROUTING)
+    with bind_llm_route("coding_python", 1000.0):
+        tight = router.route(5000, "default-model", 0.5, now=980.0)
+        relaxed = router.route(5000, "default-model", 0.5, now=900.0)
+    assert (tight.model_name, tight.fallback_from) == ("flash", "pro")
+    assert relaxed.model_name == "pro"
+
+    # L'historique observé remplace l'estimation configurée.
+    for _ in range(5):
+        router.observe("pro", 120.0, True)
+    with bind_llm_route("coding_python", 1000.0):
+        assert router.route(5000, "default-model", 0.5, now=900.0).model_name == "flash"
+    assert router.metrics()["fallbacks"] == 2
+    assert router.metrics()["requests_by_route"]["code-large:fallback"] == 2
+
+
+def test_primary_model_is_probed_and_recovers_after_a_slow_spell(clock):
+    config = {"routes": [{"name": "code", "model": "pro", "fallback_model": "flash", "latency_budget_seconds": 20}]}
+    router = LLMRouter(config, clock=clock, probe_interval=5, max_sample_age_seconds=60)
+    for _ in range(3):
+        router.observe("pro", 30.0, True)
+
+    models = [router.route(100, "default-model", 0.5).model_name for _ in range(5)]
+    assert models == ["flash", "flash", "flash", "flash", "pro"]
+    assert router.metrics()["probes"] == 1
+
+    # Sonde rapide : le modèle principal reste replié tant que les mesures lentes comptent...
+    router.observe("pro", 5.0, True)
+    assert router.route(100, "default-model", 0.5).model_name == "flash"
+    # ... puis redevient éligible quand elles expirent.
+    clock.now = 61.0
+    assert router.expected_latency("pro") is None
+    assert router.route(100, "default-model", 0.5).model_name == "pro"
+
+
+def test_fast_failures_are_ignored_but_interrupted_calls_count():
+    router = LLMRouter({})
+    router.observe("pro", 0.1, False)
+    assert router.expected_latency("pro") is None
+    router.observe("pro", 45.0, False, timed_out=True)
+    assert router.expected_latency("pro") == 45.0
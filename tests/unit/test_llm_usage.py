@@ -0,0 +1,120 @@
+import pytest
+
+from src.shared.llm_usage import LLMUsageTracker, bind_llm_usage, usage_breakdown
+
+
+class _Timing:
+    def __init__(self, prompt_tokens, output_tokens, total_seconds, succeeded=True):
+        self.prompt_tokens = prompt_tokens
+        self.output_tokens = output_tokens
+        self.total_tokens = prompt_tokens + output_tokens
+        self.total_seconds = total_seconds
+        self.queue_seconds = 0.0
+        self.succeeded = succeeded
+
+
+class _FakeDocument:
+    def __init__(self, writes, path):
+        self._writes = writes
+        self._path = path
+
+    def set(self, data, merge=False):
+        self._writes.append((self._path, data))
+
+
+class _FakeCollection:
+    def __init__(self, writes, name):
+        self._writes = writes
+        self._name = name
+
+    def document(self, doc_id):
+        return _FakeDocument(self._writes, f"{self._name}/{doc_id}")
+
+
+class _FakeDb:
+    def __init__(self):
+        self.writes = []
+
+    def collection(self, name):
+        return _FakeCollection(self.writes, name)
+
+
+def test_calls_are_tagged_and_flushed_per_plan_and_task():
+    tracker = LLMUsageTracker(agent_name="ResearchAgentServer")
+    with bind_llm_usage("plan-1", "task-a"):
+        tracker.record(_Timing(100, 20, 1.5))
+        tracker.record(_Timing(50, 0, 0.5, succeeded=False))
+    with bind_llm_usage("plan-2", "task-b"):
+        tracker.record(_Timing(10, 5, 1.0))
+
+    summary = tracker.summary()
+    assert summary["calls"] == 3 and summary["failures"] == 1 and summary["total_tokens"] == 185
+    assert summary["pending_plans"] == 2
+
+    db = _FakeDb()
+    assert tracker.flush(db) == 2
+    paths = [path for path, _ in db.writes]
+    assert paths == ["llm_usage/plan-1", "llm_usage/plan-2", "agent_stats/ResearchAgentServer"]
+    plan_1 = db.writes[0][1]
+    assert plan_1["totals"]["prompt_tokens"].value == 150
+    assert plan_1["tasks"]["task-a"]["agent"] == "ResearchAgentServer"
+    assert db.writes[2][1]["llm_calls"].value == 3
+    assert tracker.flush(db) == 0
+
+
+def test_breakdown_merges_plan_documents():
+    docs = [
+        {"plan_id": "team1", "totals": {"calls": 2, "total_tokens": 300, "latency_seconds": 3.0},
+         "agents": {"EvaluatorAgentServer": {"calls": 2, "total_tokens": 300, "latency_seconds": 3.0}}},
+        {"plan_id": "exec", "totals": {"calls": 1, "total_tokens": 100, "latency_seconds": 1.0},
+         "agents": {"EvaluatorAgentServer": {"calls": 1, "total_tokens": 100, "latency_seconds": 1.0}},
+         "tasks": {"t1": {"agent": "EvaluatorAgentServer", "calls": 1, "total_tokens": 100, "latency_seconds": 1.0}}},
+    ]
+    breakdown = usage_breakdown(docs)
+    assert breakdown["totals"]["total_tokens"] == 400
+    assert breakdown["agents"]["EvaluatorAgentServer"]["avg_latency_seconds"] == 1.3333
+    assert breakdown["tasks"]["t1"]["plan_id"] == "exec"
+
+
+def test_usage_is_broken_down_per_route():
+    tracker = LLMUsageTracker(agent_name="DevelopmentAgentServer")
+    timing = _Timing(100, 20, 1.5)
+    timing.model, timing.route, timing.fallback_from = "gemini-2.0-flash-001", "code-large", "gemini-1.5-pro-002"
+    with bind_llm_usage("plan-1", "task-a"):
+        tracker.record(timing)
+        tracker.record(_Timing(10, 5, 1.0))
+
+    db = _FakeDb()
+    tracker.flush(db)
+    routes = db.writes[0][1]["routes"]
+    assert routes["code-large:fallback"]["model"] == "gemini-2.0-flash-001"
+    assert routes["default"]["calls"].value == 1
+    assert db.writes[0][1]["tasks"]["task-a"]["calls"].value == 2
+
+
+@pytest.mark.asyncio
+async def test_each_agent_server_gets_its_own_usage_entries(monkeypatch):
+    from src.shared import llm_client, llm_usage
+    from src.shared.llm_providers import StubLLMProvider
+    from src.shared.llm_rate_limiter import LLMRateLimiter
+
+    db = _FakeDb()
+    for server_name in ("EvaluatorAgentServer", "ResearchAgentServer"):
+        monkeypatch.setenv("AGENT_NAME", "placeholder")
+        monkeypatch.delenv("AGENT_NAME")
+        monkeypatch.setattr(llm_client, "_default_client", llm_client.LLMClient(
+            provider=StubLLMProvider({"latency": {"distribution": "constant", "seconds": 0}}),
+            rate_limiter=LLMRateLimiter({}),
+        ))
+        monkeypatch.setattr(llm_usage, "_tracker", None)
+
+        assert llm_client.set_llm_agent_name(server_name) == server_name
+        with bind_llm_usage("plan-1", f"task-{server_name}"):
+            await llm_client.call_llm(f"prompt de {server_name}", bypass_cache=True)
+        llm_usage.get_llm_usage_tracker().flush(db)
+
+    paths = [path for path, _ in db.writes]
+    assert "agent_stats/EvaluatorAgentServer" in paths and "agent_stats/ResearchAgentServer" in paths
+    plan_writes = [data for path, data in db.writes if path == "llm_usage/plan-1"]
+    assert [list(data["agents"]) for data in plan_writes] == [["EvaluatorAgentServer"], ["ResearchAgentServer"]]
+    assert all("unknown_agent" not in path for path in paths)
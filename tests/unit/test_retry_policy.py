@@ -0,0 +1,86 @@
+import random
+
+from src.shared.graph_storage import InMemoryGraphStorage
+from src.shared.llm_providers import StubProviderError
+from src.shared.execution_task_graph_management import (
+    ExecutionTaskGraph,
+    ExecutionTaskNode,
+    ExecutionTaskState,
+    ExecutionTaskType,
+)
+from src.shared.retry_policy import (
+    SUPERVISOR_ERROR,
+    FailureClass,
+    RetryPolicy,
+    classify_failure,
+    failure_code_for_exception,
+)
+
+
+def test_classify_and_decide():
+    assert classify_failure("429 Resource exhausted") == FailureClass.RATE_LIMITED
+    assert classify_failure("Échéance dépassée (900s), tâche annulée sur l'agent.") == FailureClass.DEADLINE
+    assert classify_failure("Pod env-1 is not Running") == FailureClass.ENVIRONMENT
+    assert classify_failure("Réponse agent A2A invalide/absente.") == FailureClass.TRANSIENT
+    assert classify_failure("Décomposition invalide: cycle a -> b -> a") == FailureClass.PERMANENT
+    # Une erreur interne du superviseur est permanente, quel que soit son message.
+    assert classify_failure(
+        "Erreur interne du superviseur: connection timeout", SUPERVISOR_ERROR
+    ) == FailureClass.PERMANENT
+
+    policy = RetryPolicy(
+        {"limits": {"transient": 2}, "base_delay_seconds": 1, "max_delay_seconds": 3},
+        rng=random.Random(0),
+    )
+    first = policy.decide(FailureClass.TRANSIENT, 0)
+    assert first.retry and first.attempt == 1 and 0 <= first.delay_seconds <= 1
+    assert 0 <= policy.decide(FailureClass.TRANSIENT, 1).delay_seconds <= 2
+    assert not policy.decide(FailureClass.TRANSIENT, 2).retry
+    assert not policy.decide(FailureClass.PERMANENT, 0).retry
+
+
+def test_backoff_and_blocked_dependents():
+    graph = ExecutionTaskGraph("exec_retry", storage=InMemoryGraphStorage())
+    graph.add_task(ExecutionTaskNode("a", "A", ExecutionTaskType.EXECUTABLE), is_root=True)
+    graph.add_task(ExecutionTaskNode("b", "B", ExecutionTaskType.EXECUTABLE, dependencies=["a"]))
+    graph.add_task(ExecutionTaskNode("c", "C", ExecutionTaskType.EXECUTABLE, dependencies=["b"]))
+    graph.add_task(ExecutionTaskNode("d", "D", ExecutionTaskType.EXECUTABLE), is_root=True)
+
+    graph.update_task_state("a", ExecutionTaskState.FAILED, "Réponse agent A2A invalide/absente.")
+    graph.schedule_retry("a", FailureClass.TRANSIENT.value, 1, 60.0)
+    assert [t.id for t in graph.get_ready_tasks()] == ["d"]
+    assert graph.get_task("a").meta["retry_attempts"] == 1
+
+    graph.update_task_state("a", ExecutionTaskState.FAILED, "Décomposition invalide")
+    assert sorted(graph.block_dependents("a")) == ["b", "c"]
+    assert graph.get_task("c").state == ExecutionTaskState.BLOCKED
+
+    graph.update_task_state("a", ExecutionTaskState.PENDING, "Relance demandée.")
+    assert "retry_attempts" not in graph.get_task("a").meta
+    assert {t.id for t in graph.get_ready_tasks()} == {"a", "d"}
+
+
+def test_agent_output_does_not_drive_classification():
+    graph = ExecutionTaskGraph("exec_classify", storage=InMemoryGraphStorage())
+    graph.add_task(ExecutionTaskNode("t", "Tests", ExecutionTaskType.EXECUTABLE), is_root=True)
+    graph.update_task_output("t", summary="Rapport de tests : timeout de connexion à l'environnement simulé.")
+    graph.update_task_state("t", ExecutionTaskState.FAILED, "Échec signalé par l'agent (code: aucun).")
+
+    node = graph.get_task("t")
+    assert classify_failure(node.meta.get("last_error"), node.meta.get("error_code")) == FailureClass.PERMANENT
+
+    graph.update_task_state("t", ExecutionTaskState.FAILED, "Erreur interne du superviseur: boom", error_code=SUPERVISOR_ERROR)
+    assert graph.get_task("t").meta["error_code"] == SUPERVISOR_ERROR
+    graph.update_task_state("t", ExecutionTaskState.FAILED, "Réponse agent A2A invalide/absente.")
+    assert "error_code" not in graph.get_task("t").meta
+
+
+def test_agent_failure_codes():
+    # Code publié par l'agent : il l'emporte sur le détail, qui ne nomme ni la tâche ni l'agent.
+    assert classify_failure("Échec signalé par l'agent (code: rate_limited).", "rate_limited") == FailureClass.RATE_LIMITED
+    assert classify_failure("Échec signalé par l'agent (code: aucun).") == FailureClass.PERMANENT
+
+    assert failure_code_for_exception(StubProviderError("quota simulé")) == "rate_limited"
+    assert failure_code_for_exception(RuntimeError("Pod 'env-1' is not in Running state: Pending")) == "environment"
+    assert failure_code_for_exception(ConnectionResetError("reset by peer")) == "transient"
+    assert failure_code_for_exception(ValueError("réponse JSON invalide")) is None
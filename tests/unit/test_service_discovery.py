@@ -0,0 +1,73 @@
+import asyncio
+import threading
+
+import pytest
+
+from src.shared import service_discovery
+from src.shared.service_discovery import GraUrlResolver
+
+
+class _FakeDoc:
+    def __init__(self, url):
+        self.exists = url is not None
+        self._url = url
+
+    def to_dict(self):
+        return {"url": self._url}
+
+
+class _FakeDocRef:
+    def __init__(self, url):
+        self.url = url
+        self.reads = 0
+        self.listener = None
+        self.release = threading.Event()
+
+    def get(self):
+        self.release.wait(timeout=2)
+        self.reads += 1
+        return _FakeDoc(self.url)
+
+    def on_snapshot(self, callback):
+        self.listener = callback
+        return object()
+
+
+class _FakeDb:
+    def __init__(self, doc_ref):
+        self.doc_ref = doc_ref
+
+    def collection(self, name):
+        return self
+
+    def document(self, name):
+        return self.doc_ref
+
+
+@pytest.mark.asyncio
+async def test_concurrent_lookups_share_one_read_and_follow_snapshots(monkeypatch):
+    monkeypatch.delenv("GRA_PUBLIC_URL", raising=False)
+    doc_ref = _FakeDocRef("http://gra:8000")
+    monkeypatch.setattr(service_discovery, "get_firestore_client", lambda: _FakeDb(doc_ref))
+    resolver = GraUrlResolver(ttl_seconds=60)
+
+    callers = [asyncio.create_task(resolver.resolve()) for _ in range(5)]
+    await asyncio.sleep(0.05)
+    doc_ref.release.set()
+    assert await asyncio.gather(*callers) == ["http://gra:8000"] * 5
+    assert doc_ref.reads == 1
+
+    assert await resolver.resolve() == "http://gra:8000"
+    doc_ref.listener([_FakeDoc("http://gra-v2:8000")], [], None)
+    assert await resolver.resolve() == "http://gra-v2:8000"
+    assert doc_ref.reads == 1
+
+    metrics = resolver.metrics()
+    assert metrics["firestore_reads"] == 1
+    assert metrics["shared_waits"] == 4
+    assert metrics["cache_hits"] == 2
+    assert metrics["watch_updates"] == 1 and metrics["watching"]
+
+    resolver.invalidate("http://gra-v2:8000")
+    assert await resolver.resolve() == "http://gra:8000"
+    assert doc_ref.reads == 2
@@ -0,0 +1,17 @@
+from src.services.gra.skill_catalog import SkillCatalog
+
+
+def test_catalog_version_changes_only_with_content():
+    catalog = SkillCatalog()
+    assert catalog.publish({"DevAgent": ["coding_python"], "TestAgent": ["software_testing"]})
+    version, etag = catalog.version, catalog.etag
+
+    assert not catalog.update_agent("DevAgent", ["coding_python", "coding_python"])
+    assert (catalog.version, catalog.etag) == (version, etag)
+
+    assert catalog.update_agent("ResearchAgent", ["web_research"])
+    assert catalog.version == version + 1 and catalog.etag != etag
+    assert catalog.to_dict()["skills"] == ["coding_python", "software_testing", "web_research"]
+
+    assert catalog.remove_agent("ResearchAgent")
+    assert catalog.etag == etag
@@ -0,0 +1,93 @@
+import pytest
+
+from src.shared.llm_cache import LLMResponseCache
+from src.shared.llm_client import LLMClient
+from src.shared.llm_providers import LLMProvider
+from src.shared.llm_rate_limiter import LLMRateLimiter
+from src.shared.structured_output import (
+    StructuredOutputError,
+    generate_json,
+    parse_json_output,
+    repair_json,
+    validate_json,
+)
+
+SCHEMA = {
+    "type": "object",
+    "properties": {
+        "summary": {"type": "string"},
+        "items": {"type": "array", "items": {"type": "string"}},
+    },
+    "required": ["summary", "items"],
+}
+
+
+@pytest.mark.parametrize(
+    "raw",
+    [
+        'Voici le résultat :\n```json\n{"summary": "ok", "items": ["a", "b",],}\n```\nBonne journée.',
+        '{"summary": "ok", "items": ["a", "b"]} Note : texte superflu {',
+        '{"summary": "ok", "items": ["a", "b',
+        '{"items": ["a", "b"], "summary": "ok", "dang',
+    ],
+)
+def test_common_malformations_are_repaired_locally(raw):
+    data = parse_json_output(raw, SCHEMA)
+    assert data["summary"] == "ok"
+    assert data["items"][0] == "a"
+
+
+def test_schema_violations_are_reported():
+    errors = validate_json({"summary": 3, "items": ["a", 1]}, SCHEMA)
+    assert errors == ["$.summary : type string attendu, int reçu", "$.items[1] : type string attendu, int reçu"]
+    assert repair_json("pas de json") == "pas de json"
+
+
+@pytest.mark.asyncio
+async def test_llm_is_reasked_only_when_repair_fails():
+    prompts = []
+    responses = iter(['{"summary": "manque items"}', '{"summary": "ok", "items": []}'])
+
+    async def fake_llm(prompt, system_prompt, json_mode=False, **kwargs):
+        prompts.append(prompt)
+        return next(responses)
+
+    data = await generate_json("prompt", "system", SCHEMA, llm_call=fake_llm, max_reasks=1)
+    assert data == {"summary": "ok", "items": []}
+    assert len(prompts) == 2 and "clé obligatoire 'items' absente" in prompts[1]
+
+    responses = iter(["toujours pas du json"])
+    with pytest.raises(StructuredOutputError) as excinfo:
+        await generate_json("prompt", "system", SCHEMA, llm_call=fake_llm, max_reasks=0)
+    assert excinfo.value.raw_response == "toujours pas du json"
+
+
+class _SequenceProvider(LLMProvider):
+    name = "sequence"
+
+    def __init__(self, responses):
+        self.responses = iter(responses)
+
+    async def stream(self, request, timing):
+        yield next(self.responses)
+
+
+@pytest.mark.asyncio
+async def test_answer_rejected_by_schema_is_not_cached():
+    cache = LLMResponseCache(path=None, enabled=True)
+    client = LLMClient(
+        model_name="test-model", cache=cache, rate_limiter=LLMRateLimiter({}),
+        provider=_SequenceProvider(['{"summary": "manque items"}', '{"summary": "ok", "items": []}']),
+    )
+
+    async def cached_call(prompt, system_prompt, **kwargs):
+        return await client.generate(prompt, system_prompt, **kwargs)
+
+    with pytest.raises(StructuredOutputError):
+        await generate_json("prompt", "system", SCHEMA, llm_call=cached_call, max_reasks=0)
+    # Le même prompt atteint de nouveau le modèle au lieu de resservir la réponse rejetée.
+    data = await generate_json("prompt", "system", SCHEMA, llm_call=cached_call, max_reasks=0)
+    assert data == {"summary": "ok", "items": []}
+    stats = cache.stats()["agents"]
+    assert sum(counts["rejected"] for counts in stats.values()) == 1
+    assert await generate_json("prompt", "system", SCHEMA, llm_call=cached_call, max_reasks=0) == data